@@ -1,66 +1,181 @@
 """
 并发控制模块 - 提供任务执行的并发控制机制
-使用信号量限制同时执行的任务数量，防止资源耗尽
+限制同时执行的任务数量，防止资源耗尽；上限可在运行时调整（管理接口或自动调节器）
 """
+import time
 import threading
-from typing import Optional
+from collections import deque
+from typing import List, Optional
 from core.config import settings
 from core.logging import get_logger
+from core.event_bus import event_bus
 
 logger = get_logger(__name__)
 
+LATENCY_BASELINE_ALPHA = 0.1  # 各任务耗时基线的 EWMA 系数
+LATENCY_MIN_SAMPLES = 3  # 基线至少积累多少次执行后才参与延迟判断
+
 
 class ConcurrencyController:
-    """并发控制器 - 使用信号量控制任务执行并发数"""
-    
+    """并发控制器 - 使用条件变量实现可调整上限的计数信号量"""
+
     _instance: Optional['ConcurrencyController'] = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(ConcurrencyController, cls).__new__(cls)
-                    max_concurrent = settings.max_concurrent_tasks
-                    cls._instance._semaphore = threading.Semaphore(max_concurrent)
+                    cls._instance._limit = cls._clamp(settings.max_concurrent_tasks)
                     cls._instance._active_count = 0
-                    cls._instance._count_lock = threading.Lock()
-                    logger.info(f"ConcurrencyController initialized with max_concurrent={max_concurrent}")
+                    cls._instance._waiting_count = 0
+                    cls._instance._cond = threading.Condition()
+                    cls._instance._changes = deque(maxlen=50)
+                    cls._instance._baselines = {}  # key -> [ewma, samples]
+                    cls._instance._latency_ratios = deque(maxlen=500)
+                    logger.info(f"ConcurrencyController initialized with max_concurrent={cls._instance._limit}")
         return cls._instance
-    
+
+    @staticmethod
+    def _clamp(limit: int) -> int:
+        return max(settings.concurrency_min_limit, min(int(limit), settings.concurrency_max_limit))
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return self._limit
+
     def acquire(self, timeout: Optional[float] = None) -> bool:
         """
         获取执行许可
-        
+
         Args:
             timeout: 超时时间（秒），None 表示无限等待
-            
+
         Returns:
             bool: 是否成功获取许可
         """
-        acquired = self._semaphore.acquire(timeout=timeout)
-        if acquired:
-            with self._count_lock:
+        with self._cond:
+            self._waiting_count += 1
+            try:
+                acquired = self._cond.wait_for(lambda: self._active_count < self._limit, timeout)
+            finally:
+                self._waiting_count -= 1
+            if acquired:
                 self._active_count += 1
-                logger.debug(f"Acquired execution slot. Active: {self._active_count}/{settings.max_concurrent_tasks}")
+                logger.debug(f"Acquired execution slot. Active: {self._active_count}/{self._limit}")
+        if acquired:
+            self._publish_usage()
         return acquired
-    
+
+    def force_acquire(self):
+        """
+        不等待地占用一个执行许可，即使已达上限
+
+        用于重启后重新接管的执行：进程已在运行，必须计入活跃数，新的执行要等它结束后才能获得许可。
+        """
+        with self._cond:
+            self._active_count += 1
+            logger.debug(f"Forced execution slot. Active: {self._active_count}/{self._limit}")
+        self._publish_usage()
+
     def release(self):
         """释放执行许可"""
-        with self._count_lock:
+        with self._cond:
             if self._active_count > 0:
                 self._active_count -= 1
-        self._semaphore.release()
-        logger.debug(f"Released execution slot. Active: {self._active_count}/{settings.max_concurrent_tasks}")
-    
+            self._cond.notify()
+        logger.debug(f"Released execution slot. Active: {self._active_count}/{self._limit}")
+        self._publish_usage()
+
+    def set_limit(self, limit: int, source: str = "admin", reason: str = "") -> Optional[dict]:
+        """
+        调整并发上限（限制在 concurrency_min_limit ~ concurrency_max_limit 之间）
+
+        调低上限不会中断运行中的执行，只是在活跃数降到新上限以下之前不再发放许可。
+
+        Args:
+            limit: 新上限
+            source: 调整来源（admin / autotune / config）
+            reason: 调整原因
+
+        Returns:
+            变更记录；上限未变化时返回 None
+        """
+        new_limit = self._clamp(limit)
+        with self._cond:
+            old_limit = self._limit
+            if new_limit == old_limit:
+                return None
+            self._limit = new_limit
+            self._cond.notify_all()
+            change = {
+                "time": time.time(),
+                "old_limit": old_limit,
+                "new_limit": new_limit,
+                "source": source,
+                "reason": reason,
+                "active": self._active_count,
+                "waiting": self._waiting_count,
+            }
+            self._changes.append(change)
+        logger.info(f"Concurrency limit changed {old_limit} -> {new_limit} ({source}: {reason})")
+        self._publish_usage()
+        return change
+
+    def observe_duration(self, key, duration: Optional[float]):
+        """
+        记录一次成功执行的耗时，按任务维护耗时基线（EWMA），并记录本次耗时相对基线的倍数
+
+        并发过高导致资源争用时，同一任务的耗时会整体变长，自动调节器据此收缩并发上限。
+        """
+        if not duration or duration <= 0:
+            return
+        with self._cond:
+            baseline = self._baselines.get(key)
+            if baseline is None:
+                self._baselines[key] = [duration, 1]
+                return
+            if baseline[1] >= LATENCY_MIN_SAMPLES:
+                self._latency_ratios.append(duration / baseline[0])
+            baseline[0] += LATENCY_BASELINE_ALPHA * (duration - baseline[0])
+            baseline[1] += 1
+
+    def drain_latency_ratios(self) -> List[float]:
+        """取出并清空自上次调用以来记录的耗时倍数"""
+        with self._cond:
+            ratios = list(self._latency_ratios)
+            self._latency_ratios.clear()
+        return ratios
+
+    def _publish_usage(self):
+        """推送执行槽占用变化"""
+        event_bus.publish("slots", {
+            "active": self.get_active_count(),
+            "max": self._limit,
+            "waiting": self.get_waiting_count(),
+        })
+
     def get_active_count(self) -> int:
         """获取当前活跃执行数"""
-        with self._count_lock:
+        with self._cond:
             return self._active_count
-    
+
+    def get_waiting_count(self) -> int:
+        """获取正在等待许可的执行数"""
+        with self._cond:
+            return self._waiting_count
+
     def get_available_slots(self) -> int:
         """获取可用执行槽数"""
-        return settings.max_concurrent_tasks - self.get_active_count()
+        with self._cond:
+            return max(0, self._limit - self._active_count)
+
+    def get_changes(self) -> List[dict]:
+        """最近的上限变更记录（新的在前）"""
+        with self._cond:
+            return list(reversed(self._changes))
 
 
 # 全局单例实例
@@ -39,14 +39,130 @@ class Settings(BaseSettings):
     database_pool_pre_ping: bool = True
     
     # ========== 调度器配置 ==========
-    max_concurrent_tasks: int = 50
+    max_concurrent_tasks: int = 50  # 初始并发上限，运行时可通过 /api/system/concurrency 调整
     scheduler_coalesce: bool = False
     scheduler_max_instances: int = 3
+    cron_stagger_mode: str = "off"  # off（仅任务单独开启）/ hash（全部按哈希错峰）/ spread（全部按触发直方图错峰）
+    cron_stagger_window: int = 300  # 全局错峰窗口（秒），任务的 stagger_window 优先
+    cron_stagger_horizon: int = 86400  # spread 模式预测触发时间的范围（秒）
+    forecast_default_duration: int = 60  # 容量预测中没有执行历史的任务按此耗时（秒）估算
+    forecast_max_hours: int = 168  # 容量预测范围上限（小时）
+    
+    # ========== 执行性能分析配置 ==========
+    performance_window: int = 100  # 每个任务参与统计的最近成功执行数
+    adaptive_timeout_enabled: bool = False  # 未单独设置的任务是否使用自适应超时
+    adaptive_timeout_quantile: float = 0.99  # 自适应超时参考的耗时分位数
+    adaptive_timeout_factor: float = 3.0  # 自适应超时 = 耗时分位数 × 此倍数（不超过任务配置的超时）
+    adaptive_timeout_min_samples: int = 20  # 成功执行数达到此值后才使用自适应超时
+    adaptive_timeout_floor: int = 60  # 自适应超时下限（秒）
+    regression_recent_runs: int = 10  # 与基线比较的最近成功执行数
+    regression_ratio: float = 1.5  # 最近中位数超过基线中位数的倍数时标记为性能退化
+    
+    # ========== 分发队列配置 ==========
+    dispatch_queue_size: int = 1000  # 等待并发许可的运行数上限，超出时手动/API 触发返回 429
+    dispatch_retry_after: int = 30  # 无法根据近期吞吐估算时 Retry-After 的默认秒数
+    dispatch_retry_after_max: int = 600  # Retry-After 上限（秒）
+    dispatch_policy: str = "fifo"  # fifo / sjf（预计耗时最短优先）/ binpack（按内存预算装箱）
+    dispatch_aging_seconds: int = 600  # sjf / binpack 下队首运行等待超过此时间后优先分发，0 为不启用
+    dispatch_memory_budget_mb: int = 0  # binpack 的内存预算，0 为物理内存的 80%
+    dispatch_default_duration: int = 60  # 没有执行历史的任务的预计耗时（秒）
+    
+    # ========== 并发自动调节配置 ==========
+    concurrency_min_limit: int = 1  # 并发上限可调整的下界
+    concurrency_max_limit: int = 200  # 并发上限可调整的上界（调度线程池按此大小创建）
+    concurrency_autotune: bool = False  # 是否默认启用并发自动调节
+    concurrency_autotune_interval: int = 30  # 自动调节周期（秒）
+    concurrency_autotune_cpu_high: float = 85.0  # CPU 使用率高于此值时收缩
+    concurrency_autotune_cpu_low: float = 60.0  # CPU 使用率低于此值且有排队时扩张
+    concurrency_autotune_memory_high: float = 90.0  # 内存使用率高于此值时收缩
+    concurrency_autotune_latency_ratio: float = 1.5  # 执行耗时中位数超过各任务基线的倍数时收缩
     
     # ========== 资源监控配置 ==========
     resource_monitor_interval: int = 2  # 监控间隔（秒）
     resource_update_interval: int = 10  # 数据库更新间隔（秒）
     
+    # ========== 卡死检测与停止配置 ==========
+    stall_timeout: int = 0  # 未单独设置的任务无输出且 CPU 空闲多少秒后判定卡死，0 为不检测
+    stall_cpu_idle_percent: float = 1.0  # 执行进程 CPU 使用率低于此值视为空闲
+    stop_sequence: str = "SIGINT:5,SIGTERM:10,SIGKILL"  # 停止执行时依次发送的信号及每步的宽限秒数
+    
+    # ========== 重启接管配置 ==========
+    exit_code_wrapper: bool = True  # 通过 exit_wrapper.py 启动命令并记录退出码，重启后接管的执行据此记录结果
+    reattach_poll_interval: float = 1.0  # 重新接管的执行的存活检查间隔（秒）
+    
+    # ========== 环境复用配置 ==========
+    lockfile_default_python: str = "3.10"  # 锁文件环境默认 Python 版本
+    lockfile_env_prefix: str = "lock-"  # 锁文件环境目录名前缀
+    env_gc_idle_days: int = 7  # 无引用的锁文件环境闲置多少天后回收
+    dedupe_min_file_size: int = 4096  # 参与环境文件去重的最小文件大小（字节）
+    dedupe_readonly: bool = True  # 去重后的共享文件去除写权限，防止原地写入
+    
+    # ========== 项目上传配置 ==========
+    upload_chunk_size: int = 1024 * 1024  # 上传/解压分块大小（字节）
+    upload_max_bytes: int = 2 * 1024 * 1024 * 1024  # 上传压缩包大小上限
+    extract_max_bytes: int = 10 * 1024 * 1024 * 1024  # 解压后总大小上限
+    extract_max_members: int = 200000  # 压缩包成员数量上限
+    extract_max_ratio: int = 200  # 解压总大小 / 压缩包大小 的上限（防 zip 炸弹）
+    extract_workers: int = 4  # ZIP 并行解压线程数
+    revision_keep: int = 10  # 每个项目保留的修订版本数量
+    git_fetch_timeout: int = 300  # git 拉取超时（秒）
+    git_sync_interval_minutes: int = 60  # git 项目自动同步间隔（分钟）
+    precompile_enabled: bool = True  # 上传/编辑/同步后预编译项目字节码
+    precompile_mode: str = "auto"  # auto / timestamp / checked-hash / unchecked-hash
+    precompile_workers: int = 4  # 预编译进程池大小
+    precompile_timeout: int = 300  # 单个解释器预编译超时（秒）
+    
+    # ========== 预热解释器池配置 ==========
+    warm_preload_modules: str = ""  # 预热工作进程预先导入的模块（逗号分隔，如 "requests,lxml.html"）
+    warm_pool_max_runs: int = 1000  # 单个预热工作进程处理多少次运行后回收
+    warm_pool_start_timeout: int = 60  # 预热工作进程启动（含预加载导入）超时（秒）
+    
+    # ========== 浏览器池配置 ==========
+    browser_pool_chrome_bin: str = ""  # Chromium 路径，留空时使用 CHROME_BIN 或 PATH 查找
+    browser_pool_size: int = 2  # 常驻浏览器数量上限
+    browser_pool_contexts_per_browser: int = 4  # 每个浏览器同时租用的隔离上下文数量
+    browser_pool_max_uses: int = 50  # 浏览器累计租用多少次后回收
+    browser_pool_max_memory_mb: int = 1536  # 浏览器进程树内存超过该值后回收，0 表示不限制
+    browser_pool_acquire_timeout: int = 300  # 等待空闲浏览器的超时（秒）
+    browser_pool_start_timeout: int = 30  # 浏览器启动超时（秒）
+    
+    # ========== 全局限速协调配置 ==========
+    rate_limit_enabled: bool = True  # 随后端启动本地限速协调服务
+    rate_limit_default_rps: float = 0.0  # 无规则且任务未声明速率时的默认速率，0 表示不限速
+    rate_limit_max_wait: float = 300.0  # 单次申请默认最长等待（秒）
+    
+    # ========== 缓存转发代理配置（系统配置 cache_proxy.enabled 开启） ==========
+    cache_proxy_dir: str = "./data/proxy_cache"
+    cache_proxy_port: int = 0  # 0 表示随机端口
+    cache_proxy_max_bytes: int = 1024 * 1024 * 1024  # 缓存总大小上限
+    cache_proxy_max_object_bytes: int = 50 * 1024 * 1024  # 单个响应可缓存的大小上限
+    cache_proxy_pool_size: int = 64  # 每个上游主机保持的连接数
+    cache_proxy_timeout: int = 60  # 上游连接/读取超时（秒）
+    
+    # ========== URL 去重服务配置 ==========
+    url_dedupe_enabled: bool = True  # 随后端启动本地 URL 去重服务
+    url_dedupe_dir: str = "./data/dedupe"  # 布隆过滤器文件目录（每个命名空间一个子目录）
+    url_dedupe_initial_capacity: int = 1000000  # 第一阶段过滤器容量，写满后按 2 倍扩展
+    url_dedupe_error_rate: float = 0.001  # 命名空间总误判率上限
+    
+    # ========== 本地服务端点 ==========
+    service_state_dir: str = "./data/services"  # 协调服务与缓存代理的端口和令牌（重启后复用，重新接管的执行仍可连接）
+    
+    # ========== 断点续跑配置 ==========
+    checkpoint_dir: str = "./data/checkpoints"  # 每次逻辑运行的断点目录（重试之间共享）
+    checkpoint_retention_hours: int = 72  # 最终失败的运行保留断点的时长
+    
+    # ========== 事件触发器配置 ==========
+    file_trigger_use_inotify: bool = True  # Linux 下使用 inotify 监听文件触发器目录，否则轮询
+    file_trigger_poll_interval: float = 5.0  # 轮询模式扫描间隔（秒）
+    file_trigger_default_debounce: float = 2.0  # 文件触发器默认防抖时间（秒）
+    
+    # ========== 实时推送配置 ==========
+    event_bus_history: int = 1000  # 保留的最近事件数，断线重连时据此补发
+    event_bus_queue_size: int = 256  # 单个连接的待发送队列上限，溢出后要求客户端重新同步
+    event_bus_stats_interval: float = 3.0  # 有订阅者时推送主机资源统计的间隔（秒）
+    event_bus_heartbeat: float = 25.0  # 连接空闲时发送心跳的间隔（秒）
+    
     # ========== 安全配置 ==========
     secret_key_file: str = "./data/secret.key"
     secret_key_env: str = "KUMO_SECRET_KEY"
@@ -78,6 +194,10 @@ class Settings(BaseSettings):
         self.task_log_dir = normalize_path(self.task_log_dir)
         self.install_log_dir = normalize_path(self.install_log_dir)
         self.backup_dir = normalize_path(self.backup_dir)
+        self.cache_proxy_dir = normalize_path(self.cache_proxy_dir)
+        self.url_dedupe_dir = normalize_path(self.url_dedupe_dir)
+        self.checkpoint_dir = normalize_path(self.checkpoint_dir)
+        self.service_state_dir = normalize_path(self.service_state_dir)
         self.secret_key_file = normalize_path(self.secret_key_file)
         
         # 处理数据库路径
@@ -18,7 +18,8 @@ def create_error_response(
     error_code: str,
     message: str,
     path: str,
-    details: Dict[str, Any] = None
+    details: Dict[str, Any] = None,
+    headers: Dict[str, str] = None
 ) -> JSONResponse:
     """
     创建统一的错误响应
@@ -29,6 +30,7 @@ def create_error_response(
         message: 错误消息
         path: 请求路径
         details: 额外详情
+        headers: 额外响应头（如 429 的 Retry-After）
     
     Returns:
         JSONResponse: 统一的错误响应
@@ -46,7 +48,8 @@ def create_error_response(
     
     return JSONResponse(
         status_code=status_code,
-        content=response_data
+        content=response_data,
+        headers=headers
     )
 
 
@@ -97,7 +100,8 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
         status_code=exc.status_code,
         error_code=error_code,
         message=str(exc.detail),
-        path=str(request.url.path)
+        path=str(request.url.path),
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -0,0 +1,198 @@
+"""
+事件总线 - 服务端推送通道的发布/订阅核心
+
+任意线程（执行器、调度器、路由）调用 publish(topic, data)；WebSocket / SSE 连接通过
+subscribe() 获得绑定到自身事件循环的队列。事件带递增序号并保留最近一段历史，
+断线重连时可以用 since 补发，缺口超出历史时客户端收到 resync 后重新拉取全量数据。
+
+track_model() 在 ORM 提交后自动发布模型的新增/删除/字段变化，
+执行器、调度器和路由无需在每个修改点手动发布。
+"""
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    """单个连接的订阅，事件经 call_soon_threadsafe 投递到连接所在的事件循环"""
+
+    def __init__(self, topics: Optional[Set[str]], loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.topics = topics
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def deliver(self, event: dict):
+        if self.closed:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed
+            self.closed = True
+
+    def _put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop the backlog, the client refetches everything
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """等待下一个事件，超时返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """事件总线 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(EventBus, cls).__new__(cls)
+                    cls._instance._subscribers = set()
+                    cls._instance._history = deque(maxlen=settings.event_bus_history)
+                    cls._instance._seq = 0
+                    cls._instance._evicted_seq = 0  # 已被挤出历史的最大序号
+                    cls._instance._state_lock = threading.Lock()
+        return cls._instance
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, topic: str, data: dict, retain: bool = True):
+        """
+        发布事件（可在任意线程调用）
+
+        Args:
+            topic: 事件主题
+            data: 事件数据（需可 JSON 序列化）
+            retain: 是否保留在历史中供重连补发；周期性快照（如主机统计）无需保留
+        """
+        with self._state_lock:
+            self._seq += 1
+            item = {"seq": self._seq, "topic": topic, "ts": time.time(), "data": data}
+            if retain:
+                if len(self._history) == self._history.maxlen:
+                    self._evicted_seq = self._history[0]["seq"]
+                self._history.append(item)
+            subscribers = [s for s in self._subscribers if s.wants(topic)]
+        for subscription in subscribers:
+            subscription.deliver(item)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None,
+                  loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        subscription = Subscription(
+            set(topics) if topics else None,
+            loop or asyncio.get_running_loop(),
+            settings.event_bus_queue_size,
+        )
+        with self._state_lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        with self._state_lock:
+            self._subscribers.discard(subscription)
+
+    def events_since(self, seq: int, topics: Optional[Set[str]] = None) -> Optional[List[dict]]:
+        """返回序号大于 seq 的历史事件；历史已不完整时返回 None（需要 resync）"""
+        with self._state_lock:
+            history = list(self._history)
+            current = self._seq
+            evicted = self._evicted_seq
+        if seq == current:
+            return []
+        if seq > current or seq < evicted:
+            # seq from before a backend restart, or events already evicted from history
+            return None
+        return [e for e in history if e["seq"] > seq and (topics is None or e["topic"] in topics)]
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        with self._state_lock:
+            return sum(1 for s in self._subscribers if topic is None or s.wants(topic))
+
+
+# 全局单例
+event_bus = EventBus()
+
+
+# ---------- ORM 变更跟踪 ----------
+
+_tracked: Dict[type, dict] = {}
+_PENDING_KEY = "event_bus_pending"
+
+
+def track_model(model: type, topic: str, fields: Iterable[str], serialize: Callable[[object], dict]):
+    """
+    在提交后为模型发布事件：新增（created）、删除（deleted）或 fields 中任一字段变化（updated）
+
+    Args:
+        model: ORM 模型类
+        topic: 事件主题
+        fields: 触发 updated 事件的字段
+        serialize: 把实例转换为事件数据（在 flush 时调用，此时主键已分配）
+    """
+    _tracked[model] = {"topic": topic, "fields": tuple(fields), "serialize": serialize}
+
+
+def _collect(session, flush_context):
+    if not _tracked:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for action, objects in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            spec = _tracked.get(type(obj))
+            if not spec:
+                continue
+            if action == "updated":
+                state = inspect(obj)
+                if not any(state.attrs[f].history.has_changes() for f in spec["fields"]):
+                    continue
+            try:
+                data = spec["serialize"](obj)
+            except Exception as e:
+                logger.debug(f"Could not serialize {type(obj).__name__} for event bus: {e}")
+                continue
+            data["action"] = action
+            pending.append((spec["topic"], data))
+
+
+def _publish_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    for topic, data in pending or ():
+        event_bus.publish(topic, data)
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# after_flush still sees the pre-flush new/dirty/deleted collections and attribute history,
+# and new objects already have their primary keys
+event.listen(Session, "after_flush", _collect)
+event.listen(Session, "after_commit", _publish_pending)
+event.listen(Session, "after_soft_rollback", lambda session, previous: _discard_pending(session))
@@ -0,0 +1,153 @@
+"""
+目录列表引擎 - 单层列表、游标分页、忽略规则与基于目录 mtime 的缓存
+
+项目文件浏览、系统文件浏览和输出目录选择共用此引擎：
+- 每次只列出一层，目录优先、按名称排序
+- 游标为上一页最后一项的排序键，目录在翻页期间增删条目不会导致重复或遗漏
+- 列表按 (路径, 目录 mtime_ns, 过滤条件) 缓存，目录条目变化会改变 mtime 从而自然失效
+- ETag 由上述缓存键和分页参数计算，支持 If-None-Match 返回 304
+"""
+import os
+import json
+import base64
+import bisect
+import fnmatch
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 默认忽略规则（fnmatch 匹配条目名称）
+DEFAULT_IGNORE_PATTERNS = ("__pycache__", ".*", "node_modules", "*.pyc")
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+class ListingError(Exception):
+    """列表参数不合法"""
+
+
+def _sort_key(entry: dict) -> Tuple[int, str, str]:
+    return (0 if entry["type"] == "dir" else 1, entry["name"].lower(), entry["name"])
+
+
+def encode_cursor(key: Tuple[int, str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str, str]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (int(key[0]), str(key[1]), str(key[2]))
+    except Exception:
+        raise ListingError("Invalid cursor")
+
+
+def parse_ignore_patterns(value: Optional[str]) -> Tuple[str, ...]:
+    """解析逗号分隔的忽略规则；None 使用默认规则，空字符串表示不忽略"""
+    if value is None:
+        return DEFAULT_IGNORE_PATTERNS
+    return tuple(p.strip() for p in value.split(",") if p.strip())
+
+
+class DirectoryListingCache:
+    """目录列表 LRU 缓存 - 线程安全"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[List[dict], List[tuple]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def set(self, key: tuple, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+listing_cache = DirectoryListingCache()
+
+
+def _scan(abs_path: str, ignore: Sequence[str], dirs_only: bool) -> List[dict]:
+    entries = []
+    with os.scandir(abs_path) as it:
+        for entry in it:
+            if any(fnmatch.fnmatch(entry.name, pattern) for pattern in ignore):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if dirs_only and not is_dir:
+                continue
+            entries.append({"name": entry.name, "type": "dir" if is_dir else "file"})
+    entries.sort(key=_sort_key)
+    return entries
+
+
+def list_directory(
+    abs_path: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    ignore: Sequence[str] = DEFAULT_IGNORE_PATTERNS,
+    dirs_only: bool = False
+) -> dict:
+    """
+    列出目录的一层内容
+
+    Returns:
+        {"entries": [{"name", "type"}], "next_cursor", "total", "etag"}
+
+    Raises:
+        FileNotFoundError / NotADirectoryError / PermissionError: 由调用方转换为 HTTP 错误
+        ListingError: 游标或分页参数不合法
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ListingError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    st = os.stat(abs_path)
+    if not os.path.isdir(abs_path):
+        raise NotADirectoryError(abs_path)
+
+    cache_key = (abs_path, st.st_mtime_ns, tuple(ignore), dirs_only)
+    cached = listing_cache.get(cache_key)
+    if cached is None:
+        entries = _scan(abs_path, ignore, dirs_only)
+        cached = (entries, [_sort_key(e) for e in entries])
+        listing_cache.set(cache_key, cached)
+    entries, keys = cached
+
+    start = bisect.bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+    page = entries[start:start + limit]
+    next_cursor = encode_cursor(keys[start + limit - 1]) if start + limit < len(entries) else None
+
+    etag_source = json.dumps([abs_path, st.st_mtime_ns, list(ignore), dirs_only, cursor, limit])
+    etag = 'W/"' + hashlib.sha1(etag_source.encode("utf-8")).hexdigest()[:20] + '"'
+    return {"entries": page, "next_cursor": next_cursor, "total": len(entries), "etag": etag}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断请求的 If-None-Match 是否命中"""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.replace('W/', '') in candidates
@@ -0,0 +1,152 @@
+"""
+本地协调服务基础模块 - 为任务进程提供仅监听 127.0.0.1 的 JSON HTTP 服务
+
+任务进程是独立的子进程，无法直接访问后端内存中的状态；协调服务（限速、去重等）
+通过本模块在后端进程内启动一个轻量 HTTP 服务，并将地址与访问令牌以环境变量注入任务。
+请求与响应均为 JSON，令牌通过 `X-Kumo-Token` 请求头校验。
+
+端口和令牌保存在 KUMO_SERVICE_STATE_DIR，重启后复用：重新接管的执行在启动时注入的地址和令牌仍然有效。
+"""
+import os
+import json
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# handler(payload, query) -> (status, body)
+Handler = Callable[[dict, Dict[str, str]], Tuple[int, dict]]
+
+
+class LocalServiceError(Exception):
+    """请求参数错误，返回 400"""
+    pass
+
+
+def load_service_state(name: str) -> dict:
+    """读取服务上次使用的端点（端口、令牌等），不存在或损坏时返回空字典"""
+    try:
+        with open(os.path.join(settings.service_state_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_service_state(name: str, state: dict):
+    """保存服务端点（仅所有者可读，内容含访问令牌）"""
+    try:
+        os.makedirs(settings.service_state_dir, exist_ok=True)
+        path = os.path.join(settings.service_state_dir, f"{name}.json")
+        fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not save endpoint of {name}: {e}")
+
+
+def bind_server(name: str, host: str, port: int, handler_class) -> ThreadingHTTPServer:
+    """绑定端口，上次使用的端口已被占用时改用随机端口"""
+    try:
+        return ThreadingHTTPServer((host, port), handler_class)
+    except OSError as e:
+        if not port:
+            raise
+        logger.warning(f"{name} could not reuse port {port} ({e}), running executions started before "
+                       f"the restart lose access to it")
+        return ThreadingHTTPServer((host, 0), handler_class)
+
+
+class LocalJSONService:
+    """本地 JSON HTTP 服务，路由为 (method, path) -> handler"""
+
+    def __init__(self, name: str, host: str = "127.0.0.1", port: int = 0):
+        self.name = name
+        self.host = host
+        state = load_service_state(name)
+        # Reuse the previous endpoint so reattached runs can still reach the service
+        self.port = port or int(state.get("port") or 0)
+        self.token = state.get("token") or secrets.token_hex(16)
+        self.routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def route(self, method: str, path: str, handler: Handler):
+        self.routes[(method.upper(), path)] = handler
+
+    @property
+    def url(self) -> Optional[str]:
+        if not self._server:
+            return None
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def _make_handler(self):
+        service = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                path, _, query_string = self.path.partition("?")
+                query = dict(p.split("=", 1) for p in query_string.split("&") if "=" in p)
+                if not secrets.compare_digest(self.headers.get("X-Kumo-Token", ""), service.token):
+                    return self._reply(403, {"error": "invalid token"})
+                handler = service.routes.get((method, path))
+                if handler is None:
+                    return self._reply(404, {"error": f"unknown endpoint {path}"})
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                    status, body = handler(payload, query)
+                except (LocalServiceError, ValueError, TypeError) as e:
+                    status, body = 400, {"error": str(e)}
+                except Exception as e:
+                    logger.error(f"{service.name} handler {path} failed: {e}", exc_info=True)
+                    status, body = 500, {"error": "internal error"}
+                self._reply(status, body)
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return RequestHandler
+
+    def start(self):
+        if self._server:
+            return
+        self._server = bind_server(self.name, self.host, self.port, self._make_handler())
+        self._server.daemon_threads = True
+        save_service_state(self.name, {"port": self._server.server_address[1], "token": self.token})
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"{self.name} listening on {self.url}")
+
+    def stop(self):
+        if not self._server:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        logger.info(f"{self.name} stopped")
@@ -0,0 +1,269 @@
+"""
+环境文件去重模块 - 对 envs 目录下的环境做内容寻址硬链接去重
+
+相同内容（且可执行位一致）的文件被替换为指向共享存储 `.kumo_store/objects`
+中同一 inode 的硬链接，清单文件记录每个受管文件的哈希与 inode：
+- 包升级通常以“删除 + 重写”方式替换文件，硬链接自然断开，下次运行时重新哈希并去重
+- 去重后的对象默认去除写权限，防止原地写入污染其他环境；原地写入会同时改写所有链接到同一 inode 的文件，
+  且没有干净副本可以恢复。inode 未变但大小或 mtime 变化（且内容哈希不符）即视为原地写入：链接到该 inode 的
+  所有环境列入 broken_envs（由调用方标记为 error 以便重建），对应的存储对象被移除，
+  被改写的文件在清单中标记为 broken，不再参与去重，避免把损坏的内容链接给其它环境
+- 存储中仅剩自身引用（st_nlink == 1）的对象会被回收
+"""
+import os
+import json
+import stat
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+STORE_DIRNAME = ".kumo_store"
+MANIFEST_VERSION = 1
+_HASH_CHUNK = 1024 * 1024
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EnvDeduplicator:
+    """环境文件去重器"""
+
+    def __init__(self, envs_dir: Optional[str] = None):
+        self.envs_dir = os.path.abspath(envs_dir or settings.envs_dir)
+        self.store_dir = os.path.join(self.envs_dir, STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.store_dir, "objects")
+        self.manifest_path = os.path.join(self.store_dir, "manifest.json")
+        self._run_lock = threading.Lock()
+        self.status: Dict = {"state": "idle", "last_run": None, "last_stats": None}
+
+    # ---------- manifest ----------
+
+    def load_manifest(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == MANIFEST_VERSION:
+                    return manifest
+            except Exception as e:
+                logger.warning(f"Dedupe manifest unreadable, rebuilding: {e}")
+        return {"version": MANIFEST_VERSION, "files": {}}
+
+    def save_manifest(self, manifest: dict):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- helpers ----------
+
+    def _object_path(self, digest: str, executable: bool) -> str:
+        name = f"{digest}-x" if executable else digest
+        return os.path.join(self.objects_dir, digest[:2], name)
+
+    def _stored_object(self, digest: str, ino: int) -> Optional[str]:
+        """返回与给定 inode 相同的存储对象路径（可执行位可能被原地修改，两种变体都检查）"""
+        for executable in (False, True):
+            object_path = self._object_path(digest, executable)
+            try:
+                if os.stat(object_path).st_ino == ino:
+                    return object_path
+            except OSError:
+                continue
+        return None
+
+    def _iter_env_files(self, skip_dirs: Iterable[str]) -> Iterable[str]:
+        skip = {os.path.abspath(d) for d in skip_dirs}
+        if not os.path.isdir(self.envs_dir):
+            return
+        for entry in os.scandir(self.envs_dir):
+            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                continue
+            if os.path.abspath(entry.path) in skip or "_trash" in entry.name:
+                continue
+            for root, _, files in os.walk(entry.path, followlinks=False):
+                for name in files:
+                    yield os.path.join(root, name)
+
+    def _link_into_place(self, object_path: str, target: str):
+        """用硬链接原子替换目标文件"""
+        tmp_path = f"{target}.kumo-dedupe-tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.link(object_path, tmp_path)
+        os.replace(tmp_path, target)
+
+    # ---------- main ----------
+
+    def run(self, min_size: Optional[int] = None, skip_dirs: Iterable[str] = (), verify: bool = False) -> dict:
+        """
+        执行一次去重
+
+        Args:
+            min_size: 参与去重的最小文件大小（字节）
+            skip_dirs: 跳过的环境目录（如正在安装的环境）
+            verify: 是否重新校验已去重文件的内容（检测原地写入）
+
+        Returns:
+            统计信息
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("Deduplication is already running")
+        try:
+            self.status["state"] = "running"
+            stats = self._run(settings.dedupe_min_file_size if min_size is None else min_size, skip_dirs, verify)
+            self.status["last_stats"] = stats
+            self.status["last_run"] = time.time()
+            return stats
+        finally:
+            self.status["state"] = "idle"
+            self._run_lock.release()
+
+    def _run(self, min_size: int, skip_dirs: Iterable[str], verify: bool) -> dict:
+        started = time.time()
+        manifest = self.load_manifest()
+        old_files: Dict[str, dict] = manifest.get("files", {})
+        new_files: Dict[str, dict] = {}
+        stats = {
+            "scanned_files": 0,
+            "hashed_files": 0,
+            "linked_files": 0,
+            "relinked_files": 0,
+            "already_deduped": 0,
+            "bytes_saved": 0,
+            "modified_in_place": [],
+            "broken_envs": [],
+            "objects_removed": 0,
+            "errors": 0,
+        }
+        os.makedirs(self.objects_dir, exist_ok=True)
+        # Environments sharing each deduplicated inode, to mark all of them when one is written in place
+        inode_envs: Dict[int, set] = {}
+        for rel_path, entry in old_files.items():
+            inode_envs.setdefault(entry["ino"], set()).add(rel_path.split(os.sep, 1)[0])
+        poisoned = set()
+
+        for path in self._iter_env_files(skip_dirs):
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode) or st.st_size < min_size or path.endswith(".kumo-dedupe-tmp"):
+                continue
+            stats["scanned_files"] += 1
+            rel_path = os.path.relpath(path, self.envs_dir)
+            executable = bool(st.st_mode & stat.S_IXUSR)
+            entry = old_files.get(rel_path)
+
+            try:
+                same_inode = bool(entry) and entry["ino"] == st.st_ino
+                if same_inode and (entry.get("broken") or st.st_ino in poisoned):
+                    # Already known to be written in place, never feed it back into the store
+                    if st.st_ino in poisoned:
+                        stats["modified_in_place"].append(rel_path)
+                    new_files[rel_path] = dict(entry, broken=True, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                    continue
+                object_path = self._stored_object(entry["hash"], st.st_ino) if same_inode else None
+                if object_path:
+                    # Still linked to the store: any change of size or mtime means the shared
+                    # inode itself was written in place (a rewrite would have changed the inode)
+                    if entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns or verify:
+                        digest = _file_sha256(path)
+                        stats["hashed_files"] += 1
+                        if digest != entry["hash"]:
+                            poisoned.add(st.st_ino)
+                            # Evict the poisoned object so new files never link to it
+                            os.remove(object_path)
+                            # Every link to the inode changed with it, there is no clean copy to restore
+                            for env_name in sorted(inode_envs.get(st.st_ino, ())):
+                                if env_name not in stats["broken_envs"]:
+                                    stats["broken_envs"].append(env_name)
+                            logger.warning(f"Deduplicated file modified in place, environments "
+                                           f"{sorted(inode_envs.get(st.st_ino, ()))} are broken: {rel_path}")
+                            stats["modified_in_place"].append(rel_path)
+                            new_files[rel_path] = dict(entry, broken=True, size=st.st_size,
+                                                       mtime_ns=st.st_mtime_ns)
+                            continue
+                    stats["already_deduped"] += 1
+                    new_files[rel_path] = dict(entry, mtime_ns=st.st_mtime_ns)
+                    continue
+                elif entry:
+                    # Inode changed: the link was broken by an upgrade/rewrite, re-dedupe it
+                    stats["relinked_files"] += 1
+
+                digest = _file_sha256(path)
+                stats["hashed_files"] += 1
+                object_path = self._object_path(digest, executable)
+
+                if not os.path.exists(object_path):
+                    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                    os.link(path, object_path)
+                else:
+                    object_st = os.stat(object_path)
+                    if object_st.st_ino != st.st_ino:
+                        self._link_into_place(object_path, path)
+                        stats["linked_files"] += 1
+                        stats["bytes_saved"] += st.st_size
+
+                if settings.dedupe_readonly:
+                    mode = os.stat(object_path).st_mode
+                    os.chmod(object_path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+                final_st = os.stat(path)
+                new_files[rel_path] = {
+                    "hash": digest,
+                    "size": final_st.st_size,
+                    "ino": final_st.st_ino,
+                    "mtime_ns": final_st.st_mtime_ns,
+                }
+            except OSError as e:
+                stats["errors"] += 1
+                logger.warning(f"Dedupe failed for {rel_path}: {e}")
+
+        stats["objects_removed"] = self.collect_garbage()
+        manifest["files"] = new_files
+        manifest["updated_at"] = time.time()
+        self.save_manifest(manifest)
+
+        stats["duration_seconds"] = round(time.time() - started, 2)
+        logger.info(
+            f"Env dedupe finished: scanned={stats['scanned_files']} linked={stats['linked_files']} "
+            f"saved={stats['bytes_saved']}B in {stats['duration_seconds']}s"
+        )
+        return stats
+
+    def collect_garbage(self) -> int:
+        """删除仅被存储自身引用的对象"""
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_nlink <= 1:
+                        os.chmod(path, stat.S_IWUSR | stat.S_IRUSR)
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def get_status(self) -> dict:
+        manifest = self.load_manifest()
+        return dict(self.status, managed_files=len(manifest.get("files", {})))
+
+
+# 全局单例实例
+env_deduplicator = EnvDeduplicator()
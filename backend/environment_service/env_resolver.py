@@ -0,0 +1,316 @@
+"""
+锁文件环境解析模块 - 按规范化的依赖哈希解析、复用和构建 Conda 环境
+
+相同 requirements（规范化后）+ 相同 Python 版本的项目共享同一个环境，
+环境不存在时在后台构建；无引用且长期闲置的环境由 GC 回收。
+"""
+import os
+import re
+import shutil
+import hashlib
+import datetime
+import platform
+import subprocess
+import threading
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from environment_service import models
+from environment_service.python_version_router import append_log, get_log_path, background_delete_version
+from project_service import models as project_models
+from system_service import models as system_models
+from task_service.models import Task
+
+logger = get_logger(__name__)
+
+REQUIREMENTS_FILENAME = "kumo-requirements.txt"
+
+# 串行化解析过程，避免并发请求为同一哈希重复构建环境
+_resolve_lock = threading.Lock()
+
+_REQ_NAME_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*(.*)$")
+
+
+def _normalize_requirement_line(line: str) -> Optional[str]:
+    """规范化单行依赖声明，空行/注释返回 None"""
+    # Strip inline comments ("pkg==1.0  # note") and full-line comments
+    line = re.sub(r"(^|\s)#.*$", "", line).strip()
+    if not line:
+        return None
+
+    # pip options (-i, --extra-index-url, -r ...) are kept verbatim, whitespace collapsed
+    if line.startswith("-"):
+        return " ".join(line.split())
+
+    match = _REQ_NAME_RE.match(line)
+    if not match:
+        return " ".join(line.split())
+
+    name, extras, rest = match.groups()
+    # PEP 503 name canonicalization
+    name = re.sub(r"[-_.]+", "-", name).lower()
+    if extras:
+        extra_names = sorted({e.strip().lower() for e in extras[1:-1].split(",") if e.strip()})
+        extras = f"[{','.join(extra_names)}]" if extra_names else ""
+    rest = "".join(rest.split())
+    return f"{name}{extras or ''}{rest}"
+
+
+def normalize_requirements(text: str) -> List[str]:
+    """
+    规范化 requirements 文本
+
+    去除注释和空行，统一包名大小写与分隔符，去掉版本约束中的空白，
+    去重后排序，使语义相同的 requirements 得到相同结果。
+    """
+    if not text:
+        return []
+    lines = set()
+    for raw in text.splitlines():
+        normalized = _normalize_requirement_line(raw)
+        if normalized:
+            lines.add(normalized)
+    return sorted(lines)
+
+
+def compute_requirements_hash(requirements: List[str], python_version: str) -> str:
+    """计算规范化 requirements + Python 版本的哈希值"""
+    payload = f"python={python_version}\n" + "\n".join(requirements)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_project_requirements(project: project_models.Project) -> Optional[str]:
+    """读取项目的 requirements.txt（优先工作目录，其次项目根目录）"""
+    candidates = []
+    if project.work_dir and project.work_dir != "./":
+        candidates.append(os.path.join(project.path, project.work_dir, "requirements.txt"))
+    candidates.append(os.path.join(project.path, "requirements.txt"))
+    for path in candidates:
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+    return None
+
+
+def find_ready_environment(db: Session, requirements_hash: str) -> Optional[models.PythonVersion]:
+    """查找与哈希匹配且已就绪的环境"""
+    if not requirements_hash:
+        return None
+    return db.query(models.PythonVersion).filter(
+        models.PythonVersion.requirements_hash == requirements_hash,
+        models.PythonVersion.status == "ready"
+    ).first()
+
+
+def count_references(db: Session, version: models.PythonVersion) -> int:
+    """统计环境的引用数（直接引用的任务 + 锁文件模式下哈希匹配的项目）"""
+    refs = db.query(Task).filter(Task.env_id == version.id).count()
+    if version.requirements_hash:
+        refs += db.query(project_models.Project).filter(
+            project_models.Project.env_mode == "lockfile",
+            project_models.Project.requirements_hash == version.requirements_hash
+        ).count()
+    return refs
+
+
+def _env_dir_for(name: str) -> str:
+    return os.path.join(settings.envs_dir, name)
+
+
+def _python_exe_for(env_path: str) -> str:
+    if platform.system() == "Windows":
+        return os.path.join(env_path, "python.exe")
+    return os.path.join(env_path, "bin", "python")
+
+
+def resolve_environment(
+    db: Session,
+    requirements_text: str,
+    python_version: Optional[str] = None
+) -> Tuple[models.PythonVersion, bool]:
+    """
+    按 requirements 解析环境
+
+    Args:
+        db: 数据库会话
+        requirements_text: requirements 文本
+        python_version: Python 版本，None 使用默认版本
+
+    Returns:
+        (环境记录, 是否复用了已有环境)。未复用时环境状态为 installing，后台构建中。
+    """
+    python_version = python_version or settings.lockfile_default_python
+    safe_version = "".join(c for c in python_version if c.isdigit() or c in '.-')
+    if not safe_version:
+        raise ValueError("Invalid Python version format")
+
+    lines = normalize_requirements(requirements_text)
+    req_hash = compute_requirements_hash(lines, safe_version)
+
+    with _resolve_lock:
+        candidates = db.query(models.PythonVersion).filter(
+            models.PythonVersion.requirements_hash == req_hash
+        ).all()
+        # Prefer a ready env, then one that is still being built
+        for wanted in ("ready", "installing", "configuring"):
+            for candidate in candidates:
+                if candidate.status == wanted:
+                    return candidate, True
+
+        name = f"{settings.lockfile_env_prefix}{req_hash[:12]}"
+        env_path = _env_dir_for(name)
+        version = candidates[0] if candidates else None
+        if version is None:
+            version = models.PythonVersion(
+                name=name,
+                version=safe_version,
+                path=_python_exe_for(env_path),
+                is_conda=True,
+                requirements_hash=req_hash
+            )
+            db.add(version)
+        # Previous build failed (or is being deleted): rebuild into the same record
+        version.status = "installing"
+        version.updated_at = datetime.datetime.now()
+        db.commit()
+        db.refresh(version)
+
+    log_file = get_log_path(version.id)
+    if os.path.exists(log_file):
+        os.remove(log_file)
+
+    thread = threading.Thread(
+        target=build_locked_environment,
+        args=(version.id, safe_version, lines),
+        daemon=True
+    )
+    thread.start()
+    return version, False
+
+
+def _build_subprocess_env(db: Session) -> dict:
+    """构建安装进程的环境变量（注入代理配置）"""
+    env_vars = os.environ.copy()
+    proxy_enabled = db.query(system_models.SystemConfig).filter(
+        system_models.SystemConfig.key == "proxy.enabled"
+    ).first()
+    if proxy_enabled and proxy_enabled.value == "true":
+        proxy_url = db.query(system_models.SystemConfig).filter(
+            system_models.SystemConfig.key == "proxy.url"
+        ).first()
+        if proxy_url and proxy_url.value:
+            for key in ("http_proxy", "https_proxy", "all_proxy", "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY"):
+                env_vars[key] = proxy_url.value
+    return env_vars
+
+
+def _run_logged(version_id: int, command: list, env_vars: dict, timeout: int) -> int:
+    """执行命令并把输出写入安装日志，返回退出码"""
+    append_log(version_id, f"Running: {' '.join(command)}")
+    try:
+        result = subprocess.run(
+            command,
+            env=env_vars,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        append_log(version_id, f"Command timed out after {timeout}s")
+        return -1
+    for line in (result.stdout or "").splitlines() + (result.stderr or "").splitlines():
+        if line.strip():
+            append_log(version_id, line.strip())
+    return result.returncode
+
+
+def build_locked_environment(version_id: int, python_version: str, requirements: List[str]):
+    """后台构建锁文件环境：conda create + pip install -r"""
+    db = SessionLocal()
+    try:
+        version = db.query(models.PythonVersion).filter(models.PythonVersion.id == version_id).first()
+        if not version:
+            return
+
+        env_path = _env_dir_for(version.name)
+        if os.path.exists(env_path):
+            append_log(version_id, f"Removing stale directory: {env_path}")
+            shutil.rmtree(env_path, ignore_errors=True)
+
+        env_vars = _build_subprocess_env(db)
+        append_log(version_id, f"Building lockfile environment {version.name} (hash {version.requirements_hash})")
+
+        code = _run_logged(
+            version_id,
+            ["conda", "create", "--prefix", env_path, f"python={python_version}", "-y", "-q"],
+            env_vars,
+            timeout=600
+        )
+        if code == 0 and requirements:
+            req_file = os.path.join(env_path, REQUIREMENTS_FILENAME)
+            with open(req_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(requirements) + "\n")
+
+            command = [version.path, "-m", "pip", "install", "-r", req_file]
+            mirror_config = db.query(system_models.SystemConfig).filter(
+                system_models.SystemConfig.key == "pypi_mirror"
+            ).first()
+            if mirror_config and mirror_config.value:
+                command.extend(["-i", mirror_config.value])
+            code = _run_logged(version_id, command, env_vars, timeout=1800)
+
+        version = db.query(models.PythonVersion).filter(models.PythonVersion.id == version_id).first()
+        if not version:
+            return
+        version.status = "ready" if code == 0 else "error"
+        version.updated_at = datetime.datetime.now()
+        db.commit()
+        append_log(version_id, f"Lockfile environment build finished with status: {version.status}")
+    except Exception as e:
+        logger.error(f"Failed to build lockfile environment {version_id}: {e}", exc_info=True)
+        append_log(version_id, f"Fatal error during build: {e}")
+        try:
+            version = db.query(models.PythonVersion).filter(models.PythonVersion.id == version_id).first()
+            if version:
+                version.status = "error"
+                db.commit()
+        except Exception:
+            pass
+    finally:
+        db.close()
+
+
+def collect_unused_environments(db: Session, idle_days: Optional[int] = None) -> List[dict]:
+    """
+    回收无引用且闲置超过 idle_days 的锁文件环境
+
+    Returns:
+        被回收的环境列表（删除在后台线程中进行）
+    """
+    if idle_days is None:
+        idle_days = settings.env_gc_idle_days
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=idle_days)
+
+    collected = []
+    versions = db.query(models.PythonVersion).filter(
+        models.PythonVersion.requirements_hash.isnot(None),
+        models.PythonVersion.status.in_(["ready", "error"])
+    ).all()
+    for version in versions:
+        if count_references(db, version) > 0:
+            continue
+        last_used = version.last_used_at or version.updated_at or version.created_at
+        if last_used and last_used.replace(tzinfo=None) > cutoff:
+            continue
+
+        version.status = "deleting"
+        db.commit()
+        collected.append({"id": version.id, "name": version.name, "requirements_hash": version.requirements_hash})
+        threading.Thread(target=background_delete_version, args=(version.id,), daemon=True).start()
+        logger.info(f"Collecting unused lockfile environment {version.name}")
+
+    return collected
@@ -13,5 +13,7 @@ class PythonVersion(Base):
     is_default = Column(Boolean, default=False)
     status = Column(String, default="ready")
     is_conda = Column(Boolean, default=False) # Flag to track if it was created by Conda
+    requirements_hash = Column(String, nullable=True, index=True) # Lockfile-keyed environments only
+    last_used_at = Column(DateTime(timezone=True), nullable=True) # Last time an execution used this env
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
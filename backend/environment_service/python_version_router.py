@@ -471,9 +471,17 @@ async def list_versions(db: Session = Depends(get_db)):
                 usage_map[task.env_id] = []
             usage_map[task.env_id].append(task.name)
     
+    # Lockfile environments are also referenced by projects through their requirements hash
+    from project_service.models import Project
+    lockfile_projects = db.query(Project).filter(Project.env_mode == "lockfile").all()
+    hash_usage = {}
+    for project in lockfile_projects:
+        if project.requirements_hash:
+            hash_usage[project.requirements_hash] = hash_usage.get(project.requirements_hash, 0) + 1
+    
     for v in versions:
         used_tasks = usage_map.get(v.id, [])
-        v.is_in_use = len(used_tasks) > 0
+        v.is_in_use = len(used_tasks) > 0 or hash_usage.get(v.requirements_hash, 0) > 0
         v.used_by_tasks = used_tasks
         
     return versions
@@ -632,6 +640,11 @@ async def delete_version(version_id: int, req: Request, db: Session = Depends(ge
     used_tasks = db.query(Task).filter(Task.env_id == version_id).first()
     if used_tasks:
         raise HTTPException(status_code=400, detail=f"Cannot delete environment '{version.name}': It is used by task '{used_tasks.name}'")
+    
+    if version.requirements_hash:
+        from environment_service import env_resolver
+        if env_resolver.count_references(db, version) > 0:
+            raise HTTPException(status_code=400, detail=f"Cannot delete environment '{version.name}': It is resolved by lockfile projects")
 
     # Audit Log
     create_audit_log(
@@ -976,3 +989,116 @@ async def cleanup_orphaned_records(req: Request, db: Session = Depends(get_db)):
         "cleaned": cleaned,
         "errors": errors
     }
+
+
+@router.post("/gc-locked")
+async def collect_locked_environments(req: Request, idle_days: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    回收无引用的锁文件环境
+
+    - **idle_days**: 可选，闲置天数阈值（默认使用 `KUMO_ENV_GC_IDLE_DAYS`）
+
+    引用计数 = 直接引用的任务数 + 锁文件模式下哈希匹配的项目数。
+    引用为 0 且闲置超过阈值的环境会在后台删除。
+    """
+    from environment_service import env_resolver
+    collected = env_resolver.collect_unused_environments(db, idle_days)
+    
+    create_audit_log(
+        db=db,
+        operation_type="CLEANUP",
+        target_type="ENVIRONMENT",
+        target_id="lockfile_gc",
+        target_name="lockfile_envs",
+        details=f"Collected {len(collected)} unused lockfile environments: {', '.join(c['name'] for c in collected)}",
+        operator_ip=req.client.host
+    )
+    
+    return {"ok": True, "collected": collected}
+
+
+def _env_dir(version: models.PythonVersion) -> str:
+    """解释器路径所在的环境目录"""
+    env_dir = os.path.dirname(version.path or "")
+    if os.path.basename(env_dir).lower() in ["bin", "scripts"]:
+        env_dir = os.path.dirname(env_dir)
+    return env_dir
+
+
+def get_busy_env_dirs(db: Session) -> List[str]:
+    """返回正在安装/删除中的环境目录（去重时跳过）"""
+    busy = db.query(models.PythonVersion).filter(
+        models.PythonVersion.status.notin_(["ready", "error"])
+    ).all()
+    return [env_dir for env_dir in (_env_dir(version) for version in busy) if env_dir]
+
+
+def mark_broken_envs(db: Session, env_names: List[str]) -> int:
+    """将去重校验发现共享文件被原地写入的环境标记为 error（内容已损坏，需要重建），返回标记数"""
+    if not env_names:
+        return 0
+    marked = 0
+    for version in db.query(models.PythonVersion).filter(models.PythonVersion.status == "ready").all():
+        if os.path.basename(_env_dir(version)) in env_names:
+            version.status = "error"
+            marked += 1
+            logger.error(f"Environment {version.name} has deduplicated files modified in place, marked as error")
+    db.commit()
+    return marked
+
+
+def run_env_dedupe(skip_dirs: List[str], verify: bool = False) -> dict:
+    """执行去重，并标记被原地写入损坏的环境"""
+    from environment_service.env_dedupe import env_deduplicator
+    stats = env_deduplicator.run(skip_dirs=skip_dirs, verify=verify)
+    if stats["broken_envs"]:
+        db = SessionLocal()
+        try:
+            mark_broken_envs(db, stats["broken_envs"])
+        finally:
+            db.close()
+    return stats
+
+
+def run_env_dedupe_background(skip_dirs: List[str], verify: bool = False):
+    try:
+        run_env_dedupe(skip_dirs, verify)
+    except Exception as e:
+        logger.error(f"Environment dedupe failed: {e}", exc_info=True)
+
+
+@router.post("/dedupe")
+async def start_env_dedupe(req: Request, verify: bool = False, db: Session = Depends(get_db)):
+    """
+    启动环境文件去重（后台执行）
+
+    - **verify**: 是否重新校验已去重文件内容（检测原地写入）
+
+    对 envs 目录下的文件按内容哈希去重，相同文件替换为共享存储中的硬链接。
+    正在安装或删除中的环境会被跳过。
+    """
+    from environment_service.env_dedupe import env_deduplicator
+    if env_deduplicator.status["state"] == "running":
+        raise HTTPException(status_code=409, detail="Deduplication is already running")
+
+    skip_dirs = get_busy_env_dirs(db)
+    thread = threading.Thread(target=run_env_dedupe_background, args=(skip_dirs, verify), daemon=True)
+    thread.start()
+
+    create_audit_log(
+        db=db,
+        operation_type="DEDUPE",
+        target_type="ENVIRONMENT",
+        target_id="envs",
+        target_name="env_dedupe",
+        details=f"Started environment file deduplication (skipped {len(skip_dirs)} busy envs)",
+        operator_ip=req.client.host
+    )
+    return {"message": "Deduplication started in background"}
+
+
+@router.get("/dedupe/status")
+async def get_env_dedupe_status():
+    """获取环境文件去重状态和最近一次统计"""
+    from environment_service.env_dedupe import env_deduplicator
+    return env_deduplicator.get_status()
@@ -10,6 +10,8 @@ class PythonVersionBase(BaseModel):
     is_default: bool = False
     is_conda: bool = False
     is_in_use: bool = False # Whether this version is used by any task
+    requirements_hash: Optional[str] = None # Set for lockfile-keyed environments
+    last_used_at: Optional[datetime] = None
 
 class PythonVersionCreate(PythonVersionBase):
     pass
@@ -24,6 +24,16 @@ from system_service import models as system_models # Register System models
 from audit_service import models as audit_models # Register Audit models
 from task_service import models as task_models # Register Task models
 from task_service.task_manager import task_manager
+from task_service.warm_pool import warm_pool
+from task_service.browser_pool import browser_pool
+from task_service.rate_limiter import rate_limit_coordinator
+from task_service.caching_proxy import caching_proxy
+from task_service.url_dedupe import url_dedupe_service
+from task_service.concurrency_tuner import concurrency_autotuner
+from task_service.dispatcher import task_dispatcher
+from task_service.reattach import execution_reattacher
+from project_service.archive_jobs import archive_job_manager
+from project_service import git_source
 from system_service.system_scheduler import get_system_scheduler
 from migrations.manager import migration_manager
 
@@ -43,10 +53,32 @@ async def lifespan(app: FastAPI):
         migration_manager.run_migrations()
         logger.info("Database migrations completed")
         
+        # 上次进程中未完成的解压和首次同步不会继续，对应项目标记为 error
+        archive_job_manager.fail_interrupted()
+        git_source.fail_interrupted_syncs()
+        
+        # 恢复并发上限设置并启动自动调节器
+        concurrency_autotuner.load_config()
+        concurrency_autotuner.start()
+        
+        # 启动全局限速协调服务和 URL 去重服务（沿用上次的端口和令牌，重新接管的执行仍可连接）
+        rate_limit_coordinator.start()
+        url_dedupe_service.start()
+        
+        # 重新接管上次进程遗留的仍存活的执行，须在分发队列和调度器启动前完成，先占用并发许可和重叠策略计数
+        execution_reattacher.reconcile(finish=False)
+        
+        # 启动分发队列（所有运行经此获取并发许可），恢复分发策略
+        task_dispatcher.load_config()
+        task_dispatcher.start()
+        
         task_manager.start()
         task_manager.load_jobs_from_db()
         logger.info("Task manager started")
         
+        # 记录上次进程遗留的已结束执行的结果（熔断、重试、下游触发）
+        execution_reattacher.reconcile()
+        
         system_scheduler = get_system_scheduler()
         system_scheduler.start()
         logger.info("System scheduler started")
@@ -63,9 +95,17 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down Kumo backend...")
     connection_monitor.stop()
+    concurrency_autotuner.stop()
+    execution_reattacher.shutdown()
     task_manager.shutdown()
+    task_dispatcher.shutdown()
     system_scheduler = get_system_scheduler()
     system_scheduler.shutdown()
+    warm_pool.shutdown_all()
+    browser_pool.shutdown_all()
+    rate_limit_coordinator.stop()
+    caching_proxy.stop()
+    url_dedupe_service.stop()
     logger.info("Kumo backend shutdown complete")
 
 from environment_service.python_version_router import router as python_version_router
@@ -74,6 +114,7 @@ from project_service.project_router import router as project_router
 from system_service.system_router import router as system_router
 from system_service.env_vars_router import router as env_vars_router
 from system_service.fs_router import router as fs_router
+from system_service.events_router import router as events_router
 from task_service.task_router import router as task_router
 from log_service.logs_router import router as logs_router
 from audit_service.audit_router import router as audit_router
@@ -182,6 +223,7 @@ app.include_router(project_router, prefix="/api/projects", tags=["Projects"])
 app.include_router(system_router, prefix="/api/system")
 app.include_router(env_vars_router, prefix="/api/system/env-vars", tags=["Environment Variables"])
 app.include_router(fs_router, prefix="/api")
+app.include_router(events_router, prefix="/api/events", tags=["Events"])
 app.include_router(task_router, prefix="/api/tasks", tags=["Tasks"])
 app.include_router(logs_router, prefix="/api/logs", tags=["Logs"])
 app.include_router(audit_router, prefix="/api/audit", tags=["Audit"])
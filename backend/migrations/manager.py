@@ -252,6 +252,203 @@ def register_all_migrations():
             logger.warning(f"Migration 009 warning: {e}")
     
     migration_manager.register_migration("009", "Add columns and fix indexes for python_versions", migration_009)
+    
+    # Migration 010: 添加锁文件环境复用列
+    def migration_010(conn):
+        result = conn.execute(text("PRAGMA table_info(python_versions)"))
+        columns = {row[1] for row in result}
+        if "requirements_hash" not in columns:
+            logger.info("Adding lockfile columns to python_versions table")
+            conn.execute(text("ALTER TABLE python_versions ADD COLUMN requirements_hash VARCHAR DEFAULT NULL"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_python_versions_requirements_hash ON python_versions (requirements_hash)"))
+        if "last_used_at" not in columns:
+            conn.execute(text("ALTER TABLE python_versions ADD COLUMN last_used_at DATETIME DEFAULT NULL"))
+        
+        result = conn.execute(text("PRAGMA table_info(projects)"))
+        columns = {row[1] for row in result}
+        if "env_mode" not in columns:
+            logger.info("Adding lockfile columns to projects table")
+            conn.execute(text("ALTER TABLE projects ADD COLUMN env_mode VARCHAR DEFAULT 'manual'"))
+        if "requirements_hash" not in columns:
+            conn.execute(text("ALTER TABLE projects ADD COLUMN requirements_hash VARCHAR DEFAULT NULL"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_projects_requirements_hash ON projects (requirements_hash)"))
+        if "python_version" not in columns:
+            conn.execute(text("ALTER TABLE projects ADD COLUMN python_version VARCHAR DEFAULT NULL"))
+    
+    migration_manager.register_migration("010", "Add lockfile environment columns", migration_010)
+    
+    # Migration 011: 添加项目解压状态列
+    def migration_011(conn):
+        result = conn.execute(text("PRAGMA table_info(projects)"))
+        columns = {row[1] for row in result}
+        if "status" not in columns:
+            logger.info("Adding status columns to projects table")
+            conn.execute(text("ALTER TABLE projects ADD COLUMN status VARCHAR DEFAULT 'ready'"))
+        if "extract_job_id" not in columns:
+            conn.execute(text("ALTER TABLE projects ADD COLUMN extract_job_id VARCHAR DEFAULT NULL"))
+    
+    migration_manager.register_migration("011", "Add extraction status columns to projects", migration_011)
+    
+    # Migration 012: 添加项目修订版本列
+    def migration_012(conn):
+        result = conn.execute(text("PRAGMA table_info(projects)"))
+        columns = {row[1] for row in result}
+        if "current_revision" not in columns:
+            logger.info("Adding current_revision column to projects table")
+            conn.execute(text("ALTER TABLE projects ADD COLUMN current_revision VARCHAR DEFAULT NULL"))
+        
+        result = conn.execute(text("PRAGMA table_info(task_executions)"))
+        columns = {row[1] for row in result}
+        if "revision" not in columns:
+            logger.info("Adding revision column to task_executions table")
+            conn.execute(text("ALTER TABLE task_executions ADD COLUMN revision VARCHAR DEFAULT NULL"))
+    
+    migration_manager.register_migration("012", "Add project revision columns", migration_012)
+    
+    # Migration 013: 添加 git 项目源列
+    def migration_013(conn):
+        result = conn.execute(text("PRAGMA table_info(projects)"))
+        columns = {row[1] for row in result}
+        new_columns = {
+            "source_type": "VARCHAR DEFAULT 'archive'",
+            "git_url": "VARCHAR DEFAULT NULL",
+            "git_branch": "VARCHAR DEFAULT NULL",
+            "git_commit": "VARCHAR DEFAULT NULL",
+            "git_auto_sync": "BOOLEAN DEFAULT 1",
+            "git_synced_at": "DATETIME DEFAULT NULL",
+        }
+        for name, definition in new_columns.items():
+            if name not in columns:
+                logger.info(f"Adding {name} column to projects table")
+                conn.execute(text(f"ALTER TABLE projects ADD COLUMN {name} {definition}"))
+    
+    migration_manager.register_migration("013", "Add git source columns to projects", migration_013)
+    
+    # Migration 014: 添加任务执行模式列
+    def migration_014(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "exec_mode" not in columns:
+            logger.info("Adding exec_mode column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN exec_mode VARCHAR DEFAULT 'subprocess'"))
+    
+    migration_manager.register_migration("014", "Add exec_mode column to tasks", migration_014)
+    
+    # Migration 015: 添加任务浏览器池开关
+    def migration_015(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "use_browser_pool" not in columns:
+            logger.info("Adding use_browser_pool column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN use_browser_pool BOOLEAN DEFAULT 0"))
+    
+    migration_manager.register_migration("015", "Add use_browser_pool column to tasks", migration_015)
+    
+    # Migration 016: 添加缓存代理策略与流量统计列
+    def migration_016(conn):
+        result = conn.execute(text("PRAGMA table_info(projects)"))
+        columns = {row[1] for row in result}
+        if "cache_policy" not in columns:
+            logger.info("Adding cache_policy column to projects table")
+            conn.execute(text("ALTER TABLE projects ADD COLUMN cache_policy TEXT DEFAULT NULL"))
+        
+        result = conn.execute(text("PRAGMA table_info(task_executions)"))
+        columns = {row[1] for row in result}
+        for name in ("proxy_requests", "proxy_cache_hits", "proxy_bytes"):
+            if name not in columns:
+                logger.info(f"Adding {name} column to task_executions table")
+                conn.execute(text(f"ALTER TABLE task_executions ADD COLUMN {name} INTEGER DEFAULT NULL"))
+    
+    migration_manager.register_migration("016", "Add caching proxy policy and counters", migration_016)
+    
+    # Migration 017: 添加任务分片
+    def migration_017(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "shard_count" not in columns:
+            logger.info("Adding shard_count column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN shard_count INTEGER DEFAULT 1"))
+        
+        result = conn.execute(text("PRAGMA table_info(task_executions)"))
+        columns = {row[1] for row in result}
+        for name in ("parent_execution_id", "shard_index"):
+            if name not in columns:
+                logger.info(f"Adding {name} column to task_executions table")
+                conn.execute(text(f"ALTER TABLE task_executions ADD COLUMN {name} INTEGER DEFAULT NULL"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_task_executions_parent_execution_id "
+            "ON task_executions (parent_execution_id)"
+        ))
+    
+    migration_manager.register_migration("017", "Add task sharding columns", migration_017)
+    
+    # Migration 018: 添加逻辑运行 ID（重试共享断点目录）
+    def migration_018(conn):
+        result = conn.execute(text("PRAGMA table_info(task_executions)"))
+        columns = {row[1] for row in result}
+        if "root_execution_id" not in columns:
+            logger.info("Adding root_execution_id column to task_executions table")
+            conn.execute(text("ALTER TABLE task_executions ADD COLUMN root_execution_id INTEGER DEFAULT NULL"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_task_executions_root_execution_id "
+            "ON task_executions (root_execution_id)"
+        ))
+    
+    migration_manager.register_migration("018", "Add root_execution_id to task executions", migration_018)
+    
+    # Migration 019: 添加任务重叠策略
+    def migration_019(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "overlap_policy" not in columns:
+            logger.info("Adding overlap_policy column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN overlap_policy VARCHAR DEFAULT 'parallel'"))
+        if "max_parallel" not in columns:
+            logger.info("Adding max_parallel column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN max_parallel INTEGER DEFAULT NULL"))
+    
+    migration_manager.register_migration("019", "Add task overlap policy", migration_019)
+    
+    # Migration 020: 添加定时错峰窗口
+    def migration_020(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "stagger_window" not in columns:
+            logger.info("Adding stagger_window column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN stagger_window INTEGER DEFAULT NULL"))
+    
+    migration_manager.register_migration("020", "Add task stagger window", migration_020)
+    
+    # Migration 021: 添加自适应超时开关
+    def migration_021(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "adaptive_timeout" not in columns:
+            logger.info("Adding adaptive_timeout column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN adaptive_timeout BOOLEAN DEFAULT NULL"))
+    
+    migration_manager.register_migration("021", "Add task adaptive timeout", migration_021)
+    
+    # Migration 022: 添加卡死检测时间
+    def migration_022(conn):
+        result = conn.execute(text("PRAGMA table_info(tasks)"))
+        columns = {row[1] for row in result}
+        if "stall_timeout" not in columns:
+            logger.info("Adding stall_timeout column to tasks table")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN stall_timeout INTEGER DEFAULT NULL"))
+    
+    migration_manager.register_migration("022", "Add task stall timeout", migration_022)
+    
+    # Migration 023: 添加执行进程指纹（重启后重新接管）
+    def migration_023(conn):
+        result = conn.execute(text("PRAGMA table_info(task_executions)"))
+        columns = {row[1] for row in result}
+        for name, col_type in (("pid", "INTEGER"), ("pgid", "INTEGER"), ("process_started_at", "FLOAT")):
+            if name not in columns:
+                logger.info(f"Adding {name} column to task_executions table")
+                conn.execute(text(f"ALTER TABLE task_executions ADD COLUMN {name} {col_type} DEFAULT NULL"))
+    
+    migration_manager.register_migration("023", "Add execution process fingerprint", migration_023)
 
 
 # 初始化时注册所有迁移
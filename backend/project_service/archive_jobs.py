@@ -0,0 +1,475 @@
+"""
+压缩包处理模块 - 分块上传落盘、配额检查与后台解压任务
+
+- 上传按块写入磁盘，同时计算 SHA-256 并检查上传大小上限
+- 解压前按归档目录检查成员数量、解压总大小和压缩比（防 zip 炸弹）及路径穿越
+- ZIP 按成员并行解压（每个线程独立的 ZipFile 句柄），7Z/RAR 顺序解压
+- 归档头部声明的大小可能不实，所有格式都按实际写入的字节检查单个成员和总配额
+- 解压在后台线程执行，通过进度事件对外报告
+- 任务只保存在内存中，后端重启时仍为 extracting 的项目标记为 error（需重新上传）
+"""
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import zipfile
+import threading
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+import py7zr
+import rarfile
+from py7zr.io import Py7zIO, WriterFactory
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from project_service import models
+
+logger = get_logger(__name__)
+
+SUPPORTED_EXTENSIONS = [".zip", ".7z", ".rar"]
+MAX_JOB_HISTORY = 200
+
+
+class ArchiveQuotaError(Exception):
+    """上传/解压超出配额"""
+
+
+def save_upload_stream(source: BinaryIO, dest_path: str, max_bytes: Optional[int] = None) -> Tuple[int, str]:
+    """
+    分块保存上传流，边写边计算 SHA-256
+
+    Returns:
+        (写入字节数, sha256 十六进制)
+
+    Raises:
+        ArchiveQuotaError: 超出上传大小上限
+    """
+    max_bytes = settings.upload_max_bytes if max_bytes is None else max_bytes
+    digest = hashlib.sha256()
+    written = 0
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = source.read(settings.upload_chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if max_bytes and written > max_bytes:
+                raise ArchiveQuotaError(f"Upload exceeds limit of {max_bytes} bytes")
+            digest.update(chunk)
+            out.write(chunk)
+    return written, digest.hexdigest()
+
+
+def _safe_target(dest_dir: str, member_name: str) -> str:
+    """解析成员的目标路径，拒绝绝对路径和路径穿越"""
+    dest_root = os.path.abspath(dest_dir)
+    target = os.path.abspath(os.path.join(dest_root, member_name))
+    if target != dest_root and not target.startswith(dest_root + os.sep):
+        raise ArchiveQuotaError(f"Unsafe path in archive: {member_name}")
+    return target
+
+
+def list_members(archive_path: str, ext: str) -> List[dict]:
+    """读取归档目录：name / size / compressed_size / is_dir"""
+    if ext == ".zip":
+        if not zipfile.is_zipfile(archive_path):
+            raise Exception("Uploaded file is not a valid zip file")
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            return [
+                {"name": i.filename, "size": i.file_size, "compressed_size": i.compress_size, "is_dir": i.is_dir()}
+                for i in zf.infolist()
+            ]
+    if ext == ".7z":
+        if not py7zr.is_7zfile(archive_path):
+            raise Exception("Uploaded file is not a valid 7z file")
+        with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+            return [
+                {"name": i.filename, "size": i.uncompressed or 0, "compressed_size": i.compressed or 0,
+                 "is_dir": i.is_directory}
+                for i in archive.list()
+            ]
+    if ext == ".rar":
+        if not rarfile.is_rarfile(archive_path):
+            raise Exception("Uploaded file is not a valid rar file")
+        with rarfile.RarFile(archive_path, 'r') as archive:
+            return [
+                {"name": i.filename, "size": i.file_size, "compressed_size": i.compress_size, "is_dir": i.is_dir()}
+                for i in archive.infolist()
+            ]
+    raise Exception("Unsupported archive format")
+
+
+def check_quotas(members: List[dict], dest_dir: str, archive_size: int):
+    """检查成员数量、解压总大小、压缩比和路径安全"""
+    if len(members) > settings.extract_max_members:
+        raise ArchiveQuotaError(f"Archive has {len(members)} members, limit is {settings.extract_max_members}")
+    total = sum(m["size"] for m in members)
+    if total > settings.extract_max_bytes:
+        raise ArchiveQuotaError(f"Archive expands to {total} bytes, limit is {settings.extract_max_bytes}")
+    if archive_size > 0 and total / archive_size > settings.extract_max_ratio:
+        raise ArchiveQuotaError(
+            f"Archive compression ratio {total / archive_size:.0f} exceeds limit {settings.extract_max_ratio}"
+        )
+    for m in members:
+        _safe_target(dest_dir, m["name"])
+
+
+class _ExtractBudget:
+    """解压实际写入字节的总配额（多线程共享）"""
+
+    def __init__(self):
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        with self._lock:
+            self.written += size
+            if self.written > settings.extract_max_bytes:
+                raise ArchiveQuotaError("Extraction exceeds size limit")
+
+
+def _check_member_size(name: str, written: int, declared: Optional[int]):
+    if declared is not None and written > declared:
+        raise ArchiveQuotaError(f"Member {name} is larger than declared")
+
+
+def _copy_member(src: BinaryIO, target: str, member: dict, budget: _ExtractBudget):
+    """流式写出一个成员，实际写入字节受声明大小和总配额约束"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    written = 0
+    with open(target, "wb") as out:
+        while True:
+            chunk = src.read(settings.upload_chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            # Headers can lie about sizes; enforce the quota on actual output
+            _check_member_size(member["name"], written, member["size"])
+            budget.consume(len(chunk))
+            out.write(chunk)
+
+
+def _extract_zip_parallel(
+    archive_path: str,
+    dest_dir: str,
+    members: List[dict],
+    progress: Callable[[dict], None]
+):
+    """ZIP 按成员并行解压，实际写入字节受声明大小和总配额约束"""
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+    budget = _ExtractBudget()
+
+    def get_handle() -> zipfile.ZipFile:
+        if not hasattr(local, "zf"):
+            local.zf = zipfile.ZipFile(archive_path, 'r')
+            with handles_lock:
+                handles.append(local.zf)
+        return local.zf
+
+    def extract_one(member: dict):
+        target = _safe_target(dest_dir, member["name"])
+        if member["is_dir"]:
+            os.makedirs(target, exist_ok=True)
+            progress(member)
+            return
+        with get_handle().open(member["name"]) as src:
+            _copy_member(src, target, member, budget)
+        progress(member)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, settings.extract_workers)) as pool:
+            for future in [pool.submit(extract_one, m) for m in members]:
+                future.result()
+    finally:
+        for zf in handles:
+            zf.close()
+
+
+def _extract_rar(archive_path: str, dest_dir: str, members: List[dict], progress: Callable[[dict], None]):
+    """RAR 顺序解压，按成员流式写出并计数"""
+    budget = _ExtractBudget()
+    with rarfile.RarFile(archive_path, 'r') as archive:
+        for member in members:
+            target = _safe_target(dest_dir, member["name"])
+            if member["is_dir"]:
+                os.makedirs(target, exist_ok=True)
+            else:
+                with archive.open(member["name"]) as src:
+                    _copy_member(src, target, member, budget)
+            progress(member)
+
+
+class _QuotaWriter(Py7zIO):
+    """py7zr 写出目标：直接写入磁盘文件，实际写入字节受声明大小和总配额约束"""
+
+    def __init__(self, target: str, name: str, declared: Optional[int], budget: _ExtractBudget):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        self.name = name
+        self.declared = declared
+        self.budget = budget
+        self.written = 0
+        self._file = open(target, "wb")
+
+    def write(self, s) -> int:
+        self.written += len(s)
+        _check_member_size(self.name, self.written, self.declared)
+        self.budget.consume(len(s))
+        return self._file.write(s)
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        return b""
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.written
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def size(self) -> int:
+        return self.written
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _QuotaWriterFactory(WriterFactory):
+    def __init__(self, dest_dir: str, members: List[dict]):
+        self.dest_dir = dest_dir
+        self.sizes = {os.path.normpath(m["name"]): m["size"] for m in members}
+        self.budget = _ExtractBudget()
+        self.writers: List[_QuotaWriter] = []
+
+    def create(self, filename: str) -> Py7zIO:
+        target = _safe_target(self.dest_dir, filename)
+        name = os.path.relpath(target, os.path.abspath(self.dest_dir))
+        writer = _QuotaWriter(target, name, self.sizes.get(name), self.budget)
+        self.writers.append(writer)
+        return writer
+
+
+def _extract_7z(archive_path: str, dest_dir: str, members: List[dict], progress: Callable[[dict], None]):
+    """7Z 整体解压（通常为固实压缩，成员无法独立解码），通过 writer 计数实际写入字节"""
+    for member in members:
+        if member["is_dir"]:
+            os.makedirs(_safe_target(dest_dir, member["name"]), exist_ok=True)
+    factory = _QuotaWriterFactory(dest_dir, members)
+    try:
+        with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+            archive.extractall(dest_dir, factory=factory)
+    finally:
+        for writer in factory.writers:
+            writer.close()
+    for member in members:
+        progress(member)
+
+
+def extract_archive(
+    archive_path: str,
+    ext: str,
+    dest_dir: str,
+    progress: Optional[Callable[[dict], None]] = None
+):
+    """
+    检查配额并解压归档
+
+    Args:
+        archive_path: 归档路径
+        ext: 扩展名（.zip/.7z/.rar）
+        dest_dir: 解压目标目录
+        progress: 每完成一个成员时的回调（7Z 整体解压，仅在结束时回调）
+    """
+    progress = progress or (lambda member: None)
+    members = list_members(archive_path, ext)
+    check_quotas(members, dest_dir, os.path.getsize(archive_path))
+
+    if ext == ".zip":
+        _extract_zip_parallel(archive_path, dest_dir, members, progress)
+    elif ext == ".7z":
+        _extract_7z(archive_path, dest_dir, members, progress)
+    elif ext == ".rar":
+        _extract_rar(archive_path, dest_dir, members, progress)
+
+
+class ExtractionJob:
+    """后台解压任务"""
+
+    def __init__(self, project_id: int, archive_path: str, ext: str, dest_dir: str,
+                 upload_bytes: int, sha256: str):
+        self.id = uuid.uuid4().hex
+        self.project_id = project_id
+        self.archive_path = archive_path
+        self.ext = ext
+        self.dest_dir = dest_dir
+        self.upload_bytes = upload_bytes
+        self.sha256 = sha256
+        self.status = "queued"  # queued / running / success / failed
+        self.error: Optional[str] = None
+        self.total_members = 0
+        self.done_members = 0
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.events: List[dict] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._last_progress_event = 0.0
+
+    def add_event(self, event_type: str, message: str):
+        with self._lock:
+            self.events.append({
+                "seq": len(self.events),
+                "ts": time.time(),
+                "type": event_type,
+                "message": message,
+                "done_members": self.done_members,
+                "total_members": self.total_members,
+                "done_bytes": self.done_bytes,
+                "total_bytes": self.total_bytes,
+            })
+
+    def on_member_done(self, member: dict):
+        with self._lock:
+            self.done_members += 1
+            self.done_bytes += member.get("size") or 0
+        # Throttle progress events to at most ~4 per second
+        now = time.time()
+        if now - self._last_progress_event >= 0.25 or self.done_members == self.total_members:
+            self._last_progress_event = now
+            self.add_event("progress", f"Extracted {self.done_members}/{self.total_members} members")
+
+    def to_dict(self, since: int = 0) -> dict:
+        with self._lock:
+            events = list(self.events[since:])
+        return {
+            "job_id": self.id,
+            "project_id": self.project_id,
+            "status": self.status,
+            "error": self.error,
+            "sha256": self.sha256,
+            "upload_bytes": self.upload_bytes,
+            "total_members": self.total_members,
+            "done_members": self.done_members,
+            "total_bytes": self.total_bytes,
+            "done_bytes": self.done_bytes,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": events,
+        }
+
+
+class ArchiveJobManager:
+    """解压任务管理器 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ArchiveJobManager, cls).__new__(cls)
+                    cls._instance.jobs: Dict[str, ExtractionJob] = {}
+                    cls._instance._jobs_lock = threading.Lock()
+                    cls._instance._completion_hooks = []
+        return cls._instance
+
+    def add_completion_hook(self, hook: Callable[[ExtractionJob], None]):
+        """注册解压成功后的回调（如字节码预编译）"""
+        self._completion_hooks.append(hook)
+
+    def submit(self, job: ExtractionJob) -> ExtractionJob:
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+            self._prune()
+        job.add_event("queued", "Extraction queued")
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ExtractionJob]:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        if len(self.jobs) <= MAX_JOB_HISTORY:
+            return
+        finished = sorted(
+            (j for j in self.jobs.values() if j.finished_at),
+            key=lambda j: j.finished_at
+        )
+        for job in finished[:len(self.jobs) - MAX_JOB_HISTORY]:
+            self.jobs.pop(job.id, None)
+
+    def _run(self, job: ExtractionJob):
+        job.status = "running"
+        try:
+            members = list_members(job.archive_path, job.ext)
+            job.total_members = len(members)
+            job.total_bytes = sum(m["size"] for m in members)
+            job.add_event("started", f"Extracting {job.total_members} members ({job.total_bytes} bytes)")
+            extract_archive(job.archive_path, job.ext, job.dest_dir, progress=job.on_member_done)
+            job.status = "success"
+            job.add_event("finished", "Extraction completed")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.add_event("failed", f"Extraction failed: {e}")
+            logger.error(f"Extraction job {job.id} for project {job.project_id} failed: {e}")
+            # Leave an empty project directory behind, the project is marked as error
+            if os.path.exists(job.dest_dir):
+                shutil.rmtree(job.dest_dir, ignore_errors=True)
+                os.makedirs(job.dest_dir, exist_ok=True)
+        finally:
+            if os.path.exists(job.archive_path):
+                os.remove(job.archive_path)
+            self._update_project_status(job)
+
+        if job.status == "success":
+            for hook in self._completion_hooks:
+                try:
+                    hook(job)
+                except Exception as e:
+                    logger.error(f"Extraction completion hook failed: {e}")
+        job.finished_at = time.time()
+
+    def fail_interrupted(self) -> int:
+        """
+        将上次进程中未完成解压的项目标记为 error（后端启动时调用）
+
+        解压任务只在内存中，重启后不会继续，否则项目会一直停留在 extracting。
+
+        Returns:
+            标记的项目数
+        """
+        db = SessionLocal()
+        try:
+            projects = db.query(models.Project).filter(models.Project.status == "extracting").all()
+            for project in projects:
+                project.status = "error"
+                project.updated_at = datetime.datetime.now()
+                logger.warning(f"Extraction of project {project.id} was interrupted by a restart, marked as error")
+            db.commit()
+            return len(projects)
+        except Exception as e:
+            logger.error(f"Failed to reset interrupted extractions: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def _update_project_status(self, job: ExtractionJob):
+        db = SessionLocal()
+        try:
+            project = db.query(models.Project).filter(models.Project.id == job.project_id).first()
+            if project:
+                project.status = "ready" if job.status == "success" else "error"
+                project.updated_at = datetime.datetime.now()
+                db.commit()
+        except Exception as e:
+            logger.error(f"Failed to update project {job.project_id} status: {e}")
+        finally:
+            db.close()
+
+
+# 全局单例实例
+archive_job_manager = ArchiveJobManager()
@@ -0,0 +1,69 @@
+"""
+字节码预编译工作脚本 - 由目标解释器执行（不依赖后端代码）
+
+用法: python compile_worker.py '<json options>'
+    options: root, files (可选，相对路径列表), mode (TIMESTAMP/CHECKED_HASH/UNCHECKED_HASH), workers
+
+输出一行 JSON: {"cache_tag", "version", "compiled", "errors": [{"path", "message"}]}
+"""
+import os
+import sys
+import json
+import py_compile
+from concurrent.futures import ProcessPoolExecutor
+
+SKIP_DIRS = {"__pycache__", ".git", ".venv", "venv", "node_modules", "site-packages"}
+
+
+def _compile(job):
+    path, mode = job
+    try:
+        py_compile.compile(path, doraise=True, invalidation_mode=getattr(py_compile.PycInvalidationMode, mode))
+        return path, None
+    except py_compile.PyCompileError as e:
+        return path, e.msg.strip().splitlines()[-1] if e.msg else str(e)
+    except Exception as e:
+        return path, str(e)
+
+
+def _collect(root, files):
+    if files:
+        for rel_path in files:
+            path = os.path.join(root, rel_path)
+            if rel_path.endswith(".py") and os.path.isfile(path):
+                yield path
+        return
+    for current, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in names:
+            if name.endswith(".py"):
+                yield os.path.join(current, name)
+
+
+def main():
+    options = json.loads(sys.argv[1])
+    root = options["root"]
+    mode = options.get("mode", "CHECKED_HASH")
+    jobs = [(path, mode) for path in _collect(root, options.get("files"))]
+
+    results = []
+    if len(jobs) > 1 and options.get("workers", 1) > 1:
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            results = list(pool.map(_compile, jobs, chunksize=16))
+    else:
+        results = [_compile(job) for job in jobs]
+
+    errors = [
+        {"path": os.path.relpath(path, root).replace(os.sep, "/"), "message": message}
+        for path, message in results if message
+    ]
+    print(json.dumps({
+        "cache_tag": sys.implementation.cache_tag,
+        "version": "%d.%d.%d" % sys.version_info[:3],
+        "compiled": len(results) - len(errors),
+        "errors": errors,
+    }))
+
+
+if __name__ == "__main__":
+    main()
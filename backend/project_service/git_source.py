@@ -0,0 +1,221 @@
+"""
+Git 项目源模块 - 浅克隆镜像 + 增量拉取，检出结果写入修订版本存储
+
+- 每个项目在 `projects/.kumo_git/<id>.git` 维护一个裸仓库镜像，只按 `--depth 1` 拉取目标分支的最新提交
+- 检出不使用 git worktree：提交树按 git blob id 与上一版本清单比对，只有变化的 blob 才读取并写入存储，
+  随后作为新修订版本提交（运行中的执行保留自己固定的版本）
+- 首次同步在后台线程执行，后端重启时仍为 syncing 的项目标记为 error（可手动同步重试）
+"""
+import os
+import re
+import hashlib
+import threading
+import datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import git
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from project_service import models
+from project_service.revision_store import revision_store, commit_revision, RevisionError, STORE_DIRNAME
+
+logger = get_logger(__name__)
+
+MIRRORS_DIRNAME = ".kumo_git"
+TRACKING_REF = "refs/kumo/head"
+_BRANCH_RE = re.compile(r"^[A-Za-z0-9._/-]+$")
+
+_sync_locks: Dict[int, threading.Lock] = {}
+_sync_locks_guard = threading.Lock()
+
+
+class GitSyncError(Exception):
+    """Git 拉取或检出失败"""
+
+
+def redact_url(url: str) -> str:
+    """隐藏 URL 中的凭据，用于日志与审计"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if parts.username or parts.password:
+        host = parts.hostname or ""
+        if parts.port:
+            host = f"{host}:{parts.port}"
+        return urlunsplit((parts.scheme, f"***@{host}", parts.path, parts.query, parts.fragment))
+    return url
+
+
+def validate_branch(branch: Optional[str]):
+    if branch and (not _BRANCH_RE.match(branch) or branch.startswith("-") or ".." in branch):
+        raise GitSyncError(f"Invalid branch name: {branch}")
+
+
+def mirror_path(project_id: int) -> str:
+    return os.path.join(settings.projects_dir, MIRRORS_DIRNAME, f"{project_id}.git")
+
+
+def _get_lock(project_id: int) -> threading.Lock:
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(project_id, threading.Lock())
+
+
+def fetch_commit(project_id: int, url: str, branch: Optional[str]) -> str:
+    """
+    浅拉取远端分支的最新提交到镜像
+
+    Returns:
+        提交 SHA
+    """
+    validate_branch(branch)
+    path = mirror_path(project_id)
+    if not os.path.exists(os.path.join(path, "HEAD")):
+        os.makedirs(path, exist_ok=True)
+        git.Repo.init(path, bare=True)
+    repo = git.Repo(path)
+    try:
+        repo.git.fetch("--depth", "1", "--no-tags", "--", url, branch or "HEAD",
+                       kill_after_timeout=settings.git_fetch_timeout)
+        sha = repo.git.rev_parse("FETCH_HEAD^{commit}")
+        # Keep the checked-out commit reachable so the next shallow fetch can reuse its objects
+        repo.git.update_ref(TRACKING_REF, sha)
+        return sha
+    except git.GitCommandError as e:
+        raise GitSyncError(f"git fetch failed: {redact_url(str(e.stderr or e)).strip()}")
+    finally:
+        repo.close()
+
+
+def build_manifest(project_id: int, sha: str, previous: Dict[str, dict]) -> Tuple[Dict[str, dict], int]:
+    """
+    由提交树生成修订版本清单，git blob id 未变的文件直接复用上一清单的条目
+
+    Returns:
+        (清单, 新读取的 blob 数)
+    """
+    known = {e["git_oid"]: e for e in previous.values() if e.get("git_oid")}
+    repo = git.Repo(mirror_path(project_id))
+    manifest = {}
+    read_blobs = 0
+    try:
+        listing = repo.git.ls_tree("-r", "-z", "--full-tree", sha)
+        for record in filter(None, listing.split("\0")):
+            meta, path = record.split("\t", 1)
+            mode, obj_type, oid = meta.split()
+            # Symlinks (120000) and submodules (160000) are not materialized
+            if obj_type != "blob" or mode not in ("100644", "100755"):
+                continue
+            if path.split("/")[0] == STORE_DIRNAME:
+                continue
+            executable = mode == "100755"
+            reused = known.get(oid)
+            if reused and revision_store.has_blob(reused["hash"]):
+                manifest[path] = dict(reused, executable=executable)
+                continue
+            stream = repo.odb.stream(bytes.fromhex(oid))
+            content = stream.read()
+            digest = hashlib.sha256(content).hexdigest()
+            if not revision_store.has_blob(digest):
+                revision_store.write_blob(digest, [content])
+            manifest[path] = {"hash": digest, "size": len(content), "executable": executable, "git_oid": oid}
+            read_blobs += 1
+    finally:
+        repo.close()
+    return manifest, read_blobs
+
+
+def sync_project(db: Session, project: models.Project) -> dict:
+    """
+    拉取并检出项目的 git 分支；提交未变化时不产生新修订版本
+    """
+    if project.source_type != "git" or not project.git_url:
+        raise GitSyncError("Project is not backed by git")
+
+    lock = _get_lock(project.id)
+    if not lock.acquire(blocking=False):
+        raise GitSyncError("Sync is already running for this project")
+    try:
+        sha = fetch_commit(project.id, project.git_url, project.git_branch)
+        project.git_synced_at = datetime.datetime.now()
+        if sha == project.git_commit and project.current_revision:
+            db.commit()
+            return {"commit": sha, "changed": False, "revision": project.current_revision, "read_blobs": 0}
+
+        previous = {}
+        if project.current_revision:
+            try:
+                previous = revision_store.load_manifest(project.id, project.current_revision)
+            except RevisionError:
+                previous = {}
+        manifest, read_blobs = build_manifest(project.id, sha, previous)
+        record = commit_revision(db, project, manifest, f"git {sha[:12]}")
+        project.git_commit = sha
+        db.commit()
+        logger.info(f"Project {project.id} synced to {sha[:12]} ({read_blobs} blobs read)")
+        return {"commit": sha, "changed": True, "revision": record.revision, "read_blobs": read_blobs}
+    finally:
+        lock.release()
+
+
+def run_initial_sync(project_id: int):
+    """后台执行首次拉取，完成后将项目标记为 ready/error"""
+    db = SessionLocal()
+    try:
+        project = db.query(models.Project).filter(models.Project.id == project_id).first()
+        if not project:
+            return
+        try:
+            sync_project(db, project)
+            project.status = "ready"
+        except Exception as e:
+            logger.error(f"Initial git sync of project {project_id} failed: {e}")
+            project.status = "error"
+        project.updated_at = datetime.datetime.now()
+        db.commit()
+    finally:
+        db.close()
+
+
+def fail_interrupted_syncs() -> int:
+    """将上次进程中未完成首次同步的项目标记为 error（后端启动时调用），返回标记的项目数"""
+    db = SessionLocal()
+    try:
+        projects = db.query(models.Project).filter(models.Project.status == "syncing").all()
+        for project in projects:
+            project.status = "error"
+            project.updated_at = datetime.datetime.now()
+            logger.warning(f"Initial git sync of project {project.id} was interrupted by a restart, marked as error")
+        db.commit()
+        return len(projects)
+    except Exception as e:
+        logger.error(f"Failed to reset interrupted git syncs: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def sync_all_projects() -> dict:
+    """同步所有开启自动同步的 git 项目（系统调度器调用）"""
+    db = SessionLocal()
+    results = {"synced": 0, "changed": 0, "failed": 0}
+    try:
+        projects = db.query(models.Project).filter(
+            models.Project.source_type == "git",
+            models.Project.git_auto_sync == True,
+            models.Project.status == "ready"
+        ).all()
+        for project in projects:
+            try:
+                result = sync_project(db, project)
+                results["synced"] += 1
+                if result["changed"]:
+                    results["changed"] += 1
+            except Exception as e:
+                results["failed"] += 1
+                logger.error(f"Git sync of project {project.id} failed: {e}")
+    finally:
+        db.close()
+    return results
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
 from sqlalchemy.sql import func
 from core.database import Base
 
@@ -11,5 +11,30 @@ class Project(Base):
     work_dir = Column(String) # Relative path for execution context
     output_dir = Column(String, nullable=True) # Output directory for data
     description = Column(String, default="")
+    env_mode = Column(String, default="manual") # manual: task env_id, lockfile: resolved by requirements hash
+    requirements_hash = Column(String, nullable=True, index=True) # Normalized requirements hash (lockfile mode)
+    python_version = Column(String, nullable=True) # Python version for lockfile environments
+    status = Column(String, default="ready") # ready, extracting, error
+    extract_job_id = Column(String, nullable=True) # Background extraction job of the last upload
+    current_revision = Column(String, nullable=True) # Active revision in the revision store (None: run from path)
+    source_type = Column(String, default="archive") # archive, git
+    git_url = Column(String, nullable=True)
+    git_branch = Column(String, nullable=True) # None: remote HEAD
+    git_commit = Column(String, nullable=True) # Commit of the current revision
+    git_auto_sync = Column(Boolean, default=True) # Synced by the system scheduler
+    git_synced_at = Column(DateTime(timezone=True), nullable=True)
+    cache_policy = Column(Text, nullable=True) # JSON overrides for the caching proxy
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ProjectRevision(Base):
+    __tablename__ = "project_revisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    revision = Column(String, index=True) # Content hash of the manifest
+    file_count = Column(Integer, default=0)
+    total_size = Column(Integer, default=0)
+    message = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
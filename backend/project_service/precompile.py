@@ -0,0 +1,220 @@
+"""
+项目字节码预编译模块 - 上传、编辑、同步后用任务的解释器预先编译项目源码
+
+- 编译在目标解释器中执行（`compile_worker.py`，进程池并行），pyc 文件名带解释器 cache tag，
+  不同解释器的编译结果共存于 `__pycache__`，切换解释器不会互相覆盖
+- 执行在可编辑的项目目录中运行，默认使用 checked-hash 模式（内容不可变的目录可使用 timestamp 模式）
+- 每个项目按环境记录编译状态与编译错误（`projects/.kumo_store/pyc/<project_id>.json`），可提前发现语法错误
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+import subprocess
+from typing import Dict, List, Optional, Set
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from project_service import models
+from project_service.revision_store import revision_store
+from task_service.models import Task
+from environment_service import models as env_models
+from environment_service import env_resolver
+
+logger = get_logger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compile_worker.py")
+PYC_MODES = {"timestamp": "TIMESTAMP", "checked-hash": "CHECKED_HASH", "unchecked-hash": "UNCHECKED_HASH"}
+
+
+def execution_root(project: models.Project) -> str:
+    """执行时使用的项目根目录（与执行器一致：始终在项目目录中运行，修订版本目录只读）"""
+    return project.path
+
+
+def resolve_mode(root: str, project: models.Project) -> str:
+    mode = settings.precompile_mode
+    if mode == "auto":
+        # Revision directories never change in place, mtime-based validation is safe and cheapest
+        mode = "timestamp" if root != project.path else "checked-hash"
+    if mode not in PYC_MODES:
+        raise ValueError(f"Unsupported pyc mode: {mode}")
+    return mode
+
+
+def resolve_interpreters(db: Session, project: models.Project) -> List[dict]:
+    """项目任务实际会使用的解释器列表（与执行器的选择逻辑一致）"""
+    interpreters: Dict[str, dict] = {}
+    env_ids = {
+        row[0] for row in db.query(Task.env_id).filter(Task.project_id == project.id, Task.env_id.isnot(None)).all()
+    }
+    envs = db.query(env_models.PythonVersion).filter(env_models.PythonVersion.id.in_(env_ids)).all() if env_ids else []
+    if project.env_mode == "lockfile" and project.requirements_hash:
+        locked = env_resolver.find_ready_environment(db, project.requirements_hash)
+        if locked:
+            envs.append(locked)
+    for env in envs:
+        if env.status == "ready" and os.path.exists(env.path):
+            interpreters[str(env.id)] = {"key": str(env.id), "env_id": env.id, "name": env.name, "python": env.path}
+
+    has_default_tasks = db.query(Task).filter(Task.project_id == project.id, Task.env_id.is_(None)).first()
+    if not interpreters or (has_default_tasks and project.env_mode != "lockfile"):
+        system_python = shutil.which("python") or sys.executable
+        interpreters["system"] = {"key": "system", "env_id": None, "name": "system", "python": system_python}
+    return list(interpreters.values())
+
+
+def compile_tree(python: str, root: str, mode: str, files: Optional[List[str]] = None) -> dict:
+    """用指定解释器编译目录（或其中的部分文件）"""
+    options = {"root": root, "mode": PYC_MODES[mode], "workers": settings.precompile_workers}
+    if files is not None:
+        options["files"] = files
+    result = subprocess.run(
+        [python, WORKER_SCRIPT, json.dumps(options)],
+        capture_output=True, text=True, timeout=settings.precompile_timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "compile worker failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class ProjectPrecompiler:
+    """项目预编译调度器 - 线程安全的单例，同一项目的重复请求会合并"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ProjectPrecompiler, cls).__new__(cls)
+                    cls._instance._running: Set[int] = set()
+                    cls._instance._pending: Dict[int, Optional[Set[str]]] = {}
+                    cls._instance._state_lock = threading.Lock()
+        return cls._instance
+
+    # ---------- state ----------
+
+    def state_path(self, project_id: int) -> str:
+        return os.path.join(revision_store.root, "pyc", f"{project_id}.json")
+
+    def load_state(self, project_id: int) -> dict:
+        path = self.state_path(project_id)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"Precompile state of project {project_id} unreadable: {e}")
+        return {"environments": {}}
+
+    def save_state(self, project_id: int, state: dict):
+        path = self.state_path(project_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    # ---------- scheduling ----------
+
+    def schedule(self, project_id: int, files: Optional[List[str]] = None) -> bool:
+        """后台预编译；项目正在编译时合并为一次后续编译"""
+        if not settings.precompile_enabled:
+            return False
+        with self._state_lock:
+            if project_id in self._running:
+                queued = self._pending.get(project_id, set())
+                self._pending[project_id] = None if files is None or queued is None else queued | set(files)
+                return True
+            self._running.add(project_id)
+        threading.Thread(target=self._worker, args=(project_id, files), daemon=True).start()
+        return True
+
+    def _worker(self, project_id: int, files: Optional[List[str]]):
+        while True:
+            try:
+                self.run(project_id, files)
+            except Exception as e:
+                logger.error(f"Precompile of project {project_id} failed: {e}")
+            with self._state_lock:
+                if project_id not in self._pending:
+                    self._running.discard(project_id)
+                    return
+                queued = self._pending.pop(project_id)
+                files = None if queued is None else sorted(queued)
+
+    # ---------- main ----------
+
+    def run(self, project_id: int, files: Optional[List[str]] = None, db: Optional[Session] = None) -> dict:
+        """
+        同步执行预编译
+
+        Args:
+            project_id: 项目 ID
+            files: 仅编译这些相对路径（None 编译整个项目）
+            db: 可选的数据库会话
+
+        Returns:
+            按环境记录的编译状态
+        """
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            project = db.query(models.Project).filter(models.Project.id == project_id).first()
+            if not project or project.status not in (None, "ready"):
+                return {}
+            root = execution_root(project)
+            mode = resolve_mode(root, project)
+            state = self.load_state(project_id)
+            environments = state.setdefault("environments", {})
+
+            for interp in resolve_interpreters(db, project):
+                started = time.time()
+                previous = environments.get(interp["key"], {})
+                # A partial run only refreshes errors of the files it compiled, unless the target changed
+                partial = files is not None and previous.get("root") == root
+                try:
+                    result = compile_tree(interp["python"], root, mode, files if partial else None)
+                except Exception as e:
+                    logger.warning(f"Precompile of project {project_id} with {interp['name']} failed: {e}")
+                    environments[interp["key"]] = dict(previous, status="failed", error=str(e), finished_at=time.time())
+                    continue
+
+                errors = result["errors"]
+                if partial:
+                    errors = [e for e in previous.get("errors", []) if e["path"] not in set(files)] + errors
+                environments[interp["key"]] = {
+                    "env_id": interp["env_id"],
+                    "env_name": interp["name"],
+                    "python": interp["python"],
+                    "python_version": result["version"],
+                    "cache_tag": result["cache_tag"],
+                    "mode": mode,
+                    "root": root,
+                    "revision": project.current_revision,
+                    "status": "success" if not errors else "errors",
+                    "compiled": result["compiled"],
+                    "errors": errors,
+                    "duration_seconds": round(time.time() - started, 2),
+                    "finished_at": time.time(),
+                }
+                if errors:
+                    logger.warning(
+                        f"Project {project_id}: {len(errors)} files failed to compile with {interp['name']}"
+                    )
+            self.save_state(project_id, state)
+            return state
+        finally:
+            if own_session:
+                db.close()
+
+    def is_running(self, project_id: int) -> bool:
+        return project_id in self._running
+
+
+# 全局单例实例
+project_precompiler = ProjectPrecompiler()
@@ -1,60 +1,67 @@
 import os
 import shutil
-import zipfile
-import py7zr
-import rarfile
 import platform
 import subprocess
 import time
 import stat
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from core.database import get_db
 from core.config import settings
 from core.logging import get_logger
+from core import fs_listing
 from project_service import models, schemas
 from task_service.models import Task
+from environment_service import models as env_models
+from environment_service import env_resolver
 import datetime
 from pydantic import BaseModel
 from audit_service.service import create_audit_log
+from project_service.archive_jobs import (
+    save_upload_stream, archive_job_manager, ExtractionJob, ArchiveQuotaError,
+    SUPPORTED_EXTENSIONS
+)
+from project_service.revision_store import revision_store, commit_revision, activate_revision, RevisionError
+from project_service import git_source
+from project_service.precompile import project_precompiler
+import threading
 
 router = APIRouter()
+
 logger = get_logger(__name__)
 
+# Precompile project sources once an uploaded archive has been extracted
+archive_job_manager.add_completion_hook(lambda job: project_precompiler.schedule(job.project_id))
+
 # 使用配置中的项目目录
 PROJECTS_DIR = settings.projects_dir
 
+# Projects whose files are still being written by a background job, with the 409 detail
+BUSY_STATUS_MESSAGES = {
+    "extracting": "Project files are still being extracted",
+    "syncing": "Initial git sync is still running",
+}
+
+# Frameworks that drive a real browser and can use the shared browser pool
+BROWSER_POOL_FRAMEWORKS = {"Selenium", "Playwright", "DrissionPage"}
+
 if not os.path.exists(PROJECTS_DIR):
     os.makedirs(PROJECTS_DIR)
 
+
+def _ensure_not_busy(project: models.Project):
+    """项目文件仍在后台解压或首次同步时返回 409"""
+    if project.status in BUSY_STATUS_MESSAGES:
+        raise HTTPException(status_code=409, detail=BUSY_STATUS_MESSAGES[project.status])
+
 def get_archive_extension(filename: str):
     if not filename:
         return ""
     _, ext = os.path.splitext(filename)
     return ext.lower()
 
-def extract_archive(archive_path: str, ext: str, dest_dir: str):
-    if ext == ".zip":
-        if not zipfile.is_zipfile(archive_path):
-            raise Exception("Uploaded file is not a valid zip file")
-        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-            zip_ref.extractall(dest_dir)
-        return
-    if ext == ".7z":
-        if not py7zr.is_7zfile(archive_path):
-            raise Exception("Uploaded file is not a valid 7z file")
-        with py7zr.SevenZipFile(archive_path, mode='r') as archive:
-            archive.extractall(dest_dir)
-        return
-    if ext == ".rar":
-        if not rarfile.is_rarfile(archive_path):
-            raise Exception("Uploaded file is not a valid rar file")
-        with rarfile.RarFile(archive_path, 'r') as archive:
-            archive.extractall(dest_dir)
-        return
-    raise Exception("Unsupported archive format")
-
 def read_text_file(path: str):
     for encoding in ["utf-8", "utf-8-sig", "gb18030"]:
         try:
@@ -160,15 +167,17 @@ def create_project(
     **流程**:
     1. 验证项目名称唯一性
     2. 创建项目目录
-    3. 保存并解压上传的文件
-    4. 创建数据库记录
-    5. 记录审计日志
+    3. 分块保存上传文件（计算 SHA-256，检查大小上限）
+    4. 创建数据库记录（status=extracting）并立即返回
+    5. 后台检查配额并解压，进度通过 `GET /api/projects/jobs/{extract_job_id}` 查询
+    6. 记录审计日志
     
     **错误响应**:
     - `400`: 项目名称已存在、目录已存在、不支持的压缩格式
+    - `413`: 上传文件超出大小上限
     - `500`: 文件处理失败
     
-    **返回**: 创建的项目对象
+    **返回**: 创建的项目对象（解压完成后 status 变为 ready，失败为 error）
     
     **示例请求**:
     ```bash
@@ -196,21 +205,24 @@ def create_project(
 
     # 3. Save and Unzip
     ext = get_archive_extension(file.filename)
-    if ext not in [".zip", ".7z", ".rar"]:
+    if ext not in SUPPORTED_EXTENSIONS:
         if os.path.exists(project_path):
             shutil.rmtree(project_path)
         raise HTTPException(status_code=400, detail="Only .zip, .7z, .rar archives are supported")
 
-    archive_path = os.path.join(project_path, f"upload{ext}")
+    # Keep the archive outside the extraction target so a failed job can wipe the directory
+    archive_path = os.path.join(PROJECTS_DIR, f".upload-{safe_name}{ext}")
     try:
-        with open(archive_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        extract_archive(archive_path, ext, project_path)
-        os.remove(archive_path)
-
+        upload_bytes, sha256 = save_upload_stream(file.file, archive_path)
+    except ArchiveQuotaError as e:
+        shutil.rmtree(project_path, ignore_errors=True)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        if os.path.exists(project_path):
-            shutil.rmtree(project_path) # Cleanup
+        shutil.rmtree(project_path, ignore_errors=True)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
         raise HTTPException(status_code=500, detail=f"Failed to process archive: {str(e)}")
 
     # 4. Create DB Record
@@ -220,12 +232,21 @@ def create_project(
         work_dir=work_dir,
         output_dir=output_dir,
         description=description,
+        status="extracting",
         created_at=datetime.datetime.now(),
         updated_at=datetime.datetime.now()
     )
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+
+    # 5. Extract in background
+    job = archive_job_manager.submit(
+        ExtractionJob(db_project.id, archive_path, ext, project_path, upload_bytes, sha256)
+    )
+    db_project.extract_job_id = job.id
+    db.commit()
+    db.refresh(db_project)
     
     create_audit_log(
         db=db,
@@ -233,12 +254,77 @@ def create_project(
         target_type="PROJECT",
         target_id=str(db_project.id),
         target_name=db_project.name,
-        details=f"Created project '{db_project.name}'",
+        details=f"Created project '{db_project.name}' (upload {upload_bytes} bytes, sha256 {sha256})",
         operator_ip=request.client.host
     )
 
     return db_project
 
+@router.post("/create-git", response_model=schemas.Project)
+def create_git_project(body: schemas.ProjectGitCreate, request: Request, db: Session = Depends(get_db)):
+    """
+    从 git 远端创建项目
+
+    项目记录以 status=syncing 立即返回，后台浅拉取（`--depth 1`）目标分支并检出为首个修订版本，
+    完成后 status 变为 ready/error。之后可通过 `POST /api/projects/{id}/git/sync` 或系统调度器增量同步。
+    """
+    if db.query(models.Project).filter(models.Project.name == body.name).first():
+        raise HTTPException(status_code=400, detail="Project name already exists")
+    try:
+        git_source.validate_branch(body.git_branch)
+    except git_source.GitSyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    safe_name = "".join([c for c in body.name if c.isalpha() or c.isdigit() or c in ('-', '_')]).strip()
+    project_path = os.path.join(PROJECTS_DIR, safe_name)
+    if os.path.exists(project_path):
+        raise HTTPException(status_code=400, detail="Project directory already exists")
+    os.makedirs(project_path)
+
+    db_project = models.Project(
+        name=body.name,
+        path=project_path,
+        work_dir=body.work_dir,
+        output_dir=body.output_dir,
+        description=body.description,
+        status="syncing",
+        source_type="git",
+        git_url=body.git_url,
+        git_branch=body.git_branch,
+        git_auto_sync=body.git_auto_sync,
+        created_at=datetime.datetime.now(),
+        updated_at=datetime.datetime.now()
+    )
+    db.add(db_project)
+    db.commit()
+    db.refresh(db_project)
+
+    threading.Thread(target=git_source.run_initial_sync, args=(db_project.id,), daemon=True).start()
+
+    create_audit_log(
+        db=db,
+        operation_type="CREATE",
+        target_type="PROJECT",
+        target_id=str(db_project.id),
+        target_name=db_project.name,
+        details=f"Created project '{db_project.name}' from {git_source.redact_url(body.git_url)}"
+                f" ({body.git_branch or 'HEAD'})",
+        operator_ip=request.client.host
+    )
+    return db_project
+
+@router.get("/jobs/{job_id}", response_model=schemas.ExtractionJob)
+def get_extraction_job(job_id: str, since: int = 0):
+    """
+    查询项目解压任务进度
+
+    - **since**: 只返回序号 >= since 的进度事件，便于增量轮询
+    """
+    job = archive_job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Extraction job not found")
+    return job.to_dict(since=since)
+
 @router.get("/{project_id}/detect", response_model=dict)
 def detect_project_framework(project_id: int, db: Session = Depends(get_db)):
     """
@@ -376,7 +462,8 @@ def detect_project_framework(project_id: int, db: Session = Depends(get_db)):
         return {
             "framework": fw_name.lower(),
             "command": command,
-            "description": f"Detected {fw_name} project{desc_suffix}"
+            "description": f"Detected {fw_name} project{desc_suffix}",
+            "use_browser_pool": fw_name in BROWSER_POOL_FRAMEWORKS
         }
 
     # 3. Fallback: Generic Python
@@ -423,6 +510,7 @@ def update_project(
       - work_dir: 工作目录（可选）
       - output_dir: 输出目录（可选）
       - description: 项目描述（可选）
+      - cache_policy: 缓存代理策略（可选，TTL 覆盖 / 跳过规则）
     
     **验证规则**:
     - 如果更新名称，会检查新名称是否已存在（排除当前项目）
@@ -463,6 +551,9 @@ def update_project(
     if project_in.description is not None:
         project.description = project_in.description
 
+    if project_in.cache_policy is not None:
+        project.cache_policy = project_in.cache_policy.model_dump_json()
+
     project.updated_at = datetime.datetime.now()
     db.commit()
     db.refresh(project)
@@ -479,6 +570,333 @@ def update_project(
     
     return project
 
+@router.post("/{project_id}/environment/resolve", response_model=schemas.EnvironmentResolveResponse)
+def resolve_project_environment(
+    project_id: int,
+    body: schemas.EnvironmentResolveRequest,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    按 requirements 为项目解析环境（锁文件模式）
+
+    对规范化后的 requirements + Python 版本计算哈希：
+    - 已有就绪环境哈希一致：直接复用
+    - 否则：在后台构建新环境（状态 installing）
+
+    项目切换为 `lockfile` 模式后，未指定 `env_id` 的任务会自动使用该环境。
+
+    **参数**:
+    - **requirements**: requirements 文本（可选，默认读取项目中的 requirements.txt）
+    - **python_version**: Python 版本（可选，默认使用系统配置）
+
+    **错误响应**:
+    - `404`: 项目不存在
+    - `400`: 未提供 requirements 且项目中没有 requirements.txt
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    requirements_text = body.requirements
+    if requirements_text is None:
+        requirements_text = env_resolver.read_project_requirements(project)
+        if requirements_text is None:
+            raise HTTPException(status_code=400, detail="No requirements provided and requirements.txt not found")
+
+    try:
+        version, reused = env_resolver.resolve_environment(db, requirements_text, body.python_version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    project.env_mode = "lockfile"
+    project.requirements_hash = version.requirements_hash
+    project.python_version = version.version
+    project.updated_at = datetime.datetime.now()
+    db.commit()
+
+    create_audit_log(
+        db=db,
+        operation_type="RESOLVE_ENV",
+        target_type="PROJECT",
+        target_id=str(project.id),
+        target_name=project.name,
+        details=f"{'Reused' if reused else 'Building'} environment '{version.name}' for project '{project.name}'",
+        operator_ip=request.client.host
+    )
+
+    return schemas.EnvironmentResolveResponse(
+        env_id=version.id,
+        env_name=version.name,
+        status=version.status,
+        requirements_hash=version.requirements_hash,
+        reused=reused
+    )
+
+@router.get("/{project_id}/environment", response_model=schemas.EnvironmentResolveResponse)
+def get_project_environment(project_id: int, db: Session = Depends(get_db)):
+    """
+    获取项目锁文件环境的当前状态
+
+    **返回**: 环境 ID、名称、状态（ready/installing/error），未解析时状态为 `unresolved`
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if project.env_mode != "lockfile" or not project.requirements_hash:
+        return schemas.EnvironmentResolveResponse(status="unresolved")
+
+    version = db.query(env_models.PythonVersion).filter(
+        env_models.PythonVersion.requirements_hash == project.requirements_hash
+    ).first()
+    if not version:
+        return schemas.EnvironmentResolveResponse(status="missing", requirements_hash=project.requirements_hash)
+    return schemas.EnvironmentResolveResponse(
+        env_id=version.id,
+        env_name=version.name,
+        status=version.status,
+        requirements_hash=version.requirements_hash,
+        reused=True
+    )
+
+@router.delete("/{project_id}/environment")
+def release_project_environment(project_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    释放项目的锁文件环境引用，切回手动模式
+
+    环境本身不会立即删除，引用计数归零并闲置超过保留期后由 GC 回收。
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project.env_mode = "manual"
+    project.requirements_hash = None
+    project.updated_at = datetime.datetime.now()
+    db.commit()
+
+    create_audit_log(
+        db=db,
+        operation_type="RELEASE_ENV",
+        target_type="PROJECT",
+        target_id=str(project.id),
+        target_name=project.name,
+        details=f"Released lockfile environment of project '{project.name}'",
+        operator_ip=request.client.host
+    )
+    return {"message": "Environment released"}
+
+@router.post("/{project_id}/revisions/diff", response_model=schemas.ManifestDiffResponse)
+def diff_project_manifest(project_id: int, body: schemas.ManifestDiffRequest, db: Session = Depends(get_db)):
+    """
+    比对客户端清单，返回存储中缺失的 blob 哈希
+
+    增量部署流程：
+    1. 客户端计算本地文件清单（路径 -> sha256/大小/可执行位）并调用本接口
+    2. 对 `missing` 中的每个哈希调用 `PUT /api/projects/blobs/{hash}` 上传文件内容
+    3. 调用 `POST /api/projects/{id}/revisions` 提交清单，原子切换到新修订版本
+    """
+    if not db.query(models.Project).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    manifest = {path: entry.model_dump() for path, entry in body.files.items()}
+    try:
+        missing = revision_store.missing_blobs(manifest)
+    except RevisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"missing": missing, "total_files": len(manifest), "missing_count": len(missing)}
+
+@router.put("/blobs/{blob_hash}")
+async def upload_blob(blob_hash: str, request: Request):
+    """
+    上传单个 blob（请求体为文件原始内容），服务端校验内容哈希
+    """
+    if revision_store.has_blob(blob_hash):
+        return {"hash": blob_hash, "size": None, "stored": False}
+
+    try:
+        writer = revision_store.open_blob_writer(blob_hash)
+        try:
+            async for chunk in request.stream():
+                writer.write(chunk)
+            size = writer.commit()
+        finally:
+            writer.abort()
+    except RevisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"hash": blob_hash, "size": size, "stored": True}
+
+@router.get("/{project_id}/revisions", response_model=List[schemas.ProjectRevision])
+def list_project_revisions(project_id: int, db: Session = Depends(get_db)):
+    """列出项目的修订版本（新到旧）"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    records = db.query(models.ProjectRevision).filter(
+        models.ProjectRevision.project_id == project_id
+    ).order_by(models.ProjectRevision.created_at.desc(), models.ProjectRevision.id.desc()).all()
+    for record in records:
+        record.is_current = record.revision == project.current_revision
+    return records
+
+@router.get("/{project_id}/revisions/{revision}/manifest")
+def get_revision_manifest(project_id: int, revision: str, db: Session = Depends(get_db)):
+    """获取修订版本的文件清单"""
+    if not db.query(models.Project).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        return {"revision": revision, "files": revision_store.load_manifest(project_id, revision)}
+    except RevisionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{project_id}/revisions", response_model=schemas.ProjectRevision)
+def create_project_revision(
+    project_id: int,
+    body: schemas.RevisionCreate,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    提交清单创建修订版本
+
+    所有 blob 必须已上传。`activate=true` 时原子切换 current_revision 并同步项目目录；
+    运行中的执行继续使用其启动时的修订版本。
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    _ensure_not_busy(project)
+
+    manifest = {path: entry.model_dump() for path, entry in body.files.items()}
+    try:
+        record = commit_revision(db, project, manifest, body.message, body.activate)
+    except RevisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    create_audit_log(
+        db=db,
+        operation_type="DEPLOY",
+        target_type="PROJECT",
+        target_id=str(project.id),
+        target_name=project.name,
+        details=f"Created revision {record.revision} ({record.file_count} files)"
+                + (" and activated it" if body.activate else ""),
+        operator_ip=request.client.host
+    )
+    record.is_current = record.revision == project.current_revision
+    return record
+
+@router.post("/{project_id}/revisions/snapshot", response_model=schemas.ProjectRevision)
+def snapshot_project_revision(project_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    将项目目录当前内容快照为修订版本并激活（启用版本存储的入口）
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    _ensure_not_busy(project)
+
+    try:
+        manifest = revision_store.snapshot_directory(project.path)
+        record = commit_revision(db, project, manifest, "Snapshot of project directory")
+    except RevisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    create_audit_log(
+        db=db,
+        operation_type="DEPLOY",
+        target_type="PROJECT",
+        target_id=str(project.id),
+        target_name=project.name,
+        details=f"Snapshot project directory as revision {record.revision}",
+        operator_ip=request.client.host
+    )
+    record.is_current = True
+    return record
+
+@router.post("/{project_id}/revisions/{revision}/activate")
+def activate_project_revision(project_id: int, revision: str, request: Request, db: Session = Depends(get_db)):
+    """切换到指定修订版本（回滚）"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not db.query(models.ProjectRevision).filter(
+        models.ProjectRevision.project_id == project_id,
+        models.ProjectRevision.revision == revision
+    ).first():
+        raise HTTPException(status_code=404, detail="Revision not found")
+    _ensure_not_busy(project)
+
+    try:
+        stats = activate_revision(db, project, revision)
+    except RevisionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    create_audit_log(
+        db=db,
+        operation_type="DEPLOY",
+        target_type="PROJECT",
+        target_id=str(project.id),
+        target_name=project.name,
+        details=f"Activated revision {revision}",
+        operator_ip=request.client.host
+    )
+    return {"revision": revision, **stats}
+
+@router.post("/{project_id}/git/sync", response_model=schemas.GitSyncResult)
+def sync_git_project(project_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    立即增量同步 git 项目：浅拉取最新提交，只读取变化的文件并提交为新修订版本
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.source_type != "git":
+        raise HTTPException(status_code=400, detail="Project is not backed by git")
+    _ensure_not_busy(project)
+
+    try:
+        result = git_source.sync_project(db, project)
+    except git_source.GitSyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if project.status == "error":
+        # Retrying a failed or interrupted initial sync
+        project.status = "ready"
+        db.commit()
+
+    if result["changed"]:
+        create_audit_log(
+            db=db,
+            operation_type="DEPLOY",
+            target_type="PROJECT",
+            target_id=str(project.id),
+            target_name=project.name,
+            details=f"Synced git commit {result['commit'][:12]} as revision {result['revision']}",
+            operator_ip=request.client.host
+        )
+    return result
+
+@router.get("/{project_id}/precompile")
+def get_precompile_status(project_id: int, db: Session = Depends(get_db)):
+    """
+    获取项目字节码预编译状态
+
+    按环境返回解释器版本、cache tag、pyc 模式、编译文件数和编译错误（语法错误可在执行前发现）。
+    """
+    if not db.query(models.Project).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    state = project_precompiler.load_state(project_id)
+    return {"running": project_precompiler.is_running(project_id), **state}
+
+@router.post("/{project_id}/precompile")
+def trigger_precompile(project_id: int, db: Session = Depends(get_db)):
+    """立即在后台为项目的所有任务解释器重新预编译"""
+    if not db.query(models.Project).filter(models.Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not project_precompiler.schedule(project_id):
+        raise HTTPException(status_code=400, detail="Precompilation is disabled")
+    return {"message": "Precompilation scheduled"}
+
 # Helper to remove read-only files (fixes Windows deletion issues)
 def remove_readonly(func, path, excinfo):
     os.chmod(path, stat.S_IWRITE)
@@ -515,12 +933,14 @@ def delete_project(project_id: int, request: Request, db: Session = Depends(get_
     **错误响应**:
     - `404`: 项目不存在
     - `400`: 项目正在被任务使用，无法删除
+    - `409`: 项目文件仍在解压或首次同步中
     
     **注意**: 删除操作不可逆，请谨慎操作。
     """
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    _ensure_not_busy(project)
     
     # Check if used by any task
     related_tasks = db.query(Task).filter(Task.project_id == project_id).all()
@@ -580,12 +1000,20 @@ def delete_project(project_id: int, request: Request, db: Session = Depends(get_
                     pass
             
             time.sleep(1)
+
+    if project.source_type == "git":
+        shutil.rmtree(git_source.mirror_path(project.id), ignore_errors=True)
+    if project.current_revision:
+        revision_store.remove_project(project.id)
+        db.query(models.ProjectRevision).filter(models.ProjectRevision.project_id == project.id).delete()
             
     db.delete(project)
     db.commit()
+    if project.current_revision:
+        revision_store.collect_garbage()
     return {"message": "Project deleted"}
 
-def build_file_tree(base_path, rel_path=""):
+def build_file_tree(base_path, rel_path="", max_depth=None):
     items = []
     # Ensure base_path doesn't end with slash to avoid double slash issues, though join handles it
     full_path = os.path.join(base_path, rel_path)
@@ -594,35 +1022,42 @@ def build_file_tree(base_path, rel_path=""):
         return []
 
     try:
-        for entry in os.scandir(full_path):
-            if entry.name == '__pycache__' or entry.name.startswith('.'):
-                continue
-                
-            entry_rel_path = os.path.join(rel_path, entry.name).replace("\\", "/")
-            item = {
-                "label": entry.name,
-                "path": entry_rel_path,
-                "type": "dir" if entry.is_dir() else "file",
-            }
-            if entry.is_dir():
-                item["children"] = build_file_tree(base_path, entry_rel_path)
-            items.append(item)
+        # Cached single-level listings, hidden entries and __pycache__ are ignored by default
+        cursor = None
+        while True:
+            listing = fs_listing.list_directory(full_path, cursor=cursor, limit=fs_listing.MAX_PAGE_SIZE)
+            for entry in listing["entries"]:
+                entry_rel_path = os.path.join(rel_path, entry["name"]).replace("\\", "/")
+                item = {
+                    "label": entry["name"],
+                    "path": entry_rel_path,
+                    "type": entry["type"],
+                }
+                if entry["type"] == "dir" and (max_depth is None or max_depth > 1):
+                    item["children"] = build_file_tree(
+                        base_path, entry_rel_path, None if max_depth is None else max_depth - 1
+                    )
+                items.append(item)
+            cursor = listing["next_cursor"]
+            if not cursor:
+                break
     except PermissionError:
         pass # Skip unreadable directories
     
-    # Sort: directories first, then files
-    items.sort(key=lambda x: (0 if x["type"] == "dir" else 1, x["label"].lower()))
+    # Directories first, then files (sorted by the listing engine)
     return items
 
 @router.get("/{project_id}/files")
-def get_project_files(project_id: int, db: Session = Depends(get_db)):
+def get_project_files(project_id: int, max_depth: Optional[int] = None, db: Session = Depends(get_db)):
     """
     获取项目的文件树结构
     
-    返回项目的文件树结构，用于前端展示项目文件列表。
+    返回项目的文件树结构，用于前端展示项目文件列表。大型项目请使用按层懒加载的
+    `GET /api/projects/{project_id}/files/list`。
     
     **参数**:
     - **project_id**: 项目 ID（路径参数）
+    - **max_depth**: 最大展开层数（默认不限制）
     
     **返回格式**:
     返回树形结构，每个节点包含：
@@ -674,7 +1109,79 @@ def get_project_files(project_id: int, db: Session = Depends(get_db)):
     if not os.path.exists(project.path):
         return []
         
-    return build_file_tree(project.path)
+    return build_file_tree(project.path, max_depth=max_depth)
+
+@router.get("/{project_id}/files/list")
+def list_project_files(
+    project_id: int,
+    request: Request,
+    response: Response,
+    path: str = "",
+    cursor: Optional[str] = None,
+    limit: int = fs_listing.DEFAULT_PAGE_SIZE,
+    ignore: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    按层懒加载项目文件列表
+
+    **参数**:
+    - **path**: 目录相对路径（默认项目根目录）
+    - **cursor**: 分页游标，传入上一页返回的 `next_cursor`
+    - **limit**: 每页条目数（最大 1000）
+    - **ignore**: 逗号分隔的 fnmatch 忽略规则（默认忽略 `__pycache__`、隐藏文件、`node_modules`、`*.pyc`，传空字符串不忽略）
+
+    **缓存**: 列表按目录 mtime 缓存，响应带 ETag，请求携带匹配的 If-None-Match 时返回 304。
+
+    **返回**:
+    ```json
+    {
+        "path": "src",
+        "items": [{"label": "main.py", "path": "src/main.py", "type": "file"}],
+        "next_cursor": null,
+        "total": 1
+    }
+    ```
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    base_path = os.path.abspath(project.path)
+    full_path = os.path.abspath(os.path.join(base_path, path))
+    if full_path != base_path and not full_path.startswith(base_path + os.sep):
+        raise HTTPException(status_code=403, detail="Access denied: Path traversal attempt")
+
+    try:
+        listing = fs_listing.list_directory(
+            full_path, cursor=cursor, limit=limit, ignore=fs_listing.parse_ignore_patterns(ignore)
+        )
+    except fs_listing.ListingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Directory not found")
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    if fs_listing.etag_matches(request.headers.get("if-none-match"), listing["etag"]):
+        return Response(status_code=304, headers={"ETag": listing["etag"]})
+    response.headers["ETag"] = listing["etag"]
+
+    rel_dir = os.path.relpath(full_path, base_path).replace("\\", "/")
+    rel_dir = "" if rel_dir == "." else rel_dir
+    return {
+        "path": rel_dir,
+        "items": [
+            {
+                "label": e["name"],
+                "path": f"{rel_dir}/{e['name']}" if rel_dir else e["name"],
+                "type": e["type"]
+            }
+            for e in listing["entries"]
+        ],
+        "next_cursor": listing["next_cursor"],
+        "total": listing["total"]
+    }
 
 @router.get("/{project_id}/files/content")
 def get_file_content(project_id: int, path: str, db: Session = Depends(get_db)):
@@ -764,6 +1271,7 @@ async def save_file_content(
     **错误响应**:
     - `404`: 项目不存在
     - `403`: 路径穿透尝试（安全拒绝）
+    - `409`: 项目仍在解压或首次同步
     - `500`: 文件写入错误
     
     **示例请求**:
@@ -781,7 +1289,8 @@ async def save_file_content(
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-        
+    _ensure_not_busy(project)
+
     # Security check
     full_path = os.path.abspath(os.path.join(project.path, body.path))
     if not full_path.startswith(os.path.abspath(project.path)):
@@ -790,13 +1299,30 @@ async def save_file_content(
     try:
         with open(full_path, "w", encoding="utf-8") as f:
             f.write(body.content)
-        return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error writing file: {str(e)}")
 
+    if project.current_revision:
+        # Versioned project: the edit becomes a new revision derived from the current one
+        try:
+            manifest = revision_store.load_manifest(project.id, project.current_revision)
+            rel_path = os.path.relpath(full_path, os.path.abspath(project.path)).replace(os.sep, "/")
+            manifest[rel_path] = revision_store.add_file(full_path)
+            record = await run_in_threadpool(commit_revision, db, project, manifest, f"Edited {rel_path}")
+            return {"status": "success", "revision": record.revision}
+        except RevisionError as e:
+            raise HTTPException(status_code=500, detail=f"Error creating revision: {str(e)}")
+
+    rel_path = os.path.relpath(full_path, os.path.abspath(project.path)).replace(os.sep, "/")
+    if rel_path.endswith(".py"):
+        project_precompiler.schedule(project.id, [rel_path])
+    return {"status": "success"}
+
 # Add endpoint to browse server directories (for output_dir selection)
 class DirListRequest(BaseModel):
     path: str = "/"
+    cursor: Optional[str] = None
+    limit: int = fs_listing.DEFAULT_PAGE_SIZE
 
 # Define allowed base directories for browsing
 ALLOWED_BROWSE_DIRS = [
@@ -832,6 +1358,8 @@ def browse_server_directories(request: DirListRequest):
     **参数**:
     - **request**: 目录浏览请求（请求体）
       - path: 要浏览的路径（默认: 项目目录）
+      - cursor: 分页游标（上一页返回的 next_cursor）
+      - limit: 每页条目数
     
     **安全措施**:
     - 严格限制可浏览的目录范围
@@ -906,29 +1434,28 @@ def browse_server_directories(request: DirListRequest):
                     raise HTTPException(status_code=403, detail="Access denied: Cannot browse outside allowed directories")
                 break
 
-    items = []
     try:
-        for entry in os.scandir(abs_target):
-            if entry.is_dir():
-                try:
-                    items.append({
-                        "name": entry.name,
-                        "path": entry.path,
-                        "type": "dir"
-                    })
-                except Exception:
-                    pass
+        listing = fs_listing.list_directory(
+            abs_target, cursor=request.cursor, limit=request.limit, ignore=(), dirs_only=True
+        )
+    except fs_listing.ListingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"Error reading directory: {str(e)}")
 
-    items.sort(key=lambda x: x["name"].lower())
+    items = [
+        {"name": e["name"], "path": os.path.join(abs_target, e["name"]), "type": "dir"}
+        for e in listing["entries"]
+    ]
 
-    # Add parent dir only if it's within allowed directories
+    # Add parent dir only if it's within allowed directories (first page only)
     parent = os.path.dirname(abs_target)
-    if parent and is_path_allowed(parent):
+    if parent and is_path_allowed(parent) and not request.cursor:
          items.insert(0, {"name": "..", "path": parent, "type": "dir"})
 
     return {
         "current_path": abs_target,
-        "items": items
+        "items": items,
+        "next_cursor": listing["next_cursor"],
+        "total": listing["total"]
     }
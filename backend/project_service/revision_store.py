@@ -0,0 +1,488 @@
+"""
+项目版本存储模块 - 内容寻址的项目修订版本与增量同步
+
+- 文件内容按 SHA-256 存为 blob（`projects/.kumo_store/blobs`），只读
+- 修订版本 = 清单（路径 -> 哈希/大小/可执行位），提交时只写清单；执行固定某个版本时才按需由 blob 复制出
+  版本目录（文件系统支持时为 reflink），设为只读并原子重命名到位，通过 KUMO_REVISION_DIR 暴露给执行；
+  执行仍在项目目录中运行；清理时删除不再被运行中执行固定的版本目录（保留清单）
+- blob 的引用关系以清单为准，不再被任何清单引用的 blob 被回收
+- 客户端提交清单，服务端返回缺失的 blob，只需上传变化的文件
+- 切换修订版本只更新数据库中的 current_revision 指针，执行记录固定在启动时的修订版本
+- 项目目录（project.path）作为工作副本按清单差异同步，供文件浏览与在线编辑
+"""
+import os
+import re
+import sys
+import json
+import stat
+import uuid
+import time
+import shutil
+import hashlib
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.logging import get_logger
+from project_service import models
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+STORE_DIRNAME = ".kumo_store"
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_CHUNK = 1024 * 1024
+# Uploaded blobs are unreferenced until their revision is committed; keep them this long
+BLOB_GRACE_SECONDS = 3600
+# Directories never captured when snapshotting a working copy
+SNAPSHOT_SKIP_DIRS = {".git", "__pycache__", ".venv", "venv", "node_modules", ".idea", ".vscode"}
+# ioctl that shares extents copy-on-write (btrfs, xfs, ...)
+FICLONE = 0x40049409 if sys.platform.startswith("linux") and fcntl else None
+
+
+class RevisionError(Exception):
+    """清单或 blob 不合法"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clone_file(source: str, target: str):
+    """复制文件内容：文件系统支持时使用 reflink（写时复制，不占额外空间），否则普通复制"""
+    if FICLONE is not None:
+        try:
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def set_tree_writable(root: str, writable: bool):
+    """修改目录树中文件与目录的写权限（修订版本目录只读，删除前恢复写权限）"""
+    for dirpath, _, filenames in os.walk(root):
+        for path in [dirpath] + [os.path.join(dirpath, name) for name in filenames]:
+            if os.path.islink(path):
+                continue
+            mode = os.lstat(path).st_mode
+            if writable:
+                os.chmod(path, mode | stat.S_IWUSR)
+            else:
+                os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def compute_revision_id(manifest: Dict[str, dict]) -> str:
+    """修订版本 ID 由规范化清单计算，相同内容得到相同 ID"""
+    canonical = json.dumps(
+        {path: [e["hash"], bool(e.get("executable"))] for path, e in sorted(manifest.items())},
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class RevisionStore:
+    """内容寻址的修订版本存储"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or os.path.join(settings.projects_dir, STORE_DIRNAME))
+        self.blobs_dir = os.path.join(self.root, "blobs")
+        self.revisions_dir = os.path.join(self.root, "revisions")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        # Serializes pinning/materializing against pruning, so a directory is never removed under a new pin
+        self.pin_lock = threading.RLock()
+
+    # ---------- blobs ----------
+
+    def blob_path(self, digest: str, executable: bool = False) -> str:
+        name = f"{digest}-x" if executable else digest
+        return os.path.join(self.blobs_dir, digest[:2], name)
+
+    def has_blob(self, digest: str) -> bool:
+        return os.path.exists(self.blob_path(digest)) or os.path.exists(self.blob_path(digest, True))
+
+    def missing_blobs(self, manifest: Dict[str, dict]) -> List[str]:
+        self.validate_manifest(manifest)
+        return sorted({e["hash"] for e in manifest.values() if not self.has_blob(e["hash"])})
+
+    def _finalize_blob(self, tmp_path: str, digest: str, executable: bool) -> str:
+        target = self.blob_path(digest, executable)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(tmp_path, 0o555 if executable else 0o444)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, target)
+        return target
+
+    def open_blob_writer(self, expected_hash: str) -> "BlobWriter":
+        if not _HASH_RE.match(expected_hash):
+            raise RevisionError("Invalid blob hash")
+        return BlobWriter(self, expected_hash)
+
+    def write_blob(self, expected_hash: str, chunks: Iterable[bytes]) -> int:
+        """写入上传的 blob，校验哈希后落入存储；返回字节数"""
+        writer = self.open_blob_writer(expected_hash)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            return writer.commit()
+        finally:
+            writer.abort()
+
+    def add_file(self, path: str) -> dict:
+        """将本地文件加入存储，返回清单条目"""
+        st = os.stat(path)
+        executable = bool(st.st_mode & stat.S_IXUSR)
+        digest = file_sha256(path)
+        if not os.path.exists(self.blob_path(digest, executable)):
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+            shutil.copyfile(path, tmp_path)
+            self._finalize_blob(tmp_path, digest, executable)
+        return {"hash": digest, "size": st.st_size, "executable": executable}
+
+    def _blob_source(self, digest: str) -> str:
+        """blob 在存储中的路径（任一可执行位变体，复制出的文件按清单设置权限）"""
+        for executable in (False, True):
+            path = self.blob_path(digest, executable)
+            if os.path.exists(path):
+                return path
+        raise RevisionError(f"Blob {digest} is missing")
+
+    def _copy_blob(self, entry: dict, target: str):
+        clone_file(self._blob_source(entry["hash"]), target)
+        os.chmod(target, 0o755 if entry.get("executable") else 0o644)
+
+    # ---------- manifests ----------
+
+    @staticmethod
+    def validate_manifest(manifest: Dict[str, dict]):
+        if not isinstance(manifest, dict):
+            raise RevisionError("Manifest must be an object")
+        for path, entry in manifest.items():
+            normalized = os.path.normpath(path)
+            if (os.path.isabs(path) or normalized.startswith("..") or normalized != path.replace("/", os.sep)
+                    or normalized.split(os.sep)[0] == STORE_DIRNAME):
+                raise RevisionError(f"Invalid path in manifest: {path}")
+            if not _HASH_RE.match(str(entry.get("hash", ""))):
+                raise RevisionError(f"Invalid hash for {path}")
+
+    def snapshot_directory(self, base_dir: str) -> Dict[str, dict]:
+        """将工作副本的文件加入存储并生成清单"""
+        manifest = {}
+        for root, dirs, files in os.walk(base_dir):
+            dirs[:] = [d for d in dirs if d not in SNAPSHOT_SKIP_DIRS and d != STORE_DIRNAME]
+            for name in files:
+                full_path = os.path.join(root, name)
+                if os.path.islink(full_path) or not os.path.isfile(full_path):
+                    continue
+                rel_path = os.path.relpath(full_path, base_dir).replace(os.sep, "/")
+                manifest[rel_path] = self.add_file(full_path)
+        return manifest
+
+    # ---------- revisions ----------
+
+    def project_dir(self, project_id: int) -> str:
+        return os.path.join(self.revisions_dir, str(project_id))
+
+    def revision_path(self, project_id: int, revision: str) -> str:
+        return os.path.join(self.project_dir(project_id), revision)
+
+    def manifest_path(self, project_id: int, revision: str) -> str:
+        return os.path.join(self.project_dir(project_id), f"{revision}.json")
+
+    def load_manifest(self, project_id: int, revision: str) -> Dict[str, dict]:
+        path = self.manifest_path(project_id, revision)
+        if not os.path.exists(path):
+            raise RevisionError(f"Revision {revision} not found")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def build_revision(self, project_id: int, manifest: Dict[str, dict]) -> str:
+        """
+        登记修订版本清单；已存在则直接返回
+
+        只写入清单，不复制文件：在线编辑等频繁提交不会每次物化整个项目，目录由 materialize 按需构建
+        """
+        self.validate_manifest(manifest)
+        revision = compute_revision_id(manifest)
+        manifest_path = self.manifest_path(project_id, revision)
+        if os.path.exists(manifest_path):
+            return revision
+
+        missing = self.missing_blobs(manifest)
+        if missing:
+            raise RevisionError(f"{len(missing)} blobs are missing")
+
+        os.makedirs(self.project_dir(project_id), exist_ok=True)
+        tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        return revision
+
+    def materialize(self, project_id: int, revision: str) -> str:
+        """
+        按清单由 blob 复制出只读的修订版本目录（执行固定该版本时调用），完成后原子重命名；已存在则直接返回
+
+        文件是独立副本（不与 blob 共享 inode），整个目录只读，作为执行的 KUMO_REVISION_DIR
+        """
+        final_dir = self.revision_path(project_id, revision)
+        if os.path.isdir(final_dir):
+            return final_dir
+        manifest = self.load_manifest(project_id, revision)
+
+        build_dir = os.path.join(self.project_dir(project_id), f".build-{uuid.uuid4().hex}")
+        try:
+            for rel_path, entry in manifest.items():
+                target = os.path.join(build_dir, rel_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                self._copy_blob(entry, target)
+            os.makedirs(build_dir, exist_ok=True)
+            set_tree_writable(build_dir, False)
+            os.rename(build_dir, final_dir)
+        except FileExistsError:
+            # Built concurrently by another execution
+            pass
+        except OSError as e:
+            # Another execution may have published the same revision first
+            if not os.path.isdir(final_dir):
+                raise RevisionError(f"Failed to materialize revision: {e}")
+        finally:
+            if os.path.exists(build_dir):
+                set_tree_writable(build_dir, True)
+                shutil.rmtree(build_dir, ignore_errors=True)
+        return final_dir
+
+    def dematerialize(self, project_id: int, revision: str):
+        """删除修订版本目录，保留清单（之后固定该版本的执行会重新物化）"""
+        set_tree_writable(self.revision_path(project_id, revision), True)
+        shutil.rmtree(self.revision_path(project_id, revision), ignore_errors=True)
+
+    def remove_revision(self, project_id: int, revision: str):
+        self.dematerialize(project_id, revision)
+        if os.path.exists(self.manifest_path(project_id, revision)):
+            os.remove(self.manifest_path(project_id, revision))
+
+    def remove_project(self, project_id: int):
+        set_tree_writable(self.project_dir(project_id), True)
+        shutil.rmtree(self.project_dir(project_id), ignore_errors=True)
+
+    def referenced_hashes(self) -> set:
+        """所有修订版本清单引用的 blob 哈希"""
+        hashes = set()
+        if not os.path.isdir(self.revisions_dir):
+            return hashes
+        for project_id in os.listdir(self.revisions_dir):
+            project_dir = os.path.join(self.revisions_dir, project_id)
+            if not os.path.isdir(project_dir):
+                continue
+            for name in os.listdir(project_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(project_dir, name), "r", encoding="utf-8") as f:
+                        hashes.update(entry["hash"] for entry in json.load(f).values())
+                except (OSError, ValueError, KeyError, AttributeError):
+                    continue
+        return hashes
+
+    def collect_garbage(self) -> int:
+        """删除不再被任何修订版本清单引用的 blob（刚上传、尚未提交的 blob 保留一段时间）"""
+        removed = 0
+        if not os.path.isdir(self.blobs_dir):
+            return removed
+        referenced = self.referenced_hashes()
+        for root, _, files in os.walk(self.blobs_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name[:64] in referenced:
+                    continue
+                try:
+                    st = os.stat(path)
+                    if time.time() - st.st_mtime > BLOB_GRACE_SECONDS:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    # ---------- working copy ----------
+
+    def sync_working_copy(self, base_dir: str, old_manifest: Dict[str, dict], new_manifest: Dict[str, dict]) -> dict:
+        """
+        按清单差异更新工作副本：变化的文件以复制方式原子替换（避免在线编辑写穿 blob），
+        旧版本中存在而新版本中删除的文件被移除，清单之外的文件保持不动
+        """
+        stats = {"updated": 0, "removed": 0}
+        for rel_path, entry in new_manifest.items():
+            target = os.path.join(base_dir, rel_path)
+            old = old_manifest.get(rel_path)
+            if old and old["hash"] == entry["hash"] and os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.kumo-sync-tmp"
+            self._copy_blob(entry, tmp_path)
+            os.replace(tmp_path, target)
+            stats["updated"] += 1
+        for rel_path in set(old_manifest) - set(new_manifest):
+            target = os.path.join(base_dir, rel_path)
+            if os.path.isfile(target):
+                os.remove(target)
+                stats["removed"] += 1
+        return stats
+
+
+class BlobWriter:
+    """流式写入 blob：边写边哈希，commit 时校验并落入存储"""
+
+    def __init__(self, store: RevisionStore, expected_hash: str):
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        self.store = store
+        self.expected_hash = expected_hash
+        self.tmp_path = os.path.join(store.tmp_dir, uuid.uuid4().hex)
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > settings.upload_max_bytes:
+            raise RevisionError("Blob exceeds upload limit")
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> int:
+        self._file.close()
+        if self._digest.hexdigest() != self.expected_hash:
+            raise RevisionError("Blob content does not match its hash")
+        self.store._finalize_blob(self.tmp_path, self.expected_hash, False)
+        return self.size
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def commit_revision(
+    db: Session,
+    project: models.Project,
+    manifest: Dict[str, dict],
+    message: Optional[str] = None,
+    activate: bool = True
+) -> models.ProjectRevision:
+    """
+    构建并登记修订版本；activate 时原子切换 current_revision 并同步工作副本
+
+    运行中的执行固定其启动时的修订版本（KUMO_REVISION_DIR），切换和清理不会删除这些版本目录
+    """
+    revision = revision_store.build_revision(project.id, manifest)
+    record = db.query(models.ProjectRevision).filter(
+        models.ProjectRevision.project_id == project.id,
+        models.ProjectRevision.revision == revision
+    ).first()
+    if not record:
+        record = models.ProjectRevision(
+            project_id=project.id,
+            revision=revision,
+            file_count=len(manifest),
+            total_size=sum(e.get("size") or 0 for e in manifest.values()),
+            message=message,
+            created_at=datetime.datetime.now()
+        )
+        db.add(record)
+        db.commit()
+        db.refresh(record)
+    if activate:
+        activate_revision(db, project, revision)
+    return record
+
+
+def activate_revision(db: Session, project: models.Project, revision: str) -> dict:
+    """切换当前修订版本并同步工作副本"""
+    new_manifest = revision_store.load_manifest(project.id, revision)
+    old_manifest = {}
+    if project.current_revision and project.current_revision != revision:
+        try:
+            old_manifest = revision_store.load_manifest(project.id, project.current_revision)
+        except RevisionError:
+            old_manifest = {}
+    project.current_revision = revision
+    project.updated_at = datetime.datetime.now()
+    db.commit()
+    stats = revision_store.sync_working_copy(project.path, old_manifest, new_manifest)
+    prune_revisions(db, project)
+
+    from project_service.precompile import project_precompiler
+    project_precompiler.schedule(project.id)
+    return stats
+
+
+def pin_revision(db: Session, project: models.Project, execution) -> Optional[str]:
+    """将执行固定到项目当前修订版本并按需物化版本目录；返回目录，版本不可用时返回 None"""
+    if not project.current_revision:
+        return None
+    with revision_store.pin_lock:
+        execution.revision = project.current_revision
+        db.commit()
+        try:
+            return revision_store.materialize(project.id, project.current_revision)
+        except RevisionError as e:
+            logger.warning(f"Revision {project.current_revision} of project {project.id} is unavailable: {e}")
+            return None
+
+
+def prune_revisions(db: Session, project: models.Project, keep: Optional[int] = None) -> List[str]:
+    """
+    清理旧修订版本：保留最近 keep 个、当前版本以及运行中执行所固定的版本，然后回收无引用 blob；
+    保留的版本中没有运行中执行固定的，只删除物化的目录
+    """
+    from task_service.models import Task, TaskExecution
+
+    keep = settings.revision_keep if keep is None else keep
+    removed = []
+    with revision_store.pin_lock:
+        records = db.query(models.ProjectRevision).filter(
+            models.ProjectRevision.project_id == project.id
+        ).order_by(models.ProjectRevision.created_at.desc(), models.ProjectRevision.id.desc()).all()
+
+        running = {
+            row[0] for row in db.query(TaskExecution.revision).join(Task, Task.id == TaskExecution.task_id).filter(
+                Task.project_id == project.id,
+                TaskExecution.status == "running",
+                TaskExecution.revision.isnot(None)
+            ).all()
+        }
+
+        for index, record in enumerate(records):
+            if record.revision in running:
+                continue
+            if index < keep or record.revision == project.current_revision:
+                revision_store.dematerialize(project.id, record.revision)
+                continue
+            revision_store.remove_revision(project.id, record.revision)
+            db.delete(record)
+            removed.append(record.revision)
+        if removed:
+            db.commit()
+    if removed:
+        revision_store.collect_garbage()
+        logger.info(f"Pruned {len(removed)} revisions of project {project.id}")
+    return removed
+
+
+# 全局单例实例
+revision_store = RevisionStore()
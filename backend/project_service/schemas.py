@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class ProjectBase(BaseModel):
     name: str
@@ -11,17 +11,42 @@ class ProjectBase(BaseModel):
 class ProjectCreate(ProjectBase):
     pass
 
+class CacheRule(BaseModel):
+    pattern: str  # fnmatch URL pattern, e.g. "http://example.com/list/*"
+    ttl: int  # Freshness lifetime in seconds, overrides response headers
+
+class CachePolicy(BaseModel):
+    enabled: bool = True
+    default_ttl: Optional[int] = None  # None: follow response cache headers
+    ignore_no_store: bool = False  # Also cache no-store / private / Set-Cookie responses
+    bypass: List[str] = []  # URL patterns that are never cached
+    rules: List[CacheRule] = []
+
 class ProjectUpdate(BaseModel):
     name: Optional[str] = None
     work_dir: Optional[str] = None
     description: Optional[str] = None
     output_dir: Optional[str] = None
+    cache_policy: Optional[CachePolicy] = None
 
 class Project(ProjectBase):
     model_config = ConfigDict(from_attributes=True)
     
     id: int
     path: str
+    env_mode: Optional[str] = "manual"
+    requirements_hash: Optional[str] = None
+    python_version: Optional[str] = None
+    status: Optional[str] = "ready"
+    extract_job_id: Optional[str] = None
+    current_revision: Optional[str] = None
+    source_type: Optional[str] = "archive"
+    git_url: Optional[str] = None
+    git_branch: Optional[str] = None
+    git_commit: Optional[str] = None
+    git_auto_sync: Optional[bool] = True
+    git_synced_at: Optional[datetime] = None
+    cache_policy: Optional[str] = None  # JSON encoded CachePolicy
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     used_by_tasks: Optional[list[str]] = []
@@ -29,3 +54,80 @@ class Project(ProjectBase):
 class FileSaveRequest(BaseModel):
     path: str
     content: str
+
+class EnvironmentResolveRequest(BaseModel):
+    requirements: Optional[str] = None  # None: read requirements.txt from the project
+    python_version: Optional[str] = None
+
+class EnvironmentResolveResponse(BaseModel):
+    env_id: Optional[int] = None
+    env_name: Optional[str] = None
+    status: str
+    requirements_hash: Optional[str] = None
+    reused: bool = False
+
+class ExtractionEvent(BaseModel):
+    seq: int
+    ts: float
+    type: str
+    message: str
+    done_members: int = 0
+    total_members: int = 0
+    done_bytes: int = 0
+    total_bytes: int = 0
+
+class ExtractionJob(BaseModel):
+    job_id: str
+    project_id: int
+    status: str
+    error: Optional[str] = None
+    sha256: Optional[str] = None
+    upload_bytes: int = 0
+    total_members: int = 0
+    done_members: int = 0
+    total_bytes: int = 0
+    done_bytes: int = 0
+    created_at: float
+    finished_at: Optional[float] = None
+    events: List[ExtractionEvent] = []
+
+class ManifestEntry(BaseModel):
+    hash: str
+    size: int = 0
+    executable: bool = False
+
+class ManifestDiffRequest(BaseModel):
+    files: Dict[str, ManifestEntry]
+
+class ManifestDiffResponse(BaseModel):
+    missing: List[str]
+    total_files: int
+    missing_count: int
+
+class RevisionCreate(BaseModel):
+    files: Dict[str, ManifestEntry]
+    message: Optional[str] = None
+    activate: bool = True
+
+class ProjectRevision(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    project_id: int
+    revision: str
+    file_count: int = 0
+    total_size: int = 0
+    message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    is_current: bool = False
+
+class ProjectGitCreate(ProjectBase):
+    git_url: str
+    git_branch: Optional[str] = None
+    git_auto_sync: bool = True
+
+class GitSyncResult(BaseModel):
+    commit: str
+    changed: bool
+    revision: Optional[str] = None
+    read_blobs: int = 0
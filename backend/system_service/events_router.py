@@ -0,0 +1,183 @@
+"""
+实时推送通道 - 前端通过一个 WebSocket（或 SSE）连接订阅任务、执行、执行槽、主机统计和环境状态的变化，
+取代各页面对 REST 接口的定时轮询。
+
+消息格式：
+- {"type": "hello", "seq": N}：连接建立，N 为当前事件序号
+- {"seq", "topic", "ts", "data"}：事件；data 中 action 为 created / updated / deleted
+- {"type": "resync", "seq": N}：事件已丢失（重连间隔过长或消费过慢），客户端应重新拉取全量数据
+- {"type": "ping"}：心跳
+"""
+import json
+import asyncio
+from typing import Optional, Set
+from fastapi import APIRouter, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import inspect
+from core.config import settings
+from core.logging import get_logger
+from core.event_bus import event_bus, track_model, RESYNC
+from environment_service import models as env_models
+from task_service import models as task_models
+from system_service.system_router import collect_system_stats
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+TOPICS = ("task", "execution", "slots", "system", "env")
+
+
+def _loaded(obj, *fields) -> dict:
+    """读取已加载的字段（flush 期间不触发额外查询，未加载的字段为 None）"""
+    state = inspect(obj)
+    values = dict(state.dict)
+    if values.get("id") is None and state.identity:
+        values["id"] = state.identity[0]
+    data = {}
+    for field in fields:
+        value = values.get(field)
+        data[field] = value.isoformat() if hasattr(value, "isoformat") else value
+    return data
+
+
+track_model(
+    task_models.Task, "task",
+    fields=("name", "status", "trigger_type", "trigger_value", "consecutive_failures", "priority"),
+    serialize=lambda t: _loaded(t, "id", "name", "status", "trigger_type", "consecutive_failures", "priority"),
+)
+track_model(
+    task_models.TaskExecution, "execution",
+    fields=("status", "end_time"),
+    serialize=lambda e: _loaded(e, "id", "task_id", "status", "attempt", "start_time", "end_time", "duration",
+                                "parent_execution_id", "shard_index"),
+)
+track_model(
+    env_models.PythonVersion, "env",
+    fields=("status", "name", "is_default"),
+    serialize=lambda v: _loaded(v, "id", "name", "version", "status", "is_default"),
+)
+
+
+class SystemStatsPublisher:
+    """按需采集主机统计：只要还有订阅 system 主题的连接就周期推送，所有连接共享一次采集"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while event_bus.subscriber_count("system"):
+            try:
+                stats = await asyncio.to_thread(collect_system_stats)
+                event_bus.publish("system", stats, retain=False)
+            except Exception as e:
+                logger.warning(f"Failed to collect system stats: {e}")
+            await asyncio.sleep(settings.event_bus_stats_interval)
+
+
+system_stats_publisher = SystemStatsPublisher()
+
+
+def _parse_topics(topics: Optional[str]) -> Optional[Set[str]]:
+    if not topics:
+        return None
+    return {t.strip() for t in topics.split(",") if t.strip() in TOPICS} or None
+
+
+def _open(topics: Optional[Set[str]], since: Optional[int]):
+    """订阅并计算补发内容：返回 (订阅, 首批消息)"""
+    subscription = event_bus.subscribe(topics)
+    messages = [{"type": "hello", "seq": event_bus.seq}]
+    if since is not None:
+        replay = event_bus.events_since(since, topics)
+        messages.extend(replay if replay is not None else [{**RESYNC, "seq": event_bus.seq}])
+    if subscription.wants("system"):
+        system_stats_publisher.ensure_running()
+    return subscription, messages
+
+
+async def _events(subscription, messages):
+    """依次产出首批消息和后续事件，跳过补发中已包含的事件，空闲时产出心跳"""
+    last_seq = max((m.get("seq", 0) for m in messages if "topic" in m), default=0)
+    for message in messages:
+        yield message
+    while True:
+        event = await subscription.get(timeout=settings.event_bus_heartbeat)
+        if event is None:
+            yield {"type": "ping"}
+        elif event.get("type") == "resync":
+            yield {**event, "seq": event_bus.seq}
+        elif event["seq"] > last_seq:
+            yield event
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, topics: Optional[str] = None, since: Optional[int] = None):
+    """
+    实时事件 WebSocket
+
+    - **topics**: 逗号分隔的主题（task, execution, slots, system, env），为空表示全部
+    - **since**: 上次收到的事件序号，重连时补发其后的事件
+    """
+    await websocket.accept()
+    subscription, messages = _open(_parse_topics(topics), since)
+
+    async def pump():
+        async for message in _events(subscription, messages):
+            await websocket.send_text(json.dumps(message, default=str))
+
+    sender = asyncio.create_task(pump())
+    try:
+        # 客户端无需发送消息，读取只用于感知断开
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        event_bus.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def events_stream(
+    request: Request,
+    topics: Optional[str] = None,
+    since: Optional[int] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    实时事件 SSE 流（不支持 WebSocket 的代理环境下使用），重连时浏览器自动携带 Last-Event-ID
+    """
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    subscription, messages = _open(_parse_topics(topics), since)
+
+    async def stream():
+        try:
+            async for message in _events(subscription, messages):
+                if await request.is_disconnected():
+                    break
+                if "topic" in message:
+                    yield f"id: {message['seq']}\nevent: {message['topic']}\ndata: {json.dumps(message, default=str)}\n\n"
+                elif message["type"] == "ping":
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/status")
+def get_event_bus_status():
+    """推送通道状态：当前序号与各主题订阅数"""
+    return {
+        "seq": event_bus.seq,
+        "subscribers": event_bus.subscriber_count(),
+        "topics": {topic: event_bus.subscriber_count(topic) for topic in TOPICS},
+    }
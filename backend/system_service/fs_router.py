@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Optional
 import os
 import platform
+from core import fs_listing
 
 router = APIRouter(prefix="/system/fs", tags=["system-fs"])
 
@@ -25,10 +27,21 @@ def is_path_allowed(target_path: str) -> bool:
     return False
 
 @router.get("/list")
-def list_directory(path: str = None):
+def list_directory(
+    request: Request,
+    response: Response,
+    path: str = None,
+    cursor: Optional[str] = None,
+    limit: int = fs_listing.DEFAULT_PAGE_SIZE,
+    ignore: Optional[str] = ""
+):
     """
     List directories and files in the given path.
     Restricted to allowed directories only for security.
+
+    One level per request, paginated with `cursor`/`limit` (pass the returned
+    `next_cursor` to get the next page). `ignore` takes comma separated fnmatch
+    patterns. Responses carry an ETag; a matching If-None-Match returns 304.
     """
     try:
         # Default to projects directory if no path specified
@@ -65,29 +78,35 @@ def list_directory(path: str = None):
                 raise HTTPException(status_code=403, detail="Access denied: Cannot browse outside allowed directories")
             current = parent
 
-        items = []
-        # List directories first, then files
-        with os.scandir(abs_path) as it:
-            for entry in it:
-                try:
-                    item_type = "dir" if entry.is_dir() else "file"
-                    items.append({
-                        "name": entry.name,
-                        "type": item_type,
-                        "path": entry.path
-                    })
-                except PermissionError:
-                    continue
-
-        # Sort: directories first, then files, alphabetically
-        items.sort(key=lambda x: (x["type"] != "dir", x["name"].lower()))
+        try:
+            listing = fs_listing.list_directory(
+                abs_path, cursor=cursor, limit=limit, ignore=fs_listing.parse_ignore_patterns(ignore)
+            )
+        except fs_listing.ListingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if fs_listing.etag_matches(request.headers.get("if-none-match"), listing["etag"]):
+            return Response(status_code=304, headers={"ETag": listing["etag"]})
+        response.headers["ETag"] = listing["etag"]
+
+        # Directories first, then files, alphabetically (sorted by the engine)
+        items = [
+            {"name": e["name"], "type": e["type"], "path": os.path.join(abs_path, e["name"])}
+            for e in listing["entries"]
+        ]
 
         # Add parent directory option only if parent is also allowed
         parent = os.path.dirname(abs_path)
-        if parent and is_path_allowed(parent) and parent != abs_path:
-            return {"current": abs_path, "parent": parent, "items": items}
+        if not (parent and is_path_allowed(parent) and parent != abs_path):
+            parent = None
 
-        return {"current": abs_path, "parent": None, "items": items}
+        return {
+            "current": abs_path,
+            "parent": parent,
+            "items": items,
+            "next_cursor": listing["next_cursor"],
+            "total": listing["total"]
+        }
 
     except HTTPException:
         raise
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
 class SystemConfigBase(BaseModel):
@@ -18,6 +18,13 @@ class SystemConfig(SystemConfigBase):
     
     updated_at: datetime
 
+class ConcurrencyUpdate(BaseModel):
+    limit: Optional[int] = None
+    autotune: Optional[bool] = None
+
+class DispatchPolicyUpdate(BaseModel):
+    policy: Literal["fifo", "sjf", "binpack"]
+
 # --- Environment Variables ---
 
 class EnvVarBase(BaseModel):
@@ -1,17 +1,28 @@
 import platform
+import json
 import time
 import psutil
 import os
 import shutil
 import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import List
+from core.config import settings
 from core.database import get_db, SQLALCHEMY_DATABASE_URL, Base, engine
+from core.local_service import LocalServiceError
 from environment_service import models as env_models
 from project_service import models as project_models
 from task_service import models as task_models
 from task_service.task_manager import task_manager
+from task_service.browser_pool import browser_pool
+from task_service.warm_pool import warm_pool
+from task_service.rate_limiter import rate_limit_coordinator, RULES_CONFIG_KEY
+from task_service.caching_proxy import caching_proxy
+from task_service.url_dedupe import url_dedupe_service
+from task_service.concurrency_tuner import concurrency_autotuner
+from task_service.dispatcher import task_dispatcher
+from task_service.forecast import build_forecast
 from system_service import models as system_models
 from system_service import schemas as system_schemas
 from system_service.system_scheduler import SystemScheduler
@@ -110,6 +121,7 @@ async def create_or_update_config(config: system_schemas.SystemConfigCreate, db:
     
     **特殊处理**:
     - 如果配置键以 `backup.` 开头，会自动刷新备份调度器
+    - `rate_limit.rules` 会先校验再立即应用到全局限速协调器
     
     **返回**: 创建或更新后的配置对象
     
@@ -132,6 +144,13 @@ async def create_or_update_config(config: system_schemas.SystemConfigCreate, db:
     }
     ```
     """
+    if config.key == RULES_CONFIG_KEY:
+        # Validate before saving, a broken rule set would silently disable limits
+        try:
+            rate_limit_coordinator.set_rules(json.loads(config.value or "{}"))
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rate limit rules: {e}")
+
     db_config = db.query(system_models.SystemConfig).filter(system_models.SystemConfig.key == config.key).first()
     if db_config:
         db_config.value = config.value
@@ -583,6 +602,147 @@ async def clear_all_data():
         "removed_paths": removed_paths
     }
 
+@router.get("/rate-limits")
+def get_rate_limit_stats():
+    """
+    获取全局限速协调器状态
+
+    返回当前规则（系统配置 `rate_limit.rules`）以及每个限速键的许可数、拒绝数、
+    平均/最大等待时间、剩余令牌和各执行的申请次数。
+    """
+    return rate_limit_coordinator.stats()
+
+
+@router.get("/concurrency")
+def get_concurrency():
+    """
+    获取并发控制状态
+
+    返回当前并发上限、活跃/排队执行数、可调整范围、自动调节开关、
+    最近一次自动调节采样（CPU/内存/耗时倍数）和最近的上限变更记录。
+    """
+    return concurrency_autotuner.status()
+
+
+@router.get("/dispatch-queue")
+def get_dispatch_queue():
+    """
+    获取分发队列状态
+
+    返回队列容量、排队数、最久等待时间、按来源（schedule/event/retry/manual/webhook）的排队数，
+    以及累计入队、分发、拒绝（429）和丢弃的运行数。
+    """
+    return task_dispatcher.status()
+
+
+@router.put("/dispatch-queue")
+def update_dispatch_policy(update: system_schemas.DispatchPolicyUpdate, db: Session = Depends(get_db)):
+    """
+    切换分发策略（无需重启）
+
+    - **policy**: fifo（按到达顺序）/ sjf（预计耗时最短优先，带老化）/ binpack（按内存预算装箱，带老化）
+
+    预计耗时和内存峰值来自各任务执行历史的 EWMA，设置保存在系统配置 `dispatch.policy`。
+    """
+    task_dispatcher.configure(db, update.policy)
+    return task_dispatcher.status()
+
+
+@router.get("/forecast")
+def get_capacity_forecast(
+    hours: int = Query(24, ge=1, description="预测范围（小时）"),
+    quantile: float = Query(0.9, gt=0, le=1, description="耗时/CPU/内存取历史的分位数"),
+    db: Session = Depends(get_db),
+):
+    """
+    预测未来 N 小时的容量需求
+
+    展开所有 active 任务的定时触发（含错峰偏移），结合各任务历史执行的耗时、CPU、内存分位数，
+    返回按分钟的预计并发数 / CPU / 内存时间线，以及并发需求超过当前并发上限的时段（hotspots）和涉及的任务。
+    事件触发的任务无法预测，只在 `unpredictable_task_ids` 中列出。
+    """
+    if hours > settings.forecast_max_hours:
+        raise HTTPException(status_code=400, detail=f"hours must not exceed {settings.forecast_max_hours}")
+    return build_forecast(db, hours, quantile)
+
+
+@router.put("/concurrency")
+def update_concurrency(update: system_schemas.ConcurrencyUpdate, request: Request, db: Session = Depends(get_db)):
+    """
+    运行时调整并发上限和/或自动调节开关（无需重启）
+
+    - **limit**: 新上限，限制在 `KUMO_CONCURRENCY_MIN_LIMIT` ~ `KUMO_CONCURRENCY_MAX_LIMIT` 之间
+    - **autotune**: 是否启用自动调节
+
+    设置保存在系统配置 `concurrency.settings`，上限变更写入审计日志。
+    """
+    if update.limit is not None and not (
+        settings.concurrency_min_limit <= update.limit <= settings.concurrency_max_limit
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between {settings.concurrency_min_limit} and {settings.concurrency_max_limit}",
+        )
+    concurrency_autotuner.configure(db, update.limit, update.autotune, request.client.host if request.client else None)
+    return concurrency_autotuner.status()
+
+
+@router.get("/cache-proxy")
+def get_cache_proxy_stats():
+    """
+    获取缓存转发代理状态
+
+    返回命中/未命中/重新验证次数、缓存占用，以及运行中执行的请求数与流量。
+    代理通过系统配置 `cache_proxy.enabled` 开启，项目可在 `cache_policy` 中覆盖缓存规则。
+    """
+    return caching_proxy.stats()
+
+
+@router.post("/cache-proxy/clear")
+def clear_cache_proxy():
+    """清空缓存代理的磁盘缓存"""
+    caching_proxy.clear_cache()
+    return {"success": True}
+
+
+@router.get("/dedupe")
+def list_dedupe_namespaces():
+    """
+    获取 URL 去重命名空间
+
+    返回每个命名空间（默认 `task-<任务ID>`）的已记录数量、过滤器阶段数、容量与文件大小。
+    """
+    return {
+        "running": bool(url_dedupe_service.service and url_dedupe_service.service.running),
+        "namespaces": url_dedupe_service.list_namespaces(),
+    }
+
+
+@router.delete("/dedupe/{namespace}")
+def reset_dedupe_namespace(namespace: str):
+    """清空指定命名空间的去重状态（下次运行会重新抓取全部 URL）"""
+    try:
+        removed = url_dedupe_service.reset(namespace)
+    except LocalServiceError:
+        raise HTTPException(status_code=400, detail="Invalid namespace")
+    if not removed:
+        raise HTTPException(status_code=404, detail="Namespace not found")
+    return {"success": True}
+
+
+@router.get("/runtime-pools")
+def get_runtime_pools():
+    """
+    获取任务运行时资源池状态
+
+    返回共享浏览器池（浏览器实例、内存、租用）与预热解释器池（工作进程、运行次数）的状态。
+    """
+    return {
+        "browser_pool": browser_pool.status(),
+        "warm_pool": warm_pool.status(),
+    }
+
+
 @router.get("/stats")
 async def get_system_stats():
     """
@@ -649,6 +809,11 @@ async def get_system_stats():
     - Windows: 部分指标可能不可用（如 load_avg）
     - Linux/macOS: 完整支持所有指标
     """
+    return collect_system_stats()
+
+
+def collect_system_stats() -> dict:
+    """采集系统资源统计（同步阻塞约 0.2 秒，供 /stats 和事件推送共用）"""
     # CPU
     cpu_percent = psutil.cpu_percent(interval=0.1)
     cpu_freq = psutil.cpu_freq()
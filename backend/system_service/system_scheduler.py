@@ -103,6 +103,68 @@ class SystemScheduler:
             else:
                 logger.info("Execution cleanup is disabled.")
 
+            # Load Config - Lockfile Environment GC
+            env_gc_enabled = self._get_config(db, "env_gc.enabled", "false") == "true"
+
+            if env_gc_enabled:
+                logger.info("Scheduling lockfile environment GC daily.")
+                self.scheduler.add_job(
+                    self._env_gc_job,
+                    trigger=IntervalTrigger(days=1),
+                    id="env_gc",
+                    replace_existing=True,
+                    next_run_time=datetime.datetime.now() + datetime.timedelta(minutes=5)
+                )
+            else:
+                logger.info("Lockfile environment GC is disabled.")
+
+            # Load Config - Environment File Dedupe
+            env_dedupe_enabled = self._get_config(db, "env_dedupe.enabled", "false") == "true"
+
+            if env_dedupe_enabled:
+                logger.info("Scheduling environment file dedupe daily.")
+                self.scheduler.add_job(
+                    self._env_dedupe_job,
+                    trigger=IntervalTrigger(days=1),
+                    id="env_dedupe",
+                    replace_existing=True,
+                    next_run_time=datetime.datetime.now() + datetime.timedelta(minutes=10)
+                )
+            else:
+                logger.info("Environment file dedupe is disabled.")
+
+            # Load Config - Checkpoint Cleanup (enabled by default, failed runs keep their checkpoints)
+            checkpoint_cleanup_enabled = self._get_config(db, "checkpoint_cleanup.enabled", "true") == "true"
+
+            if checkpoint_cleanup_enabled:
+                logger.info("Scheduling checkpoint cleanup hourly.")
+                self.scheduler.add_job(
+                    self._checkpoint_cleanup_job,
+                    trigger=IntervalTrigger(hours=1),
+                    id="checkpoint_cleanup",
+                    replace_existing=True,
+                    next_run_time=datetime.datetime.now() + datetime.timedelta(minutes=3)
+                )
+            else:
+                logger.info("Checkpoint cleanup is disabled.")
+
+            # Load Config - Git Project Sync
+            git_sync_enabled = self._get_config(db, "git_sync.enabled", "false") == "true"
+
+            if git_sync_enabled:
+                interval_minutes = int(self._get_config(
+                    db, "git_sync.interval_minutes", str(settings.git_sync_interval_minutes)
+                ))
+                logger.info(f"Scheduling git project sync every {interval_minutes} minutes.")
+                self.scheduler.add_job(
+                    self._git_sync_job,
+                    trigger=IntervalTrigger(minutes=interval_minutes),
+                    id="git_sync",
+                    replace_existing=True
+                )
+            else:
+                logger.info("Git project sync is disabled.")
+
         except Exception as e:
             logger.error(f"Error refreshing system jobs: {e}")
         finally:
@@ -249,6 +311,70 @@ class SystemScheduler:
         finally:
             db_gen.close()
 
+    def _checkpoint_cleanup_job(self):
+        """Remove checkpoints of finished runs older than the retention period"""
+        logger.info("Executing checkpoint cleanup...")
+        from task_service.checkpoints import cleanup_expired_checkpoints
+
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            hours = int(self._get_config(
+                db, "checkpoint_cleanup.retention_hours", str(settings.checkpoint_retention_hours)
+            ))
+            removed = cleanup_expired_checkpoints(db, hours)
+            logger.info(f"Checkpoint cleanup completed. Deleted {removed} checkpoints.")
+        except Exception as e:
+            logger.error(f"Checkpoint cleanup failed: {e}")
+        finally:
+            db_gen.close()
+
+    def _env_gc_job(self):
+        """Collect unreferenced, idle lockfile environments"""
+        logger.info("Executing lockfile environment GC...")
+        from environment_service import env_resolver
+
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            idle_days = int(self._get_config(db, "env_gc.idle_days", str(settings.env_gc_idle_days)))
+            collected = env_resolver.collect_unused_environments(db, idle_days)
+            logger.info(f"Lockfile environment GC completed. Collected {len(collected)} environments.")
+        except Exception as e:
+            logger.error(f"Lockfile environment GC failed: {e}")
+        finally:
+            db_gen.close()
+
+    def _env_dedupe_job(self):
+        """Hardlink identical files across managed environments"""
+        logger.info("Executing environment file dedupe...")
+        from environment_service.python_version_router import get_busy_env_dirs, run_env_dedupe
+
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            skip_dirs = get_busy_env_dirs(db)
+        finally:
+            db_gen.close()
+        try:
+            run_env_dedupe(skip_dirs)
+        except Exception as e:
+            logger.error(f"Environment file dedupe failed: {e}")
+
+    def _git_sync_job(self):
+        """Fetch and check out git-backed projects"""
+        logger.info("Executing git project sync...")
+        from project_service import git_source
+
+        try:
+            results = git_source.sync_all_projects()
+            logger.info(
+                f"Git project sync completed. Synced {results['synced']}, "
+                f"changed {results['changed']}, failed {results['failed']}."
+            )
+        except Exception as e:
+            logger.error(f"Git project sync failed: {e}")
+
 
 # 模块级单例获取函数
 _system_scheduler = SystemScheduler()
@@ -0,0 +1,330 @@
+"""
+共享无头浏览器池 - 为 Selenium / Playwright / DrissionPage 任务复用常驻 Chromium
+
+后端维护 N 个常驻 Chromium 实例（--remote-debugging-port），任务执行时租用其中一个，
+每次租用在浏览器内创建独立的 BrowserContext（Cookie / 存储互相隔离），并通过环境变量注入连接地址：
+
+    KUMO_BROWSER_CDP_URL           http://127.0.0.1:<port>  (Playwright connect_over_cdp)
+    KUMO_BROWSER_WS_URL            ws://127.0.0.1:<port>/devtools/browser/<id>
+    KUMO_BROWSER_DEBUGGER_ADDRESS  127.0.0.1:<port>  (Selenium debuggerAddress / DrissionPage set_address)
+    KUMO_BROWSER_CONTEXT_ID        本次租用的隔离上下文 ID
+    KUMO_BROWSER_LEASE_ID          租用 ID
+
+归还时销毁上下文；浏览器累计使用 N 次或内存超过上限后，在没有租用时回收重启。
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Optional
+import psutil
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+CHROME_CANDIDATES = ["chromium", "chromium-browser", "google-chrome", "google-chrome-stable", "chrome"]
+
+CHROME_FLAGS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-background-networking",
+    "--disable-extensions",
+    "--remote-debugging-address=127.0.0.1",
+    "--remote-debugging-port=0",
+]
+
+
+class BrowserPoolError(Exception):
+    """浏览器池不可用或租用超时"""
+    pass
+
+
+def find_chrome_binary() -> Optional[str]:
+    """查找 Chromium 可执行文件（配置 > CHROME_BIN > PATH）"""
+    configured = settings.browser_pool_chrome_bin or os.environ.get("CHROME_BIN")
+    if configured:
+        return configured if os.path.exists(configured) else shutil.which(configured)
+    for name in CHROME_CANDIDATES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+class BrowserInstance:
+    """单个常驻 Chromium 进程"""
+
+    def __init__(self, chrome_bin: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.chrome_bin = chrome_bin
+        self.user_data_dir = tempfile.mkdtemp(prefix="kumo-browser-")
+        self.port: Optional[int] = None
+        self.ws_url: Optional[str] = None
+        self.uses = 0
+        self.leases: Dict[str, "BrowserLease"] = {}
+        self.retiring = False
+        self.retire_reason: Optional[str] = None
+        self.started_at = time.time()
+        self.process = self._start()
+
+    def _start(self) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [self.chrome_bin, *CHROME_FLAGS, f"--user-data-dir={self.user_data_dir}", "about:blank"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        # Chromium writes the chosen port and browser endpoint path once DevTools is listening
+        active_port_file = os.path.join(self.user_data_dir, "DevToolsActivePort")
+        deadline = time.time() + settings.browser_pool_start_timeout
+        while time.time() < deadline and process.poll() is None:
+            try:
+                with open(active_port_file, encoding="utf-8") as f:
+                    lines = f.read().split("\n")
+                if len(lines) >= 2 and lines[1]:
+                    self.port = int(lines[0])
+                    self.ws_url = f"ws://127.0.0.1:{self.port}{lines[1]}"
+                    break
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.05)
+
+        if self.ws_url is None:
+            self.process = process
+            self.stop()
+            raise BrowserPoolError(f"Chromium ({self.chrome_bin}) failed to start")
+        logger.info(f"Started pooled browser {self.id} (pid {process.pid}, port {self.port})")
+        return process
+
+    def cdp(self, method: str, params: Optional[dict] = None) -> dict:
+        """通过浏览器级 DevTools 连接发送一条 CDP 命令"""
+        from websockets.sync.client import connect
+
+        with connect(self.ws_url, max_size=None, open_timeout=10) as ws:
+            ws.send(json.dumps({"id": 1, "method": method, "params": params or {}}))
+            while True:
+                message = json.loads(ws.recv(timeout=10))
+                if message.get("id") == 1:
+                    if "error" in message:
+                        raise BrowserPoolError(f"CDP {method} failed: {message['error'].get('message')}")
+                    return message.get("result", {})
+
+    def create_context(self) -> str:
+        return self.cdp("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+
+    def dispose_context(self, context_id: str):
+        self.cdp("Target.disposeBrowserContext", {"browserContextId": context_id})
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def memory_mb(self) -> float:
+        """浏览器进程树（含渲染进程）的 RSS 总和"""
+        try:
+            root = psutil.Process(self.process.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return 0.0
+        total = 0
+        for p in processes:
+            try:
+                total += p.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total / (1024 * 1024)
+
+    def stop(self):
+        if self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=5)
+            except (ProcessLookupError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "pid": self.process.pid,
+            "port": self.port,
+            "alive": self.alive(),
+            "uses": self.uses,
+            "active_leases": len(self.leases),
+            "memory_mb": round(self.memory_mb(), 1),
+            "retiring": self.retiring,
+            "retire_reason": self.retire_reason,
+            "started_at": self.started_at,
+        }
+
+
+class BrowserLease:
+    """一次浏览器租用"""
+
+    def __init__(self, instance: BrowserInstance, context_id: Optional[str], execution_id: Optional[int]):
+        self.id = uuid.uuid4().hex[:12]
+        self.instance = instance
+        self.context_id = context_id
+        self.execution_id = execution_id
+        self.acquired_at = time.time()
+
+    @property
+    def env(self) -> Dict[str, str]:
+        env = {
+            "KUMO_BROWSER_CDP_URL": f"http://127.0.0.1:{self.instance.port}",
+            "KUMO_BROWSER_WS_URL": self.instance.ws_url,
+            "KUMO_BROWSER_DEBUGGER_ADDRESS": f"127.0.0.1:{self.instance.port}",
+            "KUMO_BROWSER_LEASE_ID": self.id,
+        }
+        if self.context_id:
+            env["KUMO_BROWSER_CONTEXT_ID"] = self.context_id
+        return env
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "browser_id": self.instance.id,
+            "context_id": self.context_id,
+            "execution_id": self.execution_id,
+            "acquired_at": self.acquired_at,
+        }
+
+
+class BrowserPool:
+    """浏览器池 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(BrowserPool, cls).__new__(cls)
+                    cls._instance._browsers = []
+                    cls._instance._starting = 0
+                    cls._instance._cond = threading.Condition()
+        return cls._instance
+
+    def _reap(self):
+        """移除已退出或已回收完毕的浏览器（需持有 _cond）"""
+        for browser in list(self._browsers):
+            if not browser.alive() or (browser.retiring and not browser.leases):
+                if not browser.alive() and browser.leases:
+                    logger.warning(f"Pooled browser {browser.id} exited with {len(browser.leases)} active leases")
+                self._browsers.remove(browser)
+                browser.stop()
+
+    def _pick(self) -> Optional[BrowserInstance]:
+        candidates = [
+            b for b in self._browsers
+            if not b.retiring and b.alive() and len(b.leases) < settings.browser_pool_contexts_per_browser
+        ]
+        return min(candidates, key=lambda b: len(b.leases)) if candidates else None
+
+    def acquire(self, execution_id: Optional[int] = None, timeout: Optional[float] = None) -> BrowserLease:
+        """
+        租用一个浏览器上下文，池满时等待直到超时
+
+        Raises:
+            BrowserPoolError: 找不到 Chromium、启动失败或等待超时
+        """
+        timeout = settings.browser_pool_acquire_timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                self._reap()
+                browser = self._pick()
+                if browser:
+                    break
+                if len(self._browsers) + self._starting < settings.browser_pool_size:
+                    chrome_bin = find_chrome_binary()
+                    if not chrome_bin:
+                        raise BrowserPoolError("Chromium not found, set KUMO_BROWSER_POOL_CHROME_BIN or CHROME_BIN")
+                    # Launch outside the lock, Chromium startup takes a while
+                    self._starting += 1
+                    self._cond.release()
+                    try:
+                        browser = BrowserInstance(chrome_bin)
+                    except Exception:
+                        self._cond.acquire()
+                        self._starting -= 1
+                        # The reserved start slot is free again, let a waiter try
+                        self._cond.notify_all()
+                        raise
+                    self._cond.acquire()
+                    self._starting -= 1
+                    self._browsers.append(browser)
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise BrowserPoolError(f"No pooled browser available within {timeout}s")
+                self._cond.wait(remaining)
+
+            lease = BrowserLease(browser, None, execution_id)
+            browser.leases[lease.id] = lease
+
+        try:
+            lease.context_id = browser.create_context()
+        except Exception as e:
+            # The shared default context still works, isolation is best effort
+            logger.warning(f"Could not create isolated context on browser {browser.id}: {e}")
+        logger.debug(f"Leased browser {browser.id} to execution {execution_id} (lease {lease.id})")
+        return lease
+
+    def release(self, lease: BrowserLease):
+        """归还租用：销毁隔离上下文，并按使用次数 / 内存判断是否回收浏览器"""
+        browser = lease.instance
+        if lease.context_id and browser.alive():
+            try:
+                browser.dispose_context(lease.context_id)
+            except Exception as e:
+                logger.warning(f"Could not dispose context {lease.context_id} on browser {browser.id}: {e}")
+                browser.retiring, browser.retire_reason = True, "context cleanup failed"
+
+        with self._cond:
+            browser.leases.pop(lease.id, None)
+            browser.uses += 1
+            if not browser.retiring:
+                if browser.uses >= settings.browser_pool_max_uses:
+                    browser.retiring, browser.retire_reason = True, f"reached {browser.uses} uses"
+                elif settings.browser_pool_max_memory_mb and browser.memory_mb() > settings.browser_pool_max_memory_mb:
+                    browser.retiring, browser.retire_reason = True, "memory limit exceeded"
+                if browser.retiring:
+                    logger.info(f"Recycling pooled browser {browser.id}: {browser.retire_reason}")
+            self._reap()
+            self._cond.notify_all()
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "chrome_bin": find_chrome_binary(),
+                "size": settings.browser_pool_size,
+                "contexts_per_browser": settings.browser_pool_contexts_per_browser,
+                "browsers": [b.to_dict() for b in self._browsers],
+                "leases": [lease.to_dict() for b in self._browsers for lease in b.leases.values()],
+            }
+
+    def shutdown_all(self):
+        """停止所有浏览器（后端关闭时调用）"""
+        with self._cond:
+            for browser in self._browsers:
+                browser.stop()
+            self._browsers = []
+            self._cond.notify_all()
+
+
+# 全局单例
+browser_pool = BrowserPool()
@@ -0,0 +1,701 @@
+"""
+本地缓存转发代理 - 为爬虫任务提供连接复用、HTTP 缓存与按执行的流量统计
+
+启用系统配置 `cache_proxy.enabled` 后，任务执行时注入的 http_proxy / https_proxy
+指向本代理（`http://exec-<执行ID>:<令牌>@127.0.0.1:<port>`），代理凭据用于识别执行并统计流量。
+端口和签发令牌的密钥保存在 KUMO_SERVICE_STATE_DIR，令牌由执行 ID 派生：重启后重新接管的执行重新登记即可继续使用。
+若同时配置了 `proxy.url`，代理会把出站请求串联到该上游代理。
+
+- http:// 请求：经由共享的 requests.Session 转发（到上游的连接保持复用），
+  GET 响应按 Cache-Control / Expires / Last-Modified 计算新鲜期并写入磁盘缓存，
+  过期后使用 ETag / Last-Modified 条件请求重新验证；
+- https:// 请求：CONNECT 隧道透传（不解密，因此不缓存），仅统计字节数；
+- 项目可通过 cache_policy 覆盖缓存行为（强制 TTL、忽略 no-store、按 URL 规则跳过缓存）。
+  TTL 在查找时按请求方的策略生效，缓存条目只记录响应头给出的新鲜期；仅因忽略 no-store 才可缓存的响应
+  存入该项目自己的命名空间。带 Set-Cookie 或 Cache-Control: private 的响应在任何策略下都不缓存。
+"""
+import os
+import json
+import time
+import base64
+import fnmatch
+import hmac
+import hashlib
+import secrets
+import select
+import socket
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+import requests
+from requests.adapters import HTTPAdapter
+from core.config import settings
+from core.local_service import bind_server, load_service_state, save_service_state
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+CACHEABLE_STATUS = {200, 203, 204, 300, 301, 404, 405, 410, 414, 501}
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 24 * 3600
+CHUNK_SIZE = 64 * 1024
+PROXY_SERVICE_NAME = "caching-proxy"  # 端点文件名
+
+
+# ========== 缓存头解析 ==========
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """解析 Cache-Control，指令名小写，无值的指令为 None"""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def _int_directive(directives: dict, name: str) -> Optional[int]:
+    try:
+        return int(directives[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_cacheable(status: int, headers: Dict[str, str], policy: Optional[dict] = None) -> bool:
+    """
+    响应是否可以存入缓存（headers 为小写键字典）
+
+    项目策略 ignore_no_store 只放宽 no-store；Set-Cookie 和 private 响应属于某个会话，始终不缓存。
+    """
+    policy = policy or {}
+    if status not in CACHEABLE_STATUS:
+        return False
+    if headers.get("vary", "").strip() == "*":
+        return False
+    if "set-cookie" in headers:
+        return False
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "private" in directives:
+        return False
+    if "no-store" in directives:
+        return bool(policy.get("ignore_no_store"))
+    return True
+
+
+def cache_namespace(status: int, headers: Dict[str, str], project_id: Optional[int]) -> Optional[str]:
+    """可缓存响应的命名空间：默认规则即可缓存的共享（None），仅因项目策略可缓存的归该项目"""
+    return None if is_cacheable(status, headers) else f"project-{project_id}"
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> float:
+    """
+    计算响应头给出的新鲜期（秒），项目强制 TTL 在查找时另行生效（CacheEntry.is_fresh）
+
+    顺序：s-maxage > max-age > Expires - Date > Last-Modified 启发式（10%，上限 1 天）
+    """
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        value = _int_directive(directives, name)
+        if value is not None:
+            return float(max(value, 0))
+    date = _http_date(headers.get("date")) or time.time()
+    if "expires" in headers:
+        expires = _http_date(headers.get("expires"))
+        return max(expires - date, 0.0) if expires else 0.0
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified and last_modified < date:
+        return min((date - last_modified) * HEURISTIC_FRACTION, HEURISTIC_MAX)
+    return 0.0
+
+
+def policy_ttl(policy: Optional[dict], url: str) -> Optional[int]:
+    """项目缓存策略中匹配 URL 的 TTL 覆盖"""
+    if not policy:
+        return None
+    for rule in policy.get("rules") or []:
+        if fnmatch.fnmatch(url, rule.get("pattern", "")):
+            return rule.get("ttl")
+    return policy.get("default_ttl")
+
+
+def policy_bypass(policy: Optional[dict], url: str) -> bool:
+    if not policy:
+        return False
+    if policy.get("enabled") is False:
+        return True
+    return any(fnmatch.fnmatch(url, pattern) for pattern in policy.get("bypass") or [])
+
+
+# ========== 磁盘缓存 ==========
+
+class CacheEntry:
+    def __init__(self, meta: dict, body_path: str):
+        self.meta = meta
+        self.body_path = body_path
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {k.lower(): v for k, v in self.meta["headers"]}
+
+    def age(self, now: float) -> float:
+        return max(now - self.meta["stored_at"], 0) + self.meta.get("initial_age", 0)
+
+    def is_fresh(self, now: float, ttl_override: Optional[int] = None) -> bool:
+        """ttl_override 为请求方项目策略的 TTL，优先于响应头给出的新鲜期"""
+        lifetime = float(ttl_override) if ttl_override is not None else self.meta["lifetime"]
+        return self.age(now) < lifetime
+
+
+class ResponseCache:
+    """按 URL 存储的磁盘缓存，LRU 淘汰，Vary 头作为二级匹配条件"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> size
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            try:
+                with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                    meta = json.load(f)
+                entries.append((meta.get("last_used", 0), key, meta.get("size", 0)))
+            except (OSError, ValueError):
+                self._remove_files(key)
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    @staticmethod
+    def key_for(url: str, namespace: Optional[str] = None) -> str:
+        scoped = f"{namespace}\n{url}" if namespace else url
+        return hashlib.sha256(scoped.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.root, f"{key}.json"), os.path.join(self.root, f"{key}.body")
+
+    def _remove_files(self, key: str):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def lookup(self, url: str, request_headers: Dict[str, str], namespace: Optional[str] = None) -> Optional[CacheEntry]:
+        key = self.key_for(url, namespace)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for name, value in meta.get("vary", {}).items():
+            if request_headers.get(name, "") != value:
+                return None
+        entry = CacheEntry(meta, body_path)
+        if "set-cookie" in entry.headers:
+            # Never replay a session cookie, whatever stored the entry
+            return None
+        return entry
+
+    def open_writer(self) -> Tuple[str, "object"]:
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        return tmp_path, os.fdopen(fd, "wb")
+
+    def store(self, url: str, meta: dict, tmp_body_path: Optional[str]):
+        """写入缓存条目（命名空间取 meta["namespace"]）；tmp_body_path 为 None 时只更新元数据（重新验证）"""
+        key = self.key_for(url, meta.get("namespace"))
+        meta_path, body_path = self._paths(key)
+        meta["url"] = url
+        meta["last_used"] = time.time()
+        if tmp_body_path is not None:
+            meta["size"] = os.path.getsize(tmp_body_path)
+            os.replace(tmp_body_path, body_path)
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+        with self._lock:
+            self._size += meta["size"] - self._index.get(key, 0)
+            self._index[key] = meta["size"]
+            self._index.move_to_end(key)
+            evicted = self._evict()
+        return evicted
+
+    def discard(self, url: str, namespace: Optional[str] = None):
+        key = self.key_for(url, namespace)
+        with self._lock:
+            self._size -= self._index.pop(key, 0)
+            self._remove_files(key)
+
+    def _evict(self) -> int:
+        evicted = 0
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self._remove_files(key)
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove_files(key)
+            self._index.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+# ========== 代理服务 ==========
+
+class ExecutionContext:
+    """一次执行在代理中的身份、策略与流量计数"""
+
+    def __init__(self, execution_id: int, project_id: Optional[int], policy: Optional[dict], upstream: Optional[str],
+                 token: str):
+        self.execution_id = execution_id
+        self.project_id = project_id
+        self.policy = policy or {}
+        self.upstream = upstream
+        self.token = token
+        self.counters = {
+            "requests": 0, "cache_hits": 0, "revalidated": 0, "tunnels": 0,
+            "bytes_from_network": 0, "bytes_from_cache": 0, "bytes_sent": 0,
+        }
+        self._lock = threading.Lock()
+
+    def add(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self.counters[name] += value
+
+
+class CachingProxy:
+    """缓存转发代理 - 线程安全的单例，按需启动"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(CachingProxy, cls).__new__(cls)
+                    cls._instance._server = None
+                    cls._instance._secret = None
+                    cls._instance._contexts = {}
+                    cls._instance._sessions = {}
+                    cls._instance._cache = None
+                    cls._instance._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0,
+                                            "evicted": 0, "bypassed": 0, "tunnels": 0}
+                    cls._instance._state_lock = threading.Lock()
+        return cls._instance
+
+    # ---------- 生命周期 ----------
+
+    @property
+    def url(self) -> Optional[str]:
+        if not self._server:
+            return None
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    def ensure_started(self):
+        with self._state_lock:
+            if self._server:
+                return
+            if self._cache is None:
+                self._cache = ResponseCache(settings.cache_proxy_dir, settings.cache_proxy_max_bytes)
+            state = load_service_state(PROXY_SERVICE_NAME)
+            self._secret = self._secret or state.get("secret") or secrets.token_hex(16)
+            port = settings.cache_proxy_port or int(state.get("port") or 0)
+            self._server = bind_server("Caching proxy", "127.0.0.1", port, self._make_handler())
+            self._server.daemon_threads = True
+            save_service_state(PROXY_SERVICE_NAME, {"port": self._server.server_address[1], "secret": self._secret})
+            threading.Thread(target=self._server.serve_forever, name="caching-proxy", daemon=True).start()
+            logger.info(f"Caching proxy listening on {self.url}")
+
+    def stop(self):
+        with self._state_lock:
+            if self._server:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    # ---------- 执行注册 ----------
+
+    def register_execution(self, execution_id: int, project_id: Optional[int] = None,
+                           policy: Optional[dict] = None, upstream: Optional[str] = None) -> str:
+        """登记执行并返回注入任务的代理 URL（带执行凭据）；同一执行重复登记得到相同的凭据"""
+        self.ensure_started()
+        token = hmac.new(self._secret.encode(), str(execution_id).encode(), hashlib.sha256).hexdigest()[:24]
+        context = ExecutionContext(execution_id, project_id, policy, upstream, token)
+        with self._state_lock:
+            self._contexts[execution_id] = context
+        return f"http://exec-{execution_id}:{context.token}@{self.url}"
+
+    def execution_counters(self, execution_id: int) -> Optional[dict]:
+        context = self._contexts.get(execution_id)
+        return dict(context.counters) if context else None
+
+    def unregister_execution(self, execution_id: int) -> Optional[dict]:
+        with self._state_lock:
+            context = self._contexts.pop(execution_id, None)
+        return dict(context.counters) if context else None
+
+    def _authenticate(self, header: Optional[str]) -> Optional[ExecutionContext]:
+        if not header or not header.lower().startswith("basic "):
+            return None
+        try:
+            user, _, password = base64.b64decode(header[6:].strip()).decode("utf-8").partition(":")
+            execution_id = int(unquote(user).replace("exec-", "", 1))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        context = self._contexts.get(execution_id)
+        if context and secrets.compare_digest(unquote(password), context.token):
+            return context
+        return None
+
+    def _session(self, upstream: Optional[str]) -> requests.Session:
+        """每个上游代理一个连接池会话"""
+        with self._state_lock:
+            session = self._sessions.get(upstream)
+            if session is None:
+                session = requests.Session()
+                session.trust_env = False
+                session.headers.clear()
+                adapter = HTTPAdapter(pool_connections=32, pool_maxsize=settings.cache_proxy_pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                if upstream:
+                    session.proxies = {"http": upstream, "https": upstream}
+                self._sessions[upstream] = session
+            return session
+
+    def _bump(self, **values):
+        with self._state_lock:
+            for name, value in values.items():
+                self._stats[name] += value
+
+    # ---------- HTTP 转发 ----------
+
+    def handle_http(self, handler: BaseHTTPRequestHandler, context: ExecutionContext):
+        method = handler.command
+        url = handler.path
+        if not url.startswith("http://"):
+            handler.send_error(400, "Only absolute http:// URLs are proxied, use CONNECT for https")
+            return
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else None
+        request_headers = [(k, v) for k, v in handler.headers.items() if k.lower() not in HOP_BY_HOP]
+        lower_headers = {k.lower(): v for k, v in request_headers}
+        context.add(requests=1)
+
+        cache_allowed = (
+            method == "GET"
+            and not policy_bypass(context.policy, url)
+            and not any(h in lower_headers for h in ("authorization", "range", "if-none-match", "if-modified-since"))
+        )
+        if not cache_allowed:
+            if method == "GET":
+                self._bump(bypassed=1)
+            self._forward(handler, context, method, url, request_headers, body, store=False)
+            return
+
+        now = time.time()
+        entry = None
+        if context.policy.get("ignore_no_store"):
+            entry = self._cache.lookup(url, lower_headers, f"project-{context.project_id}")
+        entry = entry or self._cache.lookup(url, lower_headers)
+        request_cc = parse_cache_control(lower_headers.get("cache-control"))
+        revalidate = "no-cache" in request_cc or lower_headers.get("pragma", "").lower() == "no-cache"
+        max_age = _int_directive(request_cc, "max-age")
+        ttl = policy_ttl(context.policy, url)
+
+        if entry and not revalidate and entry.is_fresh(now, ttl) and (max_age is None or entry.age(now) <= max_age):
+            self._bump(hits=1)
+            self._serve_cached(handler, context, entry, "HIT")
+            return
+
+        conditional = list(request_headers)
+        if entry:
+            cached = entry.headers
+            if "etag" in cached:
+                conditional.append(("If-None-Match", cached["etag"]))
+            if "last-modified" in cached:
+                conditional.append(("If-Modified-Since", cached["last-modified"]))
+        self._forward(handler, context, method, url, conditional, body, store=True, entry=entry)
+
+    def _serve_cached(self, handler, context: ExecutionContext, entry: CacheEntry, status_label: str):
+        meta = entry.meta
+        handler.send_response(meta["status"], meta.get("reason"))
+        for name, value in meta["headers"]:
+            if name.lower() not in ("age", "content-length"):
+                handler.send_header(name, value)
+        handler.send_header("Age", str(int(entry.age(time.time()))))
+        handler.send_header("Content-Length", str(meta["size"]))
+        handler.send_header("X-Kumo-Cache", status_label)
+        handler.end_headers()
+        sent = 0
+        if handler.command != "HEAD":
+            with open(entry.body_path, "rb") as f:
+                shutil.copyfileobj(f, handler.wfile, CHUNK_SIZE)
+            sent = meta["size"]
+        context.add(cache_hits=1, bytes_from_cache=sent, bytes_sent=sent)
+
+    def _forward(self, handler, context: ExecutionContext, method: str, url: str, headers: List[Tuple[str, str]],
+                 body: Optional[bytes], store: bool, entry: Optional[CacheEntry] = None):
+        request_time = time.time()
+        try:
+            response = self._session(context.upstream).request(
+                method, url, headers=dict(headers), data=body, stream=True, allow_redirects=False,
+                timeout=settings.cache_proxy_timeout,
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Proxy request for execution {context.execution_id} failed: {e}")
+            handler.send_error(502, f"Upstream request failed: {e.__class__.__name__}")
+            return
+
+        response_time = time.time()
+        raw_headers = list(response.raw.headers.items())
+        lower = {}
+        for name, value in raw_headers:
+            lower[name.lower()] = value
+
+        try:
+            if entry and response.status_code == 304:
+                # Revalidated: refresh the stored headers and freshness, serve the cached body
+                merged = {k.lower(): (k, v) for k, v in entry.meta["headers"]}
+                for name, value in raw_headers:
+                    if name.lower() not in HOP_BY_HOP and name.lower() != "content-length":
+                        merged[name.lower()] = (name, value)
+                entry.meta["headers"] = list(merged.values())
+                entry.meta["stored_at"] = response_time
+                entry.meta["initial_age"] = _int_directive({"age": lower.get("age")}, "age") or 0
+                entry.meta["lifetime"] = freshness_lifetime(entry.headers)
+                if is_cacheable(entry.meta["status"], entry.headers, context.policy):
+                    self._cache.store(url, entry.meta, None)
+                else:
+                    # The refreshed headers made the entry private to this response
+                    self._cache.discard(url, entry.meta.get("namespace"))
+                self._bump(revalidated=1)
+                context.add(revalidated=1)
+                self._serve_cached(handler, context, entry, "REVALIDATED")
+                return
+
+            handler.send_response(response.status_code, response.reason)
+            for name, value in raw_headers:
+                if name.lower() not in HOP_BY_HOP:
+                    handler.send_header(name, value)
+            handler.send_header("X-Kumo-Cache", "MISS" if store else "BYPASS")
+            handler.end_headers()
+
+            cacheable = store and is_cacheable(response.status_code, lower, context.policy)
+            declared = int(lower.get("content-length") or 0)
+            if cacheable and declared > settings.cache_proxy_max_object_bytes:
+                cacheable = False
+            tmp_path, writer = self._cache.open_writer() if cacheable else (None, None)
+
+            received = 0
+            try:
+                if method != "HEAD":
+                    while True:
+                        chunk = response.raw.read(CHUNK_SIZE, decode_content=False)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        handler.wfile.write(chunk)
+                        if writer:
+                            if received > settings.cache_proxy_max_object_bytes:
+                                writer.close()
+                                os.remove(tmp_path)
+                                writer = None
+                            else:
+                                writer.write(chunk)
+            finally:
+                context.add(bytes_from_network=received, bytes_sent=received)
+                if writer:
+                    writer.close()
+
+            if writer:
+                vary = {}
+                for name in lower.get("vary", "").split(","):
+                    name = name.strip().lower()
+                    if name:
+                        vary[name] = {k.lower(): v for k, v in headers}.get(name, "")
+                meta = {
+                    "status": response.status_code,
+                    "reason": response.reason,
+                    "headers": [[k, v] for k, v in raw_headers if k.lower() not in HOP_BY_HOP],
+                    "vary": vary,
+                    "request_time": request_time,
+                    "stored_at": response_time,
+                    "initial_age": _int_directive({"age": lower.get("age")}, "age") or 0,
+                    "lifetime": freshness_lifetime(lower),
+                    "namespace": cache_namespace(response.status_code, lower, context.project_id),
+                }
+                evicted = self._cache.store(url, meta, tmp_path)
+                self._bump(misses=1, stored=1, evicted=evicted)
+            elif store:
+                self._bump(misses=1)
+        finally:
+            response.close()
+
+    # ---------- CONNECT 隧道 ----------
+
+    def _open_tunnel(self, target: str, upstream: Optional[str]) -> socket.socket:
+        host, _, port = target.rpartition(":")
+        if not upstream:
+            return socket.create_connection((host, int(port or 443)), timeout=settings.cache_proxy_timeout)
+
+        parts = urlsplit(upstream)
+        if parts.scheme != "http":
+            raise OSError(f"Tunnelling through {parts.scheme} upstream proxies is not supported")
+        sock = socket.create_connection((parts.hostname, parts.port or 80), timeout=settings.cache_proxy_timeout)
+        request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+        if parts.username:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            request += f"Proxy-Authorization: Basic {base64.b64encode(credentials.encode()).decode()}\r\n"
+        sock.sendall((request + "\r\n").encode("latin-1"))
+        reply = b""
+        while b"\r\n\r\n" not in reply:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+        status_line = reply.split(b"\r\n", 1)[0]
+        if status_line.split()[1:2] != [b"200"]:
+            sock.close()
+            raise OSError(f"Upstream proxy refused CONNECT: {status_line.decode('latin-1')}")
+        return sock
+
+    def handle_connect(self, handler: BaseHTTPRequestHandler, context: ExecutionContext):
+        context.add(requests=1, tunnels=1)
+        self._bump(tunnels=1)
+        try:
+            upstream_sock = self._open_tunnel(handler.path, context.upstream)
+        except (OSError, ValueError) as e:
+            handler.send_error(502, f"Tunnel failed: {e}")
+            return
+        handler.send_response(200, "Connection Established")
+        handler.end_headers()
+        handler.wfile.flush()
+
+        client = handler.connection
+        upstream_sock.settimeout(None)
+        sent = received = 0
+        try:
+            sockets = [client, upstream_sock]
+            while True:
+                readable, _, errored = select.select(sockets, [], sockets, settings.cache_proxy_timeout)
+                if errored or not readable:
+                    break
+                closed = False
+                for sock in readable:
+                    data = sock.recv(CHUNK_SIZE)
+                    if not data:
+                        closed = True
+                        break
+                    if sock is client:
+                        upstream_sock.sendall(data)
+                        sent += len(data)
+                    else:
+                        client.sendall(data)
+                        received += len(data)
+                if closed:
+                    break
+        except OSError:
+            pass
+        finally:
+            upstream_sock.close()
+            handler.close_connection = True
+            context.add(bytes_from_network=received, bytes_sent=received)
+
+    def _make_handler(self):
+        proxy = self
+
+        class ProxyHandler(BaseHTTPRequestHandler):
+            def _context(self) -> Optional[ExecutionContext]:
+                context = proxy._authenticate(self.headers.get("Proxy-Authorization"))
+                if context is None:
+                    self.send_response(407)
+                    self.send_header("Proxy-Authenticate", 'Basic realm="kumo"')
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                return context
+
+            def _handle(self):
+                context = self._context()
+                if context:
+                    proxy.handle_http(self, context)
+
+            do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _handle
+
+            def do_CONNECT(self):
+                context = self._context()
+                if context:
+                    proxy.handle_connect(self, context)
+
+            def log_message(self, format, *args):
+                pass
+
+        return ProxyHandler
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> dict:
+        with self._state_lock:
+            return {
+                "running": self._server is not None,
+                "address": self.url,
+                **self._stats,
+                "cache": self._cache.stats() if self._cache else None,
+                "executions": {str(eid): dict(c.counters) for eid, c in self._contexts.items()},
+            }
+
+    def clear_cache(self):
+        if self._cache is None:
+            self._cache = ResponseCache(settings.cache_proxy_dir, settings.cache_proxy_max_bytes)
+        self._cache.clear()
+
+
+# 全局单例
+caching_proxy = CachingProxy()
@@ -0,0 +1,92 @@
+"""
+断点目录管理 - 同一次逻辑运行（首次执行及其重试）共享一个持久化目录
+
+目录为 `<checkpoint_dir>/task_<任务ID>/run_<首次执行ID>`，通过 KUMO_CHECKPOINT_DIR 注入任务；
+重试时注入 KUMO_ATTEMPT 与 KUMO_RESUME=1，任务据此从断点继续而不是从头开始。
+运行成功后立即删除，最终失败的运行保留 checkpoint_retention_hours 后由系统调度器清理。
+"""
+import os
+import re
+import time
+import shutil
+from typing import Optional
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.logging import get_logger
+from task_service import models
+
+logger = get_logger(__name__)
+
+RUN_DIR_RE = re.compile(r"^run_(\d+)$")
+TASK_DIR_RE = re.compile(r"^task_(\d+)$")
+
+
+def checkpoint_path(task_id: int, root_execution_id: int) -> str:
+    return os.path.join(settings.checkpoint_dir, f"task_{task_id}", f"run_{root_execution_id}")
+
+
+def prepare_checkpoint(task_id: int, root_execution_id: int) -> str:
+    """创建（或复用）断点目录并返回路径"""
+    path = checkpoint_path(task_id, root_execution_id)
+    os.makedirs(path, exist_ok=True)
+    # Touch so the retention period counts from the latest attempt
+    os.utime(path, None)
+    return path
+
+
+def remove_checkpoint(task_id: int, root_execution_id: int) -> bool:
+    path = checkpoint_path(task_id, root_execution_id)
+    if not os.path.isdir(path):
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    task_dir = os.path.dirname(path)
+    try:
+        os.rmdir(task_dir)
+    except OSError:
+        pass
+    return True
+
+
+def cleanup_expired_checkpoints(db: Session, retention_hours: Optional[int] = None) -> int:
+    """
+    清理过期断点：所属运行没有执行中的尝试，且最后一次尝试距今超过保留时长
+
+    Returns:
+        删除的断点目录数
+    """
+    if retention_hours is None:
+        retention_hours = settings.checkpoint_retention_hours
+    if not os.path.isdir(settings.checkpoint_dir):
+        return 0
+
+    active_roots = {
+        row[0] for row in db.query(models.TaskExecution.root_execution_id).filter(
+            models.TaskExecution.status.in_(["running", "pending"]),
+            models.TaskExecution.root_execution_id.isnot(None)
+        ).all()
+    }
+    cutoff = time.time() - retention_hours * 3600
+
+    removed = 0
+    for task_name in os.listdir(settings.checkpoint_dir):
+        task_match = TASK_DIR_RE.match(task_name)
+        if not task_match:
+            continue
+        task_dir = os.path.join(settings.checkpoint_dir, task_name)
+        for run_name in os.listdir(task_dir):
+            run_match = RUN_DIR_RE.match(run_name)
+            if not run_match or int(run_match.group(1)) in active_roots:
+                continue
+            path = os.path.join(task_dir, run_name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path)
+                    removed += 1
+                    logger.info(f"Deleted expired checkpoint {task_name}/{run_name}")
+            except OSError as e:
+                logger.error(f"Error deleting checkpoint {path}: {e}")
+        try:
+            os.rmdir(task_dir)
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,205 @@
+"""
+并发自动调节器 - 根据主机饱和度和执行耗时在配置范围内调整并发上限
+
+- 收缩：CPU / 内存使用率超过高水位，或近期执行耗时中位数超过各任务基线的
+  concurrency_autotune_latency_ratio 倍（资源争用），上限乘以 0.75
+- 扩张：执行槽已用满或分发队列中有排队、CPU 低于低水位且耗时正常时，上限增加 10%（至少 1）
+- 其余情况保持不变
+
+管理员设置的上限和自动调节开关保存在系统配置 concurrency.settings 中，启动时恢复；
+每次上限变化（管理员或自动调节）都写入审计日志。
+"""
+import json
+import statistics
+import threading
+from typing import Optional
+import psutil
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from core.concurrency import concurrency_controller
+from audit_service.service import create_audit_log
+from task_service.dispatcher import task_dispatcher
+
+logger = get_logger(__name__)
+
+CONFIG_KEY = "concurrency.settings"
+DECREASE_FACTOR = 0.75
+INCREASE_FRACTION = 0.1
+MIN_LATENCY_SAMPLES = 3
+
+
+class ConcurrencyAutotuner:
+    """并发自动调节器 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ConcurrencyAutotuner, cls).__new__(cls)
+                    cls._instance._enabled = settings.concurrency_autotune
+                    cls._instance._thread = None
+                    cls._instance._stop_event = threading.Event()
+                    cls._instance._last_sample = None
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def start(self):
+        """启动调节线程（未启用时线程空转，开关可随时切换）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        psutil.cpu_percent(interval=None)  # Prime the counter, the first reading is meaningless
+        self._thread = threading.Thread(target=self._loop, name="concurrency-autotuner", daemon=True)
+        self._thread.start()
+        logger.info(f"Concurrency autotuner started (enabled={self._enabled})")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop_event.wait(settings.concurrency_autotune_interval):
+            if not self._enabled:
+                continue
+            try:
+                self.tune_once()
+            except Exception as e:
+                logger.error(f"Concurrency autotune failed: {e}")
+
+    def tune_once(self, cpu: Optional[float] = None, memory: Optional[float] = None) -> Optional[dict]:
+        """
+        执行一次调节
+
+        Args:
+            cpu: CPU 使用率（默认采样自上次调用以来的平均值）
+            memory: 内存使用率（默认当前值）
+
+        Returns:
+            变更记录；上限未变化时返回 None
+        """
+        cpu = psutil.cpu_percent(interval=None) if cpu is None else cpu
+        memory = psutil.virtual_memory().percent if memory is None else memory
+        ratios = concurrency_controller.drain_latency_ratios()
+        latency = statistics.median(ratios) if len(ratios) >= MIN_LATENCY_SAMPLES else None
+
+        limit = concurrency_controller.limit
+        active = concurrency_controller.get_active_count()
+        waiting = self._waiting_count()
+        self._last_sample = {
+            "cpu": cpu, "memory": memory, "latency_ratio": latency,
+            "limit": limit, "active": active, "waiting": waiting,
+        }
+
+        if cpu >= settings.concurrency_autotune_cpu_high:
+            new_limit, reason = int(limit * DECREASE_FACTOR), f"cpu {cpu:.0f}%"
+        elif memory >= settings.concurrency_autotune_memory_high:
+            new_limit, reason = int(limit * DECREASE_FACTOR), f"memory {memory:.0f}%"
+        elif latency is not None and latency >= settings.concurrency_autotune_latency_ratio:
+            new_limit, reason = int(limit * DECREASE_FACTOR), f"latency x{latency:.2f} of baseline"
+        elif (waiting > 0 or active >= limit) and cpu < settings.concurrency_autotune_cpu_low:
+            new_limit = limit + max(1, int(limit * INCREASE_FRACTION))
+            reason = f"saturated ({active} active, {waiting} waiting) at cpu {cpu:.0f}%"
+        else:
+            return None
+
+        change = concurrency_controller.set_limit(new_limit, source="autotune", reason=reason)
+        if change:
+            db = SessionLocal()
+            try:
+                record_change(db, change)
+            finally:
+                db.close()
+        return change
+
+    def configure(self, db: Session, limit: Optional[int] = None, autotune: Optional[bool] = None,
+                  operator_ip: Optional[str] = None) -> Optional[dict]:
+        """
+        管理员调整上限和/或自动调节开关，并持久化到系统配置
+
+        Returns:
+            上限变更记录；上限未变化时返回 None
+        """
+        change = None
+        if limit is not None:
+            change = concurrency_controller.set_limit(limit, source="admin", reason="set via API")
+            if change:
+                record_change(db, change, operator_ip)
+        if autotune is not None and autotune != self._enabled:
+            self._enabled = autotune
+            logger.info(f"Concurrency autotune {'enabled' if autotune else 'disabled'}")
+        self._save_config(db)
+        return change
+
+    def load_config(self):
+        """从系统配置恢复管理员设置的上限和自动调节开关"""
+        from system_service import models as system_models
+
+        db = SessionLocal()
+        try:
+            config = db.query(system_models.SystemConfig).filter(system_models.SystemConfig.key == CONFIG_KEY).first()
+            values = json.loads(config.value) if config and config.value else {}
+            if values.get("limit"):
+                concurrency_controller.set_limit(values["limit"], source="config", reason="restored from settings")
+            if "autotune" in values:
+                self._enabled = bool(values["autotune"])
+        except Exception as e:
+            logger.error(f"Failed to load concurrency settings: {e}")
+        finally:
+            db.close()
+
+    def _save_config(self, db: Session):
+        from system_service import models as system_models
+
+        value = json.dumps({"limit": concurrency_controller.limit, "autotune": self._enabled})
+        config = db.query(system_models.SystemConfig).filter(system_models.SystemConfig.key == CONFIG_KEY).first()
+        if config:
+            config.value = value
+        else:
+            db.add(system_models.SystemConfig(key=CONFIG_KEY, value=value, description="并发上限与自动调节开关"))
+        db.commit()
+
+    @staticmethod
+    def _waiting_count() -> int:
+        """等待执行槽的运行数：分发队列中的运行 + 直接阻塞在并发控制器上的执行"""
+        return task_dispatcher.queue_depth() + concurrency_controller.get_waiting_count()
+
+    def status(self) -> dict:
+        return {
+            "limit": concurrency_controller.limit,
+            "active": concurrency_controller.get_active_count(),
+            "waiting": self._waiting_count(),
+            "min_limit": settings.concurrency_min_limit,
+            "max_limit": settings.concurrency_max_limit,
+            "autotune": self._enabled,
+            "autotune_interval": settings.concurrency_autotune_interval,
+            "last_sample": self._last_sample,
+            "changes": concurrency_controller.get_changes(),
+        }
+
+
+def record_change(db: Session, change: dict, operator_ip: Optional[str] = None):
+    """把上限变更写入审计日志"""
+    try:
+        create_audit_log(
+            db,
+            operation_type="UPDATE",
+            target_type="SYSTEM",
+            target_name="concurrency_limit",
+            details=json.dumps(change),
+            operator_ip=operator_ip,
+        )
+    except Exception as e:
+        logger.error(f"Failed to record concurrency change: {e}")
+
+
+# 全局单例
+concurrency_autotuner = ConcurrencyAutotuner()
@@ -0,0 +1,638 @@
+"""
+分发队列 - 所有运行（定时、事件、重试、手动、Webhook）的统一入口
+
+运行先进入有界 FIFO 队列，分发线程按顺序等待并发许可，拿到许可后交给执行线程池运行；
+队列满时拒绝新的运行（手动/API 触发返回 429 + Retry-After），已创建的 pending 记录标记为 dropped，
+不会再出现大量线程各自阻塞等待许可、最终把执行记录遗留在 pending 的情况。
+
+重叠策略（任务的 overlap_policy）在分发时生效，针对同一任务上一次运行仍未结束的情况：
+- parallel：最多 max_parallel 个运行同时进行，超出的运行延后到有运行结束时再分发
+- skip：本次运行记录为 skipped，不执行
+- queue：最多保留一个延后的运行，之后的触发记录为 coalesced
+- replace：停止仍在运行的执行（stopped），本次运行在其退出后立即开始
+重试（attempt > 1）属于同一次逻辑运行，不受重叠策略限制。
+
+分片任务的父运行按上述规则分发（不占执行槽），各分片再经 run_shard 进入同一队列：按分发策略排队、
+各自占用执行槽，不占队列容量（父运行已被接纳），也不受重叠策略限制、不计入任务的并行运行数。
+
+分发策略（KUMO_DISPATCH_POLICY，可通过 PUT /api/system/dispatch-queue 切换）决定有空闲执行槽时先分发哪个运行：
+- fifo：按到达顺序
+- sjf：预计耗时最短的优先（按任务执行历史的 EWMA 估算）
+- binpack：在内存预算内优先分发预计内存峰值最大、且放得下的运行；放不下时等待运行结束释放内存
+sjf / binpack 下等待超过 KUMO_DISPATCH_AGING_SECONDS 的队首运行优先分发，避免长任务饿死。
+"""
+import time
+import datetime
+import threading
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+import psutil
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from core.concurrency import concurrency_controller
+from task_service import models
+from task_service.process_manager import process_manager
+from task_service.duration_estimator import duration_estimator
+from task_service.task_executor import run_task_execution, close_out_execution
+
+logger = get_logger(__name__)
+
+THROUGHPUT_WINDOW = 300  # 估算 Retry-After 时参考最近多少秒的分发速率
+OVERLAP_POLICIES = ("skip", "queue", "replace", "parallel")
+DISPATCH_POLICIES = ("fifo", "sjf", "binpack")
+POLICY_CONFIG_KEY = "dispatch.policy"
+SELECT_INTERVAL = 0.2  # sjf / binpack 等待空闲执行槽时的检查间隔（秒）
+
+
+class DispatchQueueFull(Exception):
+    """分发队列已满"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"Dispatch queue is full, retry after {retry_after}s")
+
+
+class RunRequest:
+    """排队中的一次运行"""
+    __slots__ = ("task_id", "attempt", "execution_id", "scheduler", "kwargs", "source", "enqueued_at",
+                 "est_duration", "est_memory", "done")
+
+    def __init__(self, task_id: int, attempt: int, execution_id: Optional[int], scheduler, kwargs: dict, source: str):
+        self.task_id = task_id
+        self.attempt = attempt
+        self.execution_id = execution_id
+        self.scheduler = scheduler
+        self.kwargs = kwargs
+        self.source = source
+        self.enqueued_at = time.time()
+        self.est_duration = None  # Filled from the duration estimator when a non-FIFO policy is active
+        self.est_memory = None
+        self.done = None  # Event set once a shard has finished or was dropped, its shard thread waits on it
+
+    @property
+    def is_shard(self) -> bool:
+        return self.kwargs.get("shard_index") is not None
+
+    def estimate(self):
+        if self.est_duration is None:
+            self.est_duration, self.est_memory = duration_estimator.estimate(self.task_id)
+
+
+def choose_next(queue: Sequence[RunRequest], policy: str, now: float, running: int = 0,
+                committed_mb: float = 0.0, budget_mb: float = 0.0, aging: float = 0.0) -> Optional[int]:
+    """
+    按分发策略选择下一个分发的运行（队列中的下标）
+
+    Args:
+        queue: 排队中的运行（已填好预计耗时和内存）
+        policy: fifo / sjf / binpack
+        now: 当前时间戳
+        running: 已分发且未结束的运行数
+        committed_mb: 已分发运行的预计内存峰值之和
+        budget_mb: 内存预算
+        aging: 队首运行等待超过此秒数后优先分发（0 表示不启用）
+
+    Returns:
+        下标；binpack 下没有放得下的运行且仍有运行未结束时返回 None（等待内存释放）
+    """
+    if not queue:
+        return None
+    aged = aging > 0 and now - queue[0].enqueued_at >= aging
+    if policy == "sjf":
+        if aged:
+            return 0
+        return min(range(len(queue)), key=lambda i: (queue[i].est_duration, i))
+    if policy == "binpack":
+        free = budget_mb - committed_mb
+        if aged:
+            return 0 if queue[0].est_memory <= free or running == 0 else None
+        fitting = [i for i in range(len(queue)) if queue[i].est_memory <= free]
+        if not fitting:
+            # A run larger than the whole budget still runs, alone
+            return 0 if running == 0 else None
+        return max(fitting, key=lambda i: (queue[i].est_memory, -i))
+    return 0
+
+
+class TaskDispatcher:
+    """分发队列 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(TaskDispatcher, cls).__new__(cls)
+                    cls._instance._queue = deque()
+                    cls._instance._deferred = {}  # task_id -> deque of runs waiting for the task's previous run
+                    cls._instance._active = {}  # task_id -> runs handed to the pool and not finished yet
+                    cls._instance._policy = (
+                        settings.dispatch_policy if settings.dispatch_policy in DISPATCH_POLICIES else "fifo"
+                    )
+                    cls._instance._committed_mb = 0.0  # Estimated peak memory of runs handed to the pool
+                    cls._instance._cond = threading.Condition()
+                    cls._instance._running = False
+                    cls._instance._thread = None
+                    cls._instance._pool = None
+                    cls._instance._dispatched_at = deque(maxlen=500)
+                    cls._instance._stats = {"submitted": 0, "dispatched": 0, "rejected": 0, "dropped": 0,
+                                            "skipped": 0, "coalesced": 0, "replaced": 0}
+        return cls._instance
+
+    def start(self):
+        """启动分发线程，并关闭上次进程遗留的 pending 记录"""
+        if self._running:
+            return
+        self._close_stale_pending()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(settings.max_concurrent_tasks, settings.concurrency_max_limit),
+            thread_name_prefix="kumo-run",
+        )
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="task-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Task dispatcher started (queue size {settings.dispatch_queue_size})")
+
+    def shutdown(self):
+        """停止分发，排队中的运行标记为 dropped（运行中的执行不受影响）"""
+        with self._cond:
+            self._running = False
+            pending = list(self._queue) + [r for runs in self._deferred.values() for r in runs]
+            self._queue.clear()
+            self._deferred.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for request in pending:
+            self._drop(request, "backend shutting down")
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def is_full(self) -> bool:
+        with self._cond:
+            return self._backlog() >= settings.dispatch_queue_size
+
+    def _backlog(self) -> int:
+        """排队中和延后中的运行总数（都占用队列容量）"""
+        return len(self._queue) + sum(len(runs) for runs in self._deferred.values())
+
+    def submit(self, task_id: int, attempt: int = 1, execution_id: Optional[int] = None, scheduler=None,
+               source: str = "schedule", **kwargs) -> int:
+        """
+        把一次运行加入队列
+
+        Args:
+            task_id: 任务 ID
+            attempt: 重试次数（从1开始）
+            execution_id: 已创建的 pending 执行记录（手动/Webhook 触发）
+            scheduler: 用于调度失败重试的 APScheduler 实例
+            source: 来源（schedule / event / retry / manual / webhook），用于统计
+            **kwargs: 透传给 run_task_execution 的参数（root_execution_id、trigger_event）
+
+        Returns:
+            排队位置（从 1 开始）
+
+        Raises:
+            DispatchQueueFull: 队列已满
+        """
+        request = RunRequest(task_id, attempt, execution_id, scheduler, kwargs, source)
+        if self._policy != "fifo":
+            request.estimate()
+        with self._cond:
+            if self._backlog() >= settings.dispatch_queue_size:
+                self._stats["rejected"] += 1
+                raise DispatchQueueFull(self._retry_after())
+            self._queue.append(request)
+            self._stats["submitted"] += 1
+            position = len(self._queue)
+            self._cond.notify()
+        return position
+
+    def run_shard(self, task_id: int, attempt: int, execution_id: int, shard_index: int, **kwargs):
+        """
+        分片经分发队列运行，阻塞到分片结束或被丢弃（由分片线程调用）
+
+        Args:
+            execution_id: 分片的 pending 执行记录
+            shard_index: 分片序号
+            **kwargs: 透传给 run_task_execution 的参数（root_execution_id、trigger_event）
+        """
+        request = RunRequest(task_id, attempt, execution_id, None, dict(kwargs, shard_index=shard_index), "shard")
+        request.done = threading.Event()
+        if self._policy != "fifo":
+            request.estimate()
+        with self._cond:
+            running = self._running
+            if running:
+                # The parent run was already admitted, its shards do not compete for queue capacity
+                self._queue.append(request)
+                self._stats["submitted"] += 1
+                self._cond.notify()
+        if not running:
+            self._drop(request, "dispatcher not running")
+        request.done.wait()
+
+    def queue_depth(self) -> int:
+        """排队等待执行槽的运行数（不含被重叠策略延后的运行）"""
+        with self._cond:
+            return len(self._queue)
+
+    def position(self, execution_id: int) -> Optional[int]:
+        """执行记录在队列中的位置（从 1 开始，延后的运行排在队列之后），不在队列中返回 None"""
+        with self._cond:
+            for index, request in enumerate(self._waiting()):
+                if request.execution_id == execution_id:
+                    return index + 1
+        return None
+
+    def remove(self, execution_id: int) -> bool:
+        """从队列中移除尚未开始的执行（停止/删除排队中的执行时调用）"""
+        with self._cond:
+            for request in self._queue:
+                if request.execution_id == execution_id:
+                    self._queue.remove(request)
+                    if request.done:
+                        request.done.set()
+                    return True
+            for runs in self._deferred.values():
+                for request in runs:
+                    if request.execution_id == execution_id:
+                        runs.remove(request)
+                        return True
+        return False
+
+    def _waiting(self):
+        """排队中的运行，后接延后中的运行"""
+        yield from self._queue
+        for runs in self._deferred.values():
+            yield from runs
+
+    def retry_after(self) -> int:
+        """按近期分发速率估算队列腾出空间所需的时间（秒）"""
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        now = time.time()
+        recent = [t for t in self._dispatched_at if now - t <= THROUGHPUT_WINDOW]
+        if len(recent) < 2 or recent[-1] <= recent[0]:
+            return settings.dispatch_retry_after
+        rate = (len(recent) - 1) / (recent[-1] - recent[0])
+        # Time until roughly a tenth of the queue has drained
+        wait = max(1.0, self._backlog() * 0.1) / rate
+        return int(min(max(1, round(wait)), settings.dispatch_retry_after_max))
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    def set_policy(self, policy: str):
+        """切换分发策略，对排队中的运行立即生效"""
+        if policy not in DISPATCH_POLICIES:
+            raise ValueError(f"Unknown dispatch policy: {policy}")
+        with self._cond:
+            if policy == self._policy:
+                return
+            self._policy = policy
+            self._cond.notify_all()
+        logger.info(f"Dispatch policy set to {policy}")
+
+    def configure(self, db: Session, policy: str):
+        """管理员切换分发策略，并持久化到系统配置"""
+        from system_service import models as system_models
+
+        self.set_policy(policy)
+        value = json.dumps({"policy": policy})
+        config = db.query(system_models.SystemConfig).filter(system_models.SystemConfig.key == POLICY_CONFIG_KEY).first()
+        if config:
+            config.value = value
+        else:
+            db.add(system_models.SystemConfig(key=POLICY_CONFIG_KEY, value=value, description="分发队列策略"))
+        db.commit()
+
+    def load_config(self):
+        """从系统配置恢复管理员设置的分发策略"""
+        from system_service import models as system_models
+
+        db = SessionLocal()
+        try:
+            config = db.query(system_models.SystemConfig).filter(system_models.SystemConfig.key == POLICY_CONFIG_KEY).first()
+            policy = json.loads(config.value).get("policy") if config and config.value else None
+            if policy in DISPATCH_POLICIES:
+                self.set_policy(policy)
+        except Exception as e:
+            logger.error(f"Failed to load dispatch policy: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def memory_budget() -> float:
+        """binpack 的内存预算（MB）"""
+        if settings.dispatch_memory_budget_mb > 0:
+            return float(settings.dispatch_memory_budget_mb)
+        return psutil.virtual_memory().total / (1024 * 1024) * 0.8
+
+    def _select(self) -> Optional[RunRequest]:
+        """按分发策略取出下一个运行（调用方持有 self._cond）；需要等待时返回 None"""
+        if not self._queue:
+            return None
+        if self._policy == "fifo":
+            return self._queue.popleft()
+        # Choose when a slot is free, so runs arriving meanwhile can still go first
+        if concurrency_controller.get_available_slots() <= 0:
+            return None
+        # Only runs queued before a policy switch lack estimates, the estimator caches per task
+        for request in self._queue:
+            request.estimate()
+        index = choose_next(
+            self._queue, self._policy, time.time(),
+            running=sum(self._active.values()),
+            committed_mb=self._committed_mb,
+            budget_mb=self.memory_budget() if self._policy == "binpack" else 0.0,
+            aging=settings.dispatch_aging_seconds,
+        )
+        if index is None:
+            return None
+        request = self._queue[index]
+        del self._queue[index]
+        return request
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                request = None
+                while self._running:
+                    request = self._select()
+                    if request is not None:
+                        break
+                    self._cond.wait(SELECT_INTERVAL if self._queue else 1.0)
+                if not self._running:
+                    return
+            try:
+                self._dispatch(request)
+            except Exception as e:
+                logger.error(f"Failed to dispatch task {request.task_id}: {e}", exc_info=True)
+                self._drop(request, f"dispatch error: {e}")
+
+    def _dispatch(self, request: RunRequest):
+        if request.is_shard:
+            # Part of a parent run that was already admitted
+            holds_slot = True
+        else:
+            policy, max_parallel, shard_count = self._load_policy(request.task_id)
+            if not self._admit(request, policy, max_parallel):
+                return
+            # Sharded runs only coordinate their shards, each shard is dispatched with its own slot
+            holds_slot = shard_count <= 1
+        if holds_slot:
+            while not concurrency_controller.acquire(timeout=1.0):
+                if not self._running:
+                    self._drop(request, "backend shutting down")
+                    self._complete(request)
+                    return
+        memory_mb = request.est_memory or 0.0
+        with self._cond:
+            self._dispatched_at.append(time.time())
+            self._stats["dispatched"] += 1
+            self._committed_mb += memory_mb
+        try:
+            if holds_slot:
+                self._pool.submit(self._run, request, holds_slot)
+            elif self._running:
+                # A sharded parent blocks until its shards finish, and the shards need pool threads:
+                # coordinate on a dedicated thread (like the shard threads) so it never starves them
+                threading.Thread(target=self._run, args=(request, False), daemon=True,
+                                 name=f"kumo-shards-{request.task_id}").start()
+            else:
+                raise RuntimeError("dispatcher stopped")
+        except (RuntimeError, AttributeError):
+            # Pool already shut down
+            if holds_slot:
+                concurrency_controller.release()
+            self._drop(request, "backend shutting down")
+            self._complete(request, memory_mb)
+
+    def _run(self, request: RunRequest, holds_slot: bool):
+        try:
+            run_task_execution(request.task_id, request.attempt, request.execution_id, request.scheduler,
+                               slot_acquired=holds_slot, **request.kwargs)
+        finally:
+            self._complete(request, request.est_memory or 0.0)
+
+    def _complete(self, request: RunRequest, memory_mb: float = 0.0):
+        """运行结束或未能分发：分片只释放预计内存并唤醒分片线程，其余运行按 _finish 结束"""
+        if request.is_shard:
+            with self._cond:
+                self._committed_mb = max(0.0, self._committed_mb - memory_mb)
+                self._cond.notify()
+            request.done.set()
+        else:
+            self._finish(request.task_id, memory_mb)
+
+    @staticmethod
+    def _load_policy(task_id: int):
+        """任务的重叠策略、并行上限和分片数"""
+        db = SessionLocal()
+        try:
+            task = db.query(models.Task).filter(models.Task.id == task_id).first()
+            if not task:
+                return "parallel", settings.scheduler_max_instances, 1
+            policy = task.overlap_policy if task.overlap_policy in OVERLAP_POLICIES else "parallel"
+            return policy, task.max_parallel or settings.scheduler_max_instances, task.shard_count or 1
+        finally:
+            db.close()
+
+    def _admit(self, request: RunRequest, policy: str, max_parallel: int) -> bool:
+        """
+        按重叠策略决定本次运行是否立即分发；不分发的运行被延后或记录为 skipped / coalesced
+
+        Returns:
+            是否立即分发（已计入该任务的运行数）
+        """
+        task_id = request.task_id
+        coalesced = []
+        with self._cond:
+            active = self._active.get(task_id, 0)
+            limit = max_parallel if policy == "parallel" else 1
+            # Retries continue a run that was already admitted
+            if request.attempt > 1 or active < limit:
+                self._active[task_id] = active + 1
+                return True
+
+            deferred = self._deferred.setdefault(task_id, deque())
+            if policy == "skip":
+                outcome = "skipped"
+            elif policy == "queue" and deferred:
+                outcome = "coalesced"
+            else:
+                # parallel / queue / replace: wait for a running run of this task to finish
+                if policy == "replace":
+                    # Only the newest fire replaces the running one
+                    coalesced = list(deferred)
+                    deferred.clear()
+                deferred.append(request)
+                outcome = None
+            for _ in coalesced:
+                self._stats["coalesced"] += 1
+            if outcome:
+                self._stats[outcome] += 1
+
+        for older in coalesced:
+            self._record_overlap(older, "coalesced", "superseded by a newer run (overlap policy: replace)")
+        if outcome == "skipped":
+            self._record_overlap(request, "skipped", "previous run still active (overlap policy: skip)")
+        elif outcome == "coalesced":
+            self._record_overlap(request, "coalesced", "a run is already waiting (overlap policy: queue)")
+        elif policy == "replace":
+            self._replace_running(task_id)
+        return False
+
+    def adopt_run(self, task_id: int):
+        """计入一个不经分发队列开始的运行（重启后重新接管的执行），结束时调用 finish_run"""
+        with self._cond:
+            self._active[task_id] = self._active.get(task_id, 0) + 1
+
+    def finish_run(self, task_id: int):
+        self._finish(task_id)
+
+    def _finish(self, task_id: int, memory_mb: float = 0.0):
+        """一次运行结束：释放其预计内存，延后中的下一个运行回到队首"""
+        with self._cond:
+            self._committed_mb = max(0.0, self._committed_mb - memory_mb)
+            remaining = self._active.get(task_id, 0) - 1
+            if remaining > 0:
+                self._active[task_id] = remaining
+            else:
+                self._active.pop(task_id, None)
+            deferred = self._deferred.get(task_id)
+            if deferred:
+                self._queue.appendleft(deferred.popleft())
+            # Wake the loop: a deferred run is back, or binpack has memory again
+            self._cond.notify()
+            if not deferred:
+                self._deferred.pop(task_id, None)
+
+    def _replace_running(self, task_id: int):
+        """停止任务仍在运行的执行（含分片），延后的新运行在其退出后开始"""
+        db = SessionLocal()
+        try:
+            running = db.query(models.TaskExecution).filter(
+                models.TaskExecution.task_id == task_id,
+                models.TaskExecution.status == "running",
+            ).all()
+            now = datetime.datetime.now()
+            for execution in running:
+                process_manager.stop_execution(execution.id)
+                execution.status = "stopped"
+                execution.end_time = now
+                execution.output = (execution.output or "") + "\n[System] Replaced by a newer run."
+            if running:
+                db.commit()
+                with self._cond:
+                    self._stats["replaced"] += 1
+                logger.info(f"Task {task_id}: stopped {len(running)} running executions to replace them")
+        except Exception as e:
+            logger.error(f"Failed to replace running executions of task {task_id}: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _record_overlap(request: RunRequest, status: str, reason: str):
+        """把未执行的运行记录为 skipped / coalesced"""
+        db = SessionLocal()
+        try:
+            now = datetime.datetime.now()
+            execution = None
+            if request.execution_id:
+                execution = db.query(models.TaskExecution).filter(
+                    models.TaskExecution.id == request.execution_id
+                ).first()
+            if execution is None:
+                execution = models.TaskExecution(task_id=request.task_id, attempt=request.attempt, start_time=now)
+                db.add(execution)
+            execution.status = status
+            execution.end_time = now
+            execution.duration = 0
+            execution.output = f"[System] Not run: {reason}"
+            db.commit()
+            logger.info(f"{request.source} run of task {request.task_id} {status}: {reason}")
+        except Exception as e:
+            logger.error(f"Failed to record {status} run of task {request.task_id}: {e}")
+        finally:
+            db.close()
+
+    def _drop(self, request: RunRequest, reason: str):
+        with self._cond:
+            self._stats["dropped"] += 1
+        if request.execution_id:
+            close_out_execution(request.execution_id, reason)
+        else:
+            logger.warning(f"Dropped {request.source} run of task {request.task_id}: {reason}")
+        if request.done:
+            request.done.set()
+
+    def _close_stale_pending(self):
+        """上次进程退出时仍在排队的运行不会再执行"""
+        db = SessionLocal()
+        try:
+            with self._cond:
+                queued = {r.execution_id for r in self._waiting() if r.execution_id}
+            stale = [
+                e for e in db.query(models.TaskExecution).filter(models.TaskExecution.status == "pending").all()
+                if e.id not in queued
+            ]
+            for execution in stale:
+                execution.status = "dropped"
+                execution.end_time = datetime.datetime.now()
+                execution.output = "[System] Dropped before start: backend restarted"
+            if stale:
+                db.commit()
+                logger.info(f"Closed out {len(stale)} pending executions left from the previous run")
+        except Exception as e:
+            logger.error(f"Failed to close out stale pending executions: {e}")
+        finally:
+            db.close()
+
+    def status(self) -> dict:
+        with self._cond:
+            queued = list(self._queue)
+            deferred = sum(len(runs) for runs in self._deferred.values())
+            active_tasks = len(self._active)
+            stats = dict(self._stats)
+        now = time.time()
+        return {
+            "running": self._running,
+            "policy": self._policy,
+            "committed_memory_mb": round(self._committed_mb, 1),
+            "capacity": settings.dispatch_queue_size,
+            "queued": len(queued),
+            "deferred": deferred,
+            "active_tasks": active_tasks,
+            "oldest_wait": round(now - queued[0].enqueued_at, 1) if queued else 0,
+            "by_source": {source: sum(1 for r in queued if r.source == source)
+                          for source in {r.source for r in queued}},
+            **stats,
+        }
+
+
+def enqueue_run(task_id: int, attempt: int = 1, execution_id: Optional[int] = None, scheduler=None, **kwargs):
+    """
+    APScheduler 任务入口（定时 / 事件 / 重试）：把运行加入分发队列，队列满时丢弃本次运行
+    """
+    source = "retry" if attempt > 1 else ("event" if kwargs.get("trigger_event") else "schedule")
+    try:
+        task_dispatcher.submit(task_id, attempt, execution_id, scheduler, source=source, **kwargs)
+    except DispatchQueueFull:
+        task_dispatcher._drop(RunRequest(task_id, attempt, execution_id, scheduler, kwargs, source),
+                              "dispatch queue full")
+
+
+# 全局单例
+task_dispatcher = TaskDispatcher()
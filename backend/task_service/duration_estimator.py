@@ -0,0 +1,85 @@
+"""
+运行时长估算 - 按任务维护执行耗时和内存峰值的 EWMA，供分发队列按预计耗时 / 内存选择下一个运行
+
+首次估算某任务时用最近的执行记录初始化，之后每次执行结束由执行器更新；没有历史时按
+KUMO_DISPATCH_DEFAULT_DURATION 和 0MB 估算。
+"""
+import threading
+from typing import Optional, Tuple
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from task_service import models
+
+logger = get_logger(__name__)
+
+EWMA_ALPHA = 0.3
+SEED_SAMPLES = 20  # 初始化时参考的最近执行数
+
+
+class DurationEstimator:
+    """运行时长估算 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(DurationEstimator, cls).__new__(cls)
+                    cls._instance._estimates = {}  # task_id -> [duration, memory_mb, samples]
+                    cls._instance._estimates_lock = threading.Lock()
+        return cls._instance
+
+    def estimate(self, task_id: int) -> Tuple[float, float]:
+        """任务下一次运行的预计耗时（秒）和内存峰值（MB）"""
+        with self._estimates_lock:
+            entry = self._estimates.get(task_id)
+        if entry is None:
+            entry = self._seed(task_id)
+        return entry[0], entry[1]
+
+    def observe(self, task_id: int, duration: Optional[float], memory_mb: Optional[float] = None):
+        """记录一次执行结束后的耗时和内存峰值"""
+        if duration is None or duration < 0:
+            return
+        with self._estimates_lock:
+            entry = self._estimates.get(task_id)
+            if entry is None or not entry[2]:
+                self._estimates[task_id] = [duration, memory_mb or 0.0, 1]
+                return
+            entry[0] += EWMA_ALPHA * (duration - entry[0])
+            if memory_mb is not None:
+                entry[1] += EWMA_ALPHA * (memory_mb - entry[1])
+            entry[2] += 1
+
+    def _seed(self, task_id: int) -> list:
+        """用最近的执行记录初始化估算（按时间顺序计算 EWMA）"""
+        entry = [float(settings.dispatch_default_duration), 0.0, 0]
+        db = SessionLocal()
+        try:
+            rows = db.query(models.TaskExecution.duration, models.TaskExecution.max_memory_mb).filter(
+                models.TaskExecution.task_id == task_id,
+                models.TaskExecution.parent_execution_id.is_(None),
+                models.TaskExecution.duration.isnot(None),
+                models.TaskExecution.status.in_(["success", "failed", "timeout"]),
+            ).order_by(models.TaskExecution.id.desc()).limit(SEED_SAMPLES).all()
+            for duration, memory_mb in reversed(rows):
+                if not entry[2]:
+                    entry = [duration, memory_mb or 0.0, 1]
+                    continue
+                entry[0] += EWMA_ALPHA * (duration - entry[0])
+                if memory_mb is not None:
+                    entry[1] += EWMA_ALPHA * (memory_mb - entry[1])
+                entry[2] += 1
+        except Exception as e:
+            logger.error(f"Failed to load execution history of task {task_id}: {e}")
+        finally:
+            db.close()
+        with self._estimates_lock:
+            # An observation may have arrived while the history was loading
+            return self._estimates.setdefault(task_id, entry)
+
+
+# 全局单例
+duration_estimator = DurationEstimator()
@@ -0,0 +1,385 @@
+"""
+事件触发器 - 文件变化、Webhook 与任务完成后链式触发
+
+- file: 监听目录中匹配 glob 的文件落地（inotify，不可用时退化为轮询），防抖后触发
+- webhook: `POST /api/tasks/{task_id}/webhook/{token}` 触发，令牌保存在 trigger_value 中
+- after_task: 上游任务的一次运行最终结束（成功/失败，不含仍会重试的失败）后触发
+
+触发时通过 TaskManager 注册的 dispatcher 立即调度执行，事件信息以 JSON 注入 KUMO_TRIGGER_EVENT。
+"""
+import os
+import json
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import fnmatch
+import secrets
+import threading
+from typing import Callable, Dict, List, Optional
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_TRIGGER_TYPES = ("file", "webhook", "after_task")
+AFTER_TASK_CONDITIONS = ("success", "failed", "any")
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def normalize_trigger_value(trigger_type: str, trigger_value) -> str:
+    """
+    校验事件触发器配置并返回规范化的 JSON 字符串（webhook 缺少令牌时生成）
+
+    Raises:
+        ValueError: 配置无效
+    """
+    if isinstance(trigger_value, str):
+        try:
+            config = json.loads(trigger_value) if trigger_value.strip() else {}
+        except ValueError:
+            raise ValueError(f"{trigger_type} trigger_value must be a JSON object")
+    else:
+        config = dict(trigger_value or {})
+    if not isinstance(config, dict):
+        raise ValueError(f"{trigger_type} trigger_value must be a JSON object")
+
+    if trigger_type == "file":
+        path = config.get("path")
+        if not path or not os.path.isabs(path):
+            raise ValueError("file trigger requires an absolute 'path'")
+        config["pattern"] = config.get("pattern") or "*"
+        debounce = float(config.get("debounce", settings.file_trigger_default_debounce))
+        if debounce < 0:
+            raise ValueError("debounce must be >= 0")
+        config["debounce"] = debounce
+    elif trigger_type == "webhook":
+        token = config.get("token")
+        if not token:
+            config["token"] = secrets.token_urlsafe(24)
+        elif not isinstance(token, str) or len(token) < 16:
+            raise ValueError("webhook token must be at least 16 characters")
+    elif trigger_type == "after_task":
+        try:
+            config["task_id"] = int(config.get("task_id"))
+        except (TypeError, ValueError):
+            raise ValueError("after_task trigger requires an upstream 'task_id'")
+        config["on"] = config.get("on") or "success"
+        if config["on"] not in AFTER_TASK_CONDITIONS:
+            raise ValueError(f"'on' must be one of {', '.join(AFTER_TASK_CONDITIONS)}")
+    else:
+        raise ValueError(f"Unknown event trigger type: {trigger_type}")
+    return json.dumps(config)
+
+
+class _Inotify:
+    """ctypes 封装的 inotify，仅 Linux 可用"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float):
+        """返回 [(wd, mask, name)]，超时返回空列表"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileTrigger:
+    """单个任务的文件触发配置与防抖状态"""
+
+    def __init__(self, task_id: int, config: dict):
+        self.task_id = task_id
+        self.directory = os.path.normpath(config["path"])
+        self.pattern = config.get("pattern") or "*"
+        self.debounce = float(config.get("debounce", settings.file_trigger_default_debounce))
+        self.wd: Optional[int] = None
+        self.snapshot: Optional[Dict[str, tuple]] = None  # Polling mode state
+        self.pending: List[str] = []
+        self.timer: Optional[threading.Timer] = None
+
+    def matches(self, name: str) -> bool:
+        return fnmatch.fnmatch(name, self.pattern)
+
+    def scan(self) -> Dict[str, tuple]:
+        result = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and self.matches(entry.name):
+                        st = entry.stat()
+                        result[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return result
+
+
+class EventTriggerManager:
+    """事件触发器管理器 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(EventTriggerManager, cls).__new__(cls)
+                    cls._instance._state_lock = threading.RLock()
+                    cls._instance._file_triggers = {}
+                    cls._instance._after_task = {}
+                    cls._instance._dispatcher = None
+                    cls._instance._inotify = None
+                    cls._instance._inotify_failed = False
+                    cls._instance._watch_dirs = {}
+                    cls._instance._thread = None
+                    cls._instance._stop_event = threading.Event()
+        return cls._instance
+
+    def set_dispatcher(self, dispatcher: Callable[[int, dict], None]):
+        """注册触发回调 dispatcher(task_id, event)（由 TaskManager 设置）"""
+        self._dispatcher = dispatcher
+
+    # ---------- 注册 ----------
+
+    def register(self, task_id: int, trigger_type: str, trigger_value):
+        """注册任务的事件触发器（替换已有注册）"""
+        self.unregister(task_id)
+        config = json.loads(normalize_trigger_value(trigger_type, trigger_value))
+        if trigger_type == "file":
+            trigger = FileTrigger(task_id, config)
+            with self._state_lock:
+                self._file_triggers[task_id] = trigger
+                self._watch(trigger)
+            self._ensure_thread()
+            logger.info(f"File trigger for task {task_id} watching {trigger.directory}/{trigger.pattern}")
+        elif trigger_type == "after_task":
+            with self._state_lock:
+                self._after_task[task_id] = config
+            logger.info(f"Task {task_id} runs after task {config['task_id']} ({config['on']})")
+        # Webhook triggers need no runtime state, the router checks the token
+
+    def unregister(self, task_id: int):
+        with self._state_lock:
+            self._after_task.pop(task_id, None)
+            trigger = self._file_triggers.pop(task_id, None)
+            if trigger:
+                if trigger.timer:
+                    trigger.timer.cancel()
+                self._unwatch(trigger)
+
+    def _watch(self, trigger: FileTrigger, quiet: bool = False):
+        if not settings.file_trigger_use_inotify or self._inotify_failed:
+            return
+        try:
+            if self._inotify is None:
+                self._inotify = _Inotify()
+            wd = self._inotify.add_watch(trigger.directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+        except (OSError, AttributeError) as e:
+            # Missing directory or no inotify support: poll this trigger instead
+            if isinstance(e, AttributeError) or getattr(e, "errno", None) in (errno.ENOSYS, errno.EMFILE):
+                self._inotify_failed = True
+            if not quiet:
+                logger.info(f"Polling {trigger.directory} for task {trigger.task_id}: {e}")
+            return
+        trigger.wd = wd
+        self._watch_dirs.setdefault(wd, set()).add(trigger.task_id)
+
+    def _unwatch(self, trigger: FileTrigger):
+        if trigger.wd is None:
+            return
+        tasks = self._watch_dirs.get(trigger.wd, set())
+        tasks.discard(trigger.task_id)
+        if not tasks:
+            self._watch_dirs.pop(trigger.wd, None)
+            try:
+                self._inotify.rm_watch(trigger.wd)
+            except Exception:
+                pass
+        trigger.wd = None
+
+    # ---------- 文件事件 ----------
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="event-triggers", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        poll_interval = settings.file_trigger_poll_interval
+        next_poll = 0.0
+        while not self._stop_event.is_set():
+            inotify = self._inotify
+            if inotify is not None:
+                try:
+                    events = inotify.read_events(min(1.0, poll_interval))
+                except OSError as e:
+                    logger.error(f"inotify read failed: {e}")
+                    events = []
+                    self._stop_event.wait(1.0)
+                self._handle_inotify(events)
+            else:
+                self._stop_event.wait(min(1.0, poll_interval))
+
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + poll_interval
+                self._poll()
+
+    def _handle_inotify(self, events):
+        with self._state_lock:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, fire every inotify trigger with its directory
+                    logger.warning("inotify queue overflowed, firing all file triggers")
+                    for trigger in self._file_triggers.values():
+                        if trigger.wd is not None:
+                            self._schedule(trigger, trigger.directory)
+                    continue
+                if mask & IN_IGNORED:
+                    # Directory removed: fall back to polling until it reappears
+                    for task_id in self._watch_dirs.pop(wd, set()):
+                        trigger = self._file_triggers.get(task_id)
+                        if trigger:
+                            trigger.wd = None
+                    continue
+                for task_id in self._watch_dirs.get(wd, ()):
+                    trigger = self._file_triggers.get(task_id)
+                    if trigger and name and trigger.matches(name):
+                        self._schedule(trigger, os.path.join(trigger.directory, name))
+
+    def _poll(self):
+        """轮询没有 inotify 监听的触发器（首次扫描只建立快照，不触发）"""
+        with self._state_lock:
+            triggers = [t for t in self._file_triggers.values() if t.wd is None]
+        for trigger in triggers:
+            current = trigger.scan()
+            with self._state_lock:
+                if self._file_triggers.get(trigger.task_id) is not trigger:
+                    continue
+                previous = trigger.snapshot
+                trigger.snapshot = current
+                if previous is not None:
+                    for name, state in current.items():
+                        if previous.get(name) != state:
+                            self._schedule(trigger, os.path.join(trigger.directory, name))
+                # The directory may exist now, switch to inotify
+                if os.path.isdir(trigger.directory):
+                    self._watch(trigger, quiet=True)
+
+    def _schedule(self, trigger: FileTrigger, path: str):
+        """防抖：在 debounce 秒内没有新事件后才触发一次"""
+        if path not in trigger.pending:
+            trigger.pending.append(path)
+        if trigger.timer:
+            trigger.timer.cancel()
+        trigger.timer = threading.Timer(trigger.debounce, self._fire_file, args=(trigger,))
+        trigger.timer.daemon = True
+        trigger.timer.start()
+
+    def _fire_file(self, trigger: FileTrigger):
+        with self._state_lock:
+            if self._file_triggers.get(trigger.task_id) is not trigger or not trigger.pending:
+                return
+            files, trigger.pending, trigger.timer = trigger.pending, [], None
+        self.fire(trigger.task_id, {"type": "file", "files": files})
+
+    # ---------- 任务链 ----------
+
+    def notify_completion(self, task_id: int, status: str, execution_id: Optional[int] = None):
+        """上游任务的一次运行最终结束，触发下游任务（被手动停止的运行不触发）"""
+        if status == "stopped":
+            return
+        outcome = "success" if status == "success" else "failed"
+        with self._state_lock:
+            dependents = [
+                downstream for downstream, config in self._after_task.items()
+                if config["task_id"] == task_id and config["on"] in (outcome, "any")
+            ]
+        for downstream in dependents:
+            self.fire(downstream, {
+                "type": "after_task", "task_id": task_id, "status": status, "execution_id": execution_id,
+            })
+
+    def fire(self, task_id: int, event: dict):
+        if not self._dispatcher:
+            logger.warning(f"Event trigger for task {task_id} fired before a dispatcher was set")
+            return
+        logger.info(f"Event trigger fired for task {task_id}: {event['type']}")
+        try:
+            self._dispatcher(task_id, event)
+        except Exception as e:
+            logger.error(f"Failed to dispatch event trigger for task {task_id}: {e}")
+
+    def status(self) -> dict:
+        with self._state_lock:
+            return {
+                "inotify": self._inotify is not None,
+                "file": {
+                    task_id: {"path": t.directory, "pattern": t.pattern, "mode": "inotify" if t.wd is not None else "poll"}
+                    for task_id, t in self._file_triggers.items()
+                },
+                "after_task": {task_id: dict(c) for task_id, c in self._after_task.items()},
+            }
+
+    def shutdown(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._state_lock:
+            for task_id in list(self._file_triggers):
+                self.unregister(task_id)
+            self._after_task = {}
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            self._watch_dirs = {}
+
+
+# 全局单例
+event_trigger_manager = EventTriggerManager()
@@ -0,0 +1,60 @@
+"""
+退出码包装器 - 作为执行的进程组首进程运行任务命令，命令结束后把退出码写入文件（不依赖后端代码）
+
+用法: python exit_wrapper.py <exit_file> <command> [args...]
+
+后端重启后重新接管的执行不再是后端的子进程，无法通过 wait 取得退出码，只能读取这个文件。
+停止信号（SIGINT / SIGTERM）发给整个进程组，包装器忽略它们，等命令退出后记录退出码，
+再以相同的退出码 / 信号结束，后端直接 wait 包装器时看到的返回码与直接运行命令一致。
+"""
+import os
+import sys
+import signal
+
+
+def _write_exit_code(path: str, code: int):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(str(code))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[Kumo] Could not record exit code: {e}", file=sys.stderr, flush=True)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: exit_wrapper.py <exit_file> <command> [args...]", file=sys.stderr)
+        sys.exit(2)
+    exit_file, args = sys.argv[1], sys.argv[2:]
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            os.execvp(args[0], args)
+        except OSError as e:
+            print(f"[Kumo] Failed to start {args[0]}: {e}", file=sys.stderr, flush=True)
+            os._exit(127)
+
+    while True:
+        try:
+            _, status = os.waitpid(pid, 0)
+            break
+        except InterruptedError:
+            continue
+    code = os.waitstatus_to_exitcode(status)
+    _write_exit_code(exit_file, code)
+
+    if code < 0:
+        # Die from the same signal as the command
+        signal.signal(-code, signal.SIG_DFL)
+        os.kill(os.getpid(), -code)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
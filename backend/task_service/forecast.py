@@ -0,0 +1,271 @@
+"""
+容量预测 - 预测未来 N 小时的并发数、CPU 和内存占用，标出需求超过并发上限的时段
+
+- 触发时间：展开每个 active 任务的 cron / interval / date 触发器（含错峰偏移）。cron 按表达式缓存展开结果，
+  相同表达式的任务共用一次计算；interval 按周期直接推算，不逐分钟调用 get_next_fire_time
+- 每次运行的耗时、CPU、内存取该任务最近执行记录的分位数（默认 P90），没有历史时按 KUMO_FORECAST_DEFAULT_DURATION
+- 时间线按分钟输出每分钟内的最大并发数和对应的 CPU / 内存；运行中的执行按预计剩余时间计入
+- 事件触发（file / webhook / after_task）和 immediate 任务无法预测，只列出任务 ID
+"""
+import math
+import datetime
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import psutil
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.logging import get_logger
+from core.concurrency import concurrency_controller
+from task_service import models
+from task_service.stagger import stagger_planner
+from task_service import performance
+from task_service.task_manager import task_manager, build_trigger
+
+logger = get_logger(__name__)
+
+HISTORY_PER_TASK = 100  # 每个任务最多参考多少条最近的执行记录
+MAX_RUNS_PER_TASK = 20000  # 每个任务在预测范围内最多展开的运行次数（每秒触发的任务）
+SCHEDULED_TRIGGERS = ("interval", "cron", "date")
+
+
+@lru_cache(maxsize=256)
+def _cron_fire_seconds(expression: str, start_ts: int, horizon: int) -> Tuple[int, ...]:
+    """cron 表达式在 [start, start + horizon) 内的触发时间（相对 start 的秒数），按表达式和起点缓存"""
+    trigger = build_trigger("cron", expression)
+    start = datetime.datetime.fromtimestamp(start_ts, trigger.timezone)
+    fires, previous, current = [], None, start
+    while len(fires) < MAX_RUNS_PER_TASK:
+        fire = trigger.get_next_fire_time(previous, current)
+        if fire is None:
+            break
+        offset = int((fire - start).total_seconds())
+        if offset >= horizon:
+            break
+        fires.append(offset)
+        previous = current = fire
+    return tuple(fires)
+
+
+def _fire_seconds(task, start: datetime.datetime, horizon: int) -> List[int]:
+    """任务在预测范围内的触发时间（相对 start 的秒数，含错峰偏移）"""
+    start_ts = int(start.timestamp())
+    if task.trigger_type == "cron":
+        # Expanded from a margin before start, so staggered fires of earlier base times are kept and
+        # every task with the same expression shares one cached expansion
+        margin = max(3600, settings.cron_stagger_window)
+        shift = stagger_planner.get_offset(task.id) - margin
+        base = _cron_fire_seconds(task.trigger_value, start_ts - margin, horizon + margin)
+        return [fire + shift for fire in base if 0 <= fire + shift < horizon]
+
+    job = task_manager.scheduler.get_job(str(task.id)) if task_manager.scheduler else None
+    next_run = job.next_run_time if job else None
+    if task.trigger_type == "interval":
+        interval = int(build_trigger("interval", task.trigger_value).interval.total_seconds())
+        if interval <= 0:
+            return []
+        if next_run:
+            first = int(next_run.timestamp()) - start_ts
+        else:
+            first = interval + stagger_planner.get_offset(task.id)
+        if first < 0:
+            first %= interval
+        return list(range(first, horizon, interval))[:MAX_RUNS_PER_TASK]
+
+    # date
+    run_at = next_run or build_trigger("date", task.trigger_value).run_date
+    offset = int(run_at.timestamp()) - start_ts
+    return [offset] if 0 <= offset < horizon else []
+
+
+def _load_profiles(db: Session, task_ids: List[int], quantile: float) -> Dict[int, dict]:
+    """按任务统计最近执行的耗时、CPU、内存分位数"""
+    rows = db.query(
+        models.TaskExecution.task_id,
+        models.TaskExecution.duration,
+        models.TaskExecution.max_cpu_percent,
+        models.TaskExecution.max_memory_mb,
+    ).filter(
+        models.TaskExecution.task_id.in_(task_ids),
+        models.TaskExecution.parent_execution_id.is_(None),
+        models.TaskExecution.duration.isnot(None),
+        models.TaskExecution.status.in_(["success", "failed", "timeout"]),
+    ).order_by(models.TaskExecution.id.desc()).all()
+
+    samples = defaultdict(list)
+    for row in rows:
+        if len(samples[row.task_id]) < HISTORY_PER_TASK:
+            samples[row.task_id].append(row)
+
+    profiles = {}
+    for task_id in task_ids:
+        history = samples.get(task_id, [])
+        duration = performance.quantile([r.duration for r in history], quantile)
+        cpu = performance.quantile([r.max_cpu_percent for r in history if r.max_cpu_percent is not None], quantile)
+        memory = performance.quantile([r.max_memory_mb for r in history if r.max_memory_mb is not None], quantile)
+        profiles[task_id] = {
+            "samples": len(history),
+            "duration": duration if duration is not None else settings.forecast_default_duration,
+            "cpu": cpu or 0.0,
+            "memory_mb": memory or 0.0,
+        }
+    return profiles
+
+
+def build_forecast(db: Session, hours: int = 24, quantile: float = 0.9,
+                   now: Optional[datetime.datetime] = None) -> dict:
+    """
+    预测未来 hours 小时的容量需求
+
+    Args:
+        db: 数据库会话
+        hours: 预测范围（小时）
+        quantile: 耗时 / CPU / 内存取历史的哪个分位数
+        now: 预测起点（默认当前时间，按分钟取整）
+
+    Returns:
+        时间线（每分钟的最大并发数、CPU、内存）、超过并发上限的时段和参与预测的任务
+    """
+    now = now or datetime.datetime.now().astimezone()
+    start = now.replace(second=0, microsecond=0)
+    horizon = hours * 3600
+    minutes = hours * 60
+    limit = concurrency_controller.limit
+
+    tasks = db.query(models.Task).filter(models.Task.status == "active").all()
+    scheduled = [t for t in tasks if t.trigger_type in SCHEDULED_TRIGGERS]
+    profiles = _load_profiles(db, [t.id for t in tasks], quantile)
+
+    # Each run: (start second, end second, weight, cpu, memory, task id)
+    runs = []
+    task_summaries = []
+    for task in scheduled:
+        try:
+            fires = _fire_seconds(task, start, horizon)
+        except Exception as e:
+            logger.warning(f"Forecast skipped task {task.id}: {e}")
+            continue
+        profile = profiles[task.id]
+        duration = max(1, int(math.ceil(profile["duration"])))
+        weight = task.shard_count or 1
+        exclusive = (task.overlap_policy or "parallel") != "parallel"
+        for index, fire in enumerate(fires):
+            end = fire + duration
+            if exclusive and index + 1 < len(fires):
+                # skip / queue / replace never overlap the task with itself
+                end = min(end, fires[index + 1])
+            runs.append((fire, end, weight, profile["cpu"], profile["memory_mb"], task.id))
+        task_summaries.append({
+            "task_id": task.id,
+            "name": task.name,
+            "runs": len(fires),
+            "expected_duration": round(profile["duration"], 1),
+            "history_samples": profile["samples"],
+        })
+
+    # Executions already running keep their slot for the rest of their expected duration
+    running = db.query(models.TaskExecution).filter(
+        models.TaskExecution.status == "running",
+        models.TaskExecution.parent_execution_id.is_(None),
+    ).all()
+    naive_now = now.replace(tzinfo=None)
+    default_profile = {"duration": settings.forecast_default_duration, "cpu": 0.0, "memory_mb": 0.0}
+    for execution in running:
+        profile = profiles.get(execution.task_id, default_profile)
+        elapsed = (naive_now - execution.start_time).total_seconds() if execution.start_time else 0
+        remaining = max(60, int(profile["duration"] - elapsed))
+        runs.append((0, remaining, 1, profile["cpu"], profile["memory_mb"], execution.task_id))
+
+    concurrency, cpu, memory = _sweep(runs, minutes)
+    cpu_count = psutil.cpu_count() or 1
+    timeline = [
+        {
+            "time": (start + datetime.timedelta(minutes=m)).isoformat(),
+            "concurrency": concurrency[m],
+            "cpu_percent": round(cpu[m] / cpu_count, 1),
+            "memory_mb": round(memory[m], 1),
+        }
+        for m in range(minutes)
+    ]
+    names = {t.id: t.name for t in tasks}
+
+    return {
+        "start": start.isoformat(),
+        "hours": hours,
+        "resolution_seconds": 60,
+        "quantile": quantile,
+        "limit": limit,
+        "peak_concurrency": max(concurrency, default=0),
+        "timeline": timeline,
+        "hotspots": _hotspots(runs, concurrency, limit, start, names),
+        "tasks": task_summaries,
+        "unpredictable_task_ids": [t.id for t in tasks if t.trigger_type not in SCHEDULED_TRIGGERS],
+    }
+
+
+def _sweep(runs: list, minutes: int):
+    """扫描运行的开始/结束事件，得到每分钟内的最大并发数及同一时刻的 CPU、内存"""
+    events = []
+    for begin, end, weight, cpu, memory, _ in runs:
+        events.append((begin, 1, weight, cpu * weight, memory * weight))
+        events.append((end, -1, weight, cpu * weight, memory * weight))
+    # Runs ending at a second free their slot before runs starting at the same second
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    concurrency, cpu, memory = [0] * minutes, [0.0] * minutes, [0.0] * minutes
+    level = [0, 0.0, 0.0]
+
+    def record(minute):
+        if level[0] > concurrency[minute]:
+            concurrency[minute] = level[0]
+        cpu[minute] = max(cpu[minute], level[1])
+        memory[minute] = max(memory[minute], level[2])
+
+    minute = 0  # First minute whose starting level is not recorded yet
+    for second, kind, weight, run_cpu, run_memory in events:
+        index = second // 60
+        if index >= minutes:
+            break
+        while minute < index:
+            record(minute)
+            minute += 1
+        if minute == index:
+            if second > index * 60:
+                # The level before this event held from the start of the minute
+                record(index)
+            minute += 1
+        level[0] += kind * weight
+        level[1] += kind * run_cpu
+        level[2] += kind * run_memory
+        record(index)
+    while minute < minutes:
+        record(minute)
+        minute += 1
+    return concurrency, cpu, memory
+
+
+def _hotspots(runs: list, concurrency: List[int], limit: int, start: datetime.datetime, names: dict) -> List[dict]:
+    """并发需求超过上限的连续时段，附上在该时段运行的任务"""
+    spans, begin = [], None
+    for minute, value in enumerate(concurrency + [0]):
+        if value > limit and begin is None:
+            begin = minute
+        elif value <= limit and begin is not None:
+            spans.append((begin, minute))
+            begin = None
+
+    hotspots = []
+    for begin, end in spans:
+        counts = defaultdict(int)
+        for run_begin, run_end, _, _, _, task_id in runs:
+            if run_begin < end * 60 and run_end > begin * 60:
+                counts[task_id] += 1
+        top = sorted(counts.items(), key=lambda item: -item[1])[:10]
+        hotspots.append({
+            "start": (start + datetime.timedelta(minutes=begin)).isoformat(),
+            "end": (start + datetime.timedelta(minutes=end)).isoformat(),
+            "peak_concurrency": max(concurrency[begin:end]),
+            "limit": limit,
+            "tasks": [{"task_id": task_id, "name": names.get(task_id), "runs": n} for task_id, n in top],
+        })
+    return hotspots
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
@@ -37,6 +37,16 @@ class Task(Base):
     max_cpu_percent = Column(Integer, default=0)  # CPU限制百分比，0表示不限制
     max_memory_mb = Column(Integer, default=0)  # 内存限制MB，0表示不限制
 
+    # Execution mode: subprocess (fresh interpreter) / warm (fork from a preloaded interpreter)
+    exec_mode = Column(String, default="subprocess")
+    use_browser_pool = Column(Boolean, default=False)  # Lease a pooled headless browser for each run
+    shard_count = Column(Integer, default=1)  # Each run fans out into N parallel shard executions
+    overlap_policy = Column(String, default="parallel")  # skip / queue / replace / parallel, enforced at dispatch
+    max_parallel = Column(Integer, nullable=True)  # parallel policy: concurrent runs of this task (None = scheduler_max_instances)
+    adaptive_timeout = Column(Boolean, nullable=True)  # Timeout from run history, capped by timeout (None = global default)
+    stall_timeout = Column(Integer, nullable=True)  # Stop after N seconds without output or CPU (None = global default, 0 = off)
+    stagger_window = Column(Integer, nullable=True)  # Cron/interval fire offset window in seconds (None = global mode, 0 = off)
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -57,5 +67,15 @@ class TaskExecution(Base):
     output = Column(Text, nullable=True) # Snippet of output
     max_cpu_percent = Column(Float, nullable=True)
     max_memory_mb = Column(Float, nullable=True)
+    revision = Column(String, nullable=True)  # Project revision the execution is pinned to
+    proxy_requests = Column(Integer, nullable=True)  # Requests made through the caching proxy
+    proxy_cache_hits = Column(Integer, nullable=True)
+    proxy_bytes = Column(Integer, nullable=True)  # Bytes fetched from the network through the proxy
+    parent_execution_id = Column(Integer, ForeignKey("task_executions.id"), nullable=True, index=True)  # Sharded run record
+    shard_index = Column(Integer, nullable=True)  # 0-based shard number, None for unsharded runs
+    root_execution_id = Column(Integer, nullable=True, index=True)  # First attempt of the logical run (shared checkpoint)
+    pid = Column(Integer, nullable=True)  # Process group leader, kept to reattach after a backend restart
+    pgid = Column(Integer, nullable=True)
+    process_started_at = Column(Float, nullable=True)  # Leader create time, tells a reused pid apart
     
     task = relationship("Task", back_populates="executions")
@@ -0,0 +1,177 @@
+"""
+执行性能分析 - 按任务统计耗时 / CPU / 内存分位数，推导自适应超时，检测性能退化
+
+- 自适应超时：任务开启 adaptive_timeout（或全局 KUMO_ADAPTIVE_TIMEOUT_ENABLED）且成功执行数达到
+  KUMO_ADAPTIVE_TIMEOUT_MIN_SAMPLES 时，超时取 成功耗时 P99 × KUMO_ADAPTIVE_TIMEOUT_FACTOR，
+  不低于 KUMO_ADAPTIVE_TIMEOUT_FLOOR，不超过任务配置的 timeout
+- 性能退化：最近 KUMO_REGRESSION_RECENT_RUNS 次成功执行的中位数，相对更早执行（基线）的中位数超过
+  KUMO_REGRESSION_RATIO 倍且差值超过各指标的最小变化量时标记
+"""
+import math
+import statistics
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.logging import get_logger
+from task_service import models
+
+logger = get_logger(__name__)
+
+DEFAULT_TIMEOUT = 3600
+METRICS = ("duration", "max_cpu_percent", "max_memory_mb")
+# Smallest absolute change worth reporting per metric (seconds, percent, MB)
+MIN_DELTA = {"duration": 5.0, "max_cpu_percent": 10.0, "max_memory_mb": 50.0}
+
+
+def quantile(values: List[float], q: float) -> Optional[float]:
+    """取分位数（最近秩法）；没有数据返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _successful_runs(db: Session, task_ids: Iterable[int], sharded: Optional[bool] = False) -> Dict[int, list]:
+    """各任务最近的成功执行（新的在前），每个任务最多 KUMO_PERFORMANCE_WINDOW 条"""
+    Execution = models.TaskExecution
+    task_ids = list(task_ids)
+    window = settings.performance_window
+    columns = (Execution.task_id, Execution.duration, Execution.max_cpu_percent, Execution.max_memory_mb)
+    filters = [
+        Execution.task_id.in_(task_ids),
+        Execution.status == "success",
+        Execution.duration.isnot(None),
+    ]
+    if sharded is not None:
+        filters.append(Execution.shard_index.isnot(None) if sharded else Execution.shard_index.is_(None))
+
+    if len(task_ids) == 1:
+        rows = db.query(*columns).filter(*filters).order_by(Execution.id.desc()).limit(window).all()
+    else:
+        # Keep only the newest `window` runs of each task in SQL instead of loading the full history
+        rank = func.row_number().over(partition_by=Execution.task_id, order_by=Execution.id.desc()).label("rank")
+        ranked = db.query(*columns, rank).filter(*filters).subquery()
+        rows = db.query(
+            ranked.c.task_id, ranked.c.duration, ranked.c.max_cpu_percent, ranked.c.max_memory_mb
+        ).filter(ranked.c.rank <= window).order_by(ranked.c.task_id, ranked.c.rank).all()
+
+    runs = defaultdict(list)
+    for row in rows:
+        runs[row.task_id].append(row)
+    return runs
+
+
+def adaptive_enabled(task) -> bool:
+    return task.adaptive_timeout if task.adaptive_timeout is not None else settings.adaptive_timeout_enabled
+
+
+def derive_timeout(task, durations: List[float]) -> Tuple[int, Optional[int]]:
+    """
+    按成功耗时推导有效超时
+
+    Returns:
+        (有效超时, 自适应超时)；未开启或样本不足时自适应超时为 None，有效超时为任务配置的超时
+    """
+    configured = task.timeout or DEFAULT_TIMEOUT
+    if not adaptive_enabled(task) or len(durations) < settings.adaptive_timeout_min_samples:
+        return configured, None
+    p99 = quantile(durations, settings.adaptive_timeout_quantile)
+    adaptive = int(math.ceil(max(settings.adaptive_timeout_floor, p99 * settings.adaptive_timeout_factor)))
+    return min(configured, adaptive), adaptive
+
+
+def effective_timeout(db: Session, task, sharded: bool = False) -> Tuple[int, bool]:
+    """
+    执行器使用的超时
+
+    Returns:
+        (超时秒数, 是否为自适应超时)
+    """
+    configured = task.timeout or DEFAULT_TIMEOUT
+    if not adaptive_enabled(task):
+        return configured, False
+    try:
+        runs = _successful_runs(db, [task.id], sharded).get(task.id, [])
+        timeout, adaptive = derive_timeout(task, [r.duration for r in runs])
+        return timeout, adaptive is not None and adaptive < configured
+    except Exception as e:
+        logger.error(f"Failed to derive adaptive timeout of task {task.id}: {e}")
+        return configured, False
+
+
+def detect_regressions(runs: list) -> List[dict]:
+    """
+    检测性能退化
+
+    Args:
+        runs: 最近的成功执行（新的在前）
+
+    Returns:
+        各退化指标的基线中位数、最近中位数和倍数
+    """
+    recent_count = settings.regression_recent_runs
+    recent, baseline = runs[:recent_count], runs[recent_count:]
+    if len(recent) < recent_count or len(baseline) < recent_count:
+        return []
+
+    regressions = []
+    for metric in METRICS:
+        recent_values = [getattr(r, metric) for r in recent if getattr(r, metric) is not None]
+        baseline_values = [getattr(r, metric) for r in baseline if getattr(r, metric) is not None]
+        if len(recent_values) < recent_count // 2 or len(baseline_values) < recent_count // 2:
+            continue
+        recent_median = statistics.median(recent_values)
+        baseline_median = statistics.median(baseline_values)
+        if recent_median - baseline_median < MIN_DELTA[metric]:
+            continue
+        ratio = recent_median / baseline_median if baseline_median > 0 else None
+        if ratio is None or ratio >= settings.regression_ratio:
+            regressions.append({
+                "metric": metric,
+                "baseline": round(baseline_median, 2),
+                "recent": round(recent_median, 2),
+                "ratio": round(ratio, 2) if ratio is not None else None,
+            })
+    return regressions
+
+
+def _percentiles(values: List[float]) -> Optional[dict]:
+    if not values:
+        return None
+    return {name: round(quantile(values, q), 2) for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}
+
+
+def task_performance(db: Session, task_id: Optional[int] = None) -> List[dict]:
+    """
+    各任务的性能报告：耗时 / CPU / 内存分位数、有效超时、性能退化
+
+    Args:
+        db: 数据库会话
+        task_id: 只分析指定任务（默认全部任务）
+    """
+    query = db.query(models.Task)
+    if task_id is not None:
+        query = query.filter(models.Task.id == task_id)
+    tasks = query.all()
+    runs_by_task = _successful_runs(db, [t.id for t in tasks])
+
+    report = []
+    for task in tasks:
+        runs = runs_by_task.get(task.id, [])
+        timeout, adaptive = derive_timeout(task, [r.duration for r in runs])
+        report.append({
+            "task_id": task.id,
+            "name": task.name,
+            "samples": len(runs),
+            "duration": _percentiles([r.duration for r in runs]),
+            "cpu_percent": _percentiles([r.max_cpu_percent for r in runs if r.max_cpu_percent is not None]),
+            "memory_mb": _percentiles([r.max_memory_mb for r in runs if r.max_memory_mb is not None]),
+            "configured_timeout": task.timeout or DEFAULT_TIMEOUT,
+            "adaptive_timeout": adaptive,
+            "effective_timeout": timeout,
+            "regressions": detect_regressions(runs),
+        })
+    return report
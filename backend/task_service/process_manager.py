@@ -1,16 +1,77 @@
 """
 进程管理模块 - 负责任务进程的启动、停止和进程组管理
+
+停止执行时按 KUMO_STOP_SEQUENCE（如 "SIGINT:5,SIGTERM:10,SIGKILL"）依次向进程组发送信号，
+每一步等待对应秒数后进程组仍存活才发送下一个信号，最后总以 SIGKILL 结束。
 """
 import os
+import sys
+import time
 import signal
 import subprocess
 import threading
 import psutil
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+from core.config import settings
 from core.logging import get_logger
 
 logger = get_logger(__name__)
 
+DEFAULT_STOP_SEQUENCE = [(signal.SIGTERM, 10.0), (signal.SIGKILL, 0.0)]
+EXIT_WRAPPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exit_wrapper.py")
+
+
+def wrap_command(args: List[str], exit_file: str) -> List[str]:
+    """通过退出码包装器运行命令，命令结束后退出码写入 exit_file"""
+    return [sys.executable, "-I", "-S", EXIT_WRAPPER, exit_file, *args]
+
+
+def exit_code_path(log_file: str) -> str:
+    """执行的退出码文件（与日志文件同目录同名）"""
+    return f"{os.path.splitext(log_file)[0]}.exit"
+
+
+def read_exit_code(path: str) -> Optional[int]:
+    """读取包装器记录的退出码，没有记录时为 None"""
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def process_fingerprint(pid: int) -> Optional[float]:
+    """进程的创建时间，与 pid 一起识别同一个进程（pid 会被复用）；进程不存在时为 None"""
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+
+def parse_stop_sequence(value: str) -> List[Tuple[signal.Signals, float]]:
+    """
+    解析停止序列
+
+    Args:
+        value: 逗号分隔的 "信号名:等待秒数"，如 "SIGINT:5,SIGTERM:10,SIGKILL"
+
+    Returns:
+        [(信号, 发送后等待秒数)]，最后一步不是 SIGKILL 时自动追加；格式错误时使用 SIGTERM:10,SIGKILL
+    """
+    steps = []
+    try:
+        for item in value.split(","):
+            name, _, grace = item.strip().partition(":")
+            name = name.strip().upper()
+            steps.append((signal.Signals[name if name.startswith("SIG") else f"SIG{name}"],
+                          max(0.0, float(grace) if grace.strip() else 0.0)))
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Invalid stop sequence {value!r} ({e}), using SIGTERM then SIGKILL")
+        return list(DEFAULT_STOP_SEQUENCE)
+    if not steps or steps[-1][0] != signal.SIGKILL:
+        steps.append((signal.SIGKILL, 0.0))
+    return steps
+
 
 class ProcessManager:
     """进程管理器 - 线程安全的单例"""
@@ -22,6 +83,9 @@ class ProcessManager:
     process_groups: Dict[int, int] = {}  # execution_id -> process group ID (pgid)
     execution_stats: Dict[int, dict] = {}  # execution_id -> {'max_cpu': 0.0, 'max_mem': 0.0}
     psutil_processes: Dict[int, psutil.Process] = {}  # execution_id -> psutil.Process (cached)
+    child_processes: Dict[int, Dict[int, psutil.Process]] = {}  # execution_id -> {pid: psutil.Process} (cached)
+    activity: Dict[int, dict] = {}  # execution_id -> {'log_file', 'stall_timeout', 'log_size', 'last_active'}
+    stop_reasons: Dict[int, str] = {}  # execution_id -> 'stopped' / 'stalled'
     
     # Maximum cache size to prevent memory leaks
     MAX_CACHE_SIZE = 1000
@@ -36,12 +100,30 @@ class ProcessManager:
                     cls._instance.process_groups = {}
                     cls._instance.execution_stats = {}
                     cls._instance.psutil_processes = {}
+                    cls._instance.child_processes = {}
+                    cls._instance.activity = {}
+                    cls._instance.stop_reasons = {}
         return cls._instance
 
-    def register_process(self, execution_id: int, process: subprocess.Popen):
-        """注册一个正在运行的进程"""
+    def register_process(self, execution_id: int, process: subprocess.Popen, log_file: str = None,
+                         stall_timeout: int = 0, wrapped: bool = False):
+        """
+        注册一个正在运行的进程
+
+        Args:
+            log_file: 执行的日志文件，卡死检测以其写入作为活动
+            stall_timeout: 无输出且 CPU 空闲超过此秒数时判定卡死，0 为不检测
+            wrapped: 进程是退出码包装器（exit_wrapper.py），资源监控改为采样其子进程（任务命令）
+        """
         self.running_processes[execution_id] = process
         self.process_groups[execution_id] = process.pid
+        self.activity[execution_id] = {
+            'log_file': log_file,
+            'stall_timeout': stall_timeout or 0,
+            'log_size': -1,
+            'last_active': time.time(),
+            'wrapped': wrapped,
+        }
         logger.debug(f"Registered process {process.pid} for execution {execution_id}")
 
     def unregister_process(self, execution_id: int):
@@ -52,38 +134,111 @@ class ProcessManager:
             del self.process_groups[execution_id]
         if execution_id in self.psutil_processes:
             del self.psutil_processes[execution_id]
+        self.child_processes.pop(execution_id, None)
+        self.activity.pop(execution_id, None)
+        self.stop_reasons.pop(execution_id, None)
         logger.debug(f"Unregistered process for execution {execution_id}")
 
-    def stop_execution(self, execution_id: int) -> bool:
+    def stop_execution(self, execution_id: int, reason: str = "stopped") -> bool:
         """
         终止一个正在运行的执行进程及其所有子进程。
-        使用进程组确保所有子进程都被终止。
+        使用进程组确保所有子进程都被终止：立即发送停止序列的第一个信号，
+        之后的升级在后台线程中进行，不阻塞调用方。
+
+        Args:
+            execution_id: 执行 ID
+            reason: 停止原因（stopped / stalled），执行器据此记录最终状态
         """
         if execution_id not in self.running_processes:
             return False
             
         process = self.running_processes[execution_id]
+        pgid = self.process_groups.get(execution_id)
+        sequence = parse_stop_sequence(settings.stop_sequence)
+        self.stop_reasons.setdefault(execution_id, reason)
         try:
-            # Kill the entire process group to ensure child processes are terminated
-            pgid = self.process_groups.get(execution_id)
-            if pgid:
-                try:
-                    # Kill the whole process group
-                    os.killpg(pgid, signal.SIGTERM)
-                    logger.info(f"Terminated process group {pgid} for execution {execution_id}")
-                except ProcessLookupError:
-                    # Process group may already be gone
-                    pass
-            else:
-                # Fallback to single process kill
-                process.terminate()
-                logger.info(f"Terminated execution {execution_id}")
-
-            return True
+            self._send_signal(execution_id, process, pgid, sequence[0][0])
         except Exception as e:
             logger.error(f"Failed to terminate execution {execution_id}: {e}")
             return False
 
+        if len(sequence) > 1:
+            threading.Thread(
+                target=self._escalate, args=(execution_id, process, pgid, sequence), daemon=True
+            ).start()
+        return True
+
+    def _send_signal(self, execution_id: int, process, pgid: Optional[int], sig: signal.Signals):
+        if pgid:
+            try:
+                # Signal the whole process group to reach child processes too
+                os.killpg(pgid, sig)
+                logger.info(f"Sent {sig.name} to process group {pgid} for execution {execution_id}")
+            except ProcessLookupError:
+                # Process group may already be gone
+                pass
+        elif process.poll() is None:
+            # Fallback to single process
+            process.send_signal(sig)
+            logger.info(f"Sent {sig.name} to execution {execution_id}")
+
+    @staticmethod
+    def _group_alive(process, pgid: Optional[int]) -> bool:
+        if not pgid:
+            return process.poll() is None
+        try:
+            os.killpg(pgid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def _escalate(self, execution_id: int, process, pgid: Optional[int], sequence: list):
+        """每一步等待宽限时间，进程组仍存活时发送下一个信号"""
+        for (_, grace), (next_sig, _) in zip(sequence, sequence[1:]):
+            deadline = time.monotonic() + grace
+            while self._group_alive(process, pgid) and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if not self._group_alive(process, pgid):
+                return
+            logger.warning(f"Execution {execution_id} still running after {grace:g}s, escalating to {next_sig.name}")
+            try:
+                self._send_signal(execution_id, process, pgid, next_sig)
+            except Exception as e:
+                logger.error(f"Failed to send {next_sig.name} to execution {execution_id}: {e}")
+
+    def get_stop_reason(self, execution_id: int) -> Optional[str]:
+        """执行被停止的原因（未被停止时为 None）"""
+        return self.stop_reasons.get(execution_id)
+
+    def record_activity(self, execution_id: int, cpu: float, now: float = None) -> float:
+        """
+        记录一次资源采样，日志有写入或 CPU 不低于空闲阈值时视为活动
+
+        Returns:
+            距上次活动的秒数
+        """
+        state = self.activity.get(execution_id)
+        if state is None:
+            return 0.0
+        now = now or time.time()
+        size = state['log_size']
+        if state['log_file']:
+            try:
+                size = os.path.getsize(state['log_file'])
+            except OSError:
+                pass
+        if size != state['log_size'] or cpu >= settings.stall_cpu_idle_percent:
+            state['last_active'] = now
+        state['log_size'] = size
+        return now - state['last_active']
+
+    def stall_timeout(self, execution_id: int) -> int:
+        """执行的卡死判定秒数，0 为不检测"""
+        state = self.activity.get(execution_id)
+        return state['stall_timeout'] if state else 0
+
     def get_process(self, execution_id: int) -> Optional[subprocess.Popen]:
         """获取执行 ID 对应的进程对象"""
         return self.running_processes.get(execution_id)
@@ -105,6 +260,12 @@ class ProcessManager:
             try:
                 pid = process.pid
                 p = psutil.Process(pid)
+                if self.activity.get(execution_id, {}).get('wrapped'):
+                    # Sample the task command, not the wrapper waiting for it
+                    children = p.children()
+                    if not children:
+                        return None
+                    p = children[0]
                 self.psutil_processes[execution_id] = p
                 # First call always returns 0.0, so we just prime it
                 p.cpu_percent(interval=None)
@@ -113,6 +274,36 @@ class ProcessManager:
                 return None
         return None
 
+    def tree_cpu_percent(self, execution_id: int, p: psutil.Process) -> float:
+        """
+        进程及其全部子孙进程的 CPU 使用率之和
+
+        cpu_percent 按同一对象的两次调用计算差值，子进程的 psutil 对象按 pid 缓存，
+        新出现的子进程本次只做初始化（计 0），下次采样起计入。
+        """
+        total = p.cpu_percent(interval=None)
+        try:
+            children = p.children(recursive=True)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            children = []
+
+        cached = self.child_processes.get(execution_id, {})
+        current = {}
+        for child in children:
+            known = cached.get(child.pid)
+            # psutil compares pid and creation time, a reused pid is a new process
+            if known is not None and known == child:
+                child = known
+            try:
+                cpu = child.cpu_percent(interval=None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            if child is known:
+                total += cpu
+            current[child.pid] = child
+        self.child_processes[execution_id] = current
+        return total
+
     def update_stats(self, execution_id: int, cpu: float, mem_mb: float):
         """更新执行统计信息"""
         if execution_id not in self.execution_stats:
@@ -153,6 +344,8 @@ class ProcessManager:
             stale_psutil = [exec_id for exec_id in psutil_keys if exec_id not in running_ids]
             for exec_id in stale_psutil:
                 self.psutil_processes.pop(exec_id, None)
+            for exec_id in [k for k in self.child_processes if k not in running_ids]:
+                self.child_processes.pop(exec_id, None)
 
             # Hard limit: if caches are too large, remove oldest entries (LRU-like)
             # 使用更智能的清理策略：保留最近使用的条目
@@ -164,6 +357,7 @@ class ProcessManager:
                 for k in keys_to_remove:
                     self.execution_stats.pop(k, None)
                     self.psutil_processes.pop(k, None)
+                    self.child_processes.pop(k, None)
                 
                 logger.debug(f"Cleaned up {remove_count} old cache entries")
         except Exception as e:
@@ -0,0 +1,268 @@
+"""
+爬虫限速协调器 - 在所有任务执行之间共享的令牌桶
+
+每个限速键（通常是域名）对应一个令牌桶，任务进程通过注入的客户端
+（runtime/kumo_ratelimit.py）向后端内的本地服务申请许可。
+申请采用预约语义：协调器立即扣减令牌并返回需要等待的时间，客户端自行 sleep，
+服务端不持有等待中的连接，多个执行对同一站点的总速率因此被全局限制。
+
+限速规则来源（优先级从高到低）：
+1. 系统配置 `rate_limit.rules`（JSON，如 {"example.com": {"rate": 2, "burst": 4}}），
+   规则键同时匹配其子域名，子域名共享同一个桶；
+2. 客户端随申请携带的速率（来自任务的 MAX_REQUESTS_PER_SECOND / REQUEST_INTERVAL_MS），
+   不同执行声明的速率不一致时取最保守的值；声明在该执行最近一次申请后 DECLARATION_TTL 秒内有效，
+   声明过的执行都不再活跃时限速恢复；
+3. 配置项 rate_limit_default_rps，0 表示不限速（仍记录统计）。
+"""
+import json
+import time
+import threading
+from typing import Dict, Optional, Tuple
+from core.config import settings
+from core.database import SessionLocal
+from core.local_service import LocalJSONService, LocalServiceError
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+RULES_CONFIG_KEY = "rate_limit.rules"
+MAX_TRACKED_EXECUTIONS = 50
+# A client-declared limit stays in force this long after the declaring execution's last request
+DECLARATION_TTL = 60.0
+
+
+class TokenBucket:
+    """支持预约的令牌桶，令牌可以为负数表示已被预约的未来额度"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, tokens: float, max_wait: Optional[float] = None, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        预约令牌
+
+        Returns:
+            (是否预约成功, 需要等待的秒数)；等待时间超过 max_wait 时不扣减令牌
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        remaining = self.tokens - tokens
+        wait = 0.0 if remaining >= 0 else -remaining / self.rate
+        if max_wait is not None and wait > max_wait:
+            return False, wait
+        self.tokens = remaining
+        return True, wait
+
+    def set_limit(self, rate: float, burst: float):
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = min(self.tokens, self.burst)
+
+
+class RateLimitCoordinator:
+    """限速协调器 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(RateLimitCoordinator, cls).__new__(cls)
+                    cls._instance._buckets = {}
+                    cls._instance._stats = {}
+                    cls._instance._rules = {}
+                    cls._instance._declared = {}
+                    cls._instance._state_lock = threading.Lock()
+                    cls._instance.service = None
+        return cls._instance
+
+    # ---------- 规则 ----------
+
+    def set_rules(self, rules: Dict[str, dict]):
+        """替换全部规则，已存在的桶按新规则调整"""
+        normalized = {}
+        for key, rule in (rules or {}).items():
+            rate = float(rule.get("rate", 0))
+            if rate <= 0:
+                raise ValueError(f"Rate limit rule for '{key}' must have a positive rate")
+            normalized[key.lower()] = {"rate": rate, "burst": float(rule.get("burst", max(rate, 1.0)))}
+        with self._state_lock:
+            for key in set(self._rules) - set(normalized):
+                self._buckets.pop(key, None)
+            self._rules = normalized
+            for key, rule in normalized.items():
+                if key in self._buckets:
+                    self._buckets[key].set_limit(rule["rate"], rule["burst"])
+
+    def load_rules(self):
+        """从系统配置加载规则"""
+        from system_service import models as system_models
+
+        db = SessionLocal()
+        try:
+            config = db.query(system_models.SystemConfig).filter(
+                system_models.SystemConfig.key == RULES_CONFIG_KEY
+            ).first()
+            rules = json.loads(config.value) if config and config.value else {}
+            self.set_rules(rules)
+            logger.info(f"Loaded {len(rules)} rate limit rules")
+        except Exception as e:
+            logger.error(f"Failed to load rate limit rules: {e}")
+        finally:
+            db.close()
+
+    def _match_rule(self, key: str) -> Tuple[str, Optional[dict]]:
+        """规则键匹配自身及子域名，返回 (桶键, 规则)"""
+        parts = key.split(".")
+        for i in range(len(parts)):
+            candidate = ".".join(parts[i:])
+            if candidate in self._rules:
+                return candidate, self._rules[candidate]
+        return key, None
+
+    # ---------- 申请 ----------
+
+    def _declared_limit(self, bucket_key: str, declarer: str, rate: Optional[float], burst: Optional[float],
+                        now: float) -> Tuple[Optional[float], Optional[float]]:
+        """记录客户端声明的速率，返回近期仍活跃的声明中最保守的 (rate, burst)；没有活跃声明时返回 (None, None)"""
+        declared = self._declared.setdefault(bucket_key, {})
+        if rate and rate > 0:
+            declared[declarer] = (rate, burst if burst and burst > 0 else max(rate, 1.0), now)
+        for name in [name for name, (_, _, seen_at) in declared.items() if now - seen_at > DECLARATION_TTL]:
+            del declared[name]
+        if not declared:
+            self._declared.pop(bucket_key, None)
+            return None, None
+        return min(r for r, _, _ in declared.values()), min(b for _, b, _ in declared.values())
+
+    def acquire(self, key: str, tokens: float = 1.0, rate: Optional[float] = None, burst: Optional[float] = None,
+                max_wait: Optional[float] = None, execution_id: Optional[int] = None) -> dict:
+        key = (key or "").strip().lower()
+        if not key:
+            raise LocalServiceError("key is required")
+        if tokens <= 0:
+            raise LocalServiceError("tokens must be positive")
+        max_wait = settings.rate_limit_max_wait if max_wait is None else max_wait
+
+        with self._state_lock:
+            bucket_key, rule = self._match_rule(key)
+            if rule:
+                rate, burst = rule["rate"], rule["burst"]
+            else:
+                # Executions without an ID are told apart by the limit they declare
+                declarer = str(execution_id) if execution_id is not None else f"anonymous:{rate}:{burst}"
+                rate, burst = self._declared_limit(bucket_key, declarer, rate, burst, time.monotonic())
+                if rate is None:
+                    rate = settings.rate_limit_default_rps
+                    burst = None
+
+            stats = self._stats.setdefault(bucket_key, {
+                "granted": 0, "denied": 0, "tokens": 0.0, "total_wait": 0.0, "max_wait": 0.0,
+                "last_at": None, "executions": {},
+            })
+
+            if not rate or rate <= 0:
+                granted, wait = True, 0.0
+                stats["rate"] = None
+            else:
+                burst = burst if burst and burst > 0 else max(rate, 1.0)
+                bucket = self._buckets.get(bucket_key)
+                if bucket is None:
+                    bucket = self._buckets[bucket_key] = TokenBucket(rate, burst)
+                elif not rule and (rate != bucket.rate or burst != bucket.burst):
+                    # The most conservative active declaration changed (or all of them lapsed)
+                    bucket.set_limit(rate, burst)
+                granted, wait = bucket.reserve(tokens, max_wait)
+                stats["rate"], stats["burst"] = bucket.rate, bucket.burst
+
+            stats["last_at"] = time.time()
+            if granted:
+                stats["granted"] += 1
+                stats["tokens"] += tokens
+                stats["total_wait"] += wait
+                stats["max_wait"] = max(stats["max_wait"], wait)
+                if execution_id is not None:
+                    executions = stats["executions"]
+                    executions[str(execution_id)] = executions.get(str(execution_id), 0) + 1
+                    if len(executions) > MAX_TRACKED_EXECUTIONS:
+                        executions.pop(next(iter(executions)))
+            else:
+                stats["denied"] += 1
+
+        return {"granted": granted, "wait": round(wait, 4), "key": bucket_key}
+
+    def stats(self) -> dict:
+        with self._state_lock:
+            keys = {}
+            for key, item in self._stats.items():
+                bucket = self._buckets.get(key)
+                keys[key] = {
+                    **item,
+                    "executions": dict(item["executions"]),
+                    "avg_wait": round(item["total_wait"] / item["granted"], 4) if item["granted"] else 0.0,
+                    "available_tokens": round(bucket.tokens, 3) if bucket else None,
+                }
+            return {
+                "running": bool(self.service and self.service.running),
+                "url": self.service.url if self.service else None,
+                "rules": dict(self._rules),
+                "keys": keys,
+            }
+
+    def reset(self):
+        with self._state_lock:
+            self._buckets.clear()
+            self._stats.clear()
+            self._declared.clear()
+
+    # ---------- 本地服务 ----------
+
+    def _handle_acquire(self, payload: dict, query: dict):
+        return 200, self.acquire(
+            key=payload.get("key"),
+            tokens=float(payload.get("tokens", 1)),
+            rate=float(payload["rate"]) if payload.get("rate") else None,
+            burst=float(payload["burst"]) if payload.get("burst") else None,
+            max_wait=float(payload["max_wait"]) if payload.get("max_wait") is not None else None,
+            execution_id=payload.get("execution_id"),
+        )
+
+    def _handle_stats(self, payload: dict, query: dict):
+        return 200, self.stats()
+
+    def start(self):
+        """启动本地协调服务（后端启动时调用）"""
+        if not settings.rate_limit_enabled or (self.service and self.service.running):
+            return
+        self.load_rules()
+        self.service = LocalJSONService("rate-limit-coordinator")
+        self.service.route("POST", "/acquire", self._handle_acquire)
+        self.service.route("GET", "/stats", self._handle_stats)
+        self.service.start()
+
+    def stop(self):
+        if self.service:
+            self.service.stop()
+
+    def client_env(self, execution_id: int) -> Dict[str, str]:
+        """注入任务进程的客户端连接信息"""
+        if not (self.service and self.service.running):
+            return {}
+        return {
+            "KUMO_RATE_LIMIT_URL": self.service.url,
+            "KUMO_RATE_LIMIT_TOKEN": self.service.token,
+            "KUMO_EXECUTION_ID": str(execution_id),
+        }
+
+
+# 全局单例
+rate_limit_coordinator = RateLimitCoordinator()
@@ -0,0 +1,355 @@
+"""
+重启后重新接管执行 - 后端启动时对账上次进程遗留的 running 执行
+
+执行启动后记录进程组首进程的 pid / pgid 和创建时间（指纹，识别被复用的 pid），命令经 exit_wrapper.py
+运行并把退出码写入 <日志文件名>.exit。启动时：
+- 进程仍存活且指纹一致：重新接管。注册到 ProcessManager（资源监控、卡死检测、停止接口照常生效），
+  计入并发许可和重叠策略，超过剩余超时时间后按停止序列终止；日志仍写入原文件，实时日志照常可读。
+  限速 / 去重服务和缓存代理沿用上次的端口和令牌（须在对账前启动），缓存代理按执行 ID 重新登记
+- 进程已结束：按记录的退出码标记 success / failed，没有退出码时标记为 failed 并注明
+- 接管的执行结束后照常计入熔断、调度重试（从断点继续）、触发下游任务；分片父执行在所有分片结束后汇总
+"""
+import os
+import json
+import time
+import signal
+import datetime
+import threading
+from typing import Optional
+import psutil
+from core.config import settings
+from core.database import SessionLocal
+from core.logging import get_logger
+from core.concurrency import concurrency_controller
+from task_service import models
+from task_service.process_manager import (
+    process_manager, EXIT_WRAPPER, exit_code_path, read_exit_code, process_fingerprint
+)
+from task_service.dispatcher import task_dispatcher
+from task_service.checkpoints import remove_checkpoint
+from task_service.performance import effective_timeout
+from task_service.task_executor import _apply_outcome, _proxy_settings, aggregate_shard_executions
+from task_service.task_manager import task_manager
+from task_service.caching_proxy import caching_proxy
+from project_service import models as project_models
+
+logger = get_logger(__name__)
+
+FINGERPRINT_TOLERANCE = 0.01  # 秒
+
+
+class AdoptedProcess:
+    """重新接管的进程（不是后端的子进程，无法 wait），提供 ProcessManager 和资源监控用到的 Popen 接口"""
+
+    def __init__(self, pid: int, started_at: Optional[float], exit_file: Optional[str]):
+        self.pid = pid
+        self.started_at = started_at
+        self.exit_file = exit_file
+        self.returncode = None
+        self.exit_known = False
+        self._ended = False
+
+    def alive(self) -> bool:
+        """pid 仍指向启动时的同一个进程，且尚未退出"""
+        fingerprint = process_fingerprint(self.pid)
+        if fingerprint is None or self.started_at is None:
+            return False
+        if abs(fingerprint - self.started_at) > FINGERPRINT_TOLERANCE:
+            return False
+        try:
+            return psutil.Process(self.pid).status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    @property
+    def wrapped(self) -> bool:
+        """进程是否为退出码包装器（任务命令是它的子进程）"""
+        try:
+            return EXIT_WRAPPER in psutil.Process(self.pid).cmdline()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    def poll(self) -> Optional[int]:
+        if not self._ended and not self.alive():
+            self._ended = True
+            code = read_exit_code(self.exit_file) if self.exit_file else None
+            self.exit_known = code is not None
+            # Unknown exit codes read as a failure
+            self.returncode = code if code is not None else -1
+        return self.returncode if self._ended else None
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            try:
+                os.killpg(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ExecutionReattacher:
+    """执行重新接管 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ExecutionReattacher, cls).__new__(cls)
+                    cls._instance._adopted = {}  # execution_id -> {'task_id', 'process', 'deadline'}
+                    cls._instance._parents = set()  # Sharded parent executions waiting for their shards
+                    cls._instance._state_lock = threading.Lock()
+                    cls._instance._stop_event = threading.Event()
+                    cls._instance._thread = None
+        return cls._instance
+
+    def reconcile(self, finish: bool = True) -> dict:
+        """
+        对账上次进程遗留的 running 执行
+
+        启动时分两次调用：分发队列和调度器启动前以 finish=False 接管仍存活的执行（先占用并发许可和重叠策略计数），
+        任务加载后再次调用，记录已结束执行的结果（熔断、重试、下游触发需要调度器和事件触发器）。
+
+        Args:
+            finish: 是否记录已结束的执行和汇总分片父执行
+
+        Returns:
+            {"adopted": 重新接管数, "finished": 已结束并记录结果数}
+        """
+        adopted = finished = 0
+        db = SessionLocal()
+        try:
+            running = db.query(models.TaskExecution).filter(models.TaskExecution.status == "running").all()
+            for execution in running:
+                with self._state_lock:
+                    known = execution.id in self._adopted or execution.id in self._parents
+                if known or execution.id in process_manager.running_processes:
+                    continue
+                if not finish and (execution.pid is None or execution.process_started_at is None):
+                    continue
+                if execution.pid is None and db.query(models.TaskExecution.id).filter(
+                    models.TaskExecution.parent_execution_id == execution.id
+                ).first():
+                    # Sharded parent, it has no process of its own
+                    with self._state_lock:
+                        self._parents.add(execution.id)
+                    continue
+
+                process = None
+                if execution.pid is not None:
+                    exit_file = exit_code_path(execution.log_file) if execution.log_file else None
+                    process = AdoptedProcess(execution.pid, execution.process_started_at, exit_file)
+                if process is not None and process.poll() is None:
+                    self._adopt(db, execution, process)
+                    adopted += 1
+                elif finish:
+                    self._finalize(db, execution, process)
+                    finished += 1
+        except Exception as e:
+            logger.error(f"Failed to reconcile running executions: {e}", exc_info=True)
+        finally:
+            db.close()
+
+        if finish:
+            self._aggregate_parents()
+        if adopted or finished:
+            logger.info(f"Reconciled executions left by the previous run: {adopted} reattached, {finished} finished")
+        with self._state_lock:
+            pending = bool(self._adopted or self._parents)
+        if pending:
+            self.start()
+        return {"adopted": adopted, "finished": finished}
+
+    def start(self):
+        """启动接管线程：检查接管的执行是否结束或超时"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="execution-reattacher", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def adopted(self) -> list:
+        """当前接管中的执行 ID"""
+        with self._state_lock:
+            return list(self._adopted)
+
+    def _adopt(self, db, execution, process: AdoptedProcess):
+        task = db.query(models.Task).filter(models.Task.id == execution.task_id).first()
+        stall_timeout = 0
+        deadline = None
+        if task:
+            stall_timeout = task.stall_timeout if task.stall_timeout is not None else settings.stall_timeout
+            timeout, _ = effective_timeout(db, task, sharded=execution.shard_index is not None)
+            started = execution.start_time.timestamp() if execution.start_time else time.time()
+            deadline = started + timeout
+
+        process_manager.register_process(execution.id, process, execution.log_file, stall_timeout, process.wrapped)
+        self._register_proxy(db, task, execution)
+        # The process is already running, it counts against the limit even when that overshoots it
+        concurrency_controller.force_acquire()
+        task_dispatcher.adopt_run(execution.task_id)
+        with self._state_lock:
+            self._adopted[execution.id] = {
+                "task_id": execution.task_id,
+                "process": process,
+                "deadline": deadline,
+            }
+        logger.info(f"Reattached execution {execution.id} of task {execution.task_id} (pid {process.pid})")
+
+    def _register_proxy(self, db, task, execution):
+        """缓存代理的执行上下文在内存中，重新登记后进程启动时注入的代理凭据恢复有效"""
+        try:
+            upstream, cache_proxy_enabled = _proxy_settings(db)
+            if not cache_proxy_enabled or not task or not task.project_id:
+                return
+            project = db.query(project_models.Project).filter(project_models.Project.id == task.project_id).first()
+            if not project:
+                return
+            policy = json.loads(project.cache_policy) if project.cache_policy else None
+            caching_proxy.register_execution(execution.id, project.id, policy, upstream)
+        except Exception as e:
+            logger.error(f"Could not re-register reattached execution {execution.id} with the caching proxy: {e}")
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(settings.reattach_poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error checking reattached executions: {e}", exc_info=True)
+            with self._state_lock:
+                if not self._adopted and not self._parents:
+                    break
+
+    def check(self):
+        """结束已退出的接管执行，终止超时的接管执行，汇总分片都已结束的父执行"""
+        with self._state_lock:
+            entries = list(self._adopted.items())
+        for execution_id, entry in entries:
+            process = entry["process"]
+            if process.poll() is None:
+                if entry["deadline"] and time.time() > entry["deadline"] \
+                        and not process_manager.get_stop_reason(execution_id):
+                    logger.warning(f"Reattached execution {execution_id} exceeded its timeout, stopping it")
+                    process_manager.stop_execution(execution_id, reason="timeout")
+                continue
+            self._complete(execution_id, entry)
+        self._aggregate_parents()
+
+    def _complete(self, execution_id: int, entry: dict):
+        with self._state_lock:
+            self._adopted.pop(execution_id, None)
+        reason = process_manager.get_stop_reason(execution_id)
+        db = SessionLocal()
+        try:
+            execution = db.query(models.TaskExecution).filter(models.TaskExecution.id == execution_id).first()
+            if execution:
+                self._finalize(db, execution, entry["process"], reason)
+        except Exception as e:
+            logger.error(f"Failed to finish reattached execution {execution_id}: {e}", exc_info=True)
+        finally:
+            db.close()
+            process_manager.unregister_process(execution_id)
+            process_manager.cleanup_stats(execution_id)
+            caching_proxy.unregister_execution(execution_id)
+            task_dispatcher.finish_run(entry["task_id"])
+            concurrency_controller.release()
+
+    def _finalize(self, db, execution, process: Optional[AdoptedProcess], reason: Optional[str] = None):
+        """记录已结束执行的最终状态，并照常计入熔断 / 重试 / 下游触发"""
+        db.refresh(execution)
+        note = None
+        if execution.status == "running":
+            if reason in ("stalled", "timeout"):
+                execution.status = reason
+                note = f"[System] Reattached run stopped: {reason}"
+            elif process is None:
+                execution.status = "failed"
+                note = "[System] Backend restarted, the process of this run was not tracked"
+            else:
+                process.poll()
+                if process.exit_known:
+                    execution.status = "success" if process.returncode == 0 else "failed"
+                    note = f"[System] Finished while detached, exit code {process.returncode}"
+                else:
+                    execution.status = "failed"
+                    note = "[System] Finished while detached, exit code unknown"
+
+        execution.end_time = datetime.datetime.now()
+        if execution.start_time:
+            execution.duration = (execution.end_time - execution.start_time).total_seconds()
+        stats = process_manager.get_stats(execution.id)
+        if stats:
+            execution.max_cpu_percent = max(execution.max_cpu_percent or 0.0, stats.get('max_cpu') or 0.0)
+            execution.max_memory_mb = max(execution.max_memory_mb or 0.0, stats.get('max_mem') or 0.0)
+        if execution.log_file:
+            try:
+                with open(execution.log_file, "r", encoding="utf-8", errors="replace") as f:
+                    execution.output = f.read(4096)
+            except OSError:
+                pass
+        if note:
+            execution.output = (execution.output or "") + f"\n{note}"
+        db.commit()
+
+        if process is not None and process.exit_file:
+            try:
+                os.remove(process.exit_file)
+            except OSError:
+                pass
+
+        task = db.query(models.Task).filter(models.Task.id == execution.task_id).first()
+        if not task:
+            return
+        if execution.status == "success":
+            remove_checkpoint(task.id, execution.root_execution_id)
+        if execution.shard_index is None:
+            _apply_outcome(db, task, execution, execution.attempt or 1, task_manager.scheduler)
+        elif execution.parent_execution_id:
+            with self._state_lock:
+                self._parents.add(execution.parent_execution_id)
+
+    def _aggregate_parents(self):
+        """分片全部结束的父执行汇总结果（分片不再重试）"""
+        with self._state_lock:
+            parents = list(self._parents)
+        if not parents:
+            return
+        db = SessionLocal()
+        try:
+            for parent_id in parents:
+                running = db.query(models.TaskExecution.id).filter(
+                    models.TaskExecution.parent_execution_id == parent_id,
+                    models.TaskExecution.status.in_(["running", "pending"]),
+                ).first()
+                if running:
+                    continue
+                with self._state_lock:
+                    self._parents.discard(parent_id)
+                parent = db.query(models.TaskExecution).filter(models.TaskExecution.id == parent_id).first()
+                if not parent or parent.status != "running":
+                    continue
+                task = db.query(models.Task).filter(models.Task.id == parent.task_id).first()
+                if not task:
+                    continue
+                aggregate_shard_executions(db, parent, task.shard_count or 1)
+                _apply_outcome(db, task, parent, parent.attempt or 1, None)
+        except Exception as e:
+            logger.error(f"Failed to aggregate shards of reattached executions: {e}", exc_info=True)
+        finally:
+            db.close()
+
+
+# 全局单例
+execution_reattacher = ExecutionReattacher()
@@ -1,5 +1,8 @@
 """
 资源监控模块 - 负责监控任务执行的 CPU 和内存使用情况
+
+同时作为卡死检测：执行的日志文件没有写入且进程树（含子孙进程）的 CPU 使用率之和低于
+KUMO_STALL_CPU_IDLE_PERCENT 持续超过任务的 stall_timeout 时，按停止序列终止进程组并记录为 stalled。
 """
 import time
 import threading
@@ -59,6 +62,7 @@ class ResourceMonitor:
                 for cid in cached_ids:
                     if cid not in process_manager.running_processes:
                         del process_manager.psutil_processes[cid]
+                        process_manager.child_processes.pop(cid, None)
 
                 # Collect updates for batch processing
                 updates_needed = []
@@ -75,13 +79,15 @@ class ResourceMonitor:
                                 continue
                             
                             # Get stats (cpu_percent needs interval=None to be non-blocking)
-                            # Subsequent calls on the SAME object return valid delta
-                            cpu = p.cpu_percent(interval=None)
+                            # Subsequent calls on the SAME object return valid delta; child
+                            # processes count too, a crawler often works in spawned workers
+                            cpu = process_manager.tree_cpu_percent(exec_id, p)
                             mem_info = p.memory_info()
                             mem_mb = mem_info.rss / (1024 * 1024)
                             
                             # Update stats
                             process_manager.update_stats(exec_id, cpu, mem_mb)
+                            self._check_stall(exec_id, cpu, now)
                             
                             # Collect updates for batch processing
                             stats = process_manager.get_stats(exec_id)
@@ -138,6 +144,15 @@ class ResourceMonitor:
                 
             time.sleep(settings.resource_monitor_interval)
 
+    def _check_stall(self, exec_id: int, cpu: float, now: float) -> bool:
+        """记录活动，无输出且 CPU 空闲超过 stall_timeout 时停止执行"""
+        idle = process_manager.record_activity(exec_id, cpu, now)
+        stall_timeout = process_manager.stall_timeout(exec_id)
+        if not stall_timeout or idle < stall_timeout or process_manager.get_stop_reason(exec_id):
+            return False
+        logger.warning(f"Execution {exec_id} stalled: no output and idle CPU for {int(idle)}s, stopping it")
+        return process_manager.stop_execution(exec_id, reason="stalled")
+
 
 # 全局单例实例
 resource_monitor = ResourceMonitor()
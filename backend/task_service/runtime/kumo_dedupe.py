@@ -0,0 +1,87 @@
+"""
+Kumo URL 去重客户端（由 Kumo 注入任务的 PYTHONPATH，仅依赖标准库）
+
+用法:
+    import kumo_dedupe
+
+    new_urls = kumo_dedupe.filter_new(urls)          # 返回未见过的 URL，并标记为已见
+    seen = kumo_dedupe.check_add(urls)               # 每个 URL 是否已见过（同时加入）
+    kumo_dedupe.seen("https://example.com/a")        # 只查询，不加入
+
+默认命名空间为当前任务（KUMO_DEDUPE_NAMESPACE），同一任务的并发执行共享去重状态；
+传入 namespace 可在多个任务之间共享。基于布隆过滤器，存在极小的误判（把新 URL 判为已见）。
+服务不可用时退化为进程内集合。
+"""
+import os
+import sys
+import json
+import urllib.request
+import urllib.error
+
+__all__ = ["check_add", "check", "filter_new", "seen"]
+
+BATCH_SIZE = 5000
+
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+_fallback = {}
+_warned = False
+
+
+def _call(endpoint, namespace, items):
+    url = os.environ.get("KUMO_DEDUPE_URL")
+    if not url:
+        raise OSError("KUMO_DEDUPE_URL is not set")
+    request = urllib.request.Request(
+        url.rstrip("/") + endpoint,
+        data=json.dumps({"namespace": namespace, "items": items}).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Kumo-Token": os.environ.get("KUMO_DEDUPE_TOKEN", "")},
+    )
+    with _opener.open(request, timeout=30) as response:
+        return json.loads(response.read())["seen"]
+
+
+def _local(namespace, items, add):
+    global _warned
+    if not _warned:
+        print("[kumo_dedupe] dedupe service unavailable, using an in-process set", file=sys.stderr)
+        _warned = True
+    known = _fallback.setdefault(namespace, set())
+    result = []
+    for item in items:
+        result.append(item in known)
+        if add:
+            known.add(item)
+    return result
+
+
+def _run(endpoint, items, namespace, add):
+    items = [str(i) for i in items]
+    namespace = namespace or os.environ.get("KUMO_DEDUPE_NAMESPACE") or "default"
+    result = []
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        try:
+            result.extend(_call(endpoint, namespace, batch))
+        except (urllib.error.URLError, OSError, ValueError, KeyError):
+            result.extend(_local(namespace, batch, add))
+    return result
+
+
+def check_add(items, namespace=None):
+    """批量查询并加入，返回每个元素此前是否已存在"""
+    return _run("/check_add", items, namespace, add=True)
+
+
+def check(items, namespace=None):
+    """批量查询（不加入）"""
+    return _run("/check", items, namespace, add=False)
+
+
+def filter_new(items, namespace=None):
+    """返回此前未见过的元素（保持顺序），并将其标记为已见"""
+    items = list(items)
+    return [item for item, was_seen in zip(items, check_add(items, namespace)) if not was_seen]
+
+
+def seen(item, namespace=None):
+    return check([item], namespace)[0]
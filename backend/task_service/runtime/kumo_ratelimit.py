@@ -0,0 +1,115 @@
+"""
+Kumo 全局限速客户端（由 Kumo 注入任务的 PYTHONPATH，仅依赖标准库）
+
+用法:
+    import kumo_ratelimit
+
+    kumo_ratelimit.acquire("https://example.com/page/1")   # 按域名限速
+    kumo_ratelimit.acquire("search-api", tokens=2)         # 自定义限速键
+
+    @kumo_ratelimit.limited("example.com")
+    def fetch(url): ...
+
+同一限速键的许可在所有任务执行之间共享。默认速率取任务配置的
+MAX_REQUESTS_PER_SECOND / REQUEST_INTERVAL_MS；协调器不可用时退化为进程内限速。
+"""
+import os
+import json
+import time
+import threading
+import functools
+import urllib.request
+import urllib.error
+from urllib.parse import urlsplit
+
+__all__ = ["acquire", "limited", "RateLimitTimeout"]
+
+_local_lock = threading.Lock()
+# The coordinator is on localhost, never route it through http_proxy
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+_local_next = {}
+
+
+class RateLimitTimeout(Exception):
+    """等待许可的时间超过 max_wait"""
+    pass
+
+
+def _default_rate():
+    rps = float(os.environ.get("MAX_REQUESTS_PER_SECOND") or 0)
+    interval_ms = float(os.environ.get("REQUEST_INTERVAL_MS") or 0)
+    rates = [r for r in (rps, 1000.0 / interval_ms if interval_ms > 0 else 0) if r > 0]
+    return min(rates) if rates else None
+
+
+def _normalize_key(key):
+    if "://" in key:
+        return (urlsplit(key).hostname or key).lower()
+    return key.lower()
+
+
+def _local_wait(key, tokens, rate):
+    """协调器不可用时的进程内限速"""
+    if not rate:
+        return 0.0
+    with _local_lock:
+        now = time.monotonic()
+        start = max(now, _local_next.get(key, now))
+        _local_next[key] = start + tokens / rate
+    return start - now
+
+
+def acquire(key, tokens=1, rate=None, burst=None, max_wait=None):
+    """
+    申请限速许可，必要时阻塞等待
+
+    Args:
+        key: 限速键，URL 会自动取域名
+        tokens: 本次消耗的令牌数
+        rate / burst: 期望速率（每秒）与突发量，默认取任务配置；系统规则优先
+        max_wait: 最长等待秒数，超过时抛出 RateLimitTimeout 且不消耗令牌
+
+    Returns:
+        实际等待的秒数
+    """
+    key = _normalize_key(key)
+    rate = rate or _default_rate()
+    url = os.environ.get("KUMO_RATE_LIMIT_URL")
+
+    wait = None
+    if url:
+        payload = {"key": key, "tokens": tokens, "rate": rate, "burst": burst, "max_wait": max_wait,
+                   "execution_id": os.environ.get("KUMO_EXECUTION_ID")}
+        request = urllib.request.Request(
+            url.rstrip("/") + "/acquire",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-Kumo-Token": os.environ.get("KUMO_RATE_LIMIT_TOKEN", "")},
+        )
+        try:
+            with _opener.open(request, timeout=10) as response:
+                result = json.loads(response.read())
+            if not result["granted"]:
+                raise RateLimitTimeout(f"Rate limit for '{key}' needs {result['wait']:.2f}s (max_wait={max_wait})")
+            wait = result["wait"]
+        except (urllib.error.URLError, OSError, ValueError, KeyError):
+            wait = None
+
+    if wait is None:
+        wait = _local_wait(key, tokens, rate)
+        if max_wait is not None and wait > max_wait:
+            raise RateLimitTimeout(f"Rate limit for '{key}' needs {wait:.2f}s (max_wait={max_wait})")
+
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+
+def limited(key, tokens=1, **kwargs):
+    """装饰器：每次调用前申请许可"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            acquire(key, tokens, **kwargs)
+            return func(*args, **kw)
+        return wrapper
+    return decorator
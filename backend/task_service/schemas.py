@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Any, Literal
 from datetime import datetime
 import json
 
@@ -28,6 +28,16 @@ class TaskBase(BaseModel):
     max_cpu_percent: Optional[int] = 0  # CPU限制百分比，0表示不限制
     max_memory_mb: Optional[int] = 0  # 内存限制MB，0表示不限制
 
+    # Execution mode
+    exec_mode: Optional[Literal["subprocess", "warm"]] = "subprocess"  # warm: 从预热解释器 fork 运行
+    use_browser_pool: Optional[bool] = False  # 运行时租用共享浏览器池中的浏览器
+    shard_count: Optional[int] = Field(1, ge=1, le=256)  # 每次运行拆分为 N 个并行分片
+    overlap_policy: Optional[Literal["skip", "queue", "replace", "parallel"]] = "parallel"  # 上一次运行未结束时新触发的处理方式
+    max_parallel: Optional[int] = Field(None, ge=1, le=256)  # parallel 策略下同时运行数上限，空为全局默认
+    stagger_window: Optional[int] = Field(None, ge=0, le=3600)  # 定时错峰窗口（秒），空为全局设置，0 为不错峰
+    adaptive_timeout: Optional[bool] = None  # 按历史耗时推导超时（不超过 timeout），空为全局设置
+    stall_timeout: Optional[int] = Field(None, ge=0, le=86400)  # 无输出且 CPU 空闲多少秒后判定卡死，空为全局设置，0 为不检测
+
 class TaskCreate(TaskBase):
     pass
 
@@ -57,6 +67,16 @@ class TaskUpdate(BaseModel):
     max_cpu_percent: Optional[int] = None
     max_memory_mb: Optional[int] = None
 
+    # Execution mode
+    exec_mode: Optional[Literal["subprocess", "warm"]] = None
+    use_browser_pool: Optional[bool] = None
+    shard_count: Optional[int] = Field(None, ge=1, le=256)
+    overlap_policy: Optional[Literal["skip", "queue", "replace", "parallel"]] = None
+    max_parallel: Optional[int] = Field(None, ge=1, le=256)
+    stagger_window: Optional[int] = Field(None, ge=0, le=3600)
+    adaptive_timeout: Optional[bool] = None
+    stall_timeout: Optional[int] = Field(None, ge=0, le=86400)
+
 class Task(TaskBase):
     model_config = ConfigDict(from_attributes=True)
     
@@ -79,6 +99,14 @@ class TaskExecutionBase(BaseModel):
     output: Optional[str] = None
     max_cpu_percent: Optional[float] = None
     max_memory_mb: Optional[float] = None
+    revision: Optional[str] = None
+    proxy_requests: Optional[int] = None
+    proxy_cache_hits: Optional[int] = None
+    proxy_bytes: Optional[int] = None
+    parent_execution_id: Optional[int] = None
+    shard_index: Optional[int] = None
+    root_execution_id: Optional[int] = None
+    pid: Optional[int] = None
 
 class TaskExecution(TaskExecutionBase):
     model_config = ConfigDict(from_attributes=True)
@@ -183,6 +211,11 @@ class DashboardStats(BaseModel):
 
 class CronPreviewRequest(BaseModel):
     cron_expression: str
+    task_id: Optional[int] = None  # 编辑已有任务时传入，用于计算其错峰偏移
+    stagger_window: Optional[int] = Field(None, ge=0, le=3600)  # 表单中的错峰窗口，空时沿用任务设置
 
 class CronPreviewResponse(BaseModel):
     next_run_times: List[str]
+    effective_run_times: List[str] = []  # 加上错峰偏移后的实际触发时间
+    offset_seconds: Optional[int] = None  # 错峰偏移；无法确定（新任务 hash 模式）时为 None
+    stagger_window: int = 0  # 生效的错峰窗口，0 表示不错峰
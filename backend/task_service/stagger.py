@@ -0,0 +1,161 @@
+"""
+定时错峰 - 为 cron / interval 任务的触发时间加上确定的秒级偏移，避免大量任务在同一秒触发
+
+- 任务级：stagger_window > 0 的任务在 [0, stagger_window) 秒内按任务 ID 哈希得到固定偏移（重启后不变）；
+  stagger_window = 0 表示该任务不错峰
+- 全局：KUMO_CRON_STAGGER_MODE=hash 时所有未显式关闭的任务按哈希偏移；
+  spread 模式下按已登记任务的预测触发直方图，为每个任务选择与其它任务重叠最少的偏移，使触发分布尽量平坦
+"""
+import zlib
+import threading
+import datetime
+from collections import Counter
+from typing import List, Optional, Tuple
+from apscheduler.triggers.base import BaseTrigger
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+STAGGER_MODES = ("off", "hash", "spread")
+MAX_SAMPLES = 64  # 每个任务最多取多少次预测触发参与直方图
+
+
+class OffsetTrigger(BaseTrigger):
+    """在原触发器的每次触发时间上加固定偏移（秒）"""
+    __slots__ = ("trigger", "offset")
+
+    def __init__(self, trigger: BaseTrigger, offset: int):
+        self.trigger = trigger
+        self.offset = offset
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        delta = datetime.timedelta(seconds=self.offset)
+        previous = previous_fire_time - delta if previous_fire_time else None
+        base = self.trigger.get_next_fire_time(previous, now - delta)
+        return base + delta if base else None
+
+    def __str__(self):
+        return f"{self.trigger} (+{self.offset}s)"
+
+    def __repr__(self):
+        return f"<OffsetTrigger ({self.trigger!r}, offset={self.offset})>"
+
+
+def hash_offset(task_id: int, window: int) -> int:
+    """任务在错峰窗口内的固定偏移（按任务 ID 哈希，与进程无关）"""
+    if window <= 1:
+        return 0
+    return zlib.crc32(f"kumo-task-{task_id}".encode()) % window
+
+
+def resolve_stagger(stagger_window: Optional[int]) -> Tuple[int, str]:
+    """
+    按任务设置与全局模式确定错峰窗口和模式
+
+    Returns:
+        (窗口秒数, 模式)；窗口为 0 表示不错峰
+    """
+    mode = settings.cron_stagger_mode if settings.cron_stagger_mode in STAGGER_MODES else "off"
+    if stagger_window == 0:
+        return 0, "off"
+    if stagger_window:
+        return stagger_window, "spread" if mode == "spread" else "hash"
+    if mode == "off":
+        return 0, "off"
+    return settings.cron_stagger_window, mode
+
+
+def sample_fire_times(trigger: BaseTrigger, limit: int = MAX_SAMPLES) -> List[int]:
+    """取触发器从当天零点起一个预测周期内的触发时间（epoch 秒）"""
+    timezone = getattr(trigger, "timezone", None)
+    now = datetime.datetime.now(timezone) if timezone else datetime.datetime.now().astimezone()
+    anchor = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    horizon = anchor + datetime.timedelta(seconds=settings.cron_stagger_horizon)
+
+    fires, previous, current = [], None, anchor
+    while len(fires) < limit:
+        fire = trigger.get_next_fire_time(previous, current)
+        if fire is None or fire >= horizon:
+            break
+        fires.append(int(fire.timestamp()))
+        previous = current = fire
+    return fires
+
+
+class StaggerPlanner:
+    """错峰偏移分配 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(StaggerPlanner, cls).__new__(cls)
+                    cls._instance._offsets = {}  # task_id -> offset
+                    cls._instance._fires = {}  # task_id -> predicted effective fire times
+                    cls._instance._histogram = Counter()
+                    cls._instance._plan_lock = threading.Lock()
+        return cls._instance
+
+    def assign(self, task_id: int, trigger: BaseTrigger, window: int, mode: str) -> int:
+        """为任务分配偏移并登记其预测触发时间，返回偏移秒数"""
+        fires = sample_fire_times(trigger)
+        with self._plan_lock:
+            self._forget(task_id)
+            offset = self._choose(task_id, fires, window, mode)
+            effective = [fire + offset for fire in fires]
+            self._offsets[task_id] = offset
+            self._fires[task_id] = effective
+            self._histogram.update(effective)
+        logger.debug(f"Task {task_id} staggered by {offset}s ({mode}, window {window}s)")
+        return offset
+
+    def preview(self, task_id: Optional[int], trigger: BaseTrigger, window: int, mode: str) -> Optional[int]:
+        """不登记，计算任务会被分配的偏移；hash 模式下尚未创建的任务无法确定偏移，返回 None"""
+        if mode == "hash" and task_id is None:
+            return None
+        fires = sample_fire_times(trigger)
+        with self._plan_lock:
+            own = Counter(self._fires.get(task_id, ()))
+            self._histogram.subtract(own)
+            try:
+                return self._choose(task_id, fires, window, mode)
+            finally:
+                self._histogram.update(own)
+
+    def remove(self, task_id: int):
+        with self._plan_lock:
+            self._forget(task_id)
+
+    def get_offset(self, task_id: int) -> int:
+        return self._offsets.get(task_id, 0)
+
+    def _forget(self, task_id: int):
+        self._offsets.pop(task_id, None)
+        fires = self._fires.pop(task_id, None)
+        if fires:
+            self._histogram.subtract(fires)
+            for fire in fires:
+                if self._histogram.get(fire, 0) <= 0:
+                    self._histogram.pop(fire, None)
+
+    def _choose(self, task_id: Optional[int], fires: List[int], window: int, mode: str) -> int:
+        preferred = hash_offset(task_id, window) if task_id is not None else 0
+        if mode != "spread" or not fires or window <= 1:
+            return preferred
+        # Offset overlapping the fewest already planned fires; scanning from the hashed offset keeps ties stable
+        best, best_cost = preferred, None
+        for step in range(window):
+            offset = (preferred + step) % window
+            cost = sum(self._histogram.get(fire + offset, 0) for fire in fires)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = offset, cost
+                if cost == 0:
+                    break
+        return best
+
+
+# 全局单例
+stagger_planner = StaggerPlanner()
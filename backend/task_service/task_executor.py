@@ -2,7 +2,10 @@
 任务执行模块 - 负责任务的实际执行逻辑（环境准备、命令执行、重试）
 """
 import os
+import json
+import time
 import shlex
+import threading
 import subprocess
 import datetime
 from core.database import SessionLocal
@@ -11,15 +14,33 @@ from core.logging import get_logger
 from core.security import decrypt_value
 from core.concurrency import concurrency_controller
 from task_service import models
-from task_service.process_manager import process_manager
+from task_service.process_manager import (
+    process_manager, wrap_command, exit_code_path, process_fingerprint
+)
+from task_service.warm_pool import warm_pool, WarmPoolError, WarmProcess
+from task_service.browser_pool import browser_pool, BrowserPoolError
+from task_service.rate_limiter import rate_limit_coordinator
+from task_service.caching_proxy import caching_proxy
+from task_service.url_dedupe import url_dedupe_service
+from task_service.checkpoints import prepare_checkpoint, remove_checkpoint
+from task_service.event_triggers import event_trigger_manager
+from task_service.duration_estimator import duration_estimator
+from task_service.performance import effective_timeout
 from project_service import models as project_models
+from project_service.revision_store import pin_revision
 from environment_service import models as env_models
+from environment_service import env_resolver
 from system_service import models as system_models
 
 logger = get_logger(__name__)
 
+# Client helpers (kumo_ratelimit, ...) injected on the task's PYTHONPATH
+RUNTIME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime")
 
-def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None, scheduler=None):
+
+def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None, scheduler=None,
+                       shard_index: int = None, root_execution_id: int = None, trigger_event: dict = None,
+                       slot_acquired: bool = False):
     """
     执行任务
     
@@ -28,14 +49,26 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
         attempt: 重试次数（从1开始）
         execution_id: 可选的执行 ID（如果已创建执行记录）
         scheduler: APScheduler 实例（用于重试调度）
+        shard_index: 分片序号（仅由分发队列为分片运行传入）
+        root_execution_id: 逻辑运行的首次执行 ID（重试时传入，共享断点目录）
+        trigger_event: 触发本次运行的事件（文件/Webhook/上游任务），注入 KUMO_TRIGGER_EVENT
+        slot_acquired: 调用方（分发队列）已持有并发许可，结束时仍由本函数释放
     """
+    if shard_index is None and _get_shard_count(task_id) > 1:
+        run_sharded_execution(task_id, attempt, execution_id, scheduler, trigger_event)
+        return
+
     # 获取并发控制许可（超时30秒）
-    acquired = concurrency_controller.acquire(timeout=30.0)
+    acquired = slot_acquired or concurrency_controller.acquire(timeout=30.0)
     if not acquired:
         logger.warning(f"Task {task_id} execution skipped: no available concurrency slot")
+        if execution_id:
+            close_out_execution(execution_id, "no concurrency slot became available within 30s")
         return
     
     db = None
+    browser_lease = None
+    proxy_registered = None
     try:
         db = SessionLocal()
         execution = None
@@ -43,6 +76,10 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
             execution = db.query(models.TaskExecution).filter(
                 models.TaskExecution.id == execution_id
             ).first()
+            if execution and execution.status != "pending":
+                # Stopped or dropped while it was waiting in the dispatch queue
+                logger.info(f"Execution {execution_id} is {execution.status}, not starting it")
+                return
             if execution:
                 # Update existing execution to running
                 execution.status = "running"
@@ -69,6 +106,10 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
             db.add(execution)
             db.commit()
             db.refresh(execution)
+
+        # Retries of the same logical run share its checkpoint directory
+        execution.root_execution_id = root_execution_id or execution.root_execution_id or execution.id
+        db.commit()
         
         # Prepare Environment and Path
         project = db.query(project_models.Project).filter(
@@ -76,6 +117,12 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
         ).first()
         if not project:
             raise Exception("Project not found")
+        if project.status and project.status != "ready":
+            raise Exception(f"Project is not ready (status: {project.status})")
+
+        # Pin the project's current revision: the task still runs in (and writes to) the project
+        # directory, the pinned revision is materialized on demand and exposed read-only through KUMO_REVISION_DIR
+        revision_dir = pin_revision(db, project, execution)
 
         # Working Directory
         cwd = project.path
@@ -105,22 +152,27 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
                 env_vars[ev.key] = val
             
             # Inject Network Proxy (If Enabled)
-            proxy_enabled = db.query(system_models.SystemConfig).filter(
-                system_models.SystemConfig.key == "proxy.enabled"
-            ).first()
-            if proxy_enabled and proxy_enabled.value == "true":
-                proxy_url = db.query(system_models.SystemConfig).filter(
-                    system_models.SystemConfig.key == "proxy.url"
-                ).first()
-                if proxy_url and proxy_url.value:
-                    p_url = proxy_url.value
-                    env_vars["http_proxy"] = p_url
-                    env_vars["https_proxy"] = p_url
-                    env_vars["all_proxy"] = p_url
-                    env_vars["HTTP_PROXY"] = p_url
-                    env_vars["HTTPS_PROXY"] = p_url
-                    env_vars["ALL_PROXY"] = p_url
-                    logger.debug(f"Injected global proxy: {p_url}")
+            p_url, cache_proxy_enabled = _proxy_settings(db)
+
+            # Route through the local caching proxy, which chains to the configured proxy
+            if cache_proxy_enabled:
+                try:
+                    policy = json.loads(project.cache_policy) if project.cache_policy else None
+                    upstream = p_url
+                    p_url = caching_proxy.register_execution(execution.id, project.id, policy, upstream)
+                    proxy_registered = execution.id
+                    env_vars["no_proxy"] = env_vars["NO_PROXY"] = "127.0.0.1,localhost"
+                except Exception as e:
+                    logger.error(f"Caching proxy unavailable, using direct proxy settings: {e}")
+
+            if p_url:
+                env_vars["http_proxy"] = p_url
+                env_vars["https_proxy"] = p_url
+                env_vars["all_proxy"] = p_url
+                env_vars["HTTP_PROXY"] = p_url
+                env_vars["HTTPS_PROXY"] = p_url
+                env_vars["ALL_PROXY"] = p_url
+                logger.debug(f"Injected proxy for execution {execution.id}")
 
         except Exception as e:
             logger.error(f"Error injecting Kumo environment variables: {e}")
@@ -149,6 +201,31 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
             env_vars["MAX_REQUESTS_PER_SECOND"] = str(task.max_requests_per_second)
             logger.debug(f"Injected MAX_REQUESTS_PER_SECOND: {task.max_requests_per_second}/s")
 
+        # Checkpoint: persistent across retries so a failed run resumes instead of restarting
+        try:
+            env_vars["KUMO_CHECKPOINT_DIR"] = prepare_checkpoint(task.id, execution.root_execution_id)
+        except OSError as e:
+            logger.warning(f"Could not create checkpoint directory for execution {execution.id}: {e}")
+        env_vars["KUMO_ATTEMPT"] = str(attempt)
+        env_vars["KUMO_RESUME"] = "1" if attempt > 1 else "0"
+        if trigger_event:
+            env_vars["KUMO_TRIGGER_EVENT"] = json.dumps(trigger_event)
+
+        # Sharding: each shard handles the slice of the work selected by its index
+        env_vars["KUMO_SHARD_INDEX"] = str(shard_index or 0)
+        env_vars["KUMO_SHARD_COUNT"] = str(task.shard_count if shard_index is not None else 1)
+        if revision_dir:
+            env_vars["KUMO_REVISION_DIR"] = revision_dir
+
+        # Shared coordination services (see runtime/kumo_ratelimit.py, runtime/kumo_dedupe.py)
+        service_env = {
+            **rate_limit_coordinator.client_env(execution.id),
+            **url_dedupe_service.client_env(task.id),
+        }
+        if service_env:
+            env_vars.update(service_env)
+            env_vars["PYTHONPATH"] = os.pathsep.join(p for p in [RUNTIME_DIR, env_vars.get("PYTHONPATH")] if p)
+
         # Inject Resource Limits Config
         if task.max_cpu_percent and task.max_cpu_percent > 0:
             env_vars["MAX_CPU_PERCENT"] = str(task.max_cpu_percent)
@@ -160,26 +237,42 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
 
         python_path = "python"  # Default
         
+        env = None
         if task.env_id:
             env = db.query(env_models.PythonVersion).filter(
                 env_models.PythonVersion.id == task.env_id
             ).first()
-            if env:
-                python_path = env.path
-                
-                # Docker Compatibility Fix:
-                # Check if file exists. If not, fallback to "python" (system python)
-                if not os.path.exists(python_path):
-                    logger.warning(
-                        f"Interpreter {python_path} not found. Falling back to system 'python'."
-                    )
-                    python_path = "python"
-                
-                # Add env to PATH if needed, or just use full path to python
-                # If it's a conda env, we might need activation, but usually running python executable directly works for scripts
-                # We can prepend env bin to PATH
-                env_bin = os.path.dirname(env.path)
-                env_vars["PATH"] = f"{env_bin}{os.pathsep}{env_vars.get('PATH', '')}"
+        elif project.env_mode == "lockfile" and project.requirements_hash:
+            # Lockfile mode: the environment is resolved by the project's requirements hash
+            env = env_resolver.find_ready_environment(db, project.requirements_hash)
+            if not env:
+                # Running against system python would hide missing or mismatched dependencies
+                pending = db.query(env_models.PythonVersion).filter(
+                    env_models.PythonVersion.requirements_hash == project.requirements_hash
+                ).first()
+                state = pending.status if pending else "not created"
+                raise Exception(
+                    f"Environment not ready: lockfile environment {project.requirements_hash[:12]} "
+                    f"for project {project.id} is {state}"
+                )
+        
+        if env:
+            env.last_used_at = datetime.datetime.now()
+            python_path = env.path
+            
+            # Docker Compatibility Fix:
+            # Check if file exists. If not, fallback to "python" (system python)
+            if not os.path.exists(python_path):
+                logger.warning(
+                    f"Interpreter {python_path} not found. Falling back to system 'python'."
+                )
+                python_path = "python"
+            
+            # Add env to PATH if needed, or just use full path to python
+            # If it's a conda env, we might need activation, but usually running python executable directly works for scripts
+            # We can prepend env bin to PATH
+            env_bin = os.path.dirname(env.path)
+            env_vars["PATH"] = f"{env_bin}{os.pathsep}{env_vars.get('PATH', '')}"
 
         # If command starts with "python", replace it with specific python path
         if cmd.strip().startswith("python "):
@@ -198,53 +291,98 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
         execution.log_file = log_file_path
         db.commit()
 
+        # Lease a pooled browser instead of letting the task launch its own
+        if task.use_browser_pool:
+            try:
+                browser_lease = browser_pool.acquire(execution.id)
+            except BrowserPoolError as e:
+                raise Exception(f"Browser pool unavailable: {e}")
+            env_vars.update(browser_lease.env)
+            logger.debug(f"Injected pooled browser {browser_lease.instance.id} for execution {execution.id}")
+
         # Execute
         try:
             with open(log_file_path, "w", encoding="utf-8") as f:
                 # Parse command string to list for shell=False safety
                 args = shlex.split(cmd)
 
-                # Create new process group for proper subprocess cleanup
-                # This ensures all child processes (like chromedriver) are terminated together
-                process = subprocess.Popen(
-                    args,
-                    shell=False,
-                    cwd=cwd,
-                    env=env_vars,
-                    stdout=f,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    start_new_session=True  # Create process group for proper cleanup
-                )
+                process = None
+                if task.exec_mode == "warm":
+                    # Fork from a preloaded interpreter, non-python commands fall back to Popen
+                    try:
+                        process = warm_pool.spawn(args, python_path, cwd, env_vars, log_file_path)
+                    except WarmPoolError as e:
+                        logger.info(f"Task {task.id} runs as subprocess instead of warm mode: {e}")
+
+                wrapped = process is None and settings.exit_code_wrapper
+                exit_file = exit_code_path(log_file_path)
+                if process is None:
+                    # Create new process group for proper subprocess cleanup
+                    # This ensures all child processes (like chromedriver) are terminated together
+                    # The exit code wrapper records the exit code, so the run can be reattached after a restart
+                    process = subprocess.Popen(
+                        wrap_command(args, exit_file) if wrapped else args,
+                        shell=False,
+                        cwd=cwd,
+                        env=env_vars,
+                        stdout=f,
+                        stderr=subprocess.STDOUT,
+                        text=True,
+                        encoding='utf-8',
+                        errors='replace',
+                        start_new_session=True  # Create process group for proper cleanup
+                    )
+
+                # Register process with process manager, the resource monitor watches it for stalls
+                stall_timeout = task.stall_timeout if task.stall_timeout is not None else settings.stall_timeout
+                process_manager.register_process(execution.id, process, log_file_path, stall_timeout, wrapped)
 
-                # Register process with process manager
-                process_manager.register_process(execution.id, process)
+                # Fingerprint of the process group, used to reattach after a backend restart
+                execution.pid = execution.pgid = process.pid
+                execution.process_started_at = process_fingerprint(process.pid)
+                db.commit()
                 
                 try:
-                    # Wait with timeout
-                    timeout_val = task.timeout if task.timeout else 3600
+                    # Wait with timeout (derived from run history when adaptive timeout is on)
+                    timeout_val, adaptive_timeout = effective_timeout(db, task, sharded=shard_index is not None)
                     process.wait(timeout=timeout_val)
-                    
-                    if process.returncode == 0:
-                        execution.status = "success"
-                    else:
-                        execution.status = "failed"
+
+                    # Stopped by user or replaced by a newer run: keep the stopped status
+                    db.refresh(execution, ["status"])
+                    if process_manager.get_stop_reason(execution.id) == "stalled":
+                        execution.status = "stalled"
+                    elif execution.status != "stopped":
+                        execution.status = "success" if process.returncode == 0 else "failed"
                         
                 except subprocess.TimeoutExpired:
                     logger.warning(
-                        f"Task {task.id} execution {execution.id} timed out after {timeout_val}s."
+                        f"Task {task.id} execution {execution.id} timed out after {timeout_val}s"
+                        f"{' (adaptive)' if adaptive_timeout else ''}."
                     )
-                    process.kill()
+                    # Stop sequence on the whole group, ends with SIGKILL
+                    process_manager.stop_execution(execution.id, reason="timeout")
+                    process.wait()
                     execution.status = "timeout"
                     
                 # Remove from running processes
                 process_manager.unregister_process(execution.id)
+                if wrapped or isinstance(process, WarmProcess):
+                    try:
+                        os.remove(exit_file)
+                    except OSError:
+                        pass
                 
             execution.end_time = datetime.datetime.now()
             execution.duration = (execution.end_time - execution.start_time).total_seconds()
             
+            # Save caching proxy traffic counters
+            if proxy_registered:
+                counters = caching_proxy.execution_counters(execution.id)
+                if counters:
+                    execution.proxy_requests = counters["requests"]
+                    execution.proxy_cache_hits = counters["cache_hits"]
+                    execution.proxy_bytes = counters["bytes_from_network"]
+
             # Save Resource Stats
             stats = process_manager.get_stats(execution.id)
             if stats:
@@ -261,50 +399,26 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
                 execution.output = "See log file."
             
             if execution.status == "timeout":
-                execution.output = (execution.output or "") + f"\n[Timeout after {timeout_val}s]"
+                execution.output = (execution.output or "") + f"\n[Timeout after {timeout_val}s" + (
+                    ", adaptive from run history]" if adaptive_timeout else "]")
+            elif execution.status == "stalled":
+                execution.output = (execution.output or "") + \
+                    f"\n[Stalled: no output and idle CPU for {stall_timeout}s, stopped]"
 
             db.commit()
 
-            # Retry Logic
-            if execution.status in ["failed", "timeout"]:
-                # Update consecutive failures count
-                task.consecutive_failures = (task.consecutive_failures or 0) + 1
-                db.commit()
+            # The run is complete, its checkpoint is no longer needed
+            if execution.status == "success":
+                remove_checkpoint(task.id, execution.root_execution_id)
+                # Run time inflation under contention feeds the concurrency autotuner
+                concurrency_controller.observe_duration((task.id, shard_index), execution.duration)
+            # Expected duration / memory of the next run, used by the sjf and binpack dispatch policies
+            if shard_index is None and execution.status in ("success", "failed", "timeout"):
+                duration_estimator.observe(task.id, execution.duration, execution.max_memory_mb)
 
-                # Circuit breaker: auto-pause task if too many consecutive failures
-                failure_threshold = task.failure_threshold or 5
-                if task.consecutive_failures >= failure_threshold:
-                    task.status = "paused"
-                    db.commit()
-                    logger.warning(
-                        f"[CIRCUIT BREAKER] Task {task.id} paused due to "
-                        f"{task.consecutive_failures} consecutive failures "
-                        f"(threshold: {failure_threshold})"
-                    )
-
-                retry_count = task.retry_count or 0
-                if attempt <= retry_count and scheduler:
-                    delay = task.retry_delay or 60
-                    next_run = datetime.datetime.now() + datetime.timedelta(seconds=delay)
-                    logger.info(
-                        f"Task {task.id} failed. Scheduling retry {attempt + 1}/{retry_count + 1} "
-                        f"in {delay}s."
-                    )
-
-                    # Schedule retry
-                    scheduler.add_job(
-                        run_task_execution,
-                        trigger='date',
-                        run_date=next_run,
-                        args=[task.id, attempt + 1, None, scheduler],
-                        id=f"retry_{task.id}_{execution.id}"
-                    )
-            else:
-                # Reset consecutive failures on success
-                if task.consecutive_failures and task.consecutive_failures > 0:
-                    task.consecutive_failures = 0
-                    db.commit()
-                    logger.info(f"Task {task.id} succeeded. Reset consecutive failures count.")
+            # Shards are retried individually and accounted on the parent execution
+            if shard_index is None:
+                _apply_outcome(db, task, execution, attempt, scheduler, trigger_event)
 
         except Exception as e:
             raise e
@@ -320,7 +434,280 @@ def run_task_execution(task_id: int, attempt: int = 1, execution_id: int = None,
             except Exception:
                 pass
     finally:
+        if browser_lease:
+            browser_pool.release(browser_lease)
+        if proxy_registered:
+            caching_proxy.unregister_execution(proxy_registered)
         # 释放并发控制许可
         concurrency_controller.release()
         if db:
             db.close()
+
+
+def close_out_execution(execution_id: int, reason: str, db=None):
+    """把未能开始的 pending 执行标记为 dropped，避免记录一直停留在 pending"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        execution = db.query(models.TaskExecution).filter(models.TaskExecution.id == execution_id).first()
+        if execution and execution.status == "pending":
+            execution.status = "dropped"
+            execution.end_time = datetime.datetime.now()
+            execution.output = f"[System] Dropped before start: {reason}"
+            db.commit()
+    except Exception as e:
+        logger.error(f"Failed to close out execution {execution_id}: {e}")
+    finally:
+        if own_session:
+            db.close()
+
+
+def _apply_outcome(db, task, execution, attempt: int, scheduler=None, trigger_event: dict = None):
+    """按执行结果更新连续失败计数（熔断），失败时调度重试；运行最终结束后触发下游任务"""
+    if execution.status in ["failed", "timeout", "stalled"]:
+        # Update consecutive failures count
+        task.consecutive_failures = (task.consecutive_failures or 0) + 1
+        db.commit()
+
+        # Circuit breaker: auto-pause task if too many consecutive failures
+        failure_threshold = task.failure_threshold or 5
+        if task.consecutive_failures >= failure_threshold:
+            task.status = "paused"
+            db.commit()
+            logger.warning(
+                f"[CIRCUIT BREAKER] Task {task.id} paused due to "
+                f"{task.consecutive_failures} consecutive failures "
+                f"(threshold: {failure_threshold})"
+            )
+
+        retry_count = task.retry_count or 0
+        if attempt <= retry_count and scheduler:
+            delay = task.retry_delay or 60
+            next_run = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+            logger.info(
+                f"Task {task.id} failed. Scheduling retry {attempt + 1}/{retry_count + 1} "
+                f"in {delay}s."
+            )
+
+            # Schedule retry, resuming from the run's checkpoint; it goes through the dispatch queue
+            from task_service.dispatcher import enqueue_run
+            scheduler.add_job(
+                enqueue_run,
+                trigger='date',
+                run_date=next_run,
+                args=[task.id, attempt + 1, None, scheduler],
+                kwargs={
+                    "root_execution_id": execution.root_execution_id or execution.id,
+                    "trigger_event": trigger_event,
+                },
+                id=f"retry_{task.id}_{execution.id}"
+            )
+            return
+    elif execution.status == "success":
+        # Reset consecutive failures on success
+        if task.consecutive_failures and task.consecutive_failures > 0:
+            task.consecutive_failures = 0
+            db.commit()
+            logger.info(f"Task {task.id} succeeded. Reset consecutive failures count.")
+
+    # The run is final (succeeded, or failed without another retry): start chained tasks
+    event_trigger_manager.notify_completion(task.id, execution.status, execution.id)
+
+
+def _proxy_settings(db):
+    """
+    读取代理系统配置
+
+    Returns:
+        (上游代理 URL 或 None, 是否经缓存转发代理)
+    """
+    configs = {
+        c.key: c.value for c in db.query(system_models.SystemConfig).filter(
+            system_models.SystemConfig.key.in_(["proxy.enabled", "proxy.url", "cache_proxy.enabled"])
+        )
+    }
+    upstream = (configs.get("proxy.url") or None) if configs.get("proxy.enabled") == "true" else None
+    return upstream, configs.get("cache_proxy.enabled") == "true"
+
+
+# ---------- 分片执行 ----------
+
+def _get_shard_count(task_id: int) -> int:
+    db = SessionLocal()
+    try:
+        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        return (task.shard_count or 1) if task else 1
+    finally:
+        db.close()
+
+
+def run_sharded_execution(task_id: int, attempt: int = 1, execution_id: int = None, scheduler=None,
+                          trigger_event: dict = None):
+    """
+    分片执行：父执行记录不占用并发许可，为每个分片创建子执行并行运行（分片经分发队列排队，各自占用执行槽），
+    注入 KUMO_SHARD_INDEX / KUMO_SHARD_COUNT。分片失败时按任务的 retry_count / retry_delay
+    单独重试，全部结束后把状态、耗时和资源峰值汇总到父执行。
+    """
+    db = SessionLocal()
+    try:
+        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        if not task:
+            logger.warning(f"Task {task_id} not found, execution skipped.")
+            return
+
+        parent = None
+        if execution_id:
+            parent = db.query(models.TaskExecution).filter(models.TaskExecution.id == execution_id).first()
+        if parent:
+            parent.status = "running"
+            parent.start_time = datetime.datetime.now()
+        else:
+            parent = models.TaskExecution(
+                task_id=task.id,
+                status="running",
+                attempt=attempt,
+                start_time=datetime.datetime.now()
+            )
+            db.add(parent)
+        db.commit()
+        db.refresh(parent)
+
+        parent_id = parent.id
+        shard_count = task.shard_count
+        retry_count = task.retry_count or 0
+        retry_delay = task.retry_delay if task.retry_delay is not None else 60
+    finally:
+        db.close()
+
+    logger.info(f"Task {task_id} execution {parent_id} fans out into {shard_count} shards")
+    threads = [
+        threading.Thread(
+            target=_run_shard,
+            args=(task_id, parent_id, index, retry_count, retry_delay, trigger_event),
+            name=f"shard-{parent_id}-{index}",
+            daemon=True,
+        )
+        for index in range(shard_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = SessionLocal()
+    try:
+        parent = db.query(models.TaskExecution).filter(models.TaskExecution.id == parent_id).first()
+        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        if parent and task:
+            aggregate_shard_executions(db, parent, shard_count)
+            # Retries already happened per shard, only the circuit breaker applies to the parent
+            _apply_outcome(db, task, parent, attempt, None, trigger_event)
+    except Exception as e:
+        logger.error(f"Failed to aggregate shards of execution {parent_id}: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+def _run_shard(task_id: int, parent_id: int, shard_index: int, retry_count: int, retry_delay: int,
+               trigger_event: dict = None):
+    """运行单个分片，失败时单独重试（父执行被停止后不再重试），重试共享该分片的断点目录"""
+    root_execution_id = None
+    for shard_attempt in range(1, retry_count + 2):
+        db = SessionLocal()
+        try:
+            parent = db.query(models.TaskExecution).filter(models.TaskExecution.id == parent_id).first()
+            if not parent or parent.status == "stopped":
+                return
+            execution = models.TaskExecution(
+                task_id=task_id,
+                status="pending",
+                attempt=shard_attempt,
+                parent_execution_id=parent_id,
+                shard_index=shard_index,
+                start_time=datetime.datetime.now()
+            )
+            db.add(execution)
+            db.commit()
+            db.refresh(execution)
+            execution_id = execution.id
+            root_execution_id = root_execution_id or execution_id
+        finally:
+            db.close()
+
+        # Shards queue like any other run: dispatch policy, concurrency slot, memory budget
+        from task_service.dispatcher import task_dispatcher
+        task_dispatcher.run_shard(task_id, shard_attempt, execution_id, shard_index,
+                                  root_execution_id=root_execution_id, trigger_event=trigger_event)
+
+        db = SessionLocal()
+        try:
+            execution = db.query(models.TaskExecution).filter(models.TaskExecution.id == execution_id).first()
+            status = execution.status if execution else None
+        finally:
+            db.close()
+        if status not in ("failed", "timeout", "stalled") or shard_attempt > retry_count:
+            return
+
+        logger.info(
+            f"Shard {shard_index} of execution {parent_id} {status}. "
+            f"Retrying {shard_attempt + 1}/{retry_count + 1} in {retry_delay}s."
+        )
+        time.sleep(retry_delay)
+
+
+def aggregate_shard_executions(db, parent, shard_count: int):
+    """
+    把分片的最后一次尝试汇总到父执行
+
+    状态：全部成功为 success，否则按 stopped > failed > stalled > timeout 取最严重的；
+    资源峰值为各分片峰值之和（分片并行运行，是总占用的上界）；代理流量包含所有尝试。
+    """
+    shards = db.query(models.TaskExecution).filter(
+        models.TaskExecution.parent_execution_id == parent.id
+    ).order_by(models.TaskExecution.shard_index, models.TaskExecution.attempt).all()
+
+    latest = {}
+    for shard in shards:
+        latest[shard.shard_index] = shard
+    statuses = [latest[i].status if i in latest else "failed" for i in range(shard_count)]
+
+    db.refresh(parent)
+    if parent.status == "stopped" or "stopped" in statuses:
+        parent.status = "stopped"
+    elif all(s == "success" for s in statuses):
+        parent.status = "success"
+    elif all(s in ("success", "timeout", "stalled") for s in statuses):
+        parent.status = "stalled" if "stalled" in statuses else "timeout"
+    else:
+        parent.status = "failed"
+
+    parent.end_time = datetime.datetime.now()
+    parent.duration = (parent.end_time - parent.start_time).total_seconds()
+    parent.max_cpu_percent = sum(s.max_cpu_percent or 0 for s in latest.values()) or None
+    parent.max_memory_mb = sum(s.max_memory_mb or 0 for s in latest.values()) or None
+    if any(s.proxy_requests is not None for s in shards):
+        parent.proxy_requests = sum(s.proxy_requests or 0 for s in shards)
+        parent.proxy_cache_hits = sum(s.proxy_cache_hits or 0 for s in shards)
+        parent.proxy_bytes = sum(s.proxy_bytes or 0 for s in shards)
+
+    lines = [f"[Sharded] {shard_count} shards: {parent.status}"]
+    for index in range(shard_count):
+        shard = latest.get(index)
+        if shard:
+            lines.append(f"Shard {index}: {shard.status} (execution {shard.id}, attempt {shard.attempt})")
+        else:
+            lines.append(f"Shard {index}: not started")
+    parent.output = "\n".join(lines)
+
+    # The parent has no process of its own, its log is the shard summary
+    try:
+        os.makedirs(settings.task_log_dir, exist_ok=True)
+        log_file_path = os.path.join(settings.task_log_dir, f"task_{parent.task_id}_exec_{parent.id}.log")
+        with open(log_file_path, "w", encoding="utf-8") as f:
+            f.write(parent.output + "\n")
+        parent.log_file = log_file_path
+    except Exception as e:
+        logger.warning(f"Could not write shard summary for execution {parent.id}: {e}")
+
+    db.commit()
+    return parent
@@ -12,13 +12,43 @@ from core.database import SessionLocal
 from core.config import settings
 from core.logging import get_logger
 from task_service import models
-from task_service.task_executor import run_task_execution
+from task_service.dispatcher import enqueue_run
 from task_service.resource_monitor import resource_monitor
 from task_service.process_manager import process_manager
+from task_service.event_triggers import event_trigger_manager, EVENT_TRIGGER_TYPES
+from task_service.stagger import OffsetTrigger, resolve_stagger, stagger_planner
 
 logger = get_logger(__name__)
 
 
+def build_trigger(trigger_type: str, trigger_value):
+    """
+    按任务的触发器配置创建 APScheduler 触发器
+
+    Returns:
+        interval / cron / date 返回对应触发器，其它类型（immediate、事件触发）返回 None
+    """
+    if trigger_type == 'interval':
+        # trigger_value example: {"value": 1, "unit": "hours"}
+        if isinstance(trigger_value, str):
+            val = json.loads(trigger_value)
+        else:
+            val = trigger_value
+        
+        kwargs = {val['unit']: int(val['value'])}
+        return IntervalTrigger(**kwargs)
+        
+    if trigger_type == 'cron':
+        # trigger_value example: "* * * * *"
+        return CronTrigger.from_crontab(trigger_value)
+        
+    if trigger_type == 'date':
+        # trigger_value example: "2025-12-07T12:00:00"
+        return DateTrigger(run_date=trigger_value)
+    
+    return None
+
+
 class TaskManager:
     """任务管理器 - 线程安全的单例，负责任务调度"""
     _instance = None
@@ -32,6 +62,7 @@ class TaskManager:
                     cls._instance = super(TaskManager, cls).__new__(cls)
             
             # High Performance Concurrency Config
+            # Jobs only put runs on the dispatch queue, the dispatcher's own pool executes them
             max_workers = settings.max_concurrent_tasks
             executors = {
                 'default': ThreadPoolExecutor(max_workers),
@@ -58,24 +89,29 @@ class TaskManager:
             # Start resource monitor
             resource_monitor.start()
             logger.info("Resource monitor started")
+            
+            event_trigger_manager.set_dispatcher(self.dispatch_event)
 
     def shutdown(self):
         """关闭调度器和资源监控"""
         if self.scheduler and self.scheduler.running:
+            event_trigger_manager.shutdown()
             resource_monitor.stop()
             self.scheduler.shutdown()
             logger.info("Scheduler shutdown")
 
-    def add_job(self, task_id: int, trigger_type: str, trigger_value: str, status: str, priority: int = 0):
+    def add_job(self, task_id: int, trigger_type: str, trigger_value: str, status: str, priority: int = 0,
+                stagger_window: int = None):
         """
         添加任务到调度器
         
         Args:
             task_id: 任务 ID
-            trigger_type: 触发器类型（interval/cron/date/immediate）
+            trigger_type: 触发器类型（interval/cron/date/immediate/file/webhook/after_task）
             trigger_value: 触发器配置（JSON 字符串或 cron 表达式）
             status: 任务状态（只有 'active' 才会被调度）
             priority: 优先级（APScheduler 不直接支持，但可以存储）
+            stagger_window: 定时错峰窗口（秒），None 沿用全局错峰模式，0 不错峰
         """
         # Remove existing job if any
         self.remove_job(task_id)
@@ -83,32 +119,17 @@ class TaskManager:
         if status != 'active':
             return
 
-        trigger = None
         try:
-            if trigger_type == 'interval':
-                # trigger_value example: {"value": 1, "unit": "hours"}
-                if isinstance(trigger_value, str):
-                    val = json.loads(trigger_value)
-                else:
-                    val = trigger_value
-                
-                kwargs = {val['unit']: int(val['value'])}
-                trigger = IntervalTrigger(**kwargs)
-                
-            elif trigger_type == 'cron':
-                # trigger_value example: "* * * * *"
-                trigger = CronTrigger.from_crontab(trigger_value)
-                
-            elif trigger_type == 'date':
-                # trigger_value example: "2025-12-07T12:00:00"
-                trigger = DateTrigger(run_date=trigger_value)
-            
-            elif trigger_type == 'immediate':
+            if trigger_type in EVENT_TRIGGER_TYPES:
+                # Event driven: no scheduler job, runs are dispatched when the event fires
+                event_trigger_manager.register(task_id, trigger_type, trigger_value)
                 return
 
+            trigger = build_trigger(trigger_type, trigger_value)
             if trigger:
+                trigger = self._stagger(task_id, trigger, stagger_window)
                 self.scheduler.add_job(
-                    run_task_execution,
+                    enqueue_run,
                     trigger=trigger,
                     args=[task_id, 1, None, self.scheduler],
                     id=str(task_id),
@@ -119,14 +140,27 @@ class TaskManager:
         except Exception as e:
             logger.error(f"Failed to add job {task_id}: {e}")
 
+    @staticmethod
+    def _stagger(task_id: int, trigger, stagger_window: int = None):
+        """为 cron / interval 触发器加上错峰偏移"""
+        window, mode = resolve_stagger(stagger_window)
+        if not window:
+            stagger_planner.remove(task_id)
+            return trigger
+        offset = stagger_planner.assign(task_id, trigger, window, mode)
+        return OffsetTrigger(trigger, offset) if offset else trigger
+
     def remove_job(self, task_id: int):
         """从调度器中移除任务"""
+        event_trigger_manager.unregister(task_id)
+        stagger_planner.remove(task_id)
         job_id = str(task_id)
         if self.scheduler.get_job(job_id):
             self.scheduler.remove_job(job_id)
 
     def pause_job(self, task_id: int):
         """暂停任务"""
+        event_trigger_manager.unregister(task_id)
         job_id = str(task_id)
         if self.scheduler.get_job(job_id):
             self.scheduler.pause_job(job_id)
@@ -144,6 +178,19 @@ class TaskManager:
             return job.next_run_time
         return None
 
+    def dispatch_event(self, task_id: int, event: dict):
+        """事件触发器回调：立即调度一次执行（任务需处于 active 状态）"""
+        db = SessionLocal()
+        try:
+            task = db.query(models.Task).filter(models.Task.id == task_id).first()
+            if not task or task.status != 'active':
+                logger.info(f"Event for task {task_id} ignored: task is not active")
+                return
+        finally:
+            db.close()
+        
+        enqueue_run(task_id, 1, None, self.scheduler, trigger_event=event)
+
     def stop_execution(self, execution_id: int) -> bool:
         """
         停止正在运行的任务执行
@@ -164,6 +211,8 @@ class TaskManager:
         db = SessionLocal()
         try:
             tasks = db.query(models.Task).filter(models.Task.status == 'active').all()
+            # Ordered by id so spread mode assigns the same offsets on every start
+            tasks.sort(key=lambda t: t.id)
             logger.info(f"Loading {len(tasks)} active tasks from DB...")
             
             loaded_count = 0
@@ -182,7 +231,8 @@ class TaskManager:
                         task.trigger_type,
                         task.trigger_value,
                         task.status,
-                        task.priority or 0
+                        task.priority or 0,
+                        stagger_window=task.stagger_window
                     )
                     loaded_count += 1
                 except Exception as e:
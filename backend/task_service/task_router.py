@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
@@ -10,10 +10,15 @@ from core.cache import query_cache
 from task_service import models, schemas
 from project_service import models as project_models
 from task_service.task_manager import task_manager
-from task_service.task_executor import run_task_execution
+from task_service.task_executor import close_out_execution
+from task_service.dispatcher import task_dispatcher, DispatchQueueFull
+from task_service.event_triggers import EVENT_TRIGGER_TYPES, normalize_trigger_value
+from task_service.stagger import OffsetTrigger, resolve_stagger, stagger_planner
+from task_service.performance import task_performance
 from audit_service.service import create_audit_log
 from apscheduler.triggers.cron import CronTrigger
 import json
+import hmac
 import csv
 import io
 import datetime
@@ -161,6 +166,43 @@ async def get_dashboard_stats(
         failure_stats=failure_stats_list
     )
 
+# Largest webhook body passed on to the task as KUMO_TRIGGER_EVENT
+WEBHOOK_MAX_PAYLOAD = 64 * 1024
+
+
+def prepare_trigger_value(db: Session, task_id, trigger_type: str, trigger_value):
+    """
+    校验事件触发器配置（webhook 自动生成令牌，after_task 检查上游任务与循环依赖）
+
+    其它触发类型原样返回。
+    """
+    if trigger_type not in EVENT_TRIGGER_TYPES:
+        return trigger_value
+    try:
+        value = normalize_trigger_value(trigger_type, trigger_value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if trigger_type == "after_task":
+        upstream_id = json.loads(value)["task_id"]
+        seen = set()
+        while upstream_id is not None:
+            if upstream_id == task_id:
+                raise HTTPException(status_code=400, detail="after_task trigger would create a cycle")
+            if upstream_id in seen:
+                break
+            seen.add(upstream_id)
+            upstream = db.query(models.Task).filter(models.Task.id == upstream_id).first()
+            if not upstream:
+                raise HTTPException(status_code=400, detail=f"Upstream task {upstream_id} not found")
+            upstream_id = None
+            if upstream.trigger_type == "after_task":
+                try:
+                    upstream_id = int(json.loads(upstream.trigger_value or "{}").get("task_id"))
+                except (TypeError, ValueError):
+                    pass
+    return value
+
 @router.post("", response_model=schemas.Task)
 async def create_task(task: schemas.TaskCreate, request: Request, db: Session = Depends(get_db)):
     """
@@ -179,7 +221,9 @@ async def create_task(task: schemas.TaskCreate, request: Request, db: Session =
     
     创建后会自动添加到调度器中（如果状态为 active）
     """
-    db_task = models.Task(**task.model_dump())
+    data = task.model_dump()
+    data["trigger_value"] = prepare_trigger_value(db, None, task.trigger_type, task.trigger_value)
+    db_task = models.Task(**data)
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
@@ -202,7 +246,8 @@ async def create_task(task: schemas.TaskCreate, request: Request, db: Session =
             db_task.trigger_type,
             db_task.trigger_value,
             db_task.status,
-            db_task.priority or 0
+            db_task.priority or 0,
+            stagger_window=db_task.stagger_window
         )
     except Exception as e:
         logger.error(f"Error scheduling task {db_task.id}: {e}")
@@ -729,6 +774,24 @@ async def export_test_metrics(project_id: int = None, task_ids: str = None, wind
         })
     raise HTTPException(status_code=400, detail="Invalid format, use json or csv")
 
+@router.get("/analytics/performance")
+def get_task_performance(task_id: int = None, regressions_only: bool = False, db: Session = Depends(get_db)):
+    """
+    任务执行性能分析
+
+    - **task_id**: 可选，只分析指定任务
+    - **regressions_only**: 只返回存在性能退化的任务
+
+    按最近的成功执行统计耗时 / CPU / 内存的 P50、P90、P99，返回配置超时、自适应超时、
+    实际生效的超时，以及最近执行相对基线的性能退化
+    """
+    if task_id is not None and not db.query(models.Task.id).filter(models.Task.id == task_id).first():
+        raise HTTPException(status_code=404, detail="Task not found")
+    report = task_performance(db, task_id)
+    if regressions_only:
+        report = [item for item in report if item["regressions"]]
+    return report
+
 @router.get("/{task_id}", response_model=schemas.Task)
 async def get_task(task_id: int, db: Session = Depends(get_db)):
     """
@@ -760,10 +823,18 @@ async def update_task(task_id: int, task_update: schemas.TaskUpdate, request: Re
         raise HTTPException(status_code=404, detail="Task not found")
         
     update_data = task_update.model_dump(exclude_unset=True)
+    if "trigger_type" in update_data or "trigger_value" in update_data:
+        trigger_type = update_data.get("trigger_type", db_task.trigger_type)
+        if trigger_type in EVENT_TRIGGER_TYPES:
+            # Keep the stored config (and webhook token) unless the trigger type changes
+            current = db_task.trigger_value if trigger_type == db_task.trigger_type else None
+            update_data["trigger_value"] = prepare_trigger_value(
+                db, db_task.id, trigger_type, update_data.get("trigger_value", current)
+            )
     
     # Check if critical fields changed
     reschedule_needed = False
-    critical_fields = ['trigger_type', 'trigger_value', 'command', 'env_id', 'project_id', 'status', 'timeout', 'retry_count', 'retry_delay']
+    critical_fields = ['trigger_type', 'trigger_value', 'command', 'env_id', 'project_id', 'status', 'timeout', 'retry_count', 'retry_delay', 'stagger_window']
     if any(k in update_data for k in critical_fields):
         reschedule_needed = True
         
@@ -791,7 +862,8 @@ async def update_task(task_id: int, task_update: schemas.TaskUpdate, request: Re
                 db_task.trigger_type,
                 db_task.trigger_value,
                 db_task.status,
-                db_task.priority or 0
+                db_task.priority or 0,
+                stagger_window=db_task.stagger_window
             )
         else:
             task_manager.remove_job(db_task.id)
@@ -871,7 +943,8 @@ async def resume_task(task_id: int, request: Request, db: Session = Depends(get_
             task.trigger_type,
             task.trigger_value,
             task.status,
-            task.priority or 0
+            task.priority or 0,
+            stagger_window=task.stagger_window
         )
          
     return {"message": "Task resumed"}
@@ -908,19 +981,36 @@ async def delete_task(task_id: int, request: Request, db: Session = Depends(get_
     db.commit()
     return {"message": "Task deleted"}
 
+def queue_full_error(retry_after: int) -> HTTPException:
+    return HTTPException(status_code=429, detail="Dispatch queue is full, try again later",
+                         headers={"Retry-After": str(retry_after)})
+
+
+def enqueue_pending_run(db: Session, execution: models.TaskExecution, source: str, scheduler=None, **kwargs) -> int:
+    """把已创建的 pending 执行加入分发队列，返回排队位置；队列已满时关闭记录并返回 429"""
+    try:
+        return task_dispatcher.submit(execution.task_id, 1, execution.id, scheduler, source=source, **kwargs)
+    except DispatchQueueFull as e:
+        close_out_execution(execution.id, "dispatch queue full", db=db)
+        raise queue_full_error(e.retry_after)
+
+
 @router.post("/{task_id}/run")
-async def run_task(task_id: int, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def run_task(task_id: int, request: Request, db: Session = Depends(get_db)):
     """
     手动触发任务执行
     
     - **task_id**: 任务 ID
     
-    立即创建一个执行记录并在后台运行任务。
-    返回执行 ID，可用于跟踪执行状态和查看日志。
+    立即创建一个 pending 执行记录并加入分发队列，与定时运行共用并发许可。
+    返回执行 ID 和排队位置（queue_position），可用于跟踪执行状态和查看日志。
+    分发队列已满时返回 429，`Retry-After` 头给出建议的重试间隔（秒）。
     """
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    if task_dispatcher.is_full():
+        raise queue_full_error(task_dispatcher.retry_after())
         
     # Create execution record immediately
     execution = models.TaskExecution(
@@ -944,10 +1034,70 @@ async def run_task(task_id: int, request: Request, background_tasks: BackgroundT
         operator_ip=request.client.host
     )
     
-    # Run in background
-    background_tasks.add_task(run_task_execution, task.id, 1, execution.id)
+    position = enqueue_pending_run(db, execution, "manual")
+    
+    return {"message": "Task queued", "execution_id": execution.id, "queue_position": position}
+
+@router.post("/{task_id}/webhook/{token}")
+async def trigger_webhook(task_id: int, token: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Webhook 触发任务执行
+    
+    - **task_id**: 任务 ID（触发方式为 webhook）
+    - **token**: 任务 trigger_value 中的令牌
+    
+    请求体（JSON 或文本，最大 64KB）随事件以 KUMO_TRIGGER_EVENT 注入任务。
+    与手动触发一样经分发队列运行，队列已满时返回 429 + Retry-After。
+    """
+    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    expected = ""
+    if task and task.trigger_type == "webhook":
+        try:
+            expected = json.loads(task.trigger_value or "{}").get("token") or ""
+        except ValueError:
+            pass
+    if not expected or not hmac.compare_digest(expected, token):
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    if task.status != "active":
+        raise HTTPException(status_code=409, detail="Task is not active")
+    
+    if task_dispatcher.is_full():
+        raise queue_full_error(task_dispatcher.retry_after())
+    
+    body = await request.body()
+    if len(body) > WEBHOOK_MAX_PAYLOAD:
+        raise HTTPException(status_code=413, detail="Webhook payload too large")
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = body.decode("utf-8", "replace")
+    
+    execution = models.TaskExecution(
+        task_id=task.id,
+        status='pending',
+        start_time=datetime.datetime.now(),
+        attempt=1
+    )
+    db.add(execution)
+    db.commit()
+    db.refresh(execution)
+    
+    # Audit Log
+    create_audit_log(
+        db=db,
+        operation_type="RUN",
+        target_type="TASK",
+        target_id=str(task.id),
+        target_name=task.name,
+        details=f"Webhook triggered task '{task.name}' (Exec ID: {execution.id})",
+        operator_ip=request.client.host
+    )
+    
+    # Automated trigger: failed runs are retried like scheduled ones
+    event = {"type": "webhook", "payload": payload}
+    position = enqueue_pending_run(db, execution, "webhook", task_manager.scheduler, trigger_event=event)
     
-    return {"message": "Task started", "execution_id": execution.id}
+    return {"message": "Task triggered", "execution_id": execution.id, "queue_position": position}
 
 @router.post("/executions/{execution_id}/stop")
 async def stop_execution(execution_id: int, request: Request, db: Session = Depends(get_db)):
@@ -964,8 +1114,25 @@ async def stop_execution(execution_id: int, request: Request, db: Session = Depe
         raise HTTPException(status_code=404, detail="Execution not found")
         
     if execution.status == 'running' or execution.status == 'pending':
+        # Still waiting in the dispatch queue: it never starts
+        task_dispatcher.remove(execution_id)
         stopped = task_manager.stop_execution(execution_id)
         
+        # Sharded run: stop the shards as well, the parent has no process of its own
+        shards = db.query(models.TaskExecution).filter(
+            models.TaskExecution.parent_execution_id == execution_id,
+            models.TaskExecution.status.in_(['running', 'pending'])
+        ).all()
+        for shard in shards:
+            task_manager.stop_execution(shard.id)
+            shard.status = 'stopped'
+            shard.end_time = datetime.datetime.now()
+        if shards:
+            db.commit()
+            # Shards still waiting in the dispatch queue never start
+            for shard in shards:
+                task_dispatcher.remove(shard.id)
+
         # Update DB status if not already updated by the process
         if execution.status != 'stopped' and execution.status != 'failed' and execution.status != 'success':
              execution.status = 'stopped'
@@ -1006,16 +1173,22 @@ async def delete_execution(execution_id: int, request: Request, db: Session = De
     if not execution:
         raise HTTPException(status_code=404, detail="Execution not found")
     
-    # If running, try stop first
-    if execution.status == 'running':
-        task_manager.stop_execution(execution_id)
-        
-    # Delete log file
-    if execution.log_file and os.path.exists(execution.log_file):
-        try:
-            os.remove(execution.log_file)
-        except Exception:
-            pass
+    # Shard executions of a sharded run are deleted with it
+    shards = db.query(models.TaskExecution).filter(
+        models.TaskExecution.parent_execution_id == execution_id
+    ).all()
+    
+    for item in [execution] + shards:
+        # If running, try stop first
+        if item.status == 'running':
+            task_manager.stop_execution(item.id)
+            
+        # Delete log file
+        if item.log_file and os.path.exists(item.log_file):
+            try:
+                os.remove(item.log_file)
+            except Exception:
+                pass
             
     # Audit Log
     task = db.query(models.Task).filter(models.Task.id == execution.task_id).first()
@@ -1031,6 +1204,8 @@ async def delete_execution(execution_id: int, request: Request, db: Session = De
         operator_ip=request.client.host
     )
 
+    for shard in shards:
+        db.delete(shard)
     db.delete(execution)
     db.commit()
     return {"message": "Execution deleted"}
@@ -1259,27 +1434,51 @@ async def get_daily_task_stats(days: int = 14, db: Session = Depends(get_db)):
     }
 
 @router.post("/cron/preview", response_model=schemas.CronPreviewResponse)
-async def preview_cron(request: schemas.CronPreviewRequest):
+async def preview_cron(request: schemas.CronPreviewRequest, db: Session = Depends(get_db)):
     """
     预览 Cron 表达式的下次执行时间
     
     - **cron_expression**: Cron 表达式（如 "0 0 * * *"）
+    - **task_id**: 可选，编辑已有任务时传入
+    - **stagger_window**: 可选，错峰窗口（秒）
     
-    返回接下来5次的执行时间，用于验证 Cron 表达式是否正确。
+    返回接下来5次的执行时间，用于验证 Cron 表达式是否正确；启用错峰时同时返回加上偏移后的实际触发时间。
     """
     try:
         trigger = CronTrigger.from_crontab(request.cron_expression)
-        now = datetime.datetime.now()
-        next_times = []
-        next_run = now
-        for _ in range(5):
-            next_run = trigger.get_next_fire_time(None, next_run)
-            if next_run:
-                next_times.append(next_run.strftime("%Y-%m-%d %H:%M:%S"))
-                # Advance slightly to find the next one
-                next_run = next_run + datetime.timedelta(seconds=1)
-            else:
-                break
-        return {"next_run_times": next_times}
+        next_times = _next_fire_times(trigger)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid cron expression: {str(e)}")
+
+    stagger_window = request.stagger_window
+    if stagger_window is None and request.task_id:
+        task = db.query(models.Task).filter(models.Task.id == request.task_id).first()
+        stagger_window = task.stagger_window if task else None
+    window, mode = resolve_stagger(stagger_window)
+    offset = stagger_planner.preview(request.task_id, trigger, window, mode) if window else 0
+
+    if offset is None:
+        effective_times = []
+    else:
+        effective_times = _next_fire_times(OffsetTrigger(trigger, offset)) if offset else next_times
+
+    return {
+        "next_run_times": next_times,
+        "effective_run_times": effective_times,
+        "offset_seconds": offset,
+        "stagger_window": window,
+    }
+
+
+def _next_fire_times(trigger, count: int = 5) -> List[str]:
+    """触发器接下来 count 次的触发时间"""
+    next_times = []
+    next_run = datetime.datetime.now()
+    for _ in range(count):
+        next_run = trigger.get_next_fire_time(None, next_run)
+        if not next_run:
+            break
+        next_times.append(next_run.strftime("%Y-%m-%d %H:%M:%S"))
+        # Advance slightly to find the next one
+        next_run = next_run + datetime.timedelta(seconds=1)
+    return next_times
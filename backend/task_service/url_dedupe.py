@@ -0,0 +1,267 @@
+"""
+URL 去重服务 - 在任务执行之间共享、持久化到内存映射文件的可扩展布隆过滤器
+
+每个命名空间（默认 `task-<任务ID>`，同一爬虫的并发执行共享）对应一个可扩展布隆过滤器：
+一组容量依次翻倍、误判率依次减半的布隆过滤器文件（mmap），总误判率不超过配置值。
+任务进程通过注入的客户端（runtime/kumo_dedupe.py）调用本地服务的批量 check_add，
+启动时无需再从 OUTPUT_DIR 重新加载完整的已抓取集合。
+"""
+import os
+import re
+import mmap
+import math
+import struct
+import shutil
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from core.config import settings
+from core.local_service import LocalJSONService, LocalServiceError
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# All-dot names ("." / "..") would resolve outside url_dedupe_dir
+NAMESPACE_RE = re.compile(r"^(?!\.+$)[A-Za-z0-9_.-]{1,64}$")
+MAX_BATCH = 10000
+GROWTH = 2
+TIGHTENING = 0.5
+
+
+class BloomFilter:
+    """单个内存映射布隆过滤器文件"""
+    MAGIC = b"KUMOBLM1"
+    # magic, capacity, m_bits, k, count, error_rate
+    HEADER = struct.Struct("<8sQQQQd")
+    HEADER_SIZE = 64
+
+    def __init__(self, path: str, capacity: Optional[int] = None, error_rate: Optional[float] = None):
+        self.path = path
+        if not os.path.exists(path):
+            if capacity is None or error_rate is None:
+                raise FileNotFoundError(path)
+            self._create(capacity, error_rate)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity, self.m_bits, self.k, self.count, self.error_rate = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a Kumo bloom filter")
+
+    def _create(self, capacity: int, error_rate: float):
+        m_bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        m_bits = (m_bits + 7) // 8 * 8
+        k = max(1, int(round(m_bits / capacity * math.log(2))))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            header = self.HEADER.pack(self.MAGIC, capacity, m_bits, k, 0, error_rate)
+            f.write(header.ljust(self.HEADER_SIZE, b"\0"))
+            f.truncate(self.HEADER_SIZE + m_bits // 8)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def hashes(item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def _positions(self, h1: int, h2: int):
+        m = self.m_bits
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def contains(self, h1: int, h2: int) -> bool:
+        mm, base = self._mm, self.HEADER_SIZE
+        for pos in self._positions(h1, h2):
+            if not mm[base + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, h1: int, h2: int):
+        mm, base = self._mm, self.HEADER_SIZE
+        for pos in self._positions(h1, h2):
+            index = base + (pos >> 3)
+            mm[index] = mm[index] | (1 << (pos & 7))
+        self.count += 1
+        struct.pack_into("<Q", mm, 32, self.count)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        try:
+            self._mm.flush()
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+class ScalableBloomFilter:
+    """可扩展布隆过滤器：当前阶段写满后追加容量翻倍的新阶段"""
+
+    def __init__(self, directory: str, initial_capacity: int, error_rate: float):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.stages: List[BloomFilter] = []
+        for name in sorted(n for n in os.listdir(directory) if n.endswith(".bf")):
+            self.stages.append(BloomFilter(os.path.join(directory, name)))
+        if not self.stages:
+            self._add_stage()
+
+    def _add_stage(self):
+        index = len(self.stages)
+        capacity = self.initial_capacity * (GROWTH ** index)
+        # Stage error rates form a geometric series whose sum stays below error_rate
+        error_rate = self.error_rate * (1 - TIGHTENING) * (TIGHTENING ** index)
+        self.stages.append(BloomFilter(os.path.join(self.directory, f"{index:03d}.bf"), capacity, error_rate))
+
+    def check_add(self, items: List[str], add: bool = True) -> List[bool]:
+        """返回每个元素是否已存在；add=True 时把新元素加入（同一批内的重复元素也会被识别）"""
+        seen = []
+        with self.lock:
+            for item in items:
+                h1, h2 = BloomFilter.hashes(item)
+                exists = any(stage.contains(h1, h2) for stage in reversed(self.stages))
+                if not exists and add:
+                    if self.stages[-1].full:
+                        self._add_stage()
+                    self.stages[-1].add(h1, h2)
+                seen.append(exists)
+        return seen
+
+    def stats(self) -> dict:
+        return {
+            "count": sum(s.count for s in self.stages),
+            "stages": len(self.stages),
+            "capacity": sum(s.capacity for s in self.stages),
+            "bytes": sum(BloomFilter.HEADER_SIZE + s.m_bits // 8 for s in self.stages),
+            "error_rate": self.error_rate,
+        }
+
+    def flush(self):
+        with self.lock:
+            for stage in self.stages:
+                stage.flush()
+
+    def close(self):
+        with self.lock:
+            for stage in self.stages:
+                stage.close()
+            self.stages = []
+
+
+class UrlDedupeService:
+    """URL 去重服务 - 线程安全的单例"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(UrlDedupeService, cls).__new__(cls)
+                    cls._instance._filters = {}
+                    cls._instance._filters_lock = threading.Lock()
+                    cls._instance.service = None
+        return cls._instance
+
+    @staticmethod
+    def validate_namespace(namespace: Optional[str]) -> str:
+        if not namespace or not NAMESPACE_RE.match(namespace):
+            raise LocalServiceError("namespace must match [A-Za-z0-9_.-]{1,64} and not consist only of dots")
+        return namespace
+
+    def _namespace_dir(self, namespace: str) -> str:
+        """命名空间目录；解析后必须是 url_dedupe_dir 的直接子目录（在任何创建/删除之前校验）"""
+        root = os.path.realpath(settings.url_dedupe_dir)
+        path = os.path.join(settings.url_dedupe_dir, namespace)
+        if os.path.dirname(os.path.realpath(path)) != root:
+            raise LocalServiceError(f"namespace {namespace!r} resolves outside the dedupe directory")
+        return path
+
+    def get_filter(self, namespace: str) -> ScalableBloomFilter:
+        namespace = self.validate_namespace(namespace)
+        with self._filters_lock:
+            bloom = self._filters.get(namespace)
+            if bloom is None:
+                bloom = ScalableBloomFilter(
+                    self._namespace_dir(namespace),
+                    settings.url_dedupe_initial_capacity,
+                    settings.url_dedupe_error_rate,
+                )
+                self._filters[namespace] = bloom
+            return bloom
+
+    def check_add(self, namespace: str, items: List[str], add: bool = True) -> List[bool]:
+        if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+            raise LocalServiceError("items must be a list of strings")
+        if len(items) > MAX_BATCH:
+            raise LocalServiceError(f"at most {MAX_BATCH} items per call")
+        return self.get_filter(namespace).check_add(items, add=add)
+
+    def list_namespaces(self) -> Dict[str, dict]:
+        result = {}
+        if os.path.isdir(settings.url_dedupe_dir):
+            for namespace in sorted(os.listdir(settings.url_dedupe_dir)):
+                if NAMESPACE_RE.match(namespace) and os.path.isdir(os.path.join(settings.url_dedupe_dir, namespace)):
+                    result[namespace] = self.get_filter(namespace).stats()
+        return result
+
+    def reset(self, namespace: str) -> bool:
+        """删除命名空间的全部去重状态"""
+        namespace = self.validate_namespace(namespace)
+        with self._filters_lock:
+            bloom = self._filters.pop(namespace, None)
+            if bloom:
+                bloom.close()
+            path = self._namespace_dir(namespace)
+            if not os.path.isdir(path):
+                return False
+            shutil.rmtree(path)
+            return True
+
+    # ---------- 本地服务 ----------
+
+    def _handle_check_add(self, payload: dict, query: dict):
+        seen = self.check_add(payload.get("namespace"), payload.get("items", []), add=True)
+        return 200, {"seen": seen, "added": seen.count(False)}
+
+    def _handle_check(self, payload: dict, query: dict):
+        return 200, {"seen": self.check_add(payload.get("namespace"), payload.get("items", []), add=False)}
+
+    def start(self):
+        """启动本地去重服务（后端启动时调用）"""
+        if not settings.url_dedupe_enabled or (self.service and self.service.running):
+            return
+        os.makedirs(settings.url_dedupe_dir, exist_ok=True)
+        self.service = LocalJSONService("url-dedupe")
+        self.service.route("POST", "/check_add", self._handle_check_add)
+        self.service.route("POST", "/check", self._handle_check)
+        self.service.start()
+
+    def stop(self):
+        if self.service:
+            self.service.stop()
+        with self._filters_lock:
+            for bloom in self._filters.values():
+                bloom.close()
+            self._filters = {}
+
+    def client_env(self, task_id: int) -> Dict[str, str]:
+        """注入任务进程的客户端连接信息，默认命名空间按任务隔离"""
+        if not (self.service and self.service.running):
+            return {}
+        return {
+            "KUMO_DEDUPE_URL": self.service.url,
+            "KUMO_DEDUPE_TOKEN": self.service.token,
+            "KUMO_DEDUPE_NAMESPACE": f"task-{task_id}",
+        }
+
+
+# 全局单例
+url_dedupe_service = UrlDedupeService()
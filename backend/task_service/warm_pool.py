@@ -0,0 +1,302 @@
+"""
+预热解释器池 - 为短周期 Python 任务复用已完成导入的解释器
+
+每个 (解释器, 预加载模块) 组合启动一个 warm_worker.py 常驻进程，
+任务运行时由工作进程 fork 出全新子进程执行脚本，省去解释器启动与重型模块导入开销。
+子进程拥有独立的进程组、工作目录、环境变量与日志输出，返回的 WarmProcess
+提供与 subprocess.Popen 相同的 pid / poll / wait / kill 接口，可直接交给 ProcessManager 管理。
+"""
+import os
+import json
+import time
+import select
+import signal
+import shutil
+import socket
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_worker.py")
+
+
+class WarmPoolError(Exception):
+    """预热池不可用（命令不支持或工作进程启动失败），调用方应回退到 Popen"""
+    pass
+
+
+def parse_python_args(args: List[str], python_path: str) -> Optional[List[str]]:
+    """
+    判断命令是否可以在预热解释器中运行
+
+    支持 `python [-u] script.py ...`、`python [-u] -m module ...`、`python [-u] -c code ...`，
+    返回解释器之后的参数列表；其它形式（其它解释器选项、非 Python 命令）返回 None。
+    """
+    if not args or args[0] != python_path:
+        return None
+    rest = list(args[1:])
+    if rest and rest[0] == "-u":
+        rest = rest[1:]
+    if not rest:
+        return None
+    if rest[0] in ("-m", "-c"):
+        return args[1:] if len(rest) >= 2 else None
+    if rest[0].startswith("-"):
+        return None
+    return args[1:]
+
+
+class WarmProcess:
+    """预热子进程句柄，接口与 subprocess.Popen 保持一致"""
+
+    def __init__(self, pid: int, conn: socket.socket):
+        self.pid = pid
+        self.args = None
+        self.returncode: Optional[int] = None
+        self._conn = conn
+        self._done = threading.Event()
+        self._reader = threading.Thread(target=self._read_exit, daemon=True)
+        self._reader.start()
+
+    def _read_exit(self):
+        buffer = b""
+        try:
+            while b"\n" not in buffer:
+                data = self._conn.recv(4096)
+                if not data:
+                    break
+                buffer += data
+        except OSError:
+            pass
+        finally:
+            self._conn.close()
+
+        try:
+            self.returncode = int(json.loads(buffer.split(b"\n", 1)[0])["exit"])
+        except (ValueError, KeyError, TypeError):
+            # Worker died before reporting, the child is orphaned and may still be running
+            logger.warning(f"Warm worker lost while running pid {self.pid}")
+            self._kill_group(signal.SIGKILL)
+            self.returncode = -signal.SIGKILL
+        self._done.set()
+
+    def _kill_group(self, sig):
+        try:
+            os.killpg(self.pid, sig)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            # The child may not have called setsid() yet
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def poll(self) -> Optional[int]:
+        return self.returncode if self._done.is_set() else None
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._done.wait(timeout):
+            raise subprocess.TimeoutExpired(f"warm pid {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if not self._done.is_set():
+            self._kill_group(sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class WarmWorker:
+    """单个预热工作进程"""
+
+    def __init__(self, python_path: str, preload: Tuple[str, ...]):
+        self.python_path = python_path
+        self.preload = preload
+        self.runs = 0
+        self.loaded: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.started_at = time.time()
+        # Unix socket paths are limited to ~108 bytes, keep them short
+        self.sock_dir = tempfile.mkdtemp(prefix="kumo-warm-")
+        self.sock_path = os.path.join(self.sock_dir, "w.sock")
+        self.process = self._start()
+
+    def _start(self) -> subprocess.Popen:
+        stderr_path = os.path.join(settings.logs_dir, "warm_pool.log")
+        with open(stderr_path, "a", encoding="utf-8") as stderr:
+            process = subprocess.Popen(
+                [self.python_path, WORKER_SCRIPT, self.sock_path, json.dumps(list(self.preload))],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                cwd=self.sock_dir,
+                start_new_session=True,
+            )
+
+        deadline = time.time() + settings.warm_pool_start_timeout
+        line = b""
+        while not line.endswith(b"\n"):
+            remaining = deadline - time.time()
+            if remaining <= 0 or process.poll() is not None:
+                break
+            ready, _, _ = select.select([process.stdout], [], [], remaining)
+            if not ready:
+                break
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            line += chunk
+        process.stdout.close()
+
+        try:
+            info = json.loads(line.decode("utf-8"))
+        except ValueError:
+            process.kill()
+            process.wait()
+            shutil.rmtree(self.sock_dir, ignore_errors=True)
+            raise WarmPoolError(f"Warm worker for {self.python_path} failed to start (see {stderr_path})")
+
+        self.loaded = info.get("loaded", [])
+        self.failed = info.get("failed", {})
+        if self.failed:
+            logger.warning(f"Warm worker {info.get('pid')} could not preload: {self.failed}")
+        logger.info(f"Started warm worker {info.get('pid')} for {self.python_path} (preloaded: {self.loaded})")
+        return process
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(10)
+        conn.connect(self.sock_path)
+        return conn
+
+    def spawn(self, argv: List[str], cwd: str, env: Dict[str, str], log_path: str) -> WarmProcess:
+        try:
+            conn = self._connect()
+            conn.sendall((json.dumps({"argv": argv, "cwd": cwd, "env": env, "log_path": log_path}) + "\n").encode("utf-8"))
+            buffer = b""
+            while b"\n" not in buffer:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                buffer += data
+            reply = json.loads(buffer.split(b"\n", 1)[0])
+        except (OSError, ValueError) as e:
+            raise WarmPoolError(f"Warm worker request failed: {e}")
+        if "pid" not in reply:
+            conn.close()
+            raise WarmPoolError(reply.get("error", "Warm worker rejected the request"))
+
+        conn.settimeout(None)
+        self.runs += 1
+        return WarmProcess(reply["pid"], conn)
+
+    def drain(self):
+        """停止接受新任务，运行中的子进程结束后工作进程自行退出"""
+        try:
+            conn = self._connect()
+            conn.sendall(b'{"op": "drain"}\n')
+            conn.recv(4096)
+            conn.close()
+        except OSError:
+            self.stop()
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.sock_dir, ignore_errors=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": self.process.pid,
+            "python_path": self.python_path,
+            "alive": self.alive(),
+            "runs": self.runs,
+            "preloaded": self.loaded,
+            "failed": self.failed,
+            "started_at": self.started_at,
+        }
+
+
+class WarmPool:
+    """预热解释器池 - 线程安全的单例，按解释器路径维护工作进程"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(WarmPool, cls).__new__(cls)
+                    cls._instance._workers = {}
+                    cls._instance._retired = []
+                    cls._instance._pool_lock = threading.Lock()
+        return cls._instance
+
+    @staticmethod
+    def preload_modules() -> Tuple[str, ...]:
+        return tuple(m.strip() for m in settings.warm_preload_modules.split(",") if m.strip())
+
+    def _get_worker(self, python_path: str) -> WarmWorker:
+        key = (os.path.realpath(shutil.which(python_path) or python_path), self.preload_modules())
+        with self._pool_lock:
+            worker = self._workers.get(key)
+            if worker and (not worker.alive() or worker.runs >= settings.warm_pool_max_runs):
+                # Recycle: long-lived workers slowly accumulate state from preloaded modules
+                worker.drain()
+                self._retired.append(worker)
+                worker = None
+            if worker is None:
+                worker = WarmWorker(key[0], key[1])
+                self._workers[key] = worker
+            for retired in [w for w in self._retired if not w.alive()]:
+                retired.stop()
+                self._retired.remove(retired)
+            return worker
+
+    def spawn(self, args: List[str], python_path: str, cwd: str, env: Dict[str, str], log_path: str) -> WarmProcess:
+        """
+        在预热解释器中运行命令
+
+        Raises:
+            WarmPoolError: 命令形式不支持或工作进程不可用，调用方应回退到 Popen
+        """
+        argv = parse_python_args(args, python_path)
+        if argv is None:
+            raise WarmPoolError("Command is not a plain python invocation")
+        worker = self._get_worker(python_path)
+        process = worker.spawn(argv, cwd, env, log_path)
+        process.args = args
+        return process
+
+    def status(self) -> List[dict]:
+        with self._pool_lock:
+            return [w.to_dict() for w in self._workers.values()]
+
+    def shutdown_all(self):
+        """停止所有工作进程（后端关闭时调用）"""
+        with self._pool_lock:
+            for worker in list(self._workers.values()) + self._retired:
+                worker.stop()
+            self._workers.clear()
+            self._retired = []
+
+
+# 全局单例
+warm_pool = WarmPool()
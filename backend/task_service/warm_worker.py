@@ -0,0 +1,232 @@
+"""
+预热解释器工作进程 - 由目标环境的解释器运行（不依赖后端代码）
+
+用法: python warm_worker.py <socket_path> '<json preload module list>'
+
+启动时导入预加载模块后监听 Unix socket，每个连接是一次运行请求（JSON 行协议）：
+    请求: {"argv": [...], "cwd": "...", "env": {...}, "log_path": "..."}
+    响应: {"pid": <child pid>}，子进程结束后再发送 {"exit": <returncode>}
+    退出码同时写入 <日志文件名>.exit（与 exit_wrapper.py 相同），后端重启后重新接管的运行据此记录结果
+    {"op": "drain"} 表示不再接受新请求，所有子进程结束后退出（用于回收）
+每次运行 fork 一个新子进程（新会话/进程组，等价于 Popen(start_new_session=True)），
+主循环为 select + waitpid(WNOHANG)，工作进程本身保持单线程以保证 fork 安全。
+"""
+import os
+import sys
+import json
+import time
+import errno
+import select
+import signal
+import socket
+import runpy
+import atexit
+import importlib
+import traceback
+
+
+def _preload(modules):
+    loaded, failed = [], {}
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except BaseException as e:
+            failed[name] = str(e)
+    return loaded, failed
+
+
+def _run_child(request, close_fds):
+    """子进程：切换会话、目录、环境和输出后执行目标，退出码语义与解释器一致"""
+    code = 1
+    try:
+        os.setsid()
+        for fd in close_fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        log_fd = os.open(request["log_path"], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+        sys.stdout = open(1, "w", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+        if request["env"].get("PYTHONUNBUFFERED"):
+            sys.stdout.reconfigure(write_through=True)
+            sys.stderr.reconfigure(write_through=True)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        extra_paths = [p for p in request["env"].get("PYTHONPATH", "").split(os.pathsep) if p]
+
+        argv = list(request["argv"])
+        if argv and argv[0] == "-u":
+            argv = argv[1:]
+        if argv[0] == "-m":
+            sys.argv = [argv[1]] + argv[2:]
+            sys.path[0:0] = [os.getcwd()] + extra_paths
+            runpy.run_module(argv[1], run_name="__main__", alter_sys=True)
+        elif argv[0] == "-c":
+            sys.argv = ["-c"] + argv[2:]
+            sys.path[0:0] = [""] + extra_paths
+            exec(compile(argv[1], "<string>", "exec"), {"__name__": "__main__"})
+        else:
+            script = os.path.abspath(argv[0])
+            sys.argv = argv
+            sys.path[0:0] = [os.path.dirname(script)] + extra_paths
+            runpy.run_path(script, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+        os._exit(code & 0xFF)
+
+
+def _write_exit_code(log_path, code):
+    path = f"{os.path.splitext(log_path)[0]}.exit"
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(str(code))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _send(conn, message):
+    try:
+        conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
+    except OSError:
+        pass
+
+
+def serve(socket_path, preload):
+    # Do not leak the backend package directory into task imports
+    if sys.path and os.path.abspath(sys.path[0] or ".") == os.path.dirname(os.path.abspath(__file__)):
+        sys.path.pop(0)
+    loaded, failed = _preload(preload)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(64)
+    server.setblocking(False)
+
+    # Tell the pool we are ready
+    sys.stdout.write(json.dumps({"ready": True, "pid": os.getpid(), "loaded": loaded, "failed": failed}) + "\n")
+    sys.stdout.flush()
+
+    pending = {}   # conn -> buffered request bytes
+    children = {}  # pid -> (conn, log_path)
+    started = time.time()
+    parent_pid = os.getppid()
+    draining = False
+
+    while True:
+        # Reap finished children and report their exit codes
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            child = children.pop(pid, None)
+            if child is None:
+                continue
+            conn, log_path = child
+            if os.WIFSIGNALED(status):
+                returncode = -os.WTERMSIG(status)
+            else:
+                returncode = os.WEXITSTATUS(status)
+            # Written before replying, the backend removes it once it has the exit code
+            _write_exit_code(log_path, returncode)
+            _send(conn, {"exit": returncode})
+            conn.close()
+
+        # Exit when draining or the backend that started us is gone, once nothing is running
+        if (draining or os.getppid() != parent_pid) and not children:
+            break
+
+        try:
+            watched = list(pending) if draining else [server] + list(pending)
+            readable, _, _ = select.select(watched, [], [], 0.05)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+
+        for sock in readable:
+            if sock is server:
+                try:
+                    conn, _ = server.accept()
+                    conn.setblocking(True)
+                    pending[conn] = b""
+                except OSError:
+                    pass
+                continue
+
+            data = sock.recv(65536)
+            if not data:
+                pending.pop(sock, None)
+                sock.close()
+                continue
+            pending[sock] += data
+            if b"\n" not in pending[sock]:
+                continue
+
+            line = pending.pop(sock).split(b"\n", 1)[0]
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                _send(sock, {"error": f"invalid request: {e}"})
+                sock.close()
+                continue
+            if request.get("op") == "ping":
+                _send(sock, {"pong": True, "uptime": time.time() - started, "running": len(children)})
+                sock.close()
+                continue
+            if request.get("op") == "drain" or draining:
+                draining = True
+                _send(sock, {"error": "worker is draining"} if request.get("op") != "drain" else {"draining": True})
+                sock.close()
+                continue
+
+            close_fds = [server.fileno()] + [c.fileno() for c in pending] + [c.fileno() for c, _ in children.values()]
+            pid = os.fork()
+            if pid == 0:
+                close_fds.append(sock.fileno())
+                _run_child(request, close_fds)
+            children[pid] = (sock, request["log_path"])
+            _send(sock, {"pid": pid})
+
+    server.close()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], json.loads(sys.argv[2]) if len(sys.argv) > 2 else [])
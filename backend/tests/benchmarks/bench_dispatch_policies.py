@@ -0,0 +1,110 @@
+"""
+基准 - 分发策略（fifo / sjf / binpack）在争用下的吞吐与等待时间
+
+离散事件模拟：固定执行槽数和内存预算，一批长任务（爬虫）、中等任务和大量短任务在整点同时触发，
+半点再来一批短任务。选择下一个运行时直接调用 task_service.dispatcher.choose_next，与线上分发逻辑一致。
+运行中的内存总量超过预算时所有运行按 (预算/占用)^2 的速度推进（换页），模拟 fifo / sjf 不考虑内存的代价。
+
+用法（在 backend 目录下）：
+    python -m tests.benchmarks.bench_dispatch_policies [--seed 7] [--slots 8] [--memory 8000]
+"""
+import argparse
+import random
+import statistics
+from task_service.dispatcher import RunRequest, choose_next, DISPATCH_POLICIES
+
+# name, runs at :00, runs at :30, mean duration (s), peak memory (MB)
+WORKLOAD = [
+    ("crawl", 4, 0, 5400, 1500),
+    ("report", 12, 0, 300, 1200),
+    ("api", 400, 200, 5, 80),
+]
+
+
+def build_workload(seed: int):
+    """生成 (到达时间, 任务名, 预计耗时, 实际耗时, 内存) 列表；预计值为该类任务的均值（EWMA 收敛后）"""
+    rng = random.Random(seed)
+    runs = []
+    for name, at_hour, at_half, duration, memory in WORKLOAD:
+        for arrival, count in ((0.0, at_hour), (1800.0, at_half)):
+            for _ in range(count):
+                actual = duration * rng.lognormvariate(0, 0.3)
+                runs.append((arrival + rng.uniform(0, 1), name, float(duration), actual, float(memory)))
+    runs.sort(key=lambda r: r[0])
+    return runs
+
+
+def simulate(policy: str, runs: list, slots: int, memory_mb: float, aging: float) -> dict:
+    """模拟一种分发策略，返回等待时间与吞吐指标"""
+    pending = list(runs)
+    queue, running = [], []  # running: [remaining work, request, actual memory]
+    waits = {name: [] for name, *_ in WORKLOAD}
+    now, pressure_time = 0.0, 0.0
+
+    while pending or queue or running:
+        # Admit arrivals up to now
+        while pending and pending[0][0] <= now:
+            arrival, name, estimate, actual, memory = pending.pop(0)
+            request = RunRequest(0, 1, None, None, {"name": name, "actual": actual}, "bench")
+            request.enqueued_at, request.est_duration, request.est_memory = arrival, estimate, memory
+            queue.append(request)
+
+        # Dispatch while slots are free
+        while queue and len(running) < slots:
+            index = choose_next(queue, policy, now, running=len(running),
+                                committed_mb=sum(r[2] for r in running), budget_mb=memory_mb, aging=aging)
+            if index is None:
+                break
+            request = queue.pop(index)
+            waits[request.kwargs["name"]].append(now - request.enqueued_at)
+            running.append([request.kwargs["actual"], request, request.est_memory])
+
+        used = sum(r[2] for r in running)
+        rate = min(1.0, memory_mb / used) ** 2 if used else 1.0
+        next_finish = now + min(r[0] for r in running) / rate if running else float("inf")
+        next_arrival = pending[0][0] if pending else float("inf")
+        step_to = min(next_finish, next_arrival)
+        if step_to == float("inf"):
+            break
+        elapsed = step_to - now
+        if rate < 1.0:
+            pressure_time += elapsed
+        for r in running:
+            r[0] -= elapsed * rate
+        now = step_to
+        running = [r for r in running if r[0] > 1e-9]
+
+    all_waits = [w for ws in waits.values() for w in ws]
+    return {
+        "policy": policy,
+        "mean_wait": statistics.mean(all_waits),
+        "p95_wait": statistics.quantiles(all_waits, n=20)[-1],
+        "short_mean_wait": statistics.mean(waits["api"]),
+        "long_max_wait": max(waits["crawl"]),
+        "makespan": now,
+        "throughput": len(all_waits) / now * 3600,
+        "swapping": pressure_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--memory", type=float, default=8000, help="memory budget (MB)")
+    parser.add_argument("--aging", type=float, default=600, help="aging threshold (s)")
+    args = parser.parse_args()
+
+    runs = build_workload(args.seed)
+    print(f"{len(runs)} runs, {args.slots} slots, {args.memory:.0f}MB, aging {args.aging:.0f}s, seed {args.seed}")
+    header = f"{'policy':<8}{'mean wait':>11}{'p95 wait':>11}{'short wait':>12}{'long max':>10}" \
+             f"{'makespan':>10}{'runs/h':>8}{'swapping':>10}"
+    print(header)
+    for policy in DISPATCH_POLICIES:
+        r = simulate(policy, runs, args.slots, args.memory, args.aging)
+        print(f"{r['policy']:<8}{r['mean_wait']:>10.0f}s{r['p95_wait']:>10.0f}s{r['short_mean_wait']:>11.0f}s"
+              f"{r['long_max_wait']:>9.0f}s{r['makespan']:>9.0f}s{r['throughput']:>8.0f}{r['swapping']:>9.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import pytest
 import os
 import tempfile
 import shutil
+from unittest.mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from core.database import Base, get_db
@@ -61,3 +62,55 @@ def temp_dir():
     temp_path = tempfile.mkdtemp()
     yield temp_path
     shutil.rmtree(temp_path, ignore_errors=True)
+
+@pytest.fixture(scope="function")
+def executor_db(test_db, temp_dir):
+    """Point the task executor and the services it talks to at the test database; logs and checkpoints go to temp_dir"""
+    from task_service import task_executor, dispatcher, duration_estimator, resource_monitor, reattach
+
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=test_db.get_bind())
+    with patch.object(task_executor, "SessionLocal", session_factory), \
+            patch.object(dispatcher, "SessionLocal", session_factory), \
+            patch.object(duration_estimator, "SessionLocal", session_factory), \
+            patch.object(resource_monitor, "SessionLocal", session_factory), \
+            patch.object(reattach, "SessionLocal", session_factory), \
+            patch.object(task_executor.settings, "task_log_dir", os.path.join(temp_dir, "logs")), \
+            patch.object(task_executor.settings, "checkpoint_dir", os.path.join(temp_dir, "checkpoints")):
+        yield session_factory
+
+@pytest.fixture(scope="function")
+def make_task(test_db, temp_dir, executor_db):
+    """Factory for tasks in a ready project rooted at temp_dir, runnable through the task executor"""
+    project = project_models.Project(name="test-project", path=temp_dir, work_dir="./", status="ready")
+    test_db.add(project)
+    test_db.commit()
+
+    def _make(command: str = "echo", **fields):
+        fields.setdefault("name", "test-task")
+        task = task_models.Task(command=command, project_id=project.id, trigger_type="immediate",
+                                trigger_value="", **fields)
+        test_db.add(task)
+        test_db.commit()
+        return task
+
+    return _make
+
+@pytest.fixture(scope="function")
+def running_dispatcher(executor_db):
+    """Run the dispatch thread for the test; sharded runs queue their shards through it"""
+    from task_service.dispatcher import task_dispatcher
+
+    task_dispatcher.start()
+    yield task_dispatcher
+    task_dispatcher.shutdown()
+    task_dispatcher._queue.clear()
+
+@pytest.fixture(autouse=True)
+def service_state_dir():
+    """Keep persisted local service endpoints out of the real data directory"""
+    from core.config import settings
+
+    temp_path = tempfile.mkdtemp()
+    with patch.object(settings, "service_state_dir", temp_path):
+        yield temp_path
+    shutil.rmtree(temp_path, ignore_errors=True)
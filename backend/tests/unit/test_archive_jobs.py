@@ -0,0 +1,174 @@
+"""
+单元测试 - 压缩包上传与后台解压
+"""
+import io
+import os
+import time
+import zipfile
+import pytest
+from unittest.mock import patch
+from sqlalchemy.orm import sessionmaker
+from project_service import archive_jobs
+from project_service.models import Project
+from project_service.archive_jobs import (
+    ArchiveJobManager, ArchiveQuotaError, ExtractionJob, extract_archive, save_upload_stream
+)
+
+
+def _make_zip(path, members):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+
+
+class TestSaveUploadStream:
+    """分块上传测试"""
+
+    def test_hash_and_size(self, temp_dir):
+        """测试写入大小与 SHA-256"""
+        import hashlib
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        dest = os.path.join(temp_dir, "upload.zip")
+        size, digest = save_upload_stream(io.BytesIO(data), dest)
+        assert size == len(data)
+        assert digest == hashlib.sha256(data).hexdigest()
+
+    def test_rejects_oversized_upload(self, temp_dir):
+        """测试超出上传上限"""
+        with pytest.raises(ArchiveQuotaError):
+            save_upload_stream(io.BytesIO(b"x" * 2048), os.path.join(temp_dir, "u.zip"), max_bytes=1024)
+
+
+class TestExtractQuotas:
+    """解压配额测试"""
+
+    def test_parallel_extract_reports_progress(self, temp_dir):
+        """测试并行解压所有成员并回调进度"""
+        zip_path = os.path.join(temp_dir, "p.zip")
+        _make_zip(zip_path, {f"pkg/mod_{i}.py": f"x = {i}\n" for i in range(50)})
+        dest = os.path.join(temp_dir, "out")
+        os.makedirs(dest)
+        done = []
+        extract_archive(zip_path, ".zip", dest, progress=done.append)
+        assert len(done) == 50
+        with open(os.path.join(dest, "pkg", "mod_7.py")) as f:
+            assert f.read() == "x = 7\n"
+
+    def test_rejects_high_compression_ratio(self, temp_dir):
+        """测试拒绝压缩比过高的归档"""
+        zip_path = os.path.join(temp_dir, "bomb.zip")
+        _make_zip(zip_path, {"zeros.bin": b"\0" * (5 * 1024 * 1024)})
+        with pytest.raises(ArchiveQuotaError, match="compression ratio"):
+            extract_archive(zip_path, ".zip", temp_dir)
+
+    def test_rejects_too_many_members(self, temp_dir):
+        """测试拒绝成员过多的归档"""
+        zip_path = os.path.join(temp_dir, "many.zip")
+        _make_zip(zip_path, {f"f{i}.txt": "a" for i in range(20)})
+        with patch("project_service.archive_jobs.settings.extract_max_members", 10):
+            with pytest.raises(ArchiveQuotaError, match="members"):
+                extract_archive(zip_path, ".zip", temp_dir)
+
+    def test_7z_extracts_and_counts_actual_bytes(self, temp_dir):
+        """测试 7Z 解压按实际写入字节检查：头部少报大小时中止"""
+        import py7zr
+        source = os.path.join(temp_dir, "src")
+        os.makedirs(os.path.join(source, "pkg", "empty"))
+        with open(os.path.join(source, "pkg", "main.py"), "w") as f:
+            f.write("print('hi')\n" * 100)
+        archive_path = os.path.join(temp_dir, "p.7z")
+        with py7zr.SevenZipFile(archive_path, "w") as archive:
+            archive.writeall(os.path.join(source, "pkg"), "pkg")
+
+        dest = os.path.join(temp_dir, "out")
+        os.makedirs(dest)
+        extract_archive(archive_path, ".7z", dest)
+        with open(os.path.join(dest, "pkg", "main.py")) as f:
+            assert f.read() == "print('hi')\n" * 100
+        assert os.path.isdir(os.path.join(dest, "pkg", "empty"))
+
+        lying = [dict(m, size=10) if m["name"] == "pkg/main.py" else m
+                 for m in archive_jobs.list_members(archive_path, ".7z")]
+        with patch.object(archive_jobs, "list_members", return_value=lying):
+            with pytest.raises(ArchiveQuotaError, match="larger than declared"):
+                extract_archive(archive_path, ".7z", os.path.join(temp_dir, "out2"))
+        with patch.object(archive_jobs, "check_quotas"), \
+                patch("project_service.archive_jobs.settings.extract_max_bytes", 100):
+            with pytest.raises(ArchiveQuotaError, match="exceeds size limit"):
+                extract_archive(archive_path, ".7z", os.path.join(temp_dir, "out3"))
+
+    def test_rejects_path_traversal(self, temp_dir):
+        """测试拒绝路径穿越"""
+        zip_path = os.path.join(temp_dir, "evil.zip")
+        _make_zip(zip_path, {"../evil.txt": "pwned"})
+        dest = os.path.join(temp_dir, "out")
+        os.makedirs(dest)
+        with pytest.raises(ArchiveQuotaError, match="Unsafe path"):
+            extract_archive(zip_path, ".zip", dest)
+        assert not os.path.exists(os.path.join(temp_dir, "evil.txt"))
+
+
+class TestArchiveJobManager:
+    """后台解压任务测试"""
+
+    def _wait(self, job, timeout=10):
+        deadline = time.time() + timeout
+        while job.finished_at is None and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_job_success_removes_archive(self, temp_dir):
+        """测试解压成功后删除上传文件并记录事件"""
+        zip_path = os.path.join(temp_dir, "upload.zip")
+        _make_zip(zip_path, {"main.py": "print(1)\n"})
+        dest = os.path.join(temp_dir, "proj")
+        os.makedirs(dest)
+
+        manager = ArchiveJobManager()
+        hook_calls = []
+        with patch.object(manager, "_update_project_status") as mock_update, \
+                patch.object(manager, "_completion_hooks", [hook_calls.append]):
+            job = manager.submit(ExtractionJob(1, zip_path, ".zip", dest, 0, "abc"))
+            self._wait(job)
+
+        assert job.status == "success"
+        assert os.path.exists(os.path.join(dest, "main.py"))
+        assert not os.path.exists(zip_path)
+        assert [e["type"] for e in job.events][0] == "queued"
+        assert job.events[-1]["type"] == "finished"
+        assert manager.get(job.id).to_dict(since=1)["events"][0]["seq"] == 1
+        mock_update.assert_called_once_with(job)
+        assert hook_calls == [job]
+
+    def test_job_failure_cleans_destination(self, temp_dir):
+        """测试解压失败时清理目标目录"""
+        bad_path = os.path.join(temp_dir, "upload.zip")
+        with open(bad_path, "w") as f:
+            f.write("not a zip")
+        dest = os.path.join(temp_dir, "proj")
+        os.makedirs(dest)
+        with open(os.path.join(dest, "partial.txt"), "w") as f:
+            f.write("x")
+
+        manager = ArchiveJobManager()
+        with patch.object(manager, "_update_project_status"):
+            job = manager.submit(ExtractionJob(1, bad_path, ".zip", dest, 0, "abc"))
+            self._wait(job)
+
+        assert job.status == "failed"
+        assert "not a valid zip file" in job.error
+        assert os.listdir(dest) == []
+        assert not os.path.exists(bad_path)
+
+    def test_interrupted_extractions_are_failed(self, test_db):
+        """测试重启后仍为 extracting 的项目标记为 error，其它项目不变"""
+        test_db.add_all([Project(name="interrupted", path="/tmp/a", status="extracting"),
+                         Project(name="done", path="/tmp/b", status="ready")])
+        test_db.commit()
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=test_db.get_bind())
+
+        with patch.object(archive_jobs, "SessionLocal", session_factory):
+            assert ArchiveJobManager().fail_interrupted() == 1
+
+        test_db.expire_all()
+        statuses = {p.name: p.status for p in test_db.query(Project).all()}
+        assert statuses == {"interrupted": "error", "done": "ready"}
@@ -0,0 +1,170 @@
+"""
+单元测试 - 共享浏览器池
+"""
+import time
+import uuid
+import threading
+import pytest
+from unittest.mock import patch
+from task_service import browser_pool as bp
+
+
+class FakeBrowser:
+    """不启动 Chromium 的浏览器实例替身"""
+    memory = 100.0
+
+    def __init__(self, chrome_bin):
+        self.id = uuid.uuid4().hex[:8]
+        self.port = 9222
+        self.ws_url = f"ws://127.0.0.1:9222/devtools/browser/{self.id}"
+        self.uses = 0
+        self.leases = {}
+        self.retiring = False
+        self.retire_reason = None
+        self.stopped = False
+        self.contexts = set()
+
+    def create_context(self):
+        context_id = uuid.uuid4().hex
+        self.contexts.add(context_id)
+        return context_id
+
+    def dispose_context(self, context_id):
+        self.contexts.discard(context_id)
+
+    def alive(self):
+        return not self.stopped
+
+    def memory_mb(self):
+        return self.memory
+
+    def stop(self):
+        self.stopped = True
+
+    def to_dict(self):
+        return {"id": self.id, "uses": self.uses, "active_leases": len(self.leases)}
+
+
+@pytest.fixture
+def pool():
+    pool = bp.BrowserPool()
+    pool.shutdown_all()
+    with patch.object(bp, "BrowserInstance", FakeBrowser), \
+            patch.object(bp, "find_chrome_binary", return_value="/usr/bin/chromium"), \
+            patch.object(bp.settings, "browser_pool_size", 1), \
+            patch.object(bp.settings, "browser_pool_contexts_per_browser", 2), \
+            patch.object(bp.settings, "browser_pool_max_uses", 3), \
+            patch.object(bp.settings, "browser_pool_max_memory_mb", 500):
+        yield pool
+        pool.shutdown_all()
+
+
+class TestBrowserPool:
+    """浏览器租用与回收测试"""
+
+    def test_lease_injects_endpoints_and_isolated_context(self, pool):
+        """测试租用注入连接地址，归还时销毁上下文"""
+        lease = pool.acquire(execution_id=7)
+        browser = lease.instance
+
+        assert lease.env["KUMO_BROWSER_CDP_URL"] == "http://127.0.0.1:9222"
+        assert lease.env["KUMO_BROWSER_DEBUGGER_ADDRESS"] == "127.0.0.1:9222"
+        assert lease.env["KUMO_BROWSER_CONTEXT_ID"] in browser.contexts
+        assert pool.status()["leases"][0]["execution_id"] == 7
+
+        pool.release(lease)
+        assert browser.contexts == set()
+        assert browser.uses == 1
+
+    def test_concurrent_leases_share_browser_until_full(self, pool):
+        """测试同一浏览器承载多个上下文，池满时等待超时"""
+        first = pool.acquire()
+        second = pool.acquire()
+        assert first.instance is second.instance
+        assert first.context_id != second.context_id
+
+        with pytest.raises(bp.BrowserPoolError, match="No pooled browser"):
+            pool.acquire(timeout=0.1)
+
+        pool.release(first)
+        third = pool.acquire(timeout=1)
+        assert third.instance is second.instance
+
+    def test_recycle_after_max_uses(self, pool):
+        """测试达到使用次数后回收浏览器"""
+        browsers = set()
+        for _ in range(3):
+            lease = pool.acquire()
+            browsers.add(lease.instance)
+            pool.release(lease)
+
+        (browser,) = browsers
+        assert browser.stopped is True
+        assert browser.retire_reason == "reached 3 uses"
+        assert pool.acquire().instance is not browser
+
+    def test_recycle_waits_for_active_leases(self, pool):
+        """测试内存超限的浏览器在仍有租用时不被关闭"""
+        busy = pool.acquire()
+        done = pool.acquire()
+        with patch.object(FakeBrowser, "memory", 800.0):
+            pool.release(done)
+
+        browser = busy.instance
+        assert browser.retiring is True
+        assert browser.stopped is False
+        pool.release(busy)
+        assert browser.stopped is True
+
+    def test_missing_chromium(self, pool):
+        """测试找不到 Chromium 时报错"""
+        with patch.object(bp, "find_chrome_binary", return_value=None):
+            with pytest.raises(bp.BrowserPoolError, match="Chromium not found"):
+                pool.acquire()
+
+    def test_failed_start_wakes_waiters(self, pool):
+        """测试浏览器启动失败后立即唤醒等待者，由等待者重新启动"""
+        starting = threading.Event()
+        fail = threading.Event()
+
+        class FailingBrowser(FakeBrowser):
+            def __init__(self, chrome_bin):
+                starting.set()
+                fail.wait(5)
+                raise RuntimeError("Chromium crashed on startup")
+
+        errors = []
+
+        def first_acquire():
+            try:
+                pool.acquire()
+            except RuntimeError as e:
+                errors.append(e)
+
+        with patch.object(bp, "BrowserInstance", FailingBrowser):
+            first = threading.Thread(target=first_acquire)
+            first.start()
+            starting.wait(5)
+        waiter = {}
+
+        def second_acquire():
+            started = time.time()
+            waiter["lease"] = pool.acquire(timeout=10)
+            waiter["elapsed"] = time.time() - started
+
+        second = threading.Thread(target=second_acquire)
+        second.start()
+        time.sleep(0.2)
+        fail.set()
+        first.join(5)
+        second.join(5)
+
+        assert len(errors) == 1
+        assert isinstance(waiter["lease"].instance, FakeBrowser)
+        assert waiter["elapsed"] < 5
+
+    def test_runtime_pools_endpoint(self, pool, test_client):
+        """测试资源池状态接口"""
+        response = test_client.get("/api/system/runtime-pools")
+        assert response.status_code == 200
+        assert response.json()["browser_pool"]["size"] == 1
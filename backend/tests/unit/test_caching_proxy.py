@@ -0,0 +1,220 @@
+"""
+单元测试 - 本地缓存转发代理
+"""
+import base64
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from unittest.mock import patch
+from task_service import caching_proxy as cp
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """测试用源站：按路径返回不同缓存头，并记录收到的请求"""
+    hits = {}
+    conditional = []
+
+    def do_GET(self):
+        OriginHandler.hits[self.path] = OriginHandler.hits.get(self.path, 0) + 1
+        count = OriginHandler.hits[self.path]
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            OriginHandler.conditional.append(self.path)
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", "max-age=0")
+            self.end_headers()
+            return
+        headers = {
+            "/fresh": {"Cache-Control": "max-age=60"},
+            "/etag": {"Cache-Control": "max-age=0", "ETag": '"v1"'},
+            "/nostore": {"Cache-Control": "no-store"},
+            "/cookie": {"Set-Cookie": "session=abc"},
+            "/private": {"Cache-Control": "private, max-age=60"},
+            "/plain": {},
+        }.get(self.path, {})
+        body = f"{self.path} #{count}".encode()
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    OriginHandler.hits = {}
+    OriginHandler.conditional = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy(temp_dir):
+    proxy = cp.CachingProxy()
+    proxy.stop()
+    proxy._cache = None
+    with patch.object(cp.settings, "cache_proxy_dir", temp_dir):
+        yield proxy
+        proxy.stop()
+        proxy._cache = None
+
+
+def _get(proxy_url, url):
+    return requests.get(url, proxies={"http": proxy_url, "https": proxy_url}, timeout=10)
+
+
+class TestCacheHeaders:
+    """缓存头计算测试"""
+
+    def test_freshness_lifetime(self):
+        """测试 s-maxage / max-age / Expires / 启发式"""
+        assert cp.freshness_lifetime({"cache-control": "public, max-age=120"}) == 120
+        assert cp.freshness_lifetime({"cache-control": "s-maxage=30, max-age=120"}) == 30
+        assert cp.freshness_lifetime({"cache-control": "no-cache, max-age=120"}) == 0
+        assert cp.freshness_lifetime({
+            "date": "Mon, 01 Jan 2024 00:00:00 GMT", "expires": "Mon, 01 Jan 2024 00:10:00 GMT",
+        }) == 600
+        assert cp.freshness_lifetime({
+            "date": "Mon, 11 Jan 2024 00:00:00 GMT", "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+        }) == 86400
+
+    def test_cacheable(self):
+        """测试 no-store / Set-Cookie / private 不缓存，项目策略只能放宽 no-store"""
+        relaxed = {"ignore_no_store": True}
+        assert cp.is_cacheable(200, {}) is True
+        assert cp.is_cacheable(500, {}) is False
+        assert cp.is_cacheable(200, {"cache-control": "no-store"}) is False
+        assert cp.is_cacheable(200, {"set-cookie": "a=1"}) is False
+        assert cp.is_cacheable(200, {"cache-control": "no-store"}, relaxed) is True
+        assert cp.is_cacheable(200, {"set-cookie": "a=1"}, relaxed) is False
+        assert cp.is_cacheable(200, {"cache-control": "private"}, relaxed) is False
+        assert cp.cache_namespace(200, {}, 3) is None
+        assert cp.cache_namespace(200, {"cache-control": "no-store"}, 3) == "project-3"
+
+    def test_policy_rules(self):
+        """测试项目规则匹配 TTL 与跳过缓存"""
+        policy = {"default_ttl": 10, "rules": [{"pattern": "*/list/*", "ttl": 300}], "bypass": ["*/api/*"]}
+        assert cp.policy_ttl(policy, "http://a.com/list/1") == 300
+        assert cp.policy_ttl(policy, "http://a.com/item/1") == 10
+        assert cp.policy_bypass(policy, "http://a.com/api/x") is True
+        assert cp.policy_bypass({"enabled": False}, "http://a.com/") is True
+
+
+class TestCachingProxy:
+    """代理转发与缓存测试"""
+
+    def test_fresh_response_is_served_from_cache(self, proxy, origin):
+        """测试新鲜响应第二次命中缓存，并按执行统计"""
+        proxy_url = proxy.register_execution(1)
+
+        first = _get(proxy_url, origin + "/fresh")
+        second = _get(proxy_url, origin + "/fresh")
+
+        assert first.headers["X-Kumo-Cache"] == "MISS"
+        assert second.headers["X-Kumo-Cache"] == "HIT"
+        assert second.text == "/fresh #1"
+        assert OriginHandler.hits["/fresh"] == 1
+        counters = proxy.unregister_execution(1)
+        assert counters["requests"] == 2
+        assert counters["cache_hits"] == 1
+        assert counters["bytes_from_network"] == len("/fresh #1")
+
+    def test_stale_response_is_revalidated(self, proxy, origin):
+        """测试过期响应使用 ETag 条件请求重新验证"""
+        proxy_url = proxy.register_execution(1)
+        _get(proxy_url, origin + "/etag")
+        second = _get(proxy_url, origin + "/etag")
+
+        assert second.headers["X-Kumo-Cache"] == "REVALIDATED"
+        assert second.text == "/etag #1"
+        assert OriginHandler.conditional == ["/etag"]
+        assert proxy.stats()["revalidated"] == 1
+
+    def test_no_store_and_project_policy(self, proxy, origin):
+        """测试 no-store 不缓存，项目策略强制 TTL 与跳过规则"""
+        plain_url = proxy.register_execution(1)
+        _get(plain_url, origin + "/nostore")
+        assert _get(plain_url, origin + "/nostore").headers["X-Kumo-Cache"] == "MISS"
+
+        policy = {"default_ttl": 60, "bypass": ["*/fresh"]}
+        policy_url = proxy.register_execution(2, project_id=1, policy=policy)
+        _get(policy_url, origin + "/plain")
+        assert _get(policy_url, origin + "/plain").headers["X-Kumo-Cache"] == "HIT"
+        assert _get(policy_url, origin + "/fresh").headers["X-Kumo-Cache"] == "BYPASS"
+
+    def test_policy_ttl_applies_to_the_caller_only(self, proxy, origin):
+        """测试项目强制 TTL 只影响该项目的查找，不会让其它项目命中按该 TTL 存入的条目"""
+        policy_url = proxy.register_execution(1, project_id=1, policy={"default_ttl": 60})
+        plain_url = proxy.register_execution(2, project_id=2)
+
+        _get(policy_url, origin + "/plain")
+        assert _get(policy_url, origin + "/plain").headers["X-Kumo-Cache"] == "HIT"
+        assert _get(plain_url, origin + "/plain").headers["X-Kumo-Cache"] == "MISS"
+        assert OriginHandler.hits["/plain"] == 2
+
+    def test_relaxed_entries_stay_in_their_project(self, proxy, origin):
+        """测试忽略 no-store 存入的条目只对该项目可见，Set-Cookie / private 响应在任何策略下都不缓存"""
+        relaxed = {"ignore_no_store": True, "default_ttl": 60}
+        first = proxy.register_execution(1, project_id=1, policy=relaxed)
+        same_project = proxy.register_execution(2, project_id=1, policy=relaxed)
+        other_project = proxy.register_execution(3, project_id=2, policy={"default_ttl": 60})
+
+        _get(first, origin + "/nostore")
+        assert _get(same_project, origin + "/nostore").headers["X-Kumo-Cache"] == "HIT"
+        assert _get(other_project, origin + "/nostore").headers["X-Kumo-Cache"] == "MISS"
+        for path in ("/cookie", "/private"):
+            _get(first, origin + path)
+            assert _get(same_project, origin + path).headers["X-Kumo-Cache"] == "MISS"
+
+    def test_requires_execution_credentials(self, proxy, origin):
+        """测试没有执行凭据时返回 407"""
+        proxy.ensure_started()
+        response = _get(f"http://{proxy.url}", origin + "/fresh")
+        assert response.status_code == 407
+
+        forged = proxy.register_execution(1).replace("exec-1:", "exec-1:wrong")
+        assert _get(forged, origin + "/fresh").status_code == 407
+
+    def test_restart_keeps_port_and_credentials(self, proxy, origin):
+        """测试重启后沿用上次的端口和密钥，重新登记的执行凭据不变（重新接管的执行仍可使用代理）"""
+        proxy_url = proxy.register_execution(7)
+        proxy.stop()
+        proxy.unregister_execution(7)
+        proxy._secret = None
+
+        assert proxy.register_execution(7) == proxy_url
+        assert proxy.register_execution(8) != proxy_url.replace("exec-7", "exec-8")
+        assert _get(proxy_url, origin + "/plain").status_code == 200
+
+    def test_connect_tunnel_counts_bytes(self, proxy, origin):
+        """测试 CONNECT 隧道透传并统计字节"""
+        proxy_url = proxy.register_execution(1)
+        credentials = proxy_url.split("//", 1)[1].split("@", 1)[0]
+        target = origin.split("//", 1)[1]
+        host, port = proxy.url.split(":")
+
+        with socket.create_connection((host, int(port)), timeout=10) as sock:
+            auth = base64.b64encode(credentials.encode()).decode()
+            sock.sendall(f"CONNECT {target} HTTP/1.1\r\nProxy-Authorization: Basic {auth}\r\n\r\n".encode())
+            assert b" 200 " in sock.recv(4096)
+            sock.sendall(b"GET /plain HTTP/1.0\r\n\r\n")
+            reply = b""
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+
+        assert reply.endswith(b"/plain #1")
+        counters = proxy.unregister_execution(1)
+        assert counters["tunnels"] == 1
+        assert counters["bytes_from_network"] == len(reply)
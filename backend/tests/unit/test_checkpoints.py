@@ -0,0 +1,114 @@
+"""
+单元测试 - 断点续跑重试
+"""
+import os
+import sys
+import time
+import pytest
+from unittest.mock import Mock
+from task_service import models
+from task_service import task_executor
+from task_service import checkpoints
+
+
+# Counts progress in the checkpoint and fails once halfway through
+RESUMABLE_SCRIPT = (
+    "import os, sys; "
+    "ckpt = os.path.join(os.environ['KUMO_CHECKPOINT_DIR'], 'progress'); "
+    "done = int(open(ckpt).read()) if os.path.exists(ckpt) else 0; "
+    "print('attempt', os.environ['KUMO_ATTEMPT'], 'resume', os.environ['KUMO_RESUME'], 'from', done); "
+    "open(ckpt, 'w').write(str(max(done, 5))); "
+    "sys.exit(0 if done >= 5 else 1)"
+)
+
+
+@pytest.fixture
+def checkpoint_dir(executor_db):
+    return checkpoints.settings.checkpoint_dir
+
+
+@pytest.fixture
+def resumable_task(make_task):
+    """创建可续跑的任务"""
+    return make_task(f'"{sys.executable}" -c "{RESUMABLE_SCRIPT}"', name="resumable",
+                     retry_count=2, retry_delay=0, failure_threshold=5)
+
+
+def _executions(test_db, task_id):
+    test_db.expire_all()
+    return test_db.query(models.TaskExecution).filter(
+        models.TaskExecution.task_id == task_id
+    ).order_by(models.TaskExecution.id).all()
+
+
+class TestCheckpointRetries:
+    """断点续跑测试"""
+
+    def test_retry_resumes_from_checkpoint(self, test_db, checkpoint_dir, resumable_task):
+        """测试重试共享首次执行的断点目录，并注入 KUMO_RESUME=1"""
+        scheduler = Mock()
+        task_executor.run_task_execution(resumable_task.id, 1, None, scheduler)
+
+        first = _executions(test_db, resumable_task.id)[0]
+        assert first.status == "failed"
+        assert first.root_execution_id == first.id
+        assert os.path.exists(os.path.join(checkpoints.checkpoint_path(resumable_task.id, first.id), "progress"))
+
+        retry = scheduler.add_job.call_args[1]
+        assert retry["kwargs"]["root_execution_id"] == first.id
+        task_executor.run_task_execution(*retry["args"], **retry["kwargs"])
+
+        second = _executions(test_db, resumable_task.id)[1]
+        assert second.status == "success"
+        assert second.attempt == 2
+        assert second.root_execution_id == first.id
+        assert "attempt 2 resume 1 from 5" in second.output
+        # Cleaned up once the run succeeded
+        assert not os.path.exists(checkpoints.checkpoint_path(resumable_task.id, first.id))
+
+    def test_first_attempt_starts_fresh(self, test_db, checkpoint_dir, resumable_task):
+        """测试新的逻辑运行使用新的断点目录"""
+        task_executor.run_task_execution(resumable_task.id)
+        task_executor.run_task_execution(resumable_task.id)
+
+        executions = _executions(test_db, resumable_task.id)
+        assert [e.status for e in executions] == ["failed", "failed"]
+        assert "attempt 1 resume 0 from 0" in executions[1].output
+        assert len(os.listdir(os.path.join(checkpoint_dir, f"task_{resumable_task.id}"))) == 2
+
+    def test_shard_retries_share_checkpoint(self, test_db, checkpoint_dir, resumable_task, running_dispatcher):
+        """测试分片重试共享该分片的断点目录"""
+        resumable_task.shard_count = 2
+        test_db.commit()
+
+        task_executor.run_task_execution(resumable_task.id)
+
+        shards = [e for e in _executions(test_db, resumable_task.id) if e.parent_execution_id]
+        assert sorted((e.shard_index, e.attempt, e.status) for e in shards) == [
+            (0, 1, "failed"), (0, 2, "success"), (1, 1, "failed"), (1, 2, "success"),
+        ]
+        for shard in shards:
+            first = next(e for e in shards if e.shard_index == shard.shard_index and e.attempt == 1)
+            assert shard.root_execution_id == first.id
+        assert not os.listdir(checkpoint_dir)
+
+
+class TestCheckpointCleanup:
+    """断点保留清理测试"""
+
+    def test_expired_checkpoints_are_removed(self, test_db, checkpoint_dir):
+        """测试只清理过期且没有执行中尝试的断点"""
+        expired = checkpoints.prepare_checkpoint(1, 10)
+        active = checkpoints.prepare_checkpoint(1, 20)
+        recent = checkpoints.prepare_checkpoint(2, 30)
+        old = time.time() - 100 * 3600
+        os.utime(expired, (old, old))
+        os.utime(active, (old, old))
+        test_db.add(models.TaskExecution(task_id=1, status="running", root_execution_id=20))
+        test_db.commit()
+
+        assert checkpoints.cleanup_expired_checkpoints(test_db, retention_hours=72) == 1
+
+        assert not os.path.exists(expired)
+        assert os.path.exists(active)
+        assert os.path.exists(recent)
@@ -0,0 +1,142 @@
+"""
+单元测试 - 可调整并发上限与自动调节器
+"""
+import json
+import threading
+import pytest
+from unittest.mock import patch
+from sqlalchemy.orm import sessionmaker
+from core.concurrency import concurrency_controller
+from audit_service.models import AuditLog
+from system_service.models import SystemConfig
+from task_service import concurrency_tuner
+from task_service.concurrency_tuner import concurrency_autotuner
+from task_service.dispatcher import task_dispatcher, RunRequest
+
+
+@pytest.fixture
+def controller(test_db):
+    """每个测试从固定上限开始，结束后恢复原上限和自动调节开关"""
+    original_limit, original_enabled = concurrency_controller.limit, concurrency_autotuner.enabled
+    concurrency_controller.set_limit(4, source="test")
+    concurrency_controller.drain_latency_ratios()
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=test_db.get_bind())
+    with patch.object(concurrency_tuner, "SessionLocal", session_factory):
+        yield concurrency_controller
+    concurrency_controller.set_limit(original_limit, source="test")
+    concurrency_autotuner._enabled = original_enabled
+
+
+class TestResizableLimit:
+    """运行时调整上限测试"""
+
+    def test_raising_limit_wakes_waiters(self, controller):
+        """测试调高上限后排队的执行立即获得许可，调低上限不影响运行中的执行"""
+        controller.set_limit(1)
+        assert controller.acquire(timeout=1)
+        assert not controller.acquire(timeout=0.1)
+
+        result = {}
+        waiter = threading.Thread(target=lambda: result.setdefault("acquired", controller.acquire(timeout=5)))
+        waiter.start()
+        change = controller.set_limit(2, source="admin", reason="test")
+        waiter.join(5)
+
+        assert result["acquired"] is True
+        assert (change["old_limit"], change["new_limit"]) == (1, 2)
+        controller.set_limit(1)
+        assert controller.get_active_count() == 2
+        assert controller.get_available_slots() == 0
+        controller.release()
+        controller.release()
+
+    def test_force_acquire_overshoots_limit(self, controller):
+        """测试强制占用的许可可以超过上限，释放到上限以下之前不再发放许可"""
+        controller.set_limit(1)
+        assert controller.acquire(timeout=1)
+        controller.force_acquire()
+
+        assert controller.get_active_count() == 2
+        controller.release()
+        assert not controller.acquire(timeout=0.1)
+        controller.release()
+        assert controller.acquire(timeout=1)
+        controller.release()
+
+    def test_limit_is_clamped(self, controller):
+        """测试上限限制在配置范围内，未变化时不记录"""
+        with patch.object(concurrency_tuner.settings, "concurrency_max_limit", 10):
+            controller.set_limit(1000)
+            assert controller.limit == 10
+            assert controller.set_limit(10) is None
+        controller.set_limit(0)
+        assert controller.limit == 1
+
+
+class TestAutotuner:
+    """自动调节测试"""
+
+    def test_saturated_host_shrinks_limit(self, test_db, controller):
+        """测试 CPU 过高时收缩上限并写入审计日志"""
+        change = concurrency_autotuner.tune_once(cpu=95, memory=40)
+
+        assert (change["new_limit"], change["source"]) == (3, "autotune")
+        log = test_db.query(AuditLog).filter(AuditLog.target_name == "concurrency_limit").one()
+        assert json.loads(log.details)["reason"] == "cpu 95%"
+
+    def test_latency_inflation_shrinks_limit(self, controller):
+        """测试执行耗时相对基线明显变长时收缩上限"""
+        for _ in range(4):
+            controller.observe_duration("task", 10.0)
+        for _ in range(3):
+            controller.observe_duration("task", 30.0)
+
+        change = concurrency_autotuner.tune_once(cpu=30, memory=40)
+        assert change["new_limit"] == 3
+        assert change["reason"].startswith("latency")
+
+    def test_queueing_with_headroom_grows_limit(self, controller):
+        """测试执行槽用满且主机空闲时扩张上限，空闲时保持不变"""
+        assert concurrency_autotuner.tune_once(cpu=30, memory=40) is None
+
+        for _ in range(4):
+            assert controller.acquire(timeout=1)
+        try:
+            change = concurrency_autotuner.tune_once(cpu=30, memory=40)
+        finally:
+            for _ in range(4):
+                controller.release()
+        assert change["new_limit"] == 5
+
+    def test_dispatch_queue_counts_as_waiting(self, controller):
+        """测试分发队列中排队的运行视为等待执行槽，主机空闲时扩张上限"""
+        task_dispatcher._queue.extend(RunRequest(1, 1, None, None, {}, "schedule") for _ in range(2))
+        try:
+            change = concurrency_autotuner.tune_once(cpu=30, memory=40)
+            assert concurrency_autotuner.status()["waiting"] == 2
+        finally:
+            task_dispatcher._queue.clear()
+
+        assert change["new_limit"] == 5
+        assert "2 waiting" in change["reason"]
+
+
+class TestConcurrencyApi:
+    """管理接口测试"""
+
+    def test_update_limit_and_autotune(self, test_db, test_client, controller):
+        """测试接口调整上限与开关，设置持久化并记录审计日志"""
+        response = test_client.put("/api/system/concurrency", json={"limit": 8, "autotune": True})
+
+        assert response.status_code == 200
+        assert (response.json()["limit"], response.json()["autotune"]) == (8, True)
+        assert response.json()["changes"][0]["source"] == "admin"
+        config = test_db.query(SystemConfig).filter(SystemConfig.key == concurrency_tuner.CONFIG_KEY).one()
+        assert json.loads(config.value) == {"limit": 8, "autotune": True}
+        assert test_db.query(AuditLog).filter(AuditLog.target_name == "concurrency_limit").count() == 1
+
+    def test_out_of_range_limit_is_rejected(self, test_client, controller):
+        """测试超出范围的上限被拒绝"""
+        response = test_client.put("/api/system/concurrency", json={"limit": 0})
+        assert response.status_code == 400
+        assert concurrency_controller.limit == 4
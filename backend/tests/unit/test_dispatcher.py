@@ -0,0 +1,167 @@
+"""
+单元测试 - 分发队列（背压与过载丢弃）
+"""
+import sys
+import time
+import pytest
+from unittest.mock import patch
+from task_service import models
+from task_service import task_executor
+from task_service import dispatcher
+from task_service.dispatcher import task_dispatcher, DispatchQueueFull, RunRequest, choose_next
+from task_service.duration_estimator import duration_estimator
+from system_service.models import SystemConfig
+
+
+@pytest.fixture
+def task(make_task):
+    """创建快速完成的任务，测试结束后清空分发队列"""
+    yield make_task(f'"{sys.executable}" -c "print(1)"', name="quick", status="paused")
+    task_dispatcher.shutdown()
+    task_dispatcher._queue.clear()
+
+
+def _executions(test_db, task_id):
+    test_db.expire_all()
+    return test_db.query(models.TaskExecution).filter(models.TaskExecution.task_id == task_id).all()
+
+
+class TestManualRunBackpressure:
+    """手动触发的背压测试"""
+
+    def test_run_reports_queue_position(self, test_db, test_client, task):
+        """测试手动触发进入分发队列并返回排队位置"""
+        first = test_client.post(f"/api/tasks/{task.id}/run").json()
+        second = test_client.post(f"/api/tasks/{task.id}/run").json()
+
+        assert (first["queue_position"], second["queue_position"]) == (1, 2)
+        assert task_dispatcher.position(second["execution_id"]) == 2
+        assert [e.status for e in _executions(test_db, task.id)] == ["pending", "pending"]
+
+    def test_full_queue_returns_429(self, test_db, test_client, task):
+        """测试队列已满时返回 429 + Retry-After，且不留下 pending 记录"""
+        with patch.object(dispatcher.settings, "dispatch_queue_size", 1):
+            assert test_client.post(f"/api/tasks/{task.id}/run").status_code == 200
+            response = test_client.post(f"/api/tasks/{task.id}/run")
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert len(_executions(test_db, task.id)) == 1
+
+    def test_rejected_pending_record_is_closed_out(self, test_db, test_client, task):
+        """测试入队失败（并发填满队列）时 pending 记录被标记为 dropped"""
+        with patch.object(task_dispatcher, "submit", side_effect=DispatchQueueFull(7)):
+            response = test_client.post(f"/api/tasks/{task.id}/run")
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+        assert [e.status for e in _executions(test_db, task.id)] == ["dropped"]
+
+    def test_stop_queued_run(self, test_db, test_client, task):
+        """测试停止排队中的执行会将其移出队列"""
+        execution_id = test_client.post(f"/api/tasks/{task.id}/run").json()["execution_id"]
+
+        assert test_client.post(f"/api/tasks/executions/{execution_id}/stop").status_code == 200
+        assert task_dispatcher.position(execution_id) is None
+        assert [e.status for e in _executions(test_db, task.id)] == ["stopped"]
+
+
+class TestDispatcher:
+    """分发线程测试"""
+
+    def test_queued_runs_execute(self, test_db, test_client, task):
+        """测试分发线程拿到许可后运行排队的执行"""
+        execution_id = test_client.post(f"/api/tasks/{task.id}/run").json()["execution_id"]
+        task_dispatcher.start()
+
+        deadline = time.time() + 10
+        while time.time() < deadline and _executions(test_db, task.id)[0].status in ("pending", "running"):
+            time.sleep(0.1)
+
+        execution = _executions(test_db, task.id)[0]
+        assert (execution.id, execution.status) == (execution_id, "success")
+        assert task_dispatcher.status()["dispatched"] >= 1
+
+    def test_start_closes_stale_pending(self, test_db, task):
+        """测试启动时关闭上次进程遗留的 pending 记录"""
+        test_db.add(models.TaskExecution(task_id=task.id, status="pending"))
+        test_db.commit()
+
+        task_dispatcher.start()
+
+        execution = _executions(test_db, task.id)[0]
+        assert execution.status == "dropped"
+        assert "backend restarted" in execution.output
+
+    def test_slot_timeout_closes_pending(self, test_db, task):
+        """测试直接执行时等待许可超时不再把记录遗留在 pending"""
+        execution = models.TaskExecution(task_id=task.id, status="pending")
+        test_db.add(execution)
+        test_db.commit()
+
+        with patch.object(task_executor.concurrency_controller, "acquire", return_value=False):
+            task_executor.run_task_execution(task.id, 1, execution.id)
+
+        assert _executions(test_db, task.id)[0].status == "dropped"
+
+
+def _request(task_id, duration, memory, enqueued_at=100.0):
+    request = RunRequest(task_id, 1, None, None, {}, "schedule")
+    request.enqueued_at, request.est_duration, request.est_memory = enqueued_at, duration, memory
+    return request
+
+
+class TestDispatchPolicies:
+    """分发策略测试"""
+
+    def test_sjf_prefers_short_runs_with_aging(self):
+        """测试 sjf 优先预计耗时最短的运行，队首等待超过老化时间后优先"""
+        queue = [_request(1, 7200, 0), _request(2, 5, 0), _request(3, 60, 0)]
+
+        assert choose_next(queue, "fifo", now=110) == 0
+        assert choose_next(queue, "sjf", now=110, aging=600) == 1
+        assert choose_next(queue, "sjf", now=800, aging=600) == 0
+
+    def test_binpack_fits_memory_budget(self):
+        """测试 binpack 选放得下的最大运行，放不下时等待，空闲时仍运行超出预算的运行"""
+        queue = [_request(1, 60, 3000), _request(2, 60, 500), _request(3, 60, 1500)]
+
+        assert choose_next(queue, "binpack", now=110, running=1, committed_mb=2000, budget_mb=4000) == 2
+        assert choose_next(queue, "binpack", now=110, running=2, committed_mb=3800, budget_mb=4000) is None
+        assert choose_next([_request(1, 60, 9000)], "binpack", now=110, running=0, budget_mb=4000) == 0
+
+    def test_estimator_seeds_from_history(self, test_db, task):
+        """测试估算器用执行历史初始化 EWMA，执行结束后更新"""
+        for duration, memory in ((10.0, 100.0), (20.0, 200.0)):
+            test_db.add(models.TaskExecution(task_id=task.id, status="success", duration=duration,
+                                             max_memory_mb=memory))
+        test_db.commit()
+        duration_estimator._estimates.pop(task.id, None)
+
+        assert duration_estimator.estimate(task.id) == (13.0, 130.0)
+        duration_estimator.observe(task.id, 23.0, 30.0)
+        assert duration_estimator.estimate(task.id) == (16.0, 100.0)
+        duration_estimator._estimates.pop(task.id, None)
+
+    def test_select_uses_policy(self, task):
+        """测试切换到 sjf 后分发线程先取出预计耗时短的运行"""
+        now = time.time()
+        task_dispatcher._queue.extend([_request(task.id, 3600, 0, now), _request(task.id, 1, 0, now)])
+        try:
+            task_dispatcher.set_policy("sjf")
+            with task_dispatcher._cond:
+                assert task_dispatcher._select().est_duration == 1
+        finally:
+            task_dispatcher.set_policy("fifo")
+
+    def test_policy_api_persists(self, test_db, test_client, task):
+        """测试接口切换分发策略并保存到系统配置"""
+        try:
+            response = test_client.put("/api/system/dispatch-queue", json={"policy": "binpack"})
+            assert response.status_code == 200
+            assert response.json()["policy"] == "binpack"
+            config = test_db.query(SystemConfig).filter(SystemConfig.key == dispatcher.POLICY_CONFIG_KEY).one()
+            assert config.value == '{"policy": "binpack"}'
+            assert test_client.put("/api/system/dispatch-queue", json={"policy": "random"}).status_code == 422
+        finally:
+            task_dispatcher.set_policy("fifo")
@@ -0,0 +1,141 @@
+"""
+单元测试 - 环境文件去重
+"""
+import os
+import pytest
+from environment_service.env_dedupe import EnvDeduplicator
+
+
+def _write(path, content, mode=0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    os.chmod(path, mode)
+
+
+@pytest.fixture
+def envs(temp_dir):
+    payload = b"x" * 8192
+    _write(os.path.join(temp_dir, "env_a", "lib", "numpy.so"), payload)
+    _write(os.path.join(temp_dir, "env_b", "lib", "numpy.so"), payload)
+    _write(os.path.join(temp_dir, "env_c", "lib", "numpy.so"), payload)
+    _write(os.path.join(temp_dir, "env_a", "lib", "unique.so"), b"y" * 8192)
+    _write(os.path.join(temp_dir, "env_a", "lib", "small.txt"), b"tiny")
+    return temp_dir
+
+
+class TestEnvDeduplicator:
+    """EnvDeduplicator 测试"""
+
+    def test_identical_files_are_hardlinked(self, envs):
+        """测试相同文件被替换为硬链接"""
+        dedupe = EnvDeduplicator(envs)
+        stats = dedupe.run(min_size=1024)
+
+        a = os.stat(os.path.join(envs, "env_a", "lib", "numpy.so"))
+        b = os.stat(os.path.join(envs, "env_b", "lib", "numpy.so"))
+        c = os.stat(os.path.join(envs, "env_c", "lib", "numpy.so"))
+        assert a.st_ino == b.st_ino == c.st_ino
+        assert stats["linked_files"] == 2
+        assert stats["bytes_saved"] == 2 * 8192
+        # Small files are left alone
+        assert "env_a/lib/small.txt" not in dedupe.load_manifest()["files"]
+
+    def test_second_run_skips_hashing(self, envs):
+        """测试二次运行不重复哈希已去重文件"""
+        dedupe = EnvDeduplicator(envs)
+        dedupe.run(min_size=1024)
+        stats = dedupe.run(min_size=1024)
+        assert stats["hashed_files"] == 0
+        assert stats["already_deduped"] == 4
+
+    def test_upgrade_breaks_link_and_is_rededuped(self, envs):
+        """测试升级替换文件后链接断开，其他环境内容不受影响"""
+        dedupe = EnvDeduplicator(envs)
+        dedupe.run(min_size=1024)
+
+        upgraded = os.path.join(envs, "env_b", "lib", "numpy.so")
+        os.remove(upgraded)
+        _write(upgraded, b"z" * 8192)
+
+        stats = dedupe.run(min_size=1024)
+        assert stats["relinked_files"] == 1
+        with open(os.path.join(envs, "env_a", "lib", "numpy.so"), "rb") as f:
+            assert f.read() == b"x" * 8192
+        with open(upgraded, "rb") as f:
+            assert f.read() == b"z" * 8192
+
+    def test_executable_bit_is_part_of_identity(self, envs):
+        """测试可执行位不同的文件不会互相链接"""
+        _write(os.path.join(envs, "env_b", "bin", "tool"), b"t" * 4096, 0o755)
+        _write(os.path.join(envs, "env_c", "bin", "tool"), b"t" * 4096, 0o644)
+        EnvDeduplicator(envs).run(min_size=1024)
+        assert os.access(os.path.join(envs, "env_b", "bin", "tool"), os.X_OK)
+        assert not os.access(os.path.join(envs, "env_c", "bin", "tool"), os.X_OK)
+
+    def test_orphaned_objects_are_collected(self, envs):
+        """测试无引用对象被回收"""
+        dedupe = EnvDeduplicator(envs)
+        dedupe.run(min_size=1024)
+        os.remove(os.path.join(envs, "env_a", "lib", "unique.so"))
+        stats = dedupe.run(min_size=1024)
+        assert stats["objects_removed"] == 1
+
+    def test_in_place_write_marks_envs_broken(self, envs):
+        """测试原地写入共享文件后，校验把链接到同一 inode 的环境列为损坏，且不再去重被改写的文件"""
+        dedupe = EnvDeduplicator(envs)
+        dedupe.run(min_size=1024)
+        written = os.path.join(envs, "env_a", "lib", "numpy.so")
+        os.chmod(written, 0o644)
+        with open(written, "r+b") as f:
+            f.write(b"patched")
+            f.seek(0)
+            damaged = f.read()
+        _write(os.path.join(envs, "env_d", "lib", "numpy.so"), damaged)
+
+        stats = dedupe.run(min_size=1024, verify=True)
+
+        assert sorted(stats["broken_envs"]) == ["env_a", "env_b", "env_c"]
+        assert len(stats["modified_in_place"]) == 3
+        assert dedupe.load_manifest()["files"]["env_a/lib/numpy.so"]["broken"]
+        # The damaged content is not linked into environments deduplicated later
+        assert os.stat(os.path.join(envs, "env_d", "lib", "numpy.so")).st_ino != os.stat(written).st_ino
+
+    def test_size_changing_in_place_write_is_not_rededuped(self, envs):
+        """测试改变大小的原地写入（inode 不变）也被识别，旧对象被移除且文件之后不再进入存储"""
+        dedupe = EnvDeduplicator(envs)
+        dedupe.run(min_size=1024)
+        written = os.path.join(envs, "env_a", "lib", "numpy.so")
+        old_object = dedupe._stored_object(dedupe.load_manifest()["files"]["env_a/lib/numpy.so"]["hash"],
+                                           os.stat(written).st_ino)
+        os.chmod(written, 0o644)
+        with open(written, "ab") as f:
+            f.write(b"appended")
+
+        stats = dedupe.run(min_size=1024)
+
+        assert sorted(stats["broken_envs"]) == ["env_a", "env_b", "env_c"]
+        assert stats["relinked_files"] == 0
+        assert not os.path.exists(old_object)
+        stats = dedupe.run(min_size=1024)
+        assert stats["hashed_files"] == 0
+        assert os.stat(written).st_nlink == 3
+        assert dedupe.load_manifest()["files"]["env_b/lib/numpy.so"]["broken"]
+
+
+class TestMarkBrokenEnvs:
+    """损坏环境标记测试"""
+
+    def test_marks_matching_ready_envs(self, test_db, temp_dir):
+        """测试按环境目录名把 ready 的环境标记为 error"""
+        from environment_service.models import PythonVersion
+        from environment_service.python_version_router import mark_broken_envs
+
+        test_db.add_all([
+            PythonVersion(name="a", version="3.11", path=os.path.join(temp_dir, "env_a", "bin", "python")),
+            PythonVersion(name="b", version="3.11", path=os.path.join(temp_dir, "env_b", "bin", "python")),
+        ])
+        test_db.commit()
+
+        assert mark_broken_envs(test_db, ["env_a"]) == 1
+        assert {v.name: v.status for v in test_db.query(PythonVersion).all()} == {"a": "error", "b": "ready"}
@@ -0,0 +1,126 @@
+"""
+单元测试 - 锁文件环境解析
+"""
+import datetime
+import pytest
+from unittest.mock import patch
+from environment_service import env_resolver
+from environment_service.models import PythonVersion
+from project_service.models import Project
+from task_service import task_executor
+from task_service.models import Task, TaskExecution
+
+
+class TestNormalizeRequirements:
+    """requirements 规范化测试"""
+
+    def test_equivalent_requirements_normalize_identically(self):
+        """测试语义相同的 requirements 规范化结果一致"""
+        a = "Requests >= 2.0\n# comment\n\nnumpy==1.26.0  # pinned\nScrapy_Splash\n"
+        b = "numpy == 1.26.0\nscrapy-splash\nrequests>=2.0\nrequests>=2.0\n"
+        assert env_resolver.normalize_requirements(a) == env_resolver.normalize_requirements(b)
+
+    def test_extras_are_sorted_and_lowercased(self):
+        """测试 extras 排序并转小写"""
+        assert env_resolver.normalize_requirements("Celery[Redis, Auth]") == ["celery[auth,redis]"]
+
+    def test_options_are_kept(self):
+        """测试 pip 选项保留"""
+        lines = env_resolver.normalize_requirements("-i   https://mirror/simple\nlxml")
+        assert "-i https://mirror/simple" in lines
+        assert "lxml" in lines
+
+    def test_hash_depends_on_python_version(self):
+        """测试哈希与 Python 版本相关"""
+        lines = env_resolver.normalize_requirements("requests")
+        assert env_resolver.compute_requirements_hash(lines, "3.10") != \
+            env_resolver.compute_requirements_hash(lines, "3.11")
+
+
+class TestResolveEnvironment:
+    """环境解析与复用测试"""
+
+    def test_reuses_ready_environment(self, test_db):
+        """测试哈希一致时复用已就绪环境"""
+        lines = env_resolver.normalize_requirements("requests\nlxml")
+        req_hash = env_resolver.compute_requirements_hash(lines, "3.10")
+        existing = PythonVersion(name="lock-x", version="3.10", path="/envs/lock-x/bin/python",
+                                 status="ready", is_conda=True, requirements_hash=req_hash)
+        test_db.add(existing)
+        test_db.commit()
+
+        with patch("environment_service.env_resolver.threading.Thread") as mock_thread:
+            version, reused = env_resolver.resolve_environment(test_db, "LXML\nrequests", "3.10")
+
+        assert reused is True
+        assert version.id == existing.id
+        mock_thread.assert_not_called()
+
+    def test_builds_new_environment_in_background(self, test_db):
+        """测试哈希不匹配时后台构建新环境"""
+        with patch("environment_service.env_resolver.threading.Thread") as mock_thread:
+            version, reused = env_resolver.resolve_environment(test_db, "requests", "3.10")
+
+        assert reused is False
+        assert version.status == "installing"
+        assert version.name.startswith("lock-")
+        mock_thread.return_value.start.assert_called_once()
+
+    def test_invalid_python_version(self, test_db):
+        """测试非法 Python 版本"""
+        with pytest.raises(ValueError):
+            env_resolver.resolve_environment(test_db, "requests", "abc")
+
+
+class TestGarbageCollection:
+    """引用计数与回收测试"""
+
+    def _make_env(self, db, name, req_hash, days_idle):
+        env = PythonVersion(name=name, version="3.10", path=f"/envs/{name}/bin/python", status="ready",
+                            is_conda=True, requirements_hash=req_hash,
+                            last_used_at=datetime.datetime.now() - datetime.timedelta(days=days_idle))
+        db.add(env)
+        db.commit()
+        return env
+
+    def test_count_references(self, test_db):
+        """测试引用计数包含任务和锁文件项目"""
+        env = self._make_env(test_db, "lock-a", "hash-a", 0)
+        test_db.add(Project(name="p1", path="/tmp/p1", work_dir="./", env_mode="lockfile", requirements_hash="hash-a"))
+        test_db.add(Task(name="t1", command="python main.py", project_id=1, env_id=env.id))
+        test_db.commit()
+        assert env_resolver.count_references(test_db, env) == 2
+
+    def test_collects_only_unused_idle_environments(self, test_db):
+        """测试只回收无引用且闲置超期的环境"""
+        self._make_env(test_db, "lock-idle", "hash-idle", 30)
+        self._make_env(test_db, "lock-recent", "hash-recent", 1)
+        self._make_env(test_db, "lock-used", "hash-used", 30)
+        test_db.add(Project(name="p1", path="/tmp/p1", work_dir="./", env_mode="lockfile", requirements_hash="hash-used"))
+        test_db.commit()
+
+        with patch("environment_service.env_resolver.threading.Thread"):
+            collected = env_resolver.collect_unused_environments(test_db, idle_days=7)
+
+        assert [c["name"] for c in collected] == ["lock-idle"]
+
+
+class TestLockfileExecution:
+    """锁文件模式执行测试"""
+
+    def test_run_fails_when_environment_not_ready(self, test_db, make_task):
+        """测试锁文件环境未就绪时执行失败并说明原因，而不是使用系统 python 运行"""
+        task = make_task("python -c pass", retry_count=0)
+        project = test_db.get(Project, task.project_id)
+        project.env_mode, project.requirements_hash = "lockfile", "hash-building"
+        test_db.add(PythonVersion(name="lock-building", version="3.10", path="/envs/lock-building/bin/python",
+                                  status="installing", is_conda=True, requirements_hash="hash-building"))
+        test_db.commit()
+
+        task_executor.run_task_execution(task.id)
+
+        test_db.expire_all()
+        execution = test_db.query(TaskExecution).filter(TaskExecution.task_id == task.id).one()
+        assert execution.status == "failed"
+        assert "Environment not ready" in execution.output
+        assert "installing" in execution.output
@@ -0,0 +1,146 @@
+"""
+单元测试 - 事件总线与实时推送通道
+"""
+import asyncio
+import pytest
+from collections import deque
+from unittest.mock import patch
+from core.event_bus import event_bus
+from core.concurrency import concurrency_controller
+from task_service import models
+from system_service import events_router
+
+
+@pytest.fixture
+def bus():
+    """清空事件历史，避免其它测试产生的事件干扰（此前的序号都视为已被挤出）"""
+    event_bus.publish("test", {})
+    with event_bus._state_lock:
+        event_bus._history.clear()
+        event_bus._evicted_seq = event_bus._seq
+    yield event_bus
+
+
+def _history(topic):
+    return [e["data"] for e in event_bus._history if e["topic"] == topic]
+
+
+class TestEventBus:
+    """事件总线测试"""
+
+    def test_subscription_receives_matching_topics(self, bus):
+        """测试订阅只收到关注主题的事件"""
+        async def scenario():
+            subscription = bus.subscribe(["task"])
+            bus.publish("execution", {"id": 1})
+            bus.publish("task", {"id": 2})
+            event = await subscription.get(timeout=1)
+            bus.unsubscribe(subscription)
+            return event, subscription.queue.qsize()
+
+        event, remaining = asyncio.run(scenario())
+        assert (event["topic"], event["data"]) == ("task", {"id": 2})
+        assert remaining == 0
+
+    def test_slow_consumer_gets_resync(self, bus):
+        """测试队列溢出时丢弃积压并要求重新同步"""
+        async def scenario():
+            with patch.object(events_router.settings, "event_bus_queue_size", 2):
+                subscription = bus.subscribe()
+            for i in range(5):
+                bus.publish("task", {"id": i})
+            await asyncio.sleep(0)
+            bus.unsubscribe(subscription)
+            return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+
+        assert asyncio.run(scenario()) == [{"type": "resync"}]
+
+    def test_events_since_detects_gaps(self, bus):
+        """测试补发：历史完整时返回缺失事件，被挤出或来自旧进程的序号需要重新同步"""
+        start = bus.seq
+        bus.publish("task", {"id": 1})
+        bus.publish("system", {"cpu": 1}, retain=False)
+        bus.publish("task", {"id": 2})
+
+        assert [e["data"] for e in bus.events_since(start)] == [{"id": 1}, {"id": 2}]
+        assert bus.events_since(bus.seq) == []
+        assert bus.events_since(bus.seq + 10) is None
+
+        with patch.object(bus, "_history", deque(bus._history, maxlen=2)):
+            bus.publish("task", {"id": 3})
+            assert bus.events_since(start) is None
+            assert [e["data"] for e in bus.events_since(start + 1)] == [{"id": 2}, {"id": 3}]
+
+    def test_slot_usage_is_published(self, bus):
+        """测试申请/释放执行槽时发布占用"""
+        assert concurrency_controller.acquire(timeout=1)
+        concurrency_controller.release()
+        slots = _history("slots")
+        assert slots[-2]["active"] == slots[-1]["active"] + 1
+
+
+class TestModelTracking:
+    """ORM 变更跟踪测试"""
+
+    def test_commit_publishes_changes(self, test_db, bus):
+        """测试提交后发布新增、字段变化和删除，无关字段变化不发布"""
+        task = models.Task(name="live", command="python main.py", trigger_type="immediate", status="paused")
+        test_db.add(task)
+        test_db.commit()
+        task.status = "active"
+        test_db.commit()
+        task.description = "not tracked"
+        test_db.commit()
+        test_db.delete(task)
+        test_db.commit()
+
+        assert [(e["action"], e["status"]) for e in _history("task")] == [
+            ("created", "paused"), ("updated", "active"), ("deleted", "active"),
+        ]
+        assert _history("task")[0]["id"] == task.id
+
+    def test_rollback_publishes_nothing(self, test_db, bus):
+        """测试回滚的变更不发布"""
+        execution = models.TaskExecution(task_id=1, status="running")
+        test_db.add(execution)
+        test_db.flush()
+        test_db.rollback()
+
+        assert _history("execution") == []
+
+
+class TestEventsWebSocket:
+    """推送通道接口测试"""
+
+    def test_websocket_streams_and_replays(self, test_db, test_client, bus):
+        """测试 WebSocket 推送提交后的执行事件，重连时按序号补发"""
+        with test_client.websocket_connect("/api/events/ws?topics=execution") as ws:
+            hello = ws.receive_json()
+            assert hello["type"] == "hello"
+
+            execution = models.TaskExecution(task_id=7, status="running")
+            test_db.add(execution)
+            test_db.commit()
+            event = ws.receive_json()
+
+        assert event["topic"] == "execution"
+        assert (event["data"]["id"], event["data"]["status"], event["data"]["action"]) == (execution.id, "running", "created")
+
+        execution.status = "success"
+        test_db.commit()
+
+        with test_client.websocket_connect(f"/api/events/ws?topics=execution&since={event['seq']}") as ws:
+            assert ws.receive_json()["type"] == "hello"
+            replayed = ws.receive_json()
+        assert (replayed["data"]["status"], replayed["data"]["action"]) == ("success", "updated")
+
+        with test_client.websocket_connect("/api/events/ws?topics=execution&since=0") as ws:
+            ws.receive_json()
+            assert ws.receive_json()["type"] == "resync"
+
+    def test_heartbeat(self, test_client, bus):
+        """测试空闲连接收到心跳"""
+        with patch.object(events_router.settings, "event_bus_heartbeat", 0.1):
+            with test_client.websocket_connect("/api/events/ws?topics=task") as ws:
+                ws.receive_json()
+                assert ws.receive_json() == {"type": "ping"}
@@ -0,0 +1,176 @@
+"""
+单元测试 - 事件触发器（文件 / Webhook / 任务链）
+"""
+import os
+import json
+import time
+import threading
+import pytest
+from unittest.mock import patch
+from project_service.models import Project
+from task_service import models
+from task_service import event_triggers
+from task_service.event_triggers import event_trigger_manager, normalize_trigger_value
+
+
+class Recorder:
+    """记录触发事件的 dispatcher"""
+
+    def __init__(self):
+        self.calls = []
+        self.event = threading.Event()
+
+    def __call__(self, task_id, event):
+        self.calls.append((task_id, event))
+        self.event.set()
+
+    def wait(self, timeout=5.0):
+        fired = self.event.wait(timeout)
+        self.event.clear()
+        return fired
+
+
+@pytest.fixture
+def recorder():
+    event_trigger_manager.shutdown()
+    event_trigger_manager._inotify_failed = False
+    recorder = Recorder()
+    event_trigger_manager.set_dispatcher(recorder)
+    yield recorder
+    event_trigger_manager.shutdown()
+    event_trigger_manager.set_dispatcher(None)
+
+
+def _write(path, content="data"):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class TestTriggerConfig:
+    """触发器配置校验测试"""
+
+    def test_normalize(self):
+        """测试 webhook 生成令牌，非法配置被拒绝"""
+        webhook = json.loads(normalize_trigger_value("webhook", ""))
+        assert len(webhook["token"]) >= 16
+        assert json.loads(normalize_trigger_value("after_task", '{"task_id": "3"}')) == {"task_id": 3, "on": "success"}
+        with pytest.raises(ValueError):
+            normalize_trigger_value("file", '{"path": "relative/dir"}')
+        with pytest.raises(ValueError):
+            normalize_trigger_value("after_task", '{"task_id": 3, "on": "sometimes"}')
+
+
+class TestFileTrigger:
+    """文件触发器测试"""
+
+    def test_inotify_debounces_matching_files(self, recorder, temp_dir):
+        """测试 inotify 只对匹配的文件触发，防抖期内的多个文件合并为一次"""
+        event_trigger_manager.register(1, "file", {"path": temp_dir, "pattern": "*.csv", "debounce": 0.3})
+        assert event_trigger_manager.status()["file"][1]["mode"] == "inotify"
+
+        _write(os.path.join(temp_dir, "ignored.txt"))
+        _write(os.path.join(temp_dir, "a.csv"))
+        _write(os.path.join(temp_dir, "b.csv"))
+
+        assert recorder.wait()
+        time.sleep(0.5)
+        assert len(recorder.calls) == 1
+        task_id, event = recorder.calls[0]
+        assert task_id == 1
+        assert event["type"] == "file"
+        assert sorted(os.path.basename(f) for f in event["files"]) == ["a.csv", "b.csv"]
+
+    def test_polling_fallback(self, recorder, temp_dir):
+        """测试禁用 inotify 时通过轮询发现新文件（已有文件不触发）"""
+        _write(os.path.join(temp_dir, "old.csv"))
+        with patch.object(event_triggers.settings, "file_trigger_use_inotify", False), \
+                patch.object(event_triggers.settings, "file_trigger_poll_interval", 0.1):
+            event_trigger_manager.register(2, "file", {"path": temp_dir, "pattern": "*.csv", "debounce": 0})
+            assert event_trigger_manager.status()["file"][2]["mode"] == "poll"
+            time.sleep(0.4)
+            _write(os.path.join(temp_dir, "new.csv"))
+
+            assert recorder.wait()
+        assert [os.path.basename(f) for f in recorder.calls[0][1]["files"]] == ["new.csv"]
+
+    def test_unregister_stops_triggering(self, recorder, temp_dir):
+        """测试注销后不再触发"""
+        event_trigger_manager.register(3, "file", {"path": temp_dir, "debounce": 0})
+        event_trigger_manager.unregister(3)
+        _write(os.path.join(temp_dir, "a.csv"))
+        assert not recorder.wait(0.5)
+
+
+class TestAfterTaskTrigger:
+    """任务链测试"""
+
+    def test_chain_on_condition(self, recorder):
+        """测试按上游结果触发下游任务，手动停止的运行不触发"""
+        event_trigger_manager.register(6, "after_task", {"task_id": 5, "on": "success"})
+        event_trigger_manager.register(7, "after_task", {"task_id": 5, "on": "any"})
+
+        event_trigger_manager.notify_completion(5, "stopped", 10)
+        event_trigger_manager.notify_completion(5, "failed", 11)
+        event_trigger_manager.notify_completion(5, "success", 12)
+
+        assert [(task_id, e["status"]) for task_id, e in recorder.calls] == [
+            (7, "failed"), (6, "success"), (7, "success"),
+        ]
+        assert recorder.calls[1][1]["execution_id"] == 12
+
+
+class TestTriggerApi:
+    """触发器接口测试"""
+
+    @pytest.fixture
+    def project(self, test_db, temp_dir):
+        project = Project(name="trigger-proj", path=temp_dir, work_dir="./", status="ready")
+        test_db.add(project)
+        test_db.commit()
+        return project
+
+    def _task(self, test_db, project, trigger_type, trigger_value, status="active"):
+        task = models.Task(name=f"t-{trigger_type}", command="python main.py", project_id=project.id,
+                           trigger_type=trigger_type, trigger_value=trigger_value, status=status)
+        test_db.add(task)
+        test_db.commit()
+        return task
+
+    def test_webhook_triggers_run(self, test_db, test_client, project):
+        """测试 Webhook 令牌校验，并把请求体作为触发事件传给执行"""
+        token = "t" * 32
+        task = self._task(test_db, project, "webhook", json.dumps({"token": token}))
+
+        with patch("task_service.task_router.task_dispatcher.submit", return_value=1) as submit:
+            assert test_client.post(f"/api/tasks/{task.id}/webhook/{'x' * 32}").status_code == 404
+            response = test_client.post(f"/api/tasks/{task.id}/webhook/{token}", json={"file": "s3://a"})
+
+        assert response.status_code == 200
+        assert submit.call_args[0][:3] == (task.id, 1, response.json()["execution_id"])
+        assert submit.call_args[1]["trigger_event"] == {"type": "webhook", "payload": {"file": "s3://a"}}
+
+        task.status = "paused"
+        test_db.commit()
+        assert test_client.post(f"/api/tasks/{task.id}/webhook/{token}").status_code == 409
+
+    def test_create_webhook_task_generates_token(self, test_client, project):
+        """测试创建 webhook 任务时自动生成令牌"""
+        response = test_client.post("/api/tasks", json={
+            "name": "hook", "command": "python main.py", "project_id": project.id,
+            "trigger_type": "webhook", "trigger_value": "",
+        })
+        assert response.status_code == 200
+        assert len(json.loads(response.json()["trigger_value"])["token"]) >= 16
+        event_trigger_manager.unregister(response.json()["id"])
+
+    def test_after_task_cycle_is_rejected(self, test_db, test_client, project):
+        """测试任务链循环依赖被拒绝"""
+        upstream = self._task(test_db, project, "cron", "0 * * * *", status="paused")
+        downstream = self._task(test_db, project, "after_task", json.dumps({"task_id": upstream.id, "on": "success"}),
+                                status="paused")
+
+        response = test_client.put(f"/api/tasks/{upstream.id}", json={
+            "trigger_type": "after_task", "trigger_value": json.dumps({"task_id": downstream.id}),
+        })
+        assert response.status_code == 400
+        assert "cycle" in response.text
@@ -0,0 +1,99 @@
+"""
+单元测试 - 容量预测
+"""
+import datetime
+import pytest
+from unittest.mock import patch
+from task_service import models
+from task_service import forecast
+from task_service.forecast import build_forecast
+from task_service.stagger import stagger_planner
+
+NOW = datetime.datetime(2026, 1, 1, 0, 30).astimezone()
+
+
+@pytest.fixture
+def scheduler():
+    """预测时不依赖真实调度器中的任务，并把并发上限固定为 2"""
+    with patch.object(forecast.task_manager.scheduler, "get_job", return_value=None), \
+            patch.object(forecast.concurrency_controller, "_limit", 2):
+        yield
+    stagger_planner._offsets.clear()
+
+
+def _add_task(test_db, name, trigger_type, trigger_value, durations=(120.0,), memory=100, **kwargs):
+    task = models.Task(name=name, command="echo", trigger_type=trigger_type, trigger_value=trigger_value,
+                       status="active", **kwargs)
+    test_db.add(task)
+    test_db.commit()
+    for duration in durations:
+        test_db.add(models.TaskExecution(task_id=task.id, status="success", duration=duration,
+                                         max_cpu_percent=50.0, max_memory_mb=memory))
+    test_db.commit()
+    return task
+
+
+class TestForecast:
+    """预测时间线测试"""
+
+    def test_co_scheduled_tasks_form_hotspots(self, test_db, scheduler):
+        """测试同一时刻触发的任务超过并发上限时标出热点时段"""
+        tasks = [_add_task(test_db, f"hourly-{i}", "cron", "0 * * * *") for i in range(3)]
+
+        result = build_forecast(test_db, hours=3, now=NOW)
+
+        assert result["peak_concurrency"] == 3
+        assert [h["start"][11:16] for h in result["hotspots"]] == ["01:00", "02:00", "03:00"]
+        hotspot = result["hotspots"][0]
+        assert (hotspot["end"][11:16], hotspot["peak_concurrency"]) == ("01:02", 3)
+        assert {t["task_id"] for t in hotspot["tasks"]} == {t.id for t in tasks}
+        point = result["timeline"][30]
+        assert (point["time"][11:16], point["concurrency"], point["memory_mb"]) == ("01:00", 3, 300.0)
+        assert len(result["timeline"]) == 180
+
+    def test_staggered_tasks_do_not_collide(self, test_db, scheduler):
+        """测试错峰偏移后运行不再重叠"""
+        tasks = [_add_task(test_db, f"hourly-{i}", "cron", "0 * * * *") for i in range(3)]
+        for index, task in enumerate(tasks):
+            stagger_planner._offsets[task.id] = index * 150
+
+        result = build_forecast(test_db, hours=3, now=NOW)
+
+        assert result["peak_concurrency"] == 1
+        assert result["hotspots"] == []
+
+    def test_duration_quantile_and_exclusive_policy(self, test_db, scheduler):
+        """测试耗时取历史分位数，非 parallel 策略的任务不与自身重叠"""
+        _add_task(test_db, "every-minute", "interval", '{"value": 60, "unit": "seconds"}',
+                  durations=(30.0, 30.0, 30.0, 600.0), overlap_policy="skip")
+
+        median = build_forecast(test_db, hours=1, quantile=0.5, now=NOW)
+        high = build_forecast(test_db, hours=1, quantile=1.0, now=NOW)
+
+        assert median["tasks"][0]["expected_duration"] == 30.0
+        assert high["tasks"][0]["expected_duration"] == 600.0
+        assert high["peak_concurrency"] == 1
+
+    def test_event_tasks_are_listed_as_unpredictable(self, test_db, scheduler):
+        """测试事件触发任务不参与预测，只列出 ID"""
+        task = _add_task(test_db, "on-webhook", "webhook", "{}")
+
+        result = build_forecast(test_db, hours=1, now=NOW)
+
+        assert result["unpredictable_task_ids"] == [task.id]
+        assert result["peak_concurrency"] == 0
+
+
+class TestForecastApi:
+    """预测接口测试"""
+
+    def test_forecast_endpoint(self, test_db, test_client, scheduler):
+        """测试接口返回分钟级时间线，超出范围时返回 400"""
+        _add_task(test_db, "daily", "cron", "0 3 * * *")
+
+        response = test_client.get("/api/system/forecast", params={"hours": 2})
+        assert response.status_code == 200
+        assert len(response.json()["timeline"]) == 120
+        assert response.json()["limit"] == 2
+
+        assert test_client.get("/api/system/forecast", params={"hours": 10000}).status_code == 400
@@ -0,0 +1,97 @@
+"""
+单元测试 - 目录列表引擎
+"""
+import os
+import pytest
+from core import fs_listing
+from project_service.models import Project
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x")
+
+
+@pytest.fixture
+def tree(temp_dir):
+    for i in range(25):
+        _touch(os.path.join(temp_dir, f"page_{i:02d}.html"))
+    os.makedirs(os.path.join(temp_dir, "spiders"))
+    os.makedirs(os.path.join(temp_dir, "__pycache__"))
+    _touch(os.path.join(temp_dir, ".env"))
+    _touch(os.path.join(temp_dir, "spiders", "a.py"))
+    return temp_dir
+
+
+class TestListDirectory:
+    """list_directory 测试"""
+
+    def test_pagination_covers_all_entries(self, tree):
+        """测试游标分页不重复不遗漏，目录优先"""
+        names, cursor = [], None
+        while True:
+            page = fs_listing.list_directory(tree, cursor=cursor, limit=10)
+            names.extend(e["name"] for e in page["entries"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert names[0] == "spiders"
+        assert len(names) == len(set(names)) == 26
+        assert page["total"] == 26
+
+    def test_cursor_is_stable_when_entries_are_added(self, tree):
+        """测试翻页期间新增条目不会导致重复"""
+        first = fs_listing.list_directory(tree, limit=10)
+        _touch(os.path.join(tree, "aaa.txt"))
+        second = fs_listing.list_directory(tree, cursor=first["next_cursor"], limit=10)
+        first_names = {e["name"] for e in first["entries"]}
+        assert not first_names & {e["name"] for e in second["entries"]}
+
+    def test_default_ignore_patterns(self, tree):
+        """测试默认忽略隐藏文件和 __pycache__，可关闭"""
+        names = {e["name"] for e in fs_listing.list_directory(tree, limit=100)["entries"]}
+        assert "__pycache__" not in names and ".env" not in names
+        names = {e["name"] for e in fs_listing.list_directory(tree, limit=100, ignore=())["entries"]}
+        assert "__pycache__" in names and ".env" in names
+
+    def test_cache_invalidated_by_directory_mtime(self, tree):
+        """测试目录变化后缓存失效、ETag 变化"""
+        first = fs_listing.list_directory(tree, limit=100)
+        again = fs_listing.list_directory(tree, limit=100)
+        assert first["etag"] == again["etag"]
+
+        _touch(os.path.join(tree, "new.html"))
+        os.utime(tree, ns=(0, os.stat(tree).st_mtime_ns + 1_000_000))
+        updated = fs_listing.list_directory(tree, limit=100)
+        assert updated["etag"] != first["etag"]
+        assert updated["total"] == first["total"] + 1
+
+    def test_invalid_cursor(self, tree):
+        """测试非法游标"""
+        with pytest.raises(fs_listing.ListingError):
+            fs_listing.list_directory(tree, cursor="not-a-cursor")
+
+
+class TestProjectFilesList:
+    """项目文件懒加载接口测试"""
+
+    def test_list_and_not_modified(self, test_client, test_db, tree):
+        """测试按层列出子目录并支持 304"""
+        test_db.add(Project(name="p1", path=tree, work_dir="./", status="ready"))
+        test_db.commit()
+
+        response = test_client.get("/api/projects/1/files/list", params={"path": "spiders"})
+        assert response.status_code == 200
+        assert response.json()["items"] == [{"label": "a.py", "path": "spiders/a.py", "type": "file"}]
+
+        cached = test_client.get("/api/projects/1/files/list", params={"path": "spiders"},
+                                 headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+
+    def test_rejects_traversal(self, test_client, test_db, tree):
+        """测试拒绝路径穿越"""
+        test_db.add(Project(name="p1", path=tree, work_dir="./", status="ready"))
+        test_db.commit()
+        response = test_client.get("/api/projects/1/files/list", params={"path": "../"})
+        assert response.status_code == 403
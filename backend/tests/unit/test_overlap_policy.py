@@ -0,0 +1,141 @@
+"""
+单元测试 - 任务重叠策略（skip / queue / replace / parallel）
+"""
+import os
+import sys
+import time
+import pytest
+from unittest.mock import patch
+from task_service import models
+from task_service import dispatcher
+from task_service.dispatcher import task_dispatcher, RunRequest
+
+SCRIPT = """
+import os, time
+if os.path.exists("first.marker"):
+    print("second run")
+else:
+    open("first.marker", "w").close()
+    time.sleep(30)
+"""
+
+
+@pytest.fixture
+def make_policy_task(temp_dir, make_task):
+    """按重叠策略创建任务，测试结束后清空分发状态"""
+    with open(os.path.join(temp_dir, "job.py"), "w") as f:
+        f.write(SCRIPT)
+
+    def _make(policy: str, max_parallel: int = None):
+        return make_task(f'"{sys.executable}" job.py', name=f"overlap-{policy}", status="paused",
+                         overlap_policy=policy, max_parallel=max_parallel)
+
+    yield _make
+    task_dispatcher.shutdown()
+    task_dispatcher._queue.clear()
+    task_dispatcher._deferred.clear()
+    task_dispatcher._active.clear()
+
+
+def _statuses(test_db, task_id):
+    test_db.expire_all()
+    executions = test_db.query(models.TaskExecution).filter(
+        models.TaskExecution.task_id == task_id
+    ).order_by(models.TaskExecution.id).all()
+    return [e.status for e in executions]
+
+
+def _fire(task, attempt: int = 1, execution_id: int = None):
+    task_dispatcher._dispatch(RunRequest(task.id, attempt, execution_id, None, {}, "schedule"))
+
+
+class TestOverlapPolicies:
+    """分发时的重叠策略测试"""
+
+    def test_skip_records_skipped_execution(self, test_db, make_policy_task):
+        """测试 skip：上一次运行未结束时新触发记录为 skipped"""
+        task = make_policy_task("skip")
+        task_dispatcher._active[task.id] = 1
+
+        _fire(task)
+
+        assert _statuses(test_db, task.id) == ["skipped"]
+        assert task_dispatcher.status()["deferred"] == 0
+
+    def test_queue_keeps_one_pending_run(self, test_db, make_policy_task):
+        """测试 queue：只保留一个延后的运行，之后的触发记录为 coalesced，上一次结束后延后的运行回到队首"""
+        task = make_policy_task("queue")
+        task_dispatcher._active[task.id] = 1
+        execution = models.TaskExecution(task_id=task.id, status="pending")
+        test_db.add(execution)
+        test_db.commit()
+
+        _fire(task, execution_id=execution.id)
+        _fire(task)
+
+        assert _statuses(test_db, task.id) == ["pending", "coalesced"]
+        assert task_dispatcher.position(execution.id) == 1
+
+        task_dispatcher._finish(task.id)
+        assert task_dispatcher._queue[0].execution_id == execution.id
+        assert task_dispatcher.status()["deferred"] == 0
+
+    def test_replace_stops_running_execution(self, test_db, make_policy_task):
+        """测试 replace：停止运行中的执行，更早延后的运行记录为 coalesced"""
+        task = make_policy_task("replace")
+        running = models.TaskExecution(task_id=task.id, status="running")
+        test_db.add(running)
+        test_db.commit()
+        task_dispatcher._active[task.id] = 1
+
+        with patch.object(dispatcher.process_manager, "stop_execution") as stop:
+            _fire(task)
+            _fire(task)
+
+        assert stop.call_args[0][0] == running.id
+        assert _statuses(test_db, task.id) == ["stopped", "coalesced"]
+        assert task_dispatcher.status()["deferred"] == 1
+
+    def test_parallel_limit_defers_extra_runs(self, make_policy_task):
+        """测试 parallel：达到 max_parallel 后新运行延后而不是丢弃"""
+        task = make_policy_task("parallel", max_parallel=2)
+        first = RunRequest(task.id, 1, None, None, {}, "schedule")
+        second = RunRequest(task.id, 1, None, None, {}, "schedule")
+        third = RunRequest(task.id, 1, None, None, {}, "schedule")
+
+        assert task_dispatcher._admit(first, "parallel", 2)
+        assert task_dispatcher._admit(second, "parallel", 2)
+        assert not task_dispatcher._admit(third, "parallel", 2)
+        assert task_dispatcher._deferred[task.id][0] is third
+
+    def test_retry_bypasses_policy(self, test_db, make_policy_task):
+        """测试重试属于同一次逻辑运行，不受 skip 限制"""
+        task = make_policy_task("skip")
+        task_dispatcher._active[task.id] = 1
+
+        assert task_dispatcher._admit(RunRequest(task.id, 2, None, None, {}, "retry"), "skip", 1)
+        assert task_dispatcher._active[task.id] == 2
+        assert _statuses(test_db, task.id) == []
+
+
+class TestReplaceEndToEnd:
+    """替换运行中的进程"""
+
+    def test_replaced_run_stays_stopped(self, test_db, test_client, temp_dir, make_policy_task):
+        """测试被替换的执行保持 stopped，新运行在其退出后执行"""
+        task = make_policy_task("replace")
+        task_dispatcher.start()
+        first = test_client.post(f"/api/tasks/{task.id}/run").json()["execution_id"]
+
+        deadline = time.time() + 10
+        while time.time() < deadline and not os.path.exists(os.path.join(temp_dir, "first.marker")):
+            time.sleep(0.1)
+        second = test_client.post(f"/api/tasks/{task.id}/run").json()["execution_id"]
+
+        deadline = time.time() + 15
+        while time.time() < deadline and _statuses(test_db, task.id) != ["stopped", "success"]:
+            time.sleep(0.2)
+
+        test_db.expire_all()
+        executions = {e.id: e for e in test_db.query(models.TaskExecution).all()}
+        assert (executions[first].status, executions[second].status) == ("stopped", "success")
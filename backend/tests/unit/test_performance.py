@@ -0,0 +1,159 @@
+"""
+单元测试 - 自适应超时与性能退化检测
+"""
+import sys
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from task_service import models
+from task_service import performance
+from task_service import task_executor
+from task_service.performance import derive_timeout, detect_regressions, effective_timeout, quantile
+
+
+def _run(duration, cpu=20.0, memory=100.0):
+    return SimpleNamespace(duration=duration, max_cpu_percent=cpu, max_memory_mb=memory)
+
+
+def _add_runs(test_db, task, durations, **kwargs):
+    for duration in durations:
+        test_db.add(models.TaskExecution(task_id=task.id, status="success", duration=duration, **kwargs))
+    test_db.commit()
+
+
+@pytest.fixture
+def adaptive_settings():
+    """小样本即可推导自适应超时"""
+    with patch.object(performance.settings, "adaptive_timeout_min_samples", 5), \
+            patch.object(performance.settings, "adaptive_timeout_floor", 1), \
+            patch.object(performance.settings, "adaptive_timeout_factor", 3.0), \
+            patch.object(performance.settings, "adaptive_timeout_enabled", False):
+        yield
+
+
+class TestAdaptiveTimeout:
+    """自适应超时推导测试"""
+
+    def test_quantile(self):
+        """测试最近秩分位数"""
+        assert quantile([], 0.5) is None
+        assert quantile([3, 1, 2, 4], 0.5) == 2
+        assert quantile(list(range(1, 101)), 0.99) == 99
+
+    def test_derive_timeout(self, adaptive_settings):
+        """测试按 P99 × 倍数收紧超时，不超过配置超时，不低于下限"""
+        task = SimpleNamespace(timeout=3600, adaptive_timeout=True)
+
+        assert derive_timeout(task, [10.0] * 5) == (30, 30)
+        assert derive_timeout(SimpleNamespace(timeout=20, adaptive_timeout=True), [10.0] * 5) == (20, 30)
+        with patch.object(performance.settings, "adaptive_timeout_floor", 60):
+            assert derive_timeout(task, [10.0] * 5) == (60, 60)
+
+    def test_requires_opt_in_and_samples(self, adaptive_settings):
+        """测试未开启或样本不足时使用配置超时；任务设置优先于全局开关"""
+        assert derive_timeout(SimpleNamespace(timeout=None, adaptive_timeout=True), [10.0] * 4) == (3600, None)
+        assert derive_timeout(SimpleNamespace(timeout=600, adaptive_timeout=None), [10.0] * 5) == (600, None)
+        assert derive_timeout(SimpleNamespace(timeout=600, adaptive_timeout=False), [10.0] * 5) == (600, None)
+        with patch.object(performance.settings, "adaptive_timeout_enabled", True):
+            assert derive_timeout(SimpleNamespace(timeout=600, adaptive_timeout=None), [10.0] * 5) == (30, 30)
+
+    def test_effective_timeout_uses_only_matching_runs(self, test_db, adaptive_settings):
+        """测试只统计成功执行，分片执行与普通执行分开统计"""
+        task = models.Task(name="adaptive", command="echo", trigger_type="immediate", trigger_value="",
+                           timeout=3600, adaptive_timeout=True)
+        test_db.add(task)
+        test_db.commit()
+        _add_runs(test_db, task, [10.0] * 5)
+        _add_runs(test_db, task, [500.0] * 5, shard_index=0)
+        test_db.add(models.TaskExecution(task_id=task.id, status="timeout", duration=3600.0))
+        test_db.commit()
+
+        assert effective_timeout(test_db, task) == (30, True)
+        assert effective_timeout(test_db, task, sharded=True) == (1500, True)
+
+    def test_window_keeps_newest_runs_per_task(self, test_db):
+        """测试每个任务只取最近 KUMO_PERFORMANCE_WINDOW 次成功执行，新的在前"""
+        first = models.Task(name="first", command="echo", trigger_type="immediate", trigger_value="")
+        second = models.Task(name="second", command="echo", trigger_type="immediate", trigger_value="")
+        test_db.add_all([first, second])
+        test_db.commit()
+        _add_runs(test_db, first, [1.0, 2.0, 3.0, 4.0])
+        _add_runs(test_db, second, [5.0])
+
+        with patch.object(performance.settings, "performance_window", 3):
+            runs = performance._successful_runs(test_db, [first.id, second.id])
+            single = performance._successful_runs(test_db, [first.id])
+
+        assert [r.duration for r in runs[first.id]] == [4.0, 3.0, 2.0]
+        assert [r.duration for r in runs[second.id]] == [5.0]
+        assert [r.duration for r in single[first.id]] == [4.0, 3.0, 2.0]
+
+
+class TestRegressionDetection:
+    """性能退化检测测试"""
+
+    def test_detects_slower_recent_runs(self):
+        """测试最近中位数超过基线倍数时标记，新的执行在前"""
+        runs = [_run(30.0, memory=400.0)] * 10 + [_run(10.0)] * 20
+
+        regressions = {r["metric"]: r for r in detect_regressions(runs)}
+
+        assert set(regressions) == {"duration", "max_memory_mb"}
+        assert regressions["duration"] == {"metric": "duration", "baseline": 10.0, "recent": 30.0, "ratio": 3.0}
+
+    def test_ignores_noise_and_short_history(self):
+        """测试变化低于最小变化量或历史不足时不标记"""
+        assert detect_regressions([_run(2.0)] * 10 + [_run(1.0)] * 10) == []
+        assert detect_regressions([_run(30.0)] * 10 + [_run(10.0)] * 5) == []
+        assert detect_regressions([_run(12.0)] * 10 + [_run(10.0)] * 10) == []
+
+
+class TestAdaptiveTimeoutExecution:
+    """执行器使用自适应超时测试"""
+
+    def test_hung_run_times_out_early(self, test_db, make_task, adaptive_settings):
+        """测试挂起的执行按历史耗时推导的超时结束，而不是等待配置的超时"""
+        task = make_task(f'"{sys.executable}" -c "import time; time.sleep(60)"', name="hung",
+                         timeout=3600, adaptive_timeout=True, retry_count=0)
+        _add_runs(test_db, task, [0.3] * 5)
+
+        started = time.time()
+        task_executor.run_task_execution(task.id)
+        elapsed = time.time() - started
+
+        test_db.expire_all()
+        execution = test_db.query(models.TaskExecution).filter(
+            models.TaskExecution.task_id == task.id, models.TaskExecution.status != "success"
+        ).one()
+        assert execution.status == "timeout"
+        assert "[Timeout after 1s, adaptive from run history]" in execution.output
+        assert elapsed < 30
+
+
+class TestPerformanceApi:
+    """性能分析接口测试"""
+
+    def test_performance_report(self, test_db, test_client, adaptive_settings):
+        """测试接口返回分位数、有效超时和性能退化，可只返回退化的任务"""
+        slow = models.Task(name="slowing", command="echo", trigger_type="immediate", trigger_value="",
+                           timeout=3600, adaptive_timeout=True)
+        steady = models.Task(name="steady", command="echo", trigger_type="immediate", trigger_value="")
+        test_db.add_all([slow, steady])
+        test_db.commit()
+        _add_runs(test_db, slow, [10.0] * 20)
+        _add_runs(test_db, slow, [40.0] * 10)
+        _add_runs(test_db, steady, [5.0] * 3)
+
+        report = test_client.get("/api/tasks/analytics/performance").json()
+        by_name = {item["name"]: item for item in report}
+        assert by_name["slowing"]["samples"] == 30
+        assert by_name["slowing"]["duration"]["p50"] == 10.0
+        assert (by_name["slowing"]["effective_timeout"], by_name["slowing"]["adaptive_timeout"]) == (120, 120)
+        assert [r["metric"] for r in by_name["slowing"]["regressions"]] == ["duration"]
+        assert by_name["steady"]["adaptive_timeout"] is None
+        assert by_name["steady"]["regressions"] == []
+
+        regressed = test_client.get("/api/tasks/analytics/performance", params={"regressions_only": True}).json()
+        assert [item["task_id"] for item in regressed] == [slow.id]
+        assert test_client.get("/api/tasks/analytics/performance", params={"task_id": 9999}).status_code == 404
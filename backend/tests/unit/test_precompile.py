@@ -0,0 +1,103 @@
+"""
+单元测试 - 项目字节码预编译
+"""
+import os
+import sys
+import importlib.util
+import pytest
+from unittest.mock import patch
+from project_service import precompile
+from project_service import revision_store as rs
+from project_service.models import Project
+from environment_service.models import PythonVersion
+from task_service.models import Task
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def source_dir(temp_dir):
+    root = os.path.join(temp_dir, "proj")
+    _write(os.path.join(root, "main.py"), "print('ok')\n")
+    _write(os.path.join(root, "pkg", "util.py"), "X = 1\n")
+    _write(os.path.join(root, "pkg", "broken.py"), "def f(:\n")
+    return root
+
+
+@pytest.fixture
+def store(temp_dir):
+    store = rs.RevisionStore(os.path.join(temp_dir, ".kumo_store"))
+    with patch.object(precompile, "revision_store", store):
+        yield store
+
+
+class TestCompileTree:
+    """compile_tree 测试"""
+
+    def test_reports_errors_and_writes_pyc(self, source_dir):
+        """测试编译错误提前报告，pyc 按解释器 cache tag 命名"""
+        result = precompile.compile_tree(sys.executable, source_dir, "checked-hash")
+
+        assert result["compiled"] == 2
+        assert [e["path"] for e in result["errors"]] == ["pkg/broken.py"]
+        assert result["cache_tag"] == sys.implementation.cache_tag
+        assert os.path.exists(importlib.util.cache_from_source(os.path.join(source_dir, "main.py")))
+
+    @pytest.mark.parametrize("mode,flags", [("timestamp", 0), ("checked-hash", 0b11)])
+    def test_pyc_invalidation_mode(self, source_dir, mode, flags):
+        """测试 timestamp 与 checked-hash 两种 pyc 模式"""
+        precompile.compile_tree(sys.executable, source_dir, mode, files=["main.py"])
+        with open(importlib.util.cache_from_source(os.path.join(source_dir, "main.py")), "rb") as f:
+            header = f.read(8)
+        assert int.from_bytes(header[4:8], "little") == flags
+
+
+class TestProjectPrecompiler:
+    """ProjectPrecompiler 测试"""
+
+    def test_run_tracks_state_per_environment(self, test_db, source_dir, store, temp_dir):
+        """测试按环境记录编译状态，局部编译合并错误"""
+        env_python = os.path.join(temp_dir, "env", "bin", "python")
+        os.makedirs(os.path.dirname(env_python))
+        os.symlink(sys.executable, env_python)
+        env = PythonVersion(name="py-a", version="3.11", path=env_python, status="ready")
+        test_db.add(env)
+        project = Project(name="p1", path=source_dir, work_dir="./", status="ready")
+        test_db.add(project)
+        test_db.commit()
+        test_db.add(Task(name="t1", command="python main.py", project_id=project.id, env_id=env.id))
+        test_db.commit()
+
+        state = precompile.project_precompiler.run(project.id, db=test_db)
+
+        assert set(state["environments"]) == {str(env.id)}
+        entry = state["environments"][str(env.id)]
+        assert entry["status"] == "errors"
+        assert entry["mode"] == "checked-hash"
+        assert entry["errors"][0]["path"] == "pkg/broken.py"
+
+        _write(os.path.join(source_dir, "pkg", "broken.py"), "def f():\n    pass\n")
+        state = precompile.project_precompiler.run(project.id, files=["pkg/broken.py"], db=test_db)
+        assert state["environments"][str(env.id)]["status"] == "success"
+        assert precompile.project_precompiler.load_state(project.id) == state
+
+    def test_project_dir_is_compiled_when_revision_pinned(self, test_db, store, temp_dir):
+        """测试有当前修订版本时仍编译执行所在的项目目录（checked-hash 模式）"""
+        project = Project(name="p1", path=os.path.join(temp_dir, "work"), work_dir="./", status="ready",
+                          current_revision="abc")
+        os.makedirs(store.revision_path(1, "abc"))
+        test_db.add(project)
+        test_db.commit()
+
+        root = precompile.execution_root(project)
+        assert root == project.path
+        assert precompile.resolve_mode(root, project) == "checked-hash"
+
+    def test_schedule_disabled(self):
+        """测试关闭预编译时不调度"""
+        with patch.object(precompile.settings, "precompile_enabled", False):
+            assert precompile.project_precompiler.schedule(1) is False
@@ -8,9 +8,9 @@ import zipfile
 from unittest.mock import Mock, patch, MagicMock
 from fastapi import HTTPException
 from project_service import models, schemas
+from project_service.archive_jobs import extract_archive
 from project_service.project_router import (
     get_archive_extension,
-    extract_archive,
     read_text_file
 )
 
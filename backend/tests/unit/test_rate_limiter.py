@@ -0,0 +1,153 @@
+"""
+单元测试 - 全局限速协调器
+"""
+import os
+import sys
+import json
+import pytest
+from unittest.mock import patch
+from task_service.rate_limiter import TokenBucket, RateLimitCoordinator, rate_limit_coordinator
+from task_service.task_executor import RUNTIME_DIR
+
+sys.path.insert(0, RUNTIME_DIR)
+import kumo_ratelimit  # noqa: E402
+
+
+@pytest.fixture
+def coordinator():
+    rate_limit_coordinator.set_rules({})
+    rate_limit_coordinator.reset()
+    yield rate_limit_coordinator
+    rate_limit_coordinator.stop()
+    rate_limit_coordinator.set_rules({})
+    rate_limit_coordinator.reset()
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_reservations_queue_into_the_future(self):
+        """测试突发额度用完后预约等待时间递增"""
+        bucket = TokenBucket(rate=2, burst=2)
+        now = bucket.updated_at
+        waits = [bucket.reserve(1, now=now)[1] for _ in range(4)]
+        assert waits == [0.0, 0.0, 0.5, 1.0]
+
+    def test_max_wait_does_not_consume(self):
+        """测试超过最长等待时不扣减令牌"""
+        bucket = TokenBucket(rate=1, burst=1)
+        now = bucket.updated_at
+        bucket.reserve(1, now=now)
+        assert bucket.reserve(1, max_wait=0.5, now=now) == (False, 1.0)
+        assert bucket.reserve(1, now=now + 1.0) == (True, 0.0)
+
+
+class TestRateLimitCoordinator:
+    """协调器测试"""
+
+    def test_limit_is_shared_across_executions(self, coordinator):
+        """测试多个执行共享同一域名的速率"""
+        waits = [coordinator.acquire("example.com", rate=1, execution_id=i)["wait"] for i in range(3)]
+        assert waits[0] == 0.0
+        assert waits[1] == pytest.approx(1.0, abs=0.05)
+        assert waits[2] == pytest.approx(2.0, abs=0.05)
+        stats = coordinator.stats()["keys"]["example.com"]
+        assert stats["granted"] == 3
+        assert stats["executions"] == {"0": 1, "1": 1, "2": 1}
+
+    def test_most_conservative_rate_wins(self, coordinator):
+        """测试不同执行声明不同速率时取最小值"""
+        coordinator.acquire("example.com", rate=10)
+        coordinator.acquire("example.com", rate=2)
+        assert coordinator.stats()["keys"]["example.com"]["rate"] == 2
+
+    def test_declared_rate_recovers_after_executions_go_idle(self, coordinator):
+        """测试声明较低速率的执行不再活跃后，限速恢复为仍活跃执行声明的速率"""
+        coordinator.acquire("example.com", rate=1, execution_id=1)
+        coordinator.acquire("example.com", rate=10, execution_id=2)
+        assert coordinator.stats()["keys"]["example.com"]["rate"] == 1
+
+        with patch("task_service.rate_limiter.DECLARATION_TTL", 0):
+            coordinator.acquire("example.com", rate=10, execution_id=2)
+        assert coordinator.stats()["keys"]["example.com"]["rate"] == 10
+
+    def test_rule_applies_to_subdomains(self, coordinator):
+        """测试规则覆盖客户端速率并匹配子域名"""
+        coordinator.set_rules({"example.com": {"rate": 1, "burst": 1}})
+        first = coordinator.acquire("api.example.com", rate=100)
+        second = coordinator.acquire("www.example.com", rate=100)
+        assert first["key"] == "example.com"
+        assert second["wait"] == pytest.approx(1.0, abs=0.05)
+
+    def test_invalid_rule_is_rejected(self, coordinator):
+        """测试拒绝非正速率的规则"""
+        with pytest.raises(ValueError):
+            coordinator.set_rules({"example.com": {"rate": 0}})
+
+    def test_unlimited_without_rate(self, coordinator):
+        """测试没有任何速率时不限速但记录统计"""
+        assert coordinator.acquire("example.com")["wait"] == 0.0
+        assert coordinator.stats()["keys"]["example.com"]["granted"] == 1
+
+
+class TestClient:
+    """注入客户端测试"""
+
+    def test_client_acquires_through_local_service(self, coordinator):
+        """测试客户端通过本地服务申请许可"""
+        with patch.object(coordinator, "load_rules"):
+            coordinator.start()
+        env = coordinator.client_env(execution_id=5)
+
+        with patch.dict(os.environ, {**env, "MAX_REQUESTS_PER_SECOND": "1000"}), \
+                patch.object(kumo_ratelimit.time, "sleep") as mock_sleep:
+            assert kumo_ratelimit.acquire("https://Example.com/page") == 0.0
+            mock_sleep.assert_not_called()
+            with pytest.raises(kumo_ratelimit.RateLimitTimeout):
+                kumo_ratelimit.acquire("example.com", tokens=5000, max_wait=1)
+
+        stats = coordinator.stats()["keys"]["example.com"]
+        assert stats["granted"] == 1
+        assert stats["denied"] == 1
+        assert stats["executions"] == {"5": 1}
+
+    def test_rejects_bad_token(self, coordinator):
+        """测试本地服务校验令牌"""
+        import urllib.request
+        import urllib.error
+        with patch.object(coordinator, "load_rules"):
+            coordinator.start()
+        request = urllib.request.Request(coordinator.service.url + "/stats", headers={"X-Kumo-Token": "wrong"})
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(request, timeout=5)
+        assert exc.value.code == 403
+
+    def test_restart_keeps_endpoint(self, coordinator):
+        """测试重启后沿用上次的地址和令牌，重新接管的执行注入的连接信息仍然有效"""
+        with patch.object(coordinator, "load_rules"):
+            coordinator.start()
+            env = coordinator.client_env(execution_id=5)
+            coordinator.stop()
+            coordinator.start()
+
+        assert coordinator.client_env(execution_id=5) == env
+        with patch.dict(os.environ, env):
+            assert kumo_ratelimit.acquire("restart.test") == 0.0
+
+    def test_client_falls_back_to_local_limit(self):
+        """测试协调器不可用时退化为进程内限速"""
+        env = {"KUMO_RATE_LIMIT_URL": "http://127.0.0.1:1", "REQUEST_INTERVAL_MS": "500"}
+        with patch.dict(os.environ, env), patch.object(kumo_ratelimit.time, "sleep") as mock_sleep:
+            kumo_ratelimit.acquire("fallback.test")
+            kumo_ratelimit.acquire("fallback.test")
+        assert mock_sleep.call_args[0][0] == pytest.approx(0.5, abs=0.05)
+
+    def test_rules_config_endpoint_validates(self, coordinator, test_client):
+        """测试通过系统配置保存规则时校验并生效"""
+        bad = test_client.post("/api/system/config", json={"key": "rate_limit.rules", "value": "not json"})
+        assert bad.status_code == 400
+
+        rules = {"example.org": {"rate": 3}}
+        ok = test_client.post("/api/system/config", json={"key": "rate_limit.rules", "value": json.dumps(rules)})
+        assert ok.status_code == 200
+        assert test_client.get("/api/system/rate-limits").json()["rules"]["example.org"]["rate"] == 3
@@ -0,0 +1,250 @@
+"""
+单元测试 - 后端重启后重新接管执行
+"""
+import os
+import sys
+import time
+import signal
+import datetime
+import subprocess
+import pytest
+from unittest.mock import patch
+from core.concurrency import concurrency_controller
+from task_service import models
+from task_service import reattach
+from task_service import task_executor
+from task_service.dispatcher import task_dispatcher
+from task_service.process_manager import (
+    process_manager, wrap_command, exit_code_path, read_exit_code, process_fingerprint
+)
+from task_service.reattach import execution_reattacher
+from system_service.models import SystemConfig
+
+
+@pytest.fixture
+def reattacher(executor_db):
+    """不启动后台线程，由测试调用 check()"""
+    with patch.object(reattach.ExecutionReattacher, "start"), \
+            patch.object(reattach.settings, "stop_sequence", "SIGINT:0.3,SIGKILL"):
+        yield execution_reattacher
+    for execution_id in execution_reattacher.adopted():
+        process_manager.stop_execution(execution_id)
+        process_manager.unregister_process(execution_id)
+        concurrency_controller.release()
+    execution_reattacher._adopted.clear()
+    execution_reattacher._parents.clear()
+    task_dispatcher._active.clear()
+
+
+@pytest.fixture
+def task(make_task):
+    return make_task("echo", name="long-crawl", timeout=3600, retry_count=0)
+
+
+def _spawn_orphan(temp_dir, name, script):
+    """模拟上次后端进程启动的执行：经退出码包装器在独立进程组中运行"""
+    log_file = os.path.join(temp_dir, f"{name}.log")
+    with open(log_file, "w") as f:
+        process = subprocess.Popen(wrap_command([sys.executable, "-c", script], exit_code_path(log_file)),
+                                   stdout=f, stderr=subprocess.STDOUT, start_new_session=True)
+    return process, log_file
+
+
+def _running_execution(test_db, task, process=None, log_file=None, **kwargs):
+    execution = models.TaskExecution(task_id=task.id, status="running", attempt=1, log_file=log_file,
+                                     start_time=datetime.datetime.now(), **kwargs)
+    if process is not None:
+        execution.pid = execution.pgid = process.pid
+        execution.process_started_at = process_fingerprint(process.pid)
+    test_db.add(execution)
+    test_db.commit()
+    return execution
+
+
+def _wait_finished(test_db, reattacher, execution_id, timeout=10):
+    deadline = time.time() + timeout
+    while execution_id in reattacher.adopted() and time.time() < deadline:
+        reattacher.check()
+        time.sleep(0.1)
+    test_db.expire_all()
+    return test_db.get(models.TaskExecution, execution_id)
+
+
+class TestExitWrapper:
+    """退出码包装器测试"""
+
+    def test_records_exit_code(self, temp_dir):
+        """测试记录命令的退出码，并以相同的返回码退出"""
+        exit_file = os.path.join(temp_dir, "run.exit")
+
+        code = subprocess.call(wrap_command([sys.executable, "-c", "import sys; sys.exit(3)"], exit_file))
+
+        assert code == 3
+        assert read_exit_code(exit_file) == 3
+
+    def test_stop_signal_reaches_command(self, temp_dir):
+        """测试发给进程组的 SIGINT 结束命令，包装器记录信号后以同一信号退出"""
+        exit_file = os.path.join(temp_dir, "run.exit")
+        process = subprocess.Popen(wrap_command(["sleep", "30"], exit_file), start_new_session=True)
+        time.sleep(0.5)
+
+        os.killpg(process.pid, signal.SIGINT)
+
+        assert process.wait(timeout=5) == -signal.SIGINT
+        assert read_exit_code(exit_file) == -signal.SIGINT
+
+    def test_missing_command(self, temp_dir):
+        """测试命令不存在时返回 127"""
+        exit_file = os.path.join(temp_dir, "run.exit")
+
+        assert subprocess.call(wrap_command(["kumo-no-such-command"], exit_file), stderr=subprocess.DEVNULL) == 127
+
+
+class TestReconcile:
+    """启动时对账测试"""
+
+    def test_reattaches_live_process(self, test_db, temp_dir, reattacher, task):
+        """测试仍存活的执行被重新接管，结束后按真实退出码记录结果并释放计数"""
+        marker = os.path.join(temp_dir, "go")
+        script = (f"import os, time\nprint('crawling', flush=True)\n"
+                  f"while not os.path.exists({marker!r}): time.sleep(0.05)\n")
+        process, log_file = _spawn_orphan(temp_dir, "live", script)
+        execution = _running_execution(test_db, task, process, log_file)
+
+        assert reattacher.reconcile() == {"adopted": 1, "finished": 0}
+        assert process_manager.is_running(execution.id)
+        deadline = time.time() + 10
+        while "crawling" not in open(log_file).read() and time.time() < deadline:
+            time.sleep(0.05)
+        # Resource sampling follows the command, not the wrapper
+        assert process_manager.get_psutil_process(execution.id).ppid() == process.pid
+        assert task_dispatcher._active[task.id] == 1
+        reattacher.check()
+        assert reattacher.adopted() == [execution.id]
+
+        open(marker, "w").close()
+        process.wait(timeout=10)
+        execution = _wait_finished(test_db, reattacher, execution.id)
+
+        assert execution.status == "success"
+        assert "crawling" in execution.output
+        assert "exit code 0" in execution.output
+        assert not process_manager.is_running(execution.id)
+        assert task.id not in task_dispatcher._active
+        assert not os.path.exists(exit_code_path(log_file))
+
+    def test_adopted_runs_count_against_full_limit(self, test_db, temp_dir, reattacher, task):
+        """测试启动前的对账只接管存活的执行，即使超过并发上限也占用许可；已结束的执行留给第二次对账"""
+        live, live_log = _spawn_orphan(temp_dir, "live", "import time; time.sleep(60)")
+        dead, dead_log = _spawn_orphan(temp_dir, "dead", "import sys; sys.exit(0)")
+        adopted = _running_execution(test_db, task, live, live_log)
+        finished = _running_execution(test_db, task, dead, dead_log)
+        dead.wait(timeout=10)
+        original_limit = concurrency_controller.limit
+        concurrency_controller.set_limit(1, source="test")
+        try:
+            assert concurrency_controller.acquire(timeout=1)
+            assert reattacher.reconcile(finish=False) == {"adopted": 1, "finished": 0}
+            assert concurrency_controller.get_active_count() == 2
+            test_db.expire_all()
+            assert test_db.get(models.TaskExecution, finished.id).status == "running"
+
+            assert reattacher.reconcile() == {"adopted": 0, "finished": 1}
+            assert reattacher.adopted() == [adopted.id]
+            test_db.expire_all()
+            assert test_db.get(models.TaskExecution, finished.id).status == "success"
+        finally:
+            concurrency_controller.release()
+            concurrency_controller.set_limit(original_limit, source="test")
+            live.kill()
+            live.wait()
+
+    def test_adopted_run_is_registered_with_caching_proxy(self, test_db, temp_dir, reattacher, task):
+        """测试启用缓存代理时接管的执行按原执行 ID 重新登记，结束后注销"""
+        test_db.add(SystemConfig(key="cache_proxy.enabled", value="true"))
+        test_db.commit()
+        process, log_file = _spawn_orphan(temp_dir, "proxied", "import time; time.sleep(60)")
+        execution = _running_execution(test_db, task, process, log_file)
+
+        with patch.object(reattach.caching_proxy, "register_execution") as register, \
+                patch.object(reattach.caching_proxy, "unregister_execution") as unregister:
+            reattacher.reconcile(finish=False)
+            register.assert_called_once_with(execution.id, task.project_id, None, None)
+            process.kill()
+            process.wait()
+            _wait_finished(test_db, reattacher, execution.id)
+        unregister.assert_called_once_with(execution.id)
+
+    def test_finished_process_gets_real_end_state(self, test_db, temp_dir, reattacher, task):
+        """测试重启期间已结束的执行按记录的退出码标记为 failed，并计入熔断"""
+        process, log_file = _spawn_orphan(temp_dir, "dead", "import sys; sys.exit(2)")
+        execution = _running_execution(test_db, task, process, log_file)
+        process.wait(timeout=10)
+
+        assert reattacher.reconcile() == {"adopted": 0, "finished": 1}
+
+        test_db.expire_all()
+        execution = test_db.get(models.TaskExecution, execution.id)
+        assert execution.status == "failed"
+        assert "exit code 2" in execution.output
+        assert test_db.get(models.Task, task.id).consecutive_failures == 1
+
+    def test_reused_pid_is_not_adopted(self, test_db, temp_dir, reattacher, task):
+        """测试 pid 已被其它进程复用（创建时间不一致）时不接管，退出码未知时记录为 failed"""
+        stale = _running_execution(test_db, task, log_file=os.path.join(temp_dir, "stale.log"),
+                                   pid=os.getpid(), pgid=os.getpid(), process_started_at=1.0)
+        untracked = _running_execution(test_db, task)
+
+        assert reattacher.reconcile() == {"adopted": 0, "finished": 2}
+
+        test_db.expire_all()
+        assert "exit code unknown" in test_db.get(models.TaskExecution, stale.id).output
+        assert "not tracked" in test_db.get(models.TaskExecution, untracked.id).output
+        assert {e.status for e in test_db.query(models.TaskExecution).all()} == {"failed"}
+
+    def test_reattached_run_still_times_out(self, test_db, temp_dir, reattacher, task):
+        """测试接管的执行超过剩余超时时间后被停止并记录为 timeout"""
+        process, log_file = _spawn_orphan(temp_dir, "slow", "import time; time.sleep(60)")
+        execution = _running_execution(test_db, task, process, log_file)
+        execution.start_time = datetime.datetime.now() - datetime.timedelta(hours=2)
+        test_db.commit()
+
+        reattacher.reconcile()
+        reattacher.check()
+        process.wait(timeout=10)
+        execution = _wait_finished(test_db, reattacher, execution.id)
+
+        assert execution.status == "timeout"
+
+    def test_sharded_parent_is_aggregated(self, test_db, reattacher, task):
+        """测试分片都已结束的父执行在对账时汇总"""
+        task.shard_count = 2
+        test_db.commit()
+        parent = _running_execution(test_db, task)
+        for index in range(2):
+            test_db.add(models.TaskExecution(task_id=task.id, status="success", attempt=1, shard_index=index,
+                                             parent_execution_id=parent.id, start_time=datetime.datetime.now()))
+        test_db.commit()
+
+        reattacher.reconcile()
+
+        test_db.expire_all()
+        assert test_db.get(models.TaskExecution, parent.id).status == "success"
+
+
+class TestExecutorFingerprint:
+    """执行器记录进程指纹测试"""
+
+    def test_execution_records_process_fingerprint(self, test_db, task):
+        """测试执行记录 pid / pgid / 创建时间，命令经包装器运行，返回码不变，结束后删除退出码文件"""
+        task.command = f'"{sys.executable}" -c "import sys; print(42); sys.exit(5)"'
+        test_db.commit()
+        task_executor.run_task_execution(task.id)
+
+        test_db.expire_all()
+        execution = test_db.query(models.TaskExecution).filter(models.TaskExecution.task_id == task.id).one()
+        assert execution.status == "failed"
+        assert "42" in execution.output
+        assert execution.pid and execution.pgid == execution.pid
+        assert execution.process_started_at
+        assert not os.path.exists(exit_code_path(execution.log_file))
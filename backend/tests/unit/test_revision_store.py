@@ -0,0 +1,221 @@
+"""
+单元测试 - 项目修订版本存储
+"""
+import os
+import sys
+import stat
+import hashlib
+import pytest
+from unittest.mock import patch
+from project_service import revision_store as rs
+from project_service.models import Project, ProjectRevision
+from task_service.models import Task, TaskExecution
+
+
+def _entry(content: bytes, executable=False):
+    return {"hash": hashlib.sha256(content).hexdigest(), "size": len(content), "executable": executable}
+
+
+@pytest.fixture
+def store(temp_dir):
+    store = rs.RevisionStore(os.path.join(temp_dir, ".kumo_store"))
+    with patch.object(rs, "revision_store", store), \
+            patch("project_service.project_router.revision_store", store), \
+            patch.object(rs.settings, "precompile_enabled", False):
+        yield store
+
+
+@pytest.fixture
+def project(test_db, temp_dir):
+    path = os.path.join(temp_dir, "proj")
+    os.makedirs(path)
+    project = Project(name="p1", path=path, work_dir="./", status="ready")
+    test_db.add(project)
+    test_db.commit()
+    return project
+
+
+class TestRevisionStore:
+    """RevisionStore 测试"""
+
+    def test_only_changed_blobs_are_missing(self, store):
+        """测试只有变化的文件需要上传"""
+        store.write_blob(_entry(b"a")["hash"], [b"a"])
+        manifest = {"a.py": _entry(b"a"), "b.py": _entry(b"b")}
+        assert store.missing_blobs(manifest) == [_entry(b"b")["hash"]]
+
+    def test_blob_hash_is_verified(self, store):
+        """测试 blob 内容与哈希不符时拒绝"""
+        with pytest.raises(rs.RevisionError, match="does not match"):
+            store.write_blob(_entry(b"a")["hash"], [b"tampered"])
+        assert not store.has_blob(_entry(b"a")["hash"])
+
+    def test_manifest_rejects_traversal(self, store):
+        """测试清单拒绝路径穿越"""
+        with pytest.raises(rs.RevisionError, match="Invalid path"):
+            store.validate_manifest({"../x.py": _entry(b"x")})
+
+    def test_build_is_idempotent_and_copied(self, store):
+        """测试相同清单得到相同修订版本，只在物化时复制出 blob 的独立只读副本"""
+        for content in (b"print(1)", b"#!/bin/sh"):
+            store.write_blob(_entry(content)["hash"], [content])
+        manifest = {"main.py": _entry(b"print(1)"), "bin/run.sh": _entry(b"#!/bin/sh", executable=True)}
+
+        rev = store.build_revision(1, manifest)
+        assert store.build_revision(1, dict(reversed(list(manifest.items())))) == rev
+        assert not os.path.exists(store.revision_path(1, rev))
+
+        assert store.materialize(1, rev) == store.revision_path(1, rev)
+        main_path = os.path.join(store.revision_path(1, rev), "main.py")
+        blob = store.blob_path(manifest["main.py"]["hash"])
+        assert os.stat(main_path).st_nlink == 1
+        assert os.stat(main_path).st_ino != os.stat(blob).st_ino
+        assert os.access(os.path.join(store.revision_path(1, rev), "bin", "run.sh"), os.X_OK)
+        # Revision directories are read-only and can still be removed
+        assert not os.stat(main_path).st_mode & stat.S_IWUSR
+        assert not os.stat(store.revision_path(1, rev)).st_mode & stat.S_IWUSR
+        store.remove_revision(1, rev)
+        assert not os.path.exists(store.revision_path(1, rev))
+
+    def test_gc_keeps_blobs_referenced_by_manifests(self, store):
+        """测试垃圾回收按清单引用判断，只删除未被引用的 blob"""
+        for content in (b"used", b"unused"):
+            store.write_blob(_entry(content)["hash"], [content])
+        store.build_revision(1, {"main.py": _entry(b"used")})
+
+        with patch.object(rs, "BLOB_GRACE_SECONDS", -1):
+            assert store.collect_garbage() == 1
+
+        assert store.has_blob(_entry(b"used")["hash"])
+        assert not store.has_blob(_entry(b"unused")["hash"])
+
+    def test_sync_working_copy_applies_diff(self, store, temp_dir):
+        """测试工作副本按差异更新，清单外文件保留"""
+        for content in (b"v1", b"v2", b"keep"):
+            store.write_blob(_entry(content)["hash"], [content])
+        work = os.path.join(temp_dir, "work")
+        old = {"a.py": _entry(b"v1"), "gone.py": _entry(b"keep")}
+        new = {"a.py": _entry(b"v2")}
+        store.sync_working_copy(work, {}, old)
+        with open(os.path.join(work, "output.csv"), "w") as f:
+            f.write("untracked")
+
+        stats = store.sync_working_copy(work, old, new)
+
+        assert stats == {"updated": 1, "removed": 1}
+        with open(os.path.join(work, "a.py"), "rb") as f:
+            assert f.read() == b"v2"
+        assert not os.path.exists(os.path.join(work, "gone.py"))
+        assert os.path.exists(os.path.join(work, "output.csv"))
+        # Working copy files are copies, editing them never writes through to a blob
+        assert os.stat(os.path.join(work, "a.py")).st_nlink == 1
+
+
+class TestCommitRevision:
+    """修订版本提交与清理测试"""
+
+    def test_activation_keeps_running_executions_pinned(self, store, test_db, project):
+        """测试切换版本不影响运行中执行所固定的版本"""
+        store.write_blob(_entry(b"v1")["hash"], [b"v1"])
+        store.write_blob(_entry(b"v2")["hash"], [b"v2"])
+        first = rs.commit_revision(test_db, project, {"main.py": _entry(b"v1")})
+
+        task = Task(name="t1", command="python main.py", project_id=project.id)
+        test_db.add(task)
+        test_db.commit()
+        execution = TaskExecution(task_id=task.id, status="running")
+        test_db.add(execution)
+        test_db.commit()
+        assert rs.pin_revision(test_db, project, execution) == store.revision_path(project.id, first.revision)
+
+        rs.commit_revision(test_db, project, {"main.py": _entry(b"v2")})
+        rs.prune_revisions(test_db, project, keep=0)
+
+        assert project.current_revision != first.revision
+        with open(os.path.join(store.revision_path(project.id, first.revision), "main.py"), "rb") as f:
+            assert f.read() == b"v1"
+        with open(os.path.join(project.path, "main.py"), "rb") as f:
+            assert f.read() == b"v2"
+
+    def test_edits_do_not_materialize_revisions(self, store, test_db, project, test_client):
+        """测试在线编辑只提交清单，不复制项目；未被运行中执行固定的版本目录在清理时删除"""
+        store.write_blob(_entry(b"v1")["hash"], [b"v1"])
+        first = rs.commit_revision(test_db, project, {"main.py": _entry(b"v1")})
+        store.materialize(project.id, first.revision)
+
+        response = test_client.post(f"/api/projects/{project.id}/files/save",
+                                    json={"path": "main.py", "content": "v2"})
+
+        assert response.status_code == 200
+        revision = response.json()["revision"]
+        assert os.path.exists(store.manifest_path(project.id, revision))
+        assert not os.path.exists(store.revision_path(project.id, revision))
+        # The previous revision is kept, but its directory is dropped once nothing runs from it
+        assert os.path.exists(store.manifest_path(project.id, first.revision))
+        assert not os.path.exists(store.revision_path(project.id, first.revision))
+
+    def test_edits_and_activation_rejected_while_busy(self, store, test_db, project, test_client):
+        """测试项目仍在解压时拒绝在线编辑和切换版本"""
+        store.write_blob(_entry(b"v1")["hash"], [b"v1"])
+        first = rs.commit_revision(test_db, project, {"main.py": _entry(b"v1")})
+        project.status = "extracting"
+        test_db.commit()
+
+        response = test_client.post(f"/api/projects/{project.id}/files/save",
+                                    json={"path": "main.py", "content": "v2"})
+        assert response.status_code == 409
+        response = test_client.post(f"/api/projects/{project.id}/revisions/{first.revision}/activate")
+        assert response.status_code == 409
+
+    def test_execution_runs_in_project_dir_with_revision_exposed(self, store, test_db, make_task):
+        """测试执行在项目目录中运行（写入留在项目目录），固定的版本目录通过 KUMO_REVISION_DIR 暴露"""
+        from task_service import task_executor
+        script = ("import os; open('out.txt', 'w').write(os.environ['KUMO_REVISION_DIR']); "
+                  "print(open(os.path.join(os.environ['KUMO_REVISION_DIR'], 'main.py')).read())")
+        task = make_task(f'"{sys.executable}" -c "{script}"')
+        project = test_db.query(Project).filter(Project.id == task.project_id).first()
+        store.write_blob(_entry(b"v1")["hash"], [b"v1"])
+        revision = rs.commit_revision(test_db, project, {"main.py": _entry(b"v1")}).revision
+
+        task_executor.run_task_execution(task.id)
+
+        execution = test_db.query(TaskExecution).filter(TaskExecution.task_id == task.id).first()
+        test_db.refresh(execution)
+        assert execution.status == "success"
+        assert execution.revision == revision
+        with open(os.path.join(project.path, "out.txt")) as f:
+            assert f.read() == store.revision_path(project.id, revision)
+        assert not os.path.exists(os.path.join(store.revision_path(project.id, revision), "out.txt"))
+
+    def test_prune_removes_old_revisions(self, store, test_db, project):
+        """测试超出保留数量的旧版本被删除"""
+        for i in range(3):
+            content = f"v{i}".encode()
+            store.write_blob(_entry(content)["hash"], [content])
+            rs.commit_revision(test_db, project, {"main.py": _entry(content)})
+
+        removed = rs.prune_revisions(test_db, project, keep=1)
+
+        assert len(removed) == 2
+        assert test_db.query(ProjectRevision).count() == 1
+        assert not os.path.exists(store.revision_path(project.id, removed[0]))
+
+    def test_incremental_deploy_api(self, store, test_client, project):
+        """测试 diff -> 上传缺失 blob -> 提交 的部署流程"""
+        manifest = {"main.py": _entry(b"print('hi')"), "lib/util.py": _entry(b"x = 1")}
+
+        diff = test_client.post(f"/api/projects/{project.id}/revisions/diff", json={"files": manifest})
+        assert diff.status_code == 200
+        assert diff.json()["missing_count"] == 2
+
+        for content in (b"print('hi')", b"x = 1"):
+            response = test_client.put(f"/api/projects/blobs/{_entry(content)['hash']}", content=content)
+            assert response.status_code == 200
+
+        diff = test_client.post(f"/api/projects/{project.id}/revisions/diff", json={"files": manifest})
+        assert diff.json()["missing"] == []
+
+        response = test_client.post(f"/api/projects/{project.id}/revisions", json={"files": manifest})
+        assert response.status_code == 200
+        assert response.json()["is_current"] is True
+        assert os.path.exists(os.path.join(project.path, "lib", "util.py"))
@@ -0,0 +1,144 @@
+"""
+单元测试 - 任务分片执行
+"""
+import os
+import sys
+import time
+import pytest
+from unittest.mock import patch
+from task_service import models
+from task_service import task_executor
+from task_service import dispatcher as task_dispatcher_module
+from task_service.dispatcher import task_dispatcher
+
+
+SHARD_SCRIPT = (
+    "import os, sys; "
+    "index = os.environ['KUMO_SHARD_INDEX']; "
+    "out = sys.argv[1]; "
+    "open(os.path.join(out, 'shard_' + index + '_of_' + os.environ['KUMO_SHARD_COUNT']), 'a').write('x'); "
+    "marker = os.path.join(out, 'fail_' + index); "
+    "failing = os.path.exists(marker); "
+    "failing and os.remove(marker); "
+    "sys.exit(1 if failing or os.path.exists(os.path.join(out, 'always_fail_' + index)) else 0)"
+)
+
+
+@pytest.fixture
+def sharded_task(temp_dir, make_task, running_dispatcher):
+    """创建分片任务（分片经分发队列运行）"""
+    return make_task(f'"{sys.executable}" -c "{SHARD_SCRIPT}" "{temp_dir}"', name="sharded", shard_count=3,
+                     retry_count=1, retry_delay=0, failure_threshold=5)
+
+
+def _executions(test_db, task_id):
+    test_db.expire_all()
+    return test_db.query(models.TaskExecution).filter(models.TaskExecution.task_id == task_id).all()
+
+
+class TestSharding:
+    """分片执行测试"""
+
+    def test_shards_run_with_index_and_aggregate(self, test_db, temp_dir, sharded_task):
+        """测试每个分片获得各自的序号，父执行汇总状态"""
+        task_executor.run_task_execution(sharded_task.id)
+
+        for index in range(3):
+            assert os.path.exists(os.path.join(temp_dir, f"shard_{index}_of_3"))
+
+        executions = _executions(test_db, sharded_task.id)
+        parents = [e for e in executions if e.parent_execution_id is None]
+        assert len(parents) == 1
+        parent = parents[0]
+        assert parent.status == "success"
+        assert parent.duration is not None
+        assert sorted(e.shard_index for e in executions if e.parent_execution_id == parent.id) == [0, 1, 2]
+        assert "Shard 2: success" in parent.output
+        assert os.path.exists(parent.log_file)
+
+    def test_sharded_run_completes_with_single_pool_thread(self, test_db, temp_dir, sharded_task):
+        """测试分片父运行不占用运行线程池：线程池只有一个线程时分片仍能运行完成"""
+        task_dispatcher.shutdown()
+        with patch.object(task_dispatcher_module.settings, "max_concurrent_tasks", 1), \
+                patch.object(task_dispatcher_module.settings, "concurrency_max_limit", 1):
+            task_dispatcher.start()
+        task_dispatcher.submit(sharded_task.id)
+
+        deadline = time.time() + 30
+        parent = None
+        while time.time() < deadline:
+            parent = next((e for e in _executions(test_db, sharded_task.id) if e.parent_execution_id is None), None)
+            if parent and parent.status in ("success", "failed"):
+                break
+            time.sleep(0.1)
+        assert parent is not None and parent.status == "success"
+
+    def test_failed_shard_is_retried_alone(self, test_db, temp_dir, sharded_task):
+        """测试失败分片单独重试，其它分片不重复运行"""
+        open(os.path.join(temp_dir, "fail_1"), "w").close()
+
+        task_executor.run_task_execution(sharded_task.id)
+
+        executions = _executions(test_db, sharded_task.id)
+        shards = [e for e in executions if e.parent_execution_id is not None]
+        assert sorted((e.shard_index, e.attempt, e.status) for e in shards) == [
+            (0, 1, "success"), (1, 1, "failed"), (1, 2, "success"), (2, 1, "success"),
+        ]
+        assert [e.status for e in executions if e.parent_execution_id is None] == ["success"]
+        with open(os.path.join(temp_dir, "shard_0_of_3")) as f:
+            assert f.read() == "x"
+
+    def test_exhausted_shard_fails_parent(self, test_db, temp_dir, sharded_task):
+        """测试分片重试耗尽后父执行失败，并计入连续失败次数"""
+        open(os.path.join(temp_dir, "always_fail_2"), "w").close()
+
+        task_executor.run_task_execution(sharded_task.id)
+
+        executions = _executions(test_db, sharded_task.id)
+        parent = next(e for e in executions if e.parent_execution_id is None)
+        assert parent.status == "failed"
+        assert "Shard 2: failed" in parent.output
+        test_db.refresh(sharded_task)
+        assert sharded_task.consecutive_failures == 1
+
+    def test_unsharded_task_gets_default_shard_env(self, test_db, temp_dir, sharded_task):
+        """测试未分片任务也注入 KUMO_SHARD_INDEX=0 / KUMO_SHARD_COUNT=1"""
+        sharded_task.shard_count = 1
+        test_db.commit()
+
+        task_executor.run_task_execution(sharded_task.id)
+
+        assert os.path.exists(os.path.join(temp_dir, "shard_0_of_1"))
+        executions = _executions(test_db, sharded_task.id)
+        assert [(e.status, e.parent_execution_id) for e in executions] == [("success", None)]
+
+    def test_shards_go_through_dispatch_queue(self, test_db, sharded_task):
+        """测试分片经分发队列分发并各自占用执行槽，不计入任务的并行运行数"""
+        before = task_dispatcher.status()["dispatched"]
+        with patch.object(task_dispatcher, "_admit", wraps=task_dispatcher._admit) as admit:
+            task_executor.run_task_execution(sharded_task.id)
+
+        assert task_dispatcher.status()["dispatched"] - before == 3
+        admit.assert_not_called()
+        assert sharded_task.id not in task_dispatcher._active
+        assert {e.status for e in _executions(test_db, sharded_task.id)} == {"success"}
+
+    def test_shards_dropped_without_dispatcher(self, test_db, sharded_task):
+        """测试分发线程未运行时分片被标记为 dropped，父执行汇总为失败而不是一直等待"""
+        task_dispatcher.shutdown()
+
+        task_executor.run_task_execution(sharded_task.id)
+
+        executions = _executions(test_db, sharded_task.id)
+        assert sorted(e.status for e in executions if e.parent_execution_id) == ["dropped"] * 3
+        assert next(e for e in executions if e.parent_execution_id is None).status == "failed"
+
+    def test_delete_parent_removes_shards(self, test_db, test_client, sharded_task):
+        """测试删除父执行时一并删除分片执行"""
+        task_executor.run_task_execution(sharded_task.id)
+        parent = next(e for e in _executions(test_db, sharded_task.id) if e.parent_execution_id is None)
+
+        response = test_client.delete(f"/api/tasks/executions/{parent.id}")
+
+        assert response.status_code == 200
+        assert _executions(test_db, sharded_task.id) == []
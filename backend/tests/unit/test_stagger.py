@@ -0,0 +1,120 @@
+"""
+单元测试 - 定时错峰
+"""
+import datetime
+import pytest
+from unittest.mock import Mock, patch
+from apscheduler.triggers.cron import CronTrigger
+from task_service import models
+from task_service import stagger
+from task_service.stagger import OffsetTrigger, hash_offset, resolve_stagger, stagger_planner
+from task_service.task_manager import TaskManager
+
+
+@pytest.fixture
+def planner():
+    """每个测试从空的错峰计划开始"""
+    stagger_planner._offsets.clear()
+    stagger_planner._fires.clear()
+    stagger_planner._histogram.clear()
+    yield stagger_planner
+    stagger_planner._offsets.clear()
+    stagger_planner._fires.clear()
+    stagger_planner._histogram.clear()
+
+
+class TestOffsetTrigger:
+    """偏移触发器测试"""
+
+    def test_fire_times_are_shifted(self):
+        """测试每次触发时间都加上固定偏移，且连续触发间隔不变"""
+        trigger = OffsetTrigger(CronTrigger.from_crontab("0 * * * *"), 90)
+        now = datetime.datetime(2026, 1, 1, 10, 0, 30).astimezone()
+
+        first = trigger.get_next_fire_time(None, now)
+        second = trigger.get_next_fire_time(first, first)
+
+        assert (first.minute, first.second) == (1, 30)
+        assert first.hour == 10
+        assert second - first == datetime.timedelta(hours=1)
+
+
+class TestStaggerPlan:
+    """偏移分配测试"""
+
+    def test_hash_offset_is_stable(self):
+        """测试哈希偏移在窗口内且对同一任务固定"""
+        assert hash_offset(7, 300) == hash_offset(7, 300)
+        assert all(0 <= hash_offset(task_id, 60) < 60 for task_id in range(100))
+        assert len({hash_offset(task_id, 300) for task_id in range(20)}) > 1
+
+    def test_resolve_stagger(self):
+        """测试任务设置优先于全局模式，0 表示关闭"""
+        with patch.object(stagger.settings, "cron_stagger_mode", "off"):
+            assert resolve_stagger(None) == (0, "off")
+            assert resolve_stagger(120) == (120, "hash")
+        with patch.object(stagger.settings, "cron_stagger_mode", "spread"), \
+                patch.object(stagger.settings, "cron_stagger_window", 300):
+            assert resolve_stagger(None) == (300, "spread")
+            assert resolve_stagger(0) == (0, "off")
+
+    def test_spread_flattens_co_scheduled_tasks(self, planner):
+        """测试 spread 模式下同一表达式的任务分到不同的秒"""
+        trigger = CronTrigger.from_crontab("0 * * * *")
+        offsets = [planner.assign(task_id, trigger, 300, "spread") for task_id in range(1, 51)]
+
+        assert len(set(offsets)) == 50
+        assert max(planner._histogram.values()) == 1
+
+    def test_reassign_and_preview_ignore_own_fires(self, planner):
+        """测试重新分配和预览时不与任务自身已登记的触发冲突"""
+        trigger = CronTrigger.from_crontab("*/5 * * * *")
+        offset = planner.assign(1, trigger, 60, "spread")
+
+        assert planner.preview(1, trigger, 60, "spread") == offset
+        assert planner.assign(1, trigger, 60, "spread") == offset
+        planner.remove(1)
+        assert not planner._histogram
+
+
+class TestSchedulerIntegration:
+    """调度器与预览接口测试"""
+
+    def test_add_job_wraps_trigger(self, planner):
+        """测试设置了错峰窗口的任务使用偏移触发器，移除任务后清除计划"""
+        manager = TaskManager()
+        scheduler = Mock(spec=["get_job", "add_job", "remove_job"])
+        scheduler.get_job = Mock(return_value=None)
+        with patch.object(manager, "scheduler", scheduler):
+            manager.add_job(3, "cron", "0 0 * * *", "active", 0, stagger_window=600)
+            trigger = scheduler.add_job.call_args[1]["trigger"]
+            assert isinstance(trigger, OffsetTrigger)
+            assert trigger.offset == hash_offset(3, 600) == planner.get_offset(3)
+
+            manager.remove_job(3)
+        assert 3 not in planner._offsets
+
+    def test_preview_shows_effective_times(self, test_db, test_client, planner):
+        """测试预览接口按任务的错峰窗口返回实际触发时间"""
+        task = models.Task(name="staggered", command="echo", trigger_type="cron", trigger_value="0 * * * *",
+                           status="paused", stagger_window=600)
+        test_db.add(task)
+        test_db.commit()
+
+        data = test_client.post("/api/tasks/cron/preview",
+                                json={"cron_expression": "0 * * * *", "task_id": task.id}).json()
+
+        offset = hash_offset(task.id, 600)
+        assert (data["offset_seconds"], data["stagger_window"]) == (offset, 600)
+        first = datetime.datetime.strptime(data["effective_run_times"][0], "%Y-%m-%d %H:%M:%S")
+        assert (first.minute * 60 + first.second) == offset
+        assert len(data["effective_run_times"]) == 5
+
+    def test_preview_for_new_task_in_hash_mode(self, test_client, planner):
+        """测试新任务在 hash 模式下无法确定偏移，只返回窗口"""
+        data = test_client.post("/api/tasks/cron/preview",
+                                json={"cron_expression": "0 * * * *", "stagger_window": 120}).json()
+
+        assert (data["offset_seconds"], data["stagger_window"]) == (None, 120)
+        assert data["effective_run_times"] == []
+        assert len(data["next_run_times"]) == 5
@@ -0,0 +1,157 @@
+"""
+单元测试 - 卡死检测与停止信号升级
+"""
+import os
+import sys
+import time
+import signal
+import subprocess
+import psutil
+import pytest
+from unittest.mock import patch
+from task_service import models
+from task_service import process_manager as process_manager_module
+from task_service import resource_monitor as resource_monitor_module
+from task_service import task_executor
+from task_service.process_manager import parse_stop_sequence, process_manager
+from task_service.resource_monitor import ResourceMonitor
+
+# Ignores SIGINT and SIGTERM, only SIGKILL ends it
+STUBBORN_SCRIPT = (
+    "import signal, sys, time; "
+    "signal.signal(signal.SIGINT, signal.SIG_IGN); "
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+    "open(sys.argv[1], 'w').close(); "
+    "time.sleep(60)"
+)
+
+
+@pytest.fixture
+def stop_sequence():
+    """缩短宽限时间，测试结束后注销进程"""
+    with patch.object(process_manager_module.settings, "stop_sequence", "SIGINT:0.3,SIGTERM:0.3,SIGKILL"):
+        yield
+    for execution_id in list(process_manager.running_processes):
+        if execution_id >= 900000:
+            process_manager.unregister_process(execution_id)
+
+
+def _spawn(args):
+    return subprocess.Popen(args, start_new_session=True)
+
+
+class TestStopSequence:
+    """停止序列测试"""
+
+    def test_parse_stop_sequence(self):
+        """测试解析信号和宽限时间，缺少 SIGKILL 时追加，格式错误时使用默认序列"""
+        assert parse_stop_sequence("SIGINT:5,SIGTERM:10,SIGKILL") == [
+            (signal.SIGINT, 5.0), (signal.SIGTERM, 10.0), (signal.SIGKILL, 0.0)]
+        assert parse_stop_sequence("term:2") == [(signal.SIGTERM, 2.0), (signal.SIGKILL, 0.0)]
+        assert parse_stop_sequence("SIGNOPE:1") == [(signal.SIGTERM, 10.0), (signal.SIGKILL, 0.0)]
+
+    def test_escalates_to_sigkill(self, temp_dir, stop_sequence):
+        """测试忽略 SIGINT / SIGTERM 的进程在宽限时间后被 SIGKILL"""
+        marker = os.path.join(temp_dir, "ready")
+        process = _spawn([sys.executable, "-c", STUBBORN_SCRIPT, marker])
+        deadline = time.time() + 10
+        while not os.path.exists(marker) and time.time() < deadline:
+            time.sleep(0.05)
+        process_manager.register_process(900001, process)
+
+        started = time.time()
+        assert process_manager.stop_execution(900001)
+
+        assert process.wait(timeout=10) == -signal.SIGKILL
+        assert time.time() - started >= 0.5
+        assert process_manager.get_stop_reason(900001) == "stopped"
+
+    def test_first_signal_is_enough(self, stop_sequence):
+        """测试响应 SIGINT 的进程不再被升级"""
+        process = _spawn(["sleep", "30"])
+        process_manager.register_process(900002, process)
+
+        with patch.object(process_manager, "_send_signal", wraps=process_manager._send_signal) as send:
+            process_manager.stop_execution(900002)
+            assert process.wait(timeout=5) == -signal.SIGINT
+            time.sleep(0.5)
+
+        assert [c.args[3] for c in send.call_args_list] == [signal.SIGINT]
+
+
+class TestStallDetection:
+    """卡死检测测试"""
+
+    def test_output_or_cpu_counts_as_activity(self, temp_dir, stop_sequence):
+        """测试日志写入或 CPU 活动会重置空闲计时，超过 stall_timeout 后以 stalled 停止"""
+        log_file = os.path.join(temp_dir, "exec.log")
+        open(log_file, "w").close()
+        process = _spawn(["sleep", "30"])
+        process_manager.register_process(900003, process, log_file, stall_timeout=10)
+        monitor = ResourceMonitor()
+
+        assert not monitor._check_stall(900003, 0.0, 1000.0)
+        assert not monitor._check_stall(900003, 0.0, 1008.0)
+        with open(log_file, "a") as f:
+            f.write("progress\n")
+        assert not monitor._check_stall(900003, 0.0, 1009.0)
+        assert not monitor._check_stall(900003, 50.0, 1018.0)
+        assert not monitor._check_stall(900003, 0.0, 1027.0)
+        assert monitor._check_stall(900003, 0.0, 1028.0)
+
+        assert process_manager.get_stop_reason(900003) == "stalled"
+        assert process.wait(timeout=5) == -signal.SIGINT
+
+    def test_busy_child_process_counts_as_activity(self, stop_sequence):
+        """测试父进程空闲等待、子进程占用 CPU 时，采样计入子孙进程的 CPU"""
+        busy_child = "import subprocess, sys; subprocess.run([sys.executable, '-c', 'while True: pass'])"
+        process = _spawn([sys.executable, "-c", busy_child])
+        process_manager.register_process(900005, process)
+        root = psutil.Process(process.pid)
+        deadline = time.time() + 10
+        while not root.children(recursive=True) and time.time() < deadline:
+            time.sleep(0.05)
+
+        process_manager.tree_cpu_percent(900005, root)
+        time.sleep(0.5)
+
+        assert process_manager.tree_cpu_percent(900005, root) > 20
+        process_manager.stop_execution(900005)
+        process.wait(timeout=5)
+
+    def test_disabled_without_stall_timeout(self, stop_sequence):
+        """测试 stall_timeout 为 0 时不检测"""
+        process = _spawn(["sleep", "30"])
+        process_manager.register_process(900004, process)
+        monitor = ResourceMonitor()
+
+        monitor._check_stall(900004, 0.0, 1000.0)
+        assert not monitor._check_stall(900004, 0.0, 100000.0)
+        process.kill()
+        process.wait()
+
+
+class TestStalledExecution:
+    """执行器记录 stalled 状态测试"""
+
+    def test_silent_run_is_stalled(self, test_db, make_task, stop_sequence):
+        """测试没有输出的执行被卡死检测停止，记录为 stalled 并释放并发许可"""
+        task = make_task(f'"{sys.executable}" -c "import time; time.sleep(60)"', name="silent",
+                         timeout=3600, stall_timeout=1, retry_count=0)
+
+        monitor = ResourceMonitor()
+        with patch.object(resource_monitor_module.settings, "resource_monitor_interval", 0.2):
+            monitor.start()
+            try:
+                started = time.time()
+                task_executor.run_task_execution(task.id)
+                elapsed = time.time() - started
+            finally:
+                monitor.stop()
+
+        test_db.expire_all()
+        execution = test_db.query(models.TaskExecution).filter(models.TaskExecution.task_id == task.id).one()
+        assert execution.status == "stalled"
+        assert "[Stalled: no output and idle CPU for 1s, stopped]" in execution.output
+        assert elapsed < 20
+        assert test_db.get(models.Task, task.id).consecutive_failures == 1
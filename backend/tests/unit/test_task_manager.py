@@ -222,6 +222,7 @@ class TestTaskManager:
         mock_task.trigger_value = '{"value": 60, "unit": "seconds"}'
         mock_task.status = "active"
         mock_task.priority = 0
+        mock_task.stagger_window = None
         
         mock_session = Mock()
         mock_query = Mock()
@@ -231,4 +232,5 @@ class TestTaskManager:
         with patch('task_service.task_manager.SessionLocal', return_value=mock_session):
             manager.load_jobs_from_db()
             
-            manager.add_job.assert_called_once_with(1, "interval", '{"value": 60, "unit": "seconds"}', "active", 0)
+            manager.add_job.assert_called_once_with(1, "interval", '{"value": 60, "unit": "seconds"}', "active", 0,
+                                                    stagger_window=None)
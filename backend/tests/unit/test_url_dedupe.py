@@ -0,0 +1,121 @@
+"""
+单元测试 - URL 去重服务
+"""
+import os
+import sys
+import pytest
+from unittest.mock import patch
+from task_service.url_dedupe import BloomFilter, ScalableBloomFilter, url_dedupe_service
+from task_service.task_executor import RUNTIME_DIR
+
+sys.path.insert(0, RUNTIME_DIR)
+import kumo_dedupe  # noqa: E402
+
+
+@pytest.fixture
+def service(temp_dir):
+    url_dedupe_service.stop()
+    with patch("task_service.url_dedupe.settings.url_dedupe_dir", temp_dir), \
+            patch("task_service.url_dedupe.settings.url_dedupe_initial_capacity", 100):
+        yield url_dedupe_service
+        url_dedupe_service.stop()
+
+
+class TestScalableBloomFilter:
+    """布隆过滤器测试"""
+
+    def test_check_add_and_batch_duplicates(self, temp_dir):
+        """测试批量 check_add，同批重复元素也被识别"""
+        bloom = ScalableBloomFilter(os.path.join(temp_dir, "ns"), 100, 0.001)
+        assert bloom.check_add(["a", "b", "a"]) == [False, False, True]
+        assert bloom.check_add(["b", "c"]) == [True, False]
+        assert bloom.check_add(["d"], add=False) == [False]
+        assert bloom.check_add(["d"]) == [False]
+
+    def test_grows_and_keeps_error_rate(self, temp_dir):
+        """测试写满后扩展阶段，误判率保持在配置范围内"""
+        bloom = ScalableBloomFilter(os.path.join(temp_dir, "ns"), 100, 0.01)
+        bloom.check_add([f"http://example.com/{i}" for i in range(1000)])
+
+        assert bloom.stats()["stages"] == 4
+        assert all(bloom.check_add([f"http://example.com/{i}" for i in range(1000)], add=False))
+        false_positives = sum(bloom.check_add([f"http://other.com/{i}" for i in range(5000)], add=False))
+        assert false_positives / 5000 < 0.02
+
+    def test_state_persists_across_reopen(self, temp_dir):
+        """测试 mmap 文件在重新打开后保持状态"""
+        path = os.path.join(temp_dir, "ns")
+        bloom = ScalableBloomFilter(path, 100, 0.001)
+        bloom.check_add(["x", "y"])
+        bloom.close()
+
+        reopened = ScalableBloomFilter(path, 100, 0.001)
+        assert reopened.check_add(["x", "y", "z"]) == [True, True, False]
+        assert reopened.stats()["count"] == 3
+
+    def test_rejects_foreign_file(self, temp_dir):
+        """测试拒绝不是布隆过滤器的文件"""
+        path = os.path.join(temp_dir, "000.bf")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 128)
+        with pytest.raises(ValueError):
+            BloomFilter(path)
+
+
+class TestUrlDedupeService:
+    """去重服务与客户端测试"""
+
+    def test_client_shares_state_through_service(self, service):
+        """测试客户端通过本地服务共享去重状态"""
+        service.start()
+        env = service.client_env(task_id=3)
+        assert env["KUMO_DEDUPE_NAMESPACE"] == "task-3"
+
+        with patch.dict(os.environ, env):
+            assert kumo_dedupe.filter_new(["u1", "u2"]) == ["u1", "u2"]
+            assert kumo_dedupe.filter_new(["u2", "u3"]) == ["u3"]
+            assert kumo_dedupe.seen("u1") is True
+            assert kumo_dedupe.check_add(["u1"], namespace="other") == [False]
+
+        namespaces = service.list_namespaces()
+        assert namespaces["task-3"]["count"] == 3
+        assert namespaces["other"]["count"] == 1
+
+    def test_invalid_namespace(self, service):
+        """测试拒绝非法命名空间"""
+        from core.local_service import LocalServiceError
+        with pytest.raises(LocalServiceError):
+            service.check_add("../etc", ["a"])
+
+    def test_dot_namespaces_cannot_escape_dedupe_dir(self, service, temp_dir, test_client):
+        """测试 "."/".." 与指向外部的符号链接命名空间不能创建或删除去重目录之外的内容"""
+        from core.local_service import LocalServiceError
+        for namespace in (".", "..", "..."):
+            with pytest.raises(LocalServiceError):
+                service.reset(namespace)
+            with pytest.raises(LocalServiceError):
+                service.check_add(namespace, ["a"])
+        outside = os.path.join(temp_dir, "..", os.path.basename(temp_dir) + "-outside")
+        os.makedirs(outside, exist_ok=True)
+        os.symlink(outside, os.path.join(temp_dir, "linked"))
+        with pytest.raises(LocalServiceError):
+            service.reset("linked")
+        assert os.path.isdir(outside)
+        os.rmdir(outside)
+
+        assert test_client.delete("/api/system/dedupe/%2E%2E").status_code == 400
+        assert os.path.isdir(temp_dir)
+
+    def test_client_fallback_without_service(self):
+        """测试服务不可用时退化为进程内集合"""
+        with patch.dict(os.environ, {"KUMO_DEDUPE_URL": "http://127.0.0.1:1"}):
+            assert kumo_dedupe.check_add(["f1", "f1"], namespace="fallback") == [False, True]
+
+    def test_reset_endpoint(self, service, test_client):
+        """测试通过接口清空命名空间"""
+        service.check_add("task-9", ["a"])
+        assert "task-9" in test_client.get("/api/system/dedupe").json()["namespaces"]
+
+        assert test_client.delete("/api/system/dedupe/task-9").status_code == 200
+        assert test_client.delete("/api/system/dedupe/task-9").status_code == 404
+        assert service.check_add("task-9", ["a"]) == [False]
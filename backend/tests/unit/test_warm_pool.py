@@ -0,0 +1,110 @@
+"""
+单元测试 - 预热解释器池
+"""
+import os
+import sys
+import time
+import subprocess
+import pytest
+from unittest.mock import patch
+from task_service.warm_pool import WarmPool, WarmPoolError, parse_python_args
+
+
+@pytest.fixture
+def pool(temp_dir):
+    pool = WarmPool()
+    with patch("task_service.warm_pool.settings.logs_dir", temp_dir), \
+            patch("task_service.warm_pool.settings.warm_preload_modules", "json,not_a_real_module"):
+        yield pool
+        pool.shutdown_all()
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class TestParsePythonArgs:
+    """命令识别测试"""
+
+    @pytest.mark.parametrize("args,expected", [
+        (["py", "main.py", "--n", "1"], ["main.py", "--n", "1"]),
+        (["py", "-u", "-m", "pkg.mod"], ["-u", "-m", "pkg.mod"]),
+        (["py", "-c", "print(1)"], ["-c", "print(1)"]),
+        (["py", "-X", "dev", "main.py"], None),
+        (["py"], None),
+        (["scrapy", "crawl", "x"], None),
+    ])
+    def test_supported_forms(self, args, expected):
+        """测试只接受 script / -m / -c 形式"""
+        assert parse_python_args(args, "py") == expected
+
+
+class TestWarmPool:
+    """预热池运行测试"""
+
+    def test_runs_script_with_cwd_env_and_log(self, pool, temp_dir):
+        """测试子进程使用请求的工作目录、环境变量和日志文件"""
+        work = os.path.join(temp_dir, "work")
+        os.makedirs(work)
+        with open(os.path.join(work, "main.py"), "w") as f:
+            f.write("import os, sys\nprint(os.getcwd(), os.environ['KUMO_X'], sys.argv[1:])\n"
+                    "print('err', file=sys.stderr)\nsys.exit(3)\n")
+        log_path = os.path.join(temp_dir, "run.log")
+        open(log_path, "w").close()
+
+        process = pool.spawn([sys.executable, "main.py", "a"], sys.executable, work,
+                             {"KUMO_X": "42", "PATH": os.environ.get("PATH", "")}, log_path)
+
+        assert process.wait(timeout=30) == 3
+        assert process.poll() == 3
+        # Recorded like the exit code wrapper does, so the run can be reattached after a restart
+        assert _read(os.path.join(temp_dir, "run.exit")) == "3"
+        output = _read(log_path)
+        assert f"{work} 42 ['a']" in output
+        assert "err" in output
+        status = pool.status()[0]
+        assert status["runs"] == 1
+        assert status["preloaded"] == ["json"]
+        assert "not_a_real_module" in status["failed"]
+
+    def test_exceptions_and_modules(self, pool, temp_dir):
+        """测试未捕获异常返回 1，-m 与 -c 形式可运行"""
+        work = os.path.join(temp_dir, "work")
+        os.makedirs(os.path.join(work, "pkg"))
+        open(os.path.join(work, "pkg", "__init__.py"), "w").close()
+        with open(os.path.join(work, "pkg", "job.py"), "w") as f:
+            f.write("print('from module', __name__)\n")
+        log_path = os.path.join(temp_dir, "run.log")
+
+        assert pool.spawn([sys.executable, "-m", "pkg.job"], sys.executable, work, {}, log_path).wait(30) == 0
+        assert "from module __main__" in _read(log_path)
+        assert pool.spawn([sys.executable, "-c", "raise ValueError('boom')"],
+                          sys.executable, work, {}, log_path).wait(30) == 1
+        assert "ValueError: boom" in _read(log_path)
+
+    def test_timeout_and_kill(self, pool, temp_dir):
+        """测试 wait 超时抛出 TimeoutExpired，kill 终止整个进程组"""
+        log_path = os.path.join(temp_dir, "run.log")
+        process = pool.spawn([sys.executable, "-c", "import time; time.sleep(60)"],
+                             sys.executable, temp_dir, {}, log_path)
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            process.wait(timeout=0.2)
+        process.kill()
+        assert process.wait(timeout=10) < 0
+        assert _read(os.path.join(temp_dir, "run.exit")) == str(process.wait(timeout=10))
+
+    def test_recycles_after_max_runs(self, pool, temp_dir):
+        """测试达到运行次数上限后启用新的工作进程"""
+        log_path = os.path.join(temp_dir, "run.log")
+        with patch("task_service.warm_pool.settings.warm_pool_max_runs", 1):
+            pool.spawn([sys.executable, "-c", "pass"], sys.executable, temp_dir, {}, log_path).wait(30)
+            first_pid = pool.status()[0]["pid"]
+            pool.spawn([sys.executable, "-c", "pass"], sys.executable, temp_dir, {}, log_path).wait(30)
+            assert pool.status()[0]["pid"] != first_pid
+
+    def test_non_python_command_is_rejected(self, pool, temp_dir):
+        """测试非 Python 命令抛出 WarmPoolError 以便回退"""
+        with pytest.raises(WarmPoolError):
+            pool.spawn(["echo", "hi"], sys.executable, temp_dir, {}, os.path.join(temp_dir, "run.log"))
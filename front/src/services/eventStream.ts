@@ -0,0 +1,148 @@
+/**
+ * 实时事件服务
+ * 整个页面共享一个到 /api/events/ws 的 WebSocket 连接，按主题分发任务、执行、执行槽、主机统计和环境状态的变化。
+ * 断线后指数退避重连，并携带上次的事件序号补发；服务端要求重新同步时通知订阅者重新拉取全量数据。
+ */
+import { ref } from 'vue'
+
+export type EventTopic = 'task' | 'execution' | 'slots' | 'system' | 'env'
+
+export interface BusEvent<T = any> {
+  seq: number
+  topic: EventTopic
+  ts: number
+  data: T
+}
+
+/** 收到事件时调用；event 为 null 表示需要重新同步（重新拉取全量数据） */
+export type EventHandler<T = any> = (event: BusEvent<T> | null) => void
+
+const WS_URL = (() => {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+  return `${protocol}//${window.location.host}/api/events/ws`
+})()
+
+class EventStreamService {
+  /** 连接状态，断开时页面回退到轮询 */
+  readonly connected = ref(false)
+
+  private socket: WebSocket | null = null
+  private handlers: Map<EventTopic, Set<EventHandler>> = new Map()
+  private lastSeq: number | null = null
+  private retryDelay = 1000
+  private maxRetryDelay = 30000
+  private reconnectTimer: number | null = null
+
+  /**
+   * 订阅主题，返回取消订阅函数；第一个订阅者建立连接，最后一个取消时断开
+   */
+  subscribe<T = any>(topic: EventTopic, handler: EventHandler<T>): () => void {
+    if (!this.handlers.has(topic)) {
+      this.handlers.set(topic, new Set())
+    }
+    this.handlers.get(topic)!.add(handler)
+    this.reconnect()
+
+    return () => {
+      this.handlers.get(topic)?.delete(handler)
+      if (this.handlers.get(topic)?.size === 0) {
+        this.handlers.delete(topic)
+      }
+      this.reconnect()
+    }
+  }
+
+  private topics(): string {
+    return Array.from(this.handlers.keys()).sort().join(',')
+  }
+
+  /** 订阅主题变化时重建连接（服务端按连接过滤主题） */
+  private reconnect() {
+    const topics = this.topics()
+    if (this.socket && (this.socket as any).kumoTopics === topics) {
+      return
+    }
+    this.close()
+    if (topics) {
+      this.connect()
+    }
+  }
+
+  private connect() {
+    const topics = this.topics()
+    const params = new URLSearchParams({ topics })
+    if (this.lastSeq !== null) {
+      params.set('since', String(this.lastSeq))
+    }
+
+    const ws = new WebSocket(`${WS_URL}?${params.toString()}`)
+    ;(ws as any).kumoTopics = topics
+    this.socket = ws
+
+    ws.onopen = () => {
+      this.retryDelay = 1000
+      this.connected.value = true
+    }
+
+    ws.onmessage = (message) => {
+      let payload: any
+      try {
+        payload = JSON.parse(message.data)
+      } catch {
+        return
+      }
+      if (payload.type === 'hello') {
+        if (this.lastSeq === null) {
+          this.lastSeq = payload.seq
+        }
+      } else if (payload.type === 'resync') {
+        this.lastSeq = payload.seq
+        this.handlers.forEach((_, topic) => this.dispatch(topic, null))
+      } else if (payload.topic) {
+        this.lastSeq = payload.seq
+        this.dispatch(payload.topic, payload)
+      }
+    }
+
+    ws.onclose = () => {
+      if (this.socket !== ws) {
+        return
+      }
+      this.socket = null
+      this.connected.value = false
+      if (this.handlers.size > 0) {
+        this.reconnectTimer = window.setTimeout(() => {
+          this.reconnectTimer = null
+          this.connect()
+        }, this.retryDelay)
+        this.retryDelay = Math.min(this.retryDelay * 2, this.maxRetryDelay)
+      }
+    }
+  }
+
+  private close() {
+    if (this.reconnectTimer) {
+      clearTimeout(this.reconnectTimer)
+      this.reconnectTimer = null
+    }
+    if (this.socket) {
+      const ws = this.socket
+      this.socket = null
+      ws.close()
+    }
+    this.connected.value = false
+  }
+
+  private dispatch(topic: EventTopic, event: BusEvent | null) {
+    this.handlers.get(topic)?.forEach(handler => {
+      try {
+        handler(event)
+      } catch (error) {
+        console.error('Event handler error:', error)
+      }
+    })
+  }
+}
+
+// 导出单例
+export const eventStream = new EventStreamService()